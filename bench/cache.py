@@ -0,0 +1,118 @@
+"""
+レスポンスキャッシュ（SQLite）。
+
+(model, 最終 messages, サンプリングパラメータ, run_index, エンドポイント, ストリームの読み方) の安定ハッシュをキーに、
+生成結果と計測値（TTFT/E2E/ITL/トークン数）を保存する。評価ルールを変えたときに
+推論をやり直さずに再評価するためのもので、評価結果そのものは保存しない。
+
+モード:
+- auto : temperature == 0 のとき read、それ以外は off（既定）
+- read : ヒットすれば保存済みの結果を返し、ミスなら実行して保存する
+- write: 常に実行し、結果で上書き保存する
+- off  : 使わない
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+CACHE_MODES = ("auto", "read", "write", "off")
+DEFAULT_CACHE_FILE = "responses.sqlite"
+
+
+def cache_key(model: str, messages: list, params: dict, run_index: int = 0, base_url: str = None,
+              stream_backend: str = None) -> str:
+    """
+    キャッシュキー（sha256）。messages には base64 画像もそのまま含まれる。
+    run_index を含めるので runs > 1 でも run ごとに別の計測値が保存される。
+    TTFT / E2E はエンドポイントとストリームの読み方（sdk / raw）で変わるので、base_url と stream_backend も含める
+    （別のサーバーで測った値を再生しない）。
+    """
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params or {}, "run_index": int(run_index),
+         "base_url": (base_url or "").rstrip("/"), "stream_backend": stream_backend},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def resolve_cache_mode(mode, params: dict) -> str:
+    """auto を read / off に解決する（決定的な temperature 0 のみキャッシュから返す）。"""
+    mode = (mode or "auto").lower()
+    if mode not in CACHE_MODES:
+        raise ValueError(f"不明なキャッシュモード: {mode}（{', '.join(CACHE_MODES)}）")
+    if mode == "auto":
+        return "read" if float((params or {}).get("temperature", 0) or 0) == 0 else "off"
+    return mode
+
+
+class ResponseCache:
+    """スレッドセーフな SQLite レスポンスキャッシュ。"""
+
+    def __init__(self, path, mode: str = "read"):
+        self.path = Path(path)
+        if self.path.suffix == "":
+            self.path = self.path / DEFAULT_CACHE_FILE
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                record TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @property
+    def readable(self) -> bool:
+        return self.mode == "read"
+
+    @property
+    def writable(self) -> bool:
+        return self.mode in ("read", "write")
+
+    def get(self, key: str):
+        """保存済みの結果（_stream_completion の戻り値と同じ形）を返す。なければ None。"""
+        if not self.readable:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, model: str, record: dict) -> None:
+        """正常終了した結果だけを保存する（エラー・キャンセルは保存しない）。"""
+        if not self.writable or record.get("status") != "ok":
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, created_at, record) VALUES (?, ?, ?, ?)",
+                (key, model, time.time(), json.dumps(record, ensure_ascii=False)),
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,359 @@
+"""
+実行間の統計的な比較と回帰検出。
+
+2つ以上の結果セット（results_*.jsonl、または結果DBの run_id）を受け取り、最初のセットをベースラインとして
+残りを1つずつ比べる。比較の単位は1リクエスト（旧形式の各 run、variants の各 variant × run）で、
+(モデル, ケース, variant, run) が一致するものを対応付ける。
+
+- レイテンシ（TTFT / E2E）: 中央値の変化率と、そのブートストラップ信頼区間。
+  対応の取れる標本が min_pairs 以上なら Wilcoxon 符号順位検定、足りなければ Mann–Whitney の U 検定
+  （どちらも同順位補正付きの正規近似）
+- 正解率: 対応の取れた合否の不一致 (b: 合格→不合格, c: 不合格→合格) に対する McNemar 検定（正確二項）
+
+p < alpha かつ閾値を超えて悪化した項目を回帰とし、1つでもあれば終了コード 1 を返す（夜間実行のゲート用）。
+
+使い方:
+    python -m bench.compare out/results_base.jsonl out/results_new.jsonl
+    python -m bench.compare --db out/results.sqlite results_20260101_000000 results_20260108_000000 \\
+        --group category --latency-threshold 0.1 --accuracy-threshold 0.05 --html out/compare.html
+"""
+import argparse
+import html as html_lib
+import json
+import math
+import random
+import statistics
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from bench.main import load_results_jsonl
+    from bench.report import _STYLE
+    from bench.resultsdb import ResultsDB
+except ImportError:
+    from main import load_results_jsonl
+    from report import _STYLE
+    from resultsdb import ResultsDB
+
+METRICS = ("ttft_ms", "e2e_ms")
+GROUPS = ("model", "category", "case")
+
+
+# --- 検定 ---
+
+def _ranks(values: Sequence[float]) -> Tuple[List[float], float]:
+    """平均順位（1始まり）と、同順位補正の項 sum(t^3 - t) を返す。"""
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0.0] * len(values)
+    tie_term = 0.0
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        rank = (i + j) / 2 + 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = rank
+        t = j - i + 1
+        tie_term += t ** 3 - t
+        i = j + 1
+    return ranks, tie_term
+
+
+def _two_sided_p(z: float) -> float:
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+def mann_whitney_u(a: Sequence[float], b: Sequence[float]) -> Optional[float]:
+    """Mann–Whitney の U 検定（両側、正規近似・連続性補正）の p 値。標本が足りなければ None。"""
+    n1, n2 = len(a), len(b)
+    if n1 < 2 or n2 < 2:
+        return None
+    ranks, tie_term = _ranks(list(a) + list(b))
+    u1 = sum(ranks[:n1]) - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    var = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if var <= 0:
+        return 1.0
+    diff = u1 - n1 * n2 / 2
+    z = (abs(diff) - 0.5) / math.sqrt(var) if abs(diff) >= 0.5 else 0.0
+    return _two_sided_p(z)
+
+
+def wilcoxon_signed_rank(a: Sequence[float], b: Sequence[float]) -> Optional[float]:
+    """対応のある標本の Wilcoxon 符号順位検定（両側、正規近似・連続性補正）の p 値。"""
+    diffs = [y - x for x, y in zip(a, b) if y != x]
+    n = len(diffs)
+    if n == 0:
+        return 1.0
+    if n < 2:
+        return None
+    ranks, tie_term = _ranks([abs(d) for d in diffs])
+    w_plus = sum(r for r, d in zip(ranks, diffs) if d > 0)
+    var = n * (n + 1) * (2 * n + 1) / 24 - tie_term / 48
+    if var <= 0:
+        return 1.0
+    diff = w_plus - n * (n + 1) / 4
+    z = (abs(diff) - 0.5) / math.sqrt(var) if abs(diff) >= 0.5 else 0.0
+    return _two_sided_p(z)
+
+
+def mcnemar_exact(b: int, c: int) -> float:
+    """McNemar 検定（正確二項、両側）の p 値。b, c は不一致の件数。"""
+    n = b + c
+    if n == 0:
+        return 1.0
+    k = min(b, c)
+    tail = sum(math.comb(n, i) for i in range(k + 1)) / 2 ** n
+    return min(1.0, 2 * tail)
+
+
+def bootstrap_ratio_ci(a: Sequence[float], b: Sequence[float], paired: bool, iterations: int = 1000,
+                       confidence: float = 0.95, seed: int = 0) -> Optional[Tuple[float, float]]:
+    """median(b) / median(a) - 1 のブートストラップ（パーセンタイル法）信頼区間。"""
+    if len(a) < 2 or len(b) < 2:
+        return None
+    rng = random.Random(seed)
+    ratios = []
+    for _ in range(iterations):
+        if paired:
+            idx = [rng.randrange(len(a)) for _ in range(len(a))]
+            ma = statistics.median(a[i] for i in idx)
+            mb = statistics.median(b[i] for i in idx)
+        else:
+            ma = statistics.median(rng.choices(a, k=len(a)))
+            mb = statistics.median(rng.choices(b, k=len(b)))
+        if ma > 0:
+            ratios.append(mb / ma - 1)
+    if not ratios:
+        return None
+    ratios.sort()
+    lo = ratios[int((1 - confidence) / 2 * (len(ratios) - 1))]
+    hi = ratios[int((1 + confidence) / 2 * (len(ratios) - 1))]
+    return lo, hi
+
+
+# --- 結果セット ---
+
+def request_records(results: List[dict]) -> Dict[tuple, dict]:
+    """
+    結果を {(model, case_id, category_id, variant_index, run_index): 1リクエストの計測値と合否} にする。
+    スキップ（未実行）は含めず、エラーは status を残す（レイテンシ比較では除外、合否では不合格扱い）。
+    """
+    records = {}
+    for r in results:
+        if r.get("status") == "skipped":
+            continue
+        base = (r.get("model"), r.get("case_id"), r.get("category_id") or r.get("category_name") or "")
+        if r.get("is_variant_test"):
+            for v in r.get("variant_details") or []:
+                if v.get("status") == "skipped":
+                    continue
+                records[base + (v.get("variant_index"), v.get("run_index"))] = v
+        else:
+            records[base + (None, r.get("run_index"))] = r
+    return records
+
+
+def load_result_set(source: str, db: Optional[ResultsDB] = None) -> List[dict]:
+    """JSONL のパス、または結果DBの run_id から結果を読み込む。"""
+    if Path(source).is_file() or db is None:
+        return load_results_jsonl(source)
+    rows = db.query("SELECT record FROM results WHERE run_id = ? ORDER BY rowid", (source,))
+    if not rows:
+        raise ValueError(f"結果DBに run_id が見つかりません: {source}")
+    return [json.loads(row["record"]) for row in rows]
+
+
+def _group_key(key: tuple, group: str) -> tuple:
+    model, case_id, category = key[:3]
+    if group == "category":
+        return (model, category)
+    if group == "case":
+        return (model, case_id)
+    return (model,)
+
+
+def compare_sets(baseline: List[dict], candidate: List[dict], group: str = "model", alpha: float = 0.05,
+                 latency_threshold: float = 0.10, accuracy_threshold: float = 0.05, min_pairs: int = 5,
+                 bootstrap: int = 1000) -> List[dict]:
+    """
+    baseline と candidate をグループごとに比べた行のリストを返す。
+    各行: {"group", "metric", "baseline", "candidate", "change", "ci", "p", "test", "n", "regression"}
+    レイテンシの行には、標本から除いたキャッシュ再生のレコード数 "cached": [baseline, candidate] も付ける。
+    latency_threshold: 中央値の悪化率（0.10 = +10%）、accuracy_threshold: 正解率の低下幅（0.05 = 5pt）
+    """
+    if group not in GROUPS:
+        raise ValueError(f"不明な group: {group}（{', '.join(GROUPS)}）")
+    base = request_records(baseline)
+    cand = request_records(candidate)
+    groups: Dict[tuple, Dict[str, dict]] = {}
+    for side, records in (("base", base), ("cand", cand)):
+        for key, rec in records.items():
+            groups.setdefault(_group_key(key, group), {"base": {}, "cand": {}})[side][key] = rec
+
+    rows = []
+    for gkey, sides in groups.items():
+        if not sides["base"] or not sides["cand"]:
+            continue  # 片方にしかないモデル・ケースは比べない
+        paired_keys = [k for k in sides["base"] if k in sides["cand"]]
+
+        # キャッシュから再生したレコードは前回の計測値なので、レイテンシの標本には入れない
+        cached = [sum(1 for rec in sides[side].values() if rec.get("cached")) for side in ("base", "cand")]
+        for metric in METRICS:
+            def ok_value(rec):
+                v = rec.get(metric)
+                return v if rec.get("status") == "ok" and not rec.get("cached") and v is not None else None
+
+            pairs = [(ok_value(sides["base"][k]), ok_value(sides["cand"][k])) for k in paired_keys]
+            pairs = [(x, y) for x, y in pairs if x is not None and y is not None]
+            if len(pairs) >= min_pairs:
+                a, b = [x for x, _ in pairs], [y for _, y in pairs]
+                p, test, paired = wilcoxon_signed_rank(a, b), "wilcoxon", True
+            else:
+                a = [v for v in map(ok_value, sides["base"].values()) if v is not None]
+                b = [v for v in map(ok_value, sides["cand"].values()) if v is not None]
+                p, test, paired = mann_whitney_u(a, b), "mann-whitney", False
+            if not a or not b:
+                if any(cached):  # 全部キャッシュ再生だったことは黙って落とさずに残す
+                    rows.append({
+                        "group": list(gkey), "metric": f"{metric} (median)", "baseline": None, "candidate": None,
+                        "change": None, "ci": None, "p": None, "test": "-", "n": [len(a), len(b)],
+                        "cached": cached, "regression": False,
+                    })
+                continue
+            ma, mb = statistics.median(a), statistics.median(b)
+            change = (mb / ma - 1) if ma > 0 else None
+            ci = bootstrap_ratio_ci(a, b, paired, iterations=bootstrap) if bootstrap else None
+            rows.append({
+                "group": list(gkey), "metric": f"{metric} (median)", "baseline": ma, "candidate": mb,
+                "change": change, "ci": list(ci) if ci else None, "p": p, "test": test, "n": [len(a), len(b)],
+                "cached": cached,
+                "regression": bool(p is not None and p < alpha and change is not None and change > latency_threshold),
+            })
+
+        # 正解率（対応の取れたものだけ。エラーは不合格として数える）
+        if paired_keys:
+            b_count = c_count = base_pass = cand_pass = 0
+            for k in paired_keys:
+                x = bool(sides["base"][k].get("passed")) and sides["base"][k].get("status") == "ok"
+                y = bool(sides["cand"][k].get("passed")) and sides["cand"][k].get("status") == "ok"
+                base_pass += x
+                cand_pass += y
+                b_count += x and not y
+                c_count += y and not x
+            n = len(paired_keys)
+            p = mcnemar_exact(b_count, c_count)
+            change = (cand_pass - base_pass) / n
+            rows.append({
+                "group": list(gkey), "metric": "pass_rate", "baseline": base_pass / n, "candidate": cand_pass / n,
+                "change": change, "ci": None, "p": p, "test": f"mcnemar (b={b_count}, c={c_count})", "n": [n, n],
+                "regression": bool(p < alpha and -change > accuracy_threshold),
+            })
+    rows.sort(key=lambda r: (r["group"], r["metric"]))
+    return rows
+
+
+# --- 出力 ---
+
+def _fmt_value(metric: str, v) -> str:
+    if v is None:
+        return "-"
+    return f"{v * 100:.1f}%" if metric == "pass_rate" else f"{v:.1f}"
+
+
+def _fmt_change(row: dict) -> str:
+    if row["change"] is None:
+        return "-"
+    if row["metric"] == "pass_rate":
+        return f"{row['change'] * 100:+.1f}pt"
+    text = f"{row['change'] * 100:+.1f}%"
+    if row["ci"]:
+        text += f" [{row['ci'][0] * 100:+.1f}%, {row['ci'][1] * 100:+.1f}%]"
+    return text
+
+
+def _fmt_test(row: dict) -> str:
+    cached = row.get("cached")
+    return f"{row['test']} (cached {cached[0]}/{cached[1]})" if cached and any(cached) else row["test"]
+
+
+def format_text(comparisons: List[dict]) -> str:
+    lines = []
+    for comp in comparisons:
+        lines.append(f"=== {comp['baseline']} -> {comp['candidate']}")
+        for row in comp["rows"]:
+            flag = "REGRESSION" if row["regression"] else ""
+            p = "-" if row["p"] is None else f"{row['p']:.4f}"
+            lines.append(f"{' / '.join(map(str, row['group'])):<50} {row['metric']:<18} "
+                         f"{_fmt_value(row['metric'], row['baseline']):>9} -> {_fmt_value(row['metric'], row['candidate']):>9} "
+                         f"{_fmt_change(row):<32} p={p:<7} {_fmt_test(row):<26} {flag}")
+    return "\n".join(lines)
+
+
+def write_html(comparisons: List[dict], path) -> None:
+    with open(path, "w", encoding="utf-8") as out:
+        out.write('<!DOCTYPE html><html lang="ja"><head><meta charset="UTF-8"><title>Benchmark Comparison</title>')
+        out.write(_STYLE)
+        out.write("</head><body><h1>📈 実行間の比較</h1>")
+        for comp in comparisons:
+            regressions = sum(r["regression"] for r in comp["rows"])
+            out.write(f"<h2>{html_lib.escape(comp['baseline'])} → {html_lib.escape(comp['candidate'])}</h2>")
+            out.write(f"<p class='{'fail' if regressions else 'pass'}'>回帰: {regressions} 件</p>")
+            out.write("<table><tr><th>グループ</th><th>指標</th><th>ベースライン</th><th>比較対象</th>"
+                      "<th>変化 [95% CI]</th><th>p</th><th>検定</th></tr>")
+            for row in comp["rows"]:
+                cls = "fail" if row["regression"] else ""
+                p = "-" if row["p"] is None else f"{row['p']:.4f}"
+                out.write(f"<tr class='{cls}'><td>{html_lib.escape(' / '.join(map(str, row['group'])))}</td>"
+                          f"<td>{row['metric']}</td><td>{_fmt_value(row['metric'], row['baseline'])}</td>"
+                          f"<td>{_fmt_value(row['metric'], row['candidate'])}</td><td>{_fmt_change(row)}</td>"
+                          f"<td>{p}</td><td>{html_lib.escape(_fmt_test(row))}</td></tr>")
+            out.write("</table>")
+        out.write("</body></html>")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="結果セットを統計的に比較し、回帰があれば終了コード 1 を返す")
+    parser.add_argument("sources", nargs="+", help="results_*.jsonl または --db の run_id（最初がベースライン）")
+    parser.add_argument("--db", help="結果DB（sources を run_id として読む）")
+    parser.add_argument("--group", choices=GROUPS, default="model")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--latency-threshold", type=float, default=0.10, help="中央値の悪化率（0.10 = +10%%）")
+    parser.add_argument("--accuracy-threshold", type=float, default=0.05, help="正解率の低下幅（0.05 = 5pt）")
+    parser.add_argument("--min-pairs", type=int, default=5, help="これ未満なら対応なしの検定にする")
+    parser.add_argument("--bootstrap", type=int, default=1000, help="ブートストラップの反復回数（0 で省略）")
+    parser.add_argument("--json", help="比較結果の JSON 出力先")
+    parser.add_argument("--html", help="比較結果の HTML 出力先")
+    args = parser.parse_args(argv)
+    if len(args.sources) < 2:
+        parser.error("比較には2つ以上の結果セットが必要です")
+
+    db = ResultsDB(args.db) if args.db else None
+    try:
+        sets = [load_result_set(s, db) for s in args.sources]
+    finally:
+        if db is not None:
+            db.close()
+
+    comparisons = [
+        {"baseline": args.sources[0], "candidate": source,
+         "rows": compare_sets(sets[0], results, args.group, args.alpha, args.latency_threshold,
+                              args.accuracy_threshold, args.min_pairs, args.bootstrap)}
+        for source, results in zip(args.sources[1:], sets[1:])
+    ]
+    print(format_text(comparisons))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(comparisons, f, ensure_ascii=False, indent=2)
+    if args.html:
+        write_html(comparisons, args.html)
+
+    regressions = sum(r["regression"] for comp in comparisons for r in comp["rows"])
+    print(f"Regressions: {regressions}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+複数の推論エンドポイントへの作業分配（coordinator モード）。
+
+1つのジョブの作業単位（main.run_bench_distributed では (モデル, ケース)）を、容量（同時に処理する
+作業単位の数）付きのエンドポイントに分配する。
+
+- 最初に、各作業単位を「そのモデルを持つエンドポイント」のうち 負荷 / 容量 が最小のものへ割り当てる
+- 各エンドポイントは容量の数だけワーカースレッドを持ち、自分のキューの先頭から取り出して実行する
+- 自分のキューが空になったら、他のエンドポイントのうち残りが最も多いキューの末尾から、自分も実行できる
+  作業単位を盗む（work stealing）。速いマシンが遅いマシンの残りを引き取るので、終了時刻が揃う
+- 作業単位の実行で例外が出たエンドポイントは以後使わない（その作業単位はキューに戻し、他が引き取る）。
+  run が EndpointUnavailable(detach=False) を投げた場合は切り離さず、その作業単位をもう一度実行する
+- 切り離しで戻った作業単位が、他のワーカーが終わった後に残っていれば、生きているエンドポイントで続けて実行する
+
+エンドポイントの指定: "URL[=容量],URL[=容量],..."（容量の既定は 1）
+    python -m bench.main --suite bench/suite.yaml --endpoints http://gpu1:1234/v1=2,http://cpu1:1234/v1
+"""
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+
+def parse_endpoints(spec) -> List[dict]:
+    """
+    "URL[=容量],..." または [str | {"base_url", "capacity"}] を [{"base_url", "capacity"}] にする。
+    """
+    items = [s for s in str(spec).split(",") if s.strip()] if isinstance(spec, str) else list(spec or [])
+    endpoints = []
+    for item in items:
+        if isinstance(item, dict):
+            base_url, capacity = item["base_url"], item.get("capacity", 1)
+        else:
+            base_url, _, capacity = str(item).strip().partition("=")
+            capacity = capacity or 1
+        capacity = int(capacity)
+        if capacity < 1:
+            raise ValueError(f"エンドポイントの容量は1以上にしてください: {item}")
+        endpoints.append({"base_url": base_url.strip(), "capacity": capacity})
+    if not endpoints:
+        raise ValueError("エンドポイントが指定されていません")
+    return endpoints
+
+
+class EndpointUnavailable(Exception):
+    """
+    エンドポイントに接続できず、作業単位を実行できなかった（結果は記録せずにキューに戻す）。
+    detach=False なら一時的なものとして、同じエンドポイントで実行し直す。
+    """
+
+    def __init__(self, message: str, detach: bool = True):
+        super().__init__(message)
+        self.detach = detach
+
+
+class WorkStealingQueues:
+    """エンドポイントごとの作業キュー。空になったワーカーは他のキューの末尾から盗む。"""
+
+    def __init__(self, count: int):
+        self._lock = threading.Lock()
+        self._queues = [deque() for _ in range(count)]
+        self.steals = [0] * count
+
+    def push(self, owner: int, item, front: bool = False) -> None:
+        with self._lock:
+            if front:
+                self._queues[owner].appendleft(item)
+            else:
+                self._queues[owner].append(item)
+
+    def pop(self, owner: int, accept: Callable = None):
+        """自分のキューの先頭、なければ最も長い他のキューの末尾から accept できるものを取る（なければ None）。"""
+        with self._lock:
+            if self._queues[owner]:
+                return self._queues[owner].popleft()
+            victims = sorted((q for i, q in enumerate(self._queues) if i != owner and q), key=len, reverse=True)
+            for q in victims:
+                for pos in range(len(q) - 1, -1, -1):
+                    if accept is None or accept(q[pos]):
+                        item = q[pos]
+                        del q[pos]
+                        self.steals[owner] += 1
+                        return item
+            return None
+
+    def remaining(self) -> list:
+        with self._lock:
+            return [item for q in self._queues for item in q]
+
+
+def run_work_stealing(endpoints: List[dict], units: list, run: Callable, eligible: Callable = None,
+                      cancel_check: Callable = None, progress_callback: Callable = None) -> Dict[str, object]:
+    """
+    units を endpoints に分配して run(endpoint, unit) を実行する。
+    eligible(endpoint, unit) が False のエンドポイントには割り当てない（そのモデルを持たない等）。
+
+    戻り値: {"unassigned": 実行されなかった作業単位, "endpoints": エンドポイントごとの統計}
+    run は複数スレッドから同時に呼ばれる。
+    """
+    def can_run(ep_idx, unit):
+        return eligible is None or eligible(endpoints[ep_idx], unit)
+
+    queues = WorkStealingQueues(len(endpoints))
+    load = [0] * len(endpoints)
+    unassigned = []
+    for unit in units:
+        candidates = [i for i in range(len(endpoints)) if can_run(i, unit)]
+        if not candidates:
+            unassigned.append(unit)
+            continue
+        target = min(candidates, key=lambda i: (load[i] / endpoints[i]["capacity"], i))
+        load[target] += 1
+        queues.push(target, unit)
+
+    stats = [{"base_url": ep["base_url"], "capacity": ep["capacity"], "assigned": load[i],
+              "completed": 0, "busy_ms": 0.0, "failed": None} for i, ep in enumerate(endpoints)]
+    lock = threading.Lock()
+    dead = set()
+
+    def detach(ep_idx, error):
+        with lock:
+            dead.add(ep_idx)
+            stats[ep_idx]["failed"] = str(error)
+        if progress_callback:
+            progress_callback("error", f"エンドポイント {endpoints[ep_idx]['base_url']} を切り離しました: {error}")
+
+    def worker(ep_idx):
+        endpoint = endpoints[ep_idx]
+        while ep_idx not in dead:
+            if cancel_check and cancel_check():
+                return
+            unit = queues.pop(ep_idx, accept=lambda u: can_run(ep_idx, u))
+            if unit is None:
+                return
+            start = time.perf_counter()
+            try:
+                run(endpoint, unit)
+            except EndpointUnavailable as e:
+                queues.push(ep_idx, unit, front=True)
+                if not e.detach:
+                    continue
+                detach(ep_idx, e)
+                return
+            except Exception as e:
+                # 他のエンドポイントが盗めるよう、自分のキューに戻しておく
+                queues.push(ep_idx, unit, front=True)
+                detach(ep_idx, e)
+                return
+            with lock:
+                stats[ep_idx]["completed"] += 1
+                stats[ep_idx]["busy_ms"] += (time.perf_counter() - start) * 1000
+
+    while True:
+        threads = [
+            threading.Thread(target=worker, args=(i,), name=f"coordinator-{i}-{slot}", daemon=True)
+            for i, ep in enumerate(endpoints) if i not in dead for slot in range(ep["capacity"])
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # 他のワーカーが終わった後に切り離しで戻った作業単位は、実行できる生きたエンドポイントでもう一度回す
+        if cancel_check and cancel_check():
+            break
+        live = [i for i in range(len(endpoints)) if i not in dead]
+        if not any(can_run(i, unit) for unit in queues.remaining() for i in live):
+            break
+
+    for i, st in enumerate(stats):
+        st["stolen"] = queues.steals[i]
+    return {"unassigned": unassigned + queues.remaining(), "endpoints": stats}
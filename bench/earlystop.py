@@ -0,0 +1,111 @@
+"""
+variants 形式のケースの逐次判定（early stopping）。
+
+variants 形式のケースは pass_rate >= pass_threshold で合格になる（母数は status が ok の実行）。従来は
+判定がすでに決まっていても全 variant × run を実行していた。ここでは結果が1件届くごとに判定を更新し、
+決まった時点で以降のリクエストを送らない（すでに送信済みのものは結果に含める）。
+
+モード:
+    off:           全件実行する（正確な合格率が必要な場合。CLI の --full）
+    deterministic: 残りの結果がどうなっても判定が変わらなくなったら止める。判定は全件実行と必ず一致する
+    sprt:          deterministic に加え、逐次確率比検定（Wald の SPRT）で止める。サンプリングあり
+                   （temperature > 0）の実行向けで、判定は統計的なもの（誤り率 alpha / beta）
+
+SPRT の仮説: 各実行の合否を Bernoulli(p) とみなし、H0: p = 閾値 - delta（不合格）と
+H1: p = 閾値 + delta（合格）を比べる。エラーの実行は観測に含めない。
+"""
+import math
+from typing import Optional
+
+EARLY_STOP_MODES = ("off", "deterministic", "sprt")
+
+
+def resolve_early_stop(mode) -> str:
+    mode = (mode or "off").lower()
+    if mode not in EARLY_STOP_MODES:
+        raise ValueError(f"不明な early stop モード: {mode}（{', '.join(EARLY_STOP_MODES)}）")
+    return mode
+
+
+def _rate(passed: int, valid: int) -> float:
+    return passed / valid if valid > 0 else 0
+
+
+def deterministic_decision(passed: int, valid: int, remaining: int, threshold: float) -> Optional[bool]:
+    """
+    残り remaining 件の結果（合格・不合格・エラー）に関わらず判定が決まっていれば True / False、
+    まだ決まらなければ None。最悪は残りが全て不合格、最良は全て合格の場合になる。
+    """
+    if _rate(passed, valid + remaining) >= threshold:
+        return True
+    if _rate(passed + remaining, valid + remaining) < threshold:
+        return False
+    return None
+
+
+class VariantDecider:
+    """1つの variants ケースの逐次判定。add で結果を入力順に渡し、decision が決まったら以降は送らない。"""
+
+    def __init__(self, total: int, threshold: float, mode: str = "deterministic",
+                 alpha: float = 0.05, beta: float = 0.05, delta: float = 0.1):
+        self.total = total
+        self.threshold = threshold
+        self.mode = resolve_early_stop(mode)
+        self.seen = 0
+        self.passed = 0
+        self.valid = 0
+        self.decision: Optional[bool] = None
+        self.reason: Optional[str] = None
+        self.decided_at: Optional[int] = None
+        self._llr = 0.0
+        p0 = min(max(threshold - delta, 0.0), 1.0)
+        p1 = min(max(threshold + delta, 0.0), 1.0)
+        self._log_pass = self._log_ratio(p1, p0)
+        self._log_fail = self._log_ratio(1 - p1, 1 - p0)
+        self._upper = math.log((1 - beta) / alpha)
+        self._lower = math.log(beta / (1 - alpha))
+
+    @staticmethod
+    def _log_ratio(a: float, b: float) -> float:
+        if a == b:
+            return 0.0
+        if a == 0:
+            return -math.inf
+        if b == 0:
+            return math.inf
+        return math.log(a / b)
+
+    @property
+    def decided(self) -> bool:
+        return self.decision is not None
+
+    def add(self, vres: dict) -> None:
+        self.seen += 1
+        ok = vres.get("status") == "ok"
+        if ok:
+            self.valid += 1
+            self.passed += 1 if vres.get("passed") else 0
+        if self.decided or self.mode == "off":
+            return
+        decision = deterministic_decision(self.passed, self.valid, self.total - self.seen, self.threshold)
+        reason = "deterministic"
+        if decision is None and self.mode == "sprt" and ok:
+            self._llr += self._log_pass if vres.get("passed") else self._log_fail
+            if self._llr >= self._upper:
+                decision, reason = True, "sprt"
+            elif self._llr <= self._lower:
+                decision, reason = False, "sprt"
+        if decision is not None and self.seen < self.total:
+            self.decision, self.reason, self.decided_at = decision, reason, self.seen
+
+    def summary(self, executed_variants: int) -> dict:
+        """集約レコードに載せる early stop の記録。"""
+        return {
+            "mode": self.mode,
+            "decision": None if self.decision is None else ("pass" if self.decision else "fail"),
+            "reason": self.reason,
+            "decided_at": self.decided_at,
+            "executed": self.seen,
+            "executed_variants": executed_variants,
+            "total": self.total,
+        }
@@ -0,0 +1,221 @@
+"""
+画像ペイロードのキャッシュと前処理（vision ケース用）。
+
+variants の各実行・各モデルで同じ画像を読み直して base64 化していたのを、内容アドレス
+（sha256）で1回だけ行うようにする。前処理（長辺の縮小・JPEG/WebP への再エンコード）を
+指定した場合は、前処理後のバイト列も同じキャッシュに入る。
+
+前処理の指定（suite の meta / case / variant の順に上書き、旧形式は content の要素でも可）:
+
+    image_preprocess:
+      max_side: 1024      # 長辺の上限（px）。超える場合だけ縮小
+      format: jpeg        # jpeg | webp | png（省略時は元の形式のまま）
+      quality: 85         # jpeg / webp の品質
+
+前処理には Pillow が必要（pip install pillow）。前処理を指定しなければ不要。
+
+- BENCH_IMAGE_CACHE_MB: キャッシュする data URL の合計サイズ上限（既定 256MB）
+- BENCH_IMAGE_MMAP=1:   元画像を mmap で読む（大きな画像を多数使う場合）
+"""
+import base64
+import hashlib
+import io
+import json
+import mimetypes
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+PREPROCESS_KEYS = ("max_side", "format", "quality")
+_FORMAT_MIME = {"jpeg": "image/jpeg", "jpg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+_PIL_FORMAT = {"jpeg": "JPEG", "jpg": "JPEG", "webp": "WEBP", "png": "PNG"}
+
+
+def sniff_mime(data: bytes, path: str = "") -> str:
+    """先頭バイトから MIME を判定する（不明なら拡張子、それも不明なら image/png）。"""
+    head = bytes(data[:16])
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    guessed, _ = mimetypes.guess_type(path)
+    return guessed if guessed and guessed.startswith("image/") else "image/png"
+
+
+def image_size(data: bytes) -> Tuple[Optional[int], Optional[int]]:
+    """PNG / GIF / JPEG のヘッダから (幅, 高さ) を読む。読めなければ (None, None)。"""
+    data = bytes(data[:65536]) if len(data) > 65536 else bytes(data)
+    try:
+        if data.startswith(b"\x89PNG\r\n\x1a\n") and data[12:16] == b"IHDR":
+            return struct.unpack(">II", data[16:24])
+        if data[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", data[6:10])
+        if data.startswith(b"\xff\xd8"):
+            i = 2
+            while i + 9 < len(data):
+                if data[i] != 0xFF:
+                    i += 1
+                    continue
+                marker = data[i + 1]
+                length = struct.unpack(">H", data[i + 2:i + 4])[0]
+                # SOF0..SOF15（DHT/JPG/DAC を除く）に寸法が入っている
+                if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                    h, w = struct.unpack(">HH", data[i + 5:i + 9])
+                    return w, h
+                i += 2 + length
+    except struct.error:
+        pass
+    return None, None
+
+
+def normalize_preprocess(spec) -> Optional[dict]:
+    """前処理指定を正規化する（空なら None）。キャッシュキーにも使う。"""
+    if not spec:
+        return None
+    out = {k: spec[k] for k in PREPROCESS_KEYS if spec.get(k) is not None}
+    if "format" in out:
+        out["format"] = str(out["format"]).lower()
+        if out["format"] not in _FORMAT_MIME:
+            raise ValueError(f"不明な画像形式: {out['format']}（jpeg | webp | png）")
+    return out or None
+
+
+def resolve_preprocess(*specs) -> Optional[dict]:
+    """meta → case → variant の順に前処理指定を上書きして1つにまとめる。"""
+    merged = {}
+    for spec in specs:
+        if spec:
+            merged.update(spec)
+    return normalize_preprocess(merged)
+
+
+def preprocess_image(data: bytes, spec: dict) -> Tuple[bytes, str]:
+    """Pillow で縮小・再エンコードし、(バイト列, MIME) を返す。"""
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError("画像の前処理には Pillow が必要です（pip install pillow）")
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        max_side = spec.get("max_side")
+        if max_side and max(img.size) > int(max_side):
+            scale = int(max_side) / max(img.size)
+            img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+        fmt = spec.get("format") or (img.format or "png").lower()
+        pil_format = _PIL_FORMAT.get(fmt, "PNG")
+        if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buf = io.BytesIO()
+        save_kwargs = {"quality": int(spec["quality"])} if spec.get("quality") and pil_format != "PNG" else {}
+        img.save(buf, format=pil_format, **save_kwargs)
+    return buf.getvalue(), _FORMAT_MIME.get(fmt, "image/png")
+
+
+class ImagePayloadCache:
+    """
+    画像パス → data URL のキャッシュ。元画像は (path, mtime, size) ごとに sha256 を1回だけ計算し、
+    ペイロードは (sha256, 前処理指定) をキーに LRU で保持する（同じ内容なら別パスでも共有）。
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, use_mmap: bool = False):
+        self.max_bytes = max_bytes
+        self.use_mmap = use_mmap
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._digests = {}  # (path, mtime_ns, size) -> sha256
+        self._payloads: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._size = 0
+
+    def _read(self, path: str) -> bytes:
+        with open(path, "rb") as f:
+            if self.use_mmap and os.fstat(f.fileno()).st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return mm[:]
+            return f.read()
+
+    def payload(self, path: str, preprocess: Optional[dict] = None) -> dict:
+        """
+        {"url", "mime", "bytes", "width", "height", "sha256", "preprocess"} を返す。
+        url は data:<mime>;base64,... 形式。
+        """
+        spec = normalize_preprocess(preprocess)
+        spec_key = json.dumps(spec, sort_keys=True) if spec else ""
+        st = os.stat(path)
+        source_key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            digest = self._digests.get(source_key)
+            hit = self._payloads.get((digest, spec_key)) if digest else None
+            if hit is not None:
+                self._payloads.move_to_end((digest, spec_key))
+                self.hits += 1
+                return hit
+
+        data = self._read(path)
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._digests[source_key] = digest
+            hit = self._payloads.get((digest, spec_key))
+            if hit is not None:
+                self._payloads.move_to_end((digest, spec_key))
+                self.hits += 1
+                return hit
+            self.misses += 1
+
+        if spec:
+            data, mime = preprocess_image(data, spec)
+        else:
+            mime = sniff_mime(data, path)
+        width, height = image_size(data)
+        entry = {
+            "url": f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}",
+            "mime": mime,
+            "bytes": len(data),
+            "width": width,
+            "height": height,
+            "sha256": digest,
+            "preprocess": spec,
+        }
+        with self._lock:
+            if (digest, spec_key) not in self._payloads:
+                self._payloads[(digest, spec_key)] = entry
+                self._size += len(entry["url"])
+            while self._size > self.max_bytes and len(self._payloads) > 1:
+                _, old = self._payloads.popitem(last=False)
+                self._size -= len(old["url"])
+        return entry
+
+    def data_url(self, path: str, preprocess: Optional[dict] = None) -> str:
+        return self.payload(path, preprocess)["url"]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._digests.clear()
+            self._payloads.clear()
+            self._size = 0
+
+
+def create_image_cache() -> ImagePayloadCache:
+    """環境変数に従って画像キャッシュを作る。"""
+    return ImagePayloadCache(
+        max_bytes=int(float(os.environ.get("BENCH_IMAGE_CACHE_MB", "256")) * 1024 * 1024),
+        use_mmap=os.environ.get("BENCH_IMAGE_MMAP", "") in ("1", "true", "yes"),
+    )
+
+
+# プロセス内で共有するキャッシュ（ジョブ内の全モデル・同じプロセスの後続ジョブで再利用される）
+IMAGE_CACHE = create_image_cache()
+
+
+def image_info(payload: dict) -> dict:
+    """結果レコードに残す画像情報（data URL 本体は含めない）。"""
+    return {k: payload[k] for k in ("mime", "bytes", "width", "height", "preprocess")}
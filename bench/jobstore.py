@@ -0,0 +1,460 @@
+"""
+Web UI サーバーのジョブストア。
+
+ジョブの状態・ログ・結果をインクリメンタルに保存する。既定は SQLite で、
+サーバーの再起動後も履歴が残り、`uvicorn --workers N` のどのプロセスからでも
+同じジョブを参照できる。メモリ上にはジョブを保持しないため、ジョブ数が増えても
+プロセスのメモリ使用量は一定に保たれる。
+
+ストアの選択（環境変数）:
+- BENCH_JOB_STORE: sqlite（既定）| memory
+- BENCH_JOB_DB:    SQLite ファイルのパス（既定: bench/out/jobs.sqlite）
+
+SQLite のジョブには作成したプロセス（ホスト・PID・ストアのインスタンス）を記録する。ストアを開いたときに、
+終了していないのに持ち主のプロセスがもういないジョブ（サーバーの停止・クラッシュで止まったもの）は
+failed にする。/api/bm/{id}/resume で再開でき、/events も終了する。
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 終了状態（これらのジョブが保持数の上限を超えたらアーカイブ・削除される）
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+# jobs テーブルの専用カラム。それ以外のフィールドは data(JSON) にまとめて保存する
+_COLUMNS = ("status", "cancelled", "expected_total")
+
+# 実行中のまま持ち主のプロセスがいなくなったジョブに付けるログ
+ORPHANED_MESSAGE = "サーバーの停止によりジョブが中断されました（/resume で再開できます）"
+
+
+def _pid_alive(pid: int) -> bool:
+    """同じホストのプロセスが生きているか（確認できない場合は生きているとみなす）。"""
+    if pid <= 0:
+        return False
+    if os.name == "nt":
+        # Windows の os.kill(pid, 0) はプロセスを終了させてしまうので OpenProcess で確認する
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class JobStore(ABC):
+    """
+    ジョブストアのインターフェース。
+    get() は従来の JOBS[job_id] と同じ形の dict（status / logs / results / ...）を返す。
+    実装は全メソッドを定義する必要がある（足りなければインスタンス化の時点で TypeError）。
+    """
+
+    @abstractmethod
+    def create(self, job_id: str, **fields) -> None:
+        ...
+
+    @abstractmethod
+    def exists(self, job_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str, logs_after: int = 0, results_after: int = 0) -> Optional[Dict[str, Any]]:
+        """logs_after / results_after を指定すると、その件数より後ろのログ・結果だけを返す（カーソル）。"""
+        ...
+
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> None:
+        ...
+
+    @abstractmethod
+    def append_log(self, job_id: str, type: str, msg: str) -> None:
+        ...
+
+    @abstractmethod
+    def append_result(self, job_id: str, result: dict) -> int:
+        ...
+
+    @abstractmethod
+    def get_result(self, job_id: str, index: int) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def set_result(self, job_id: str, index: int, result: dict) -> None:
+        ...
+
+    @abstractmethod
+    def count_results(self, job_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def request_cancel(self, job_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def is_cancelled(self, job_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def list_jobs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def prune(self) -> List[str]:
+        """保持数を超えた終了済みジョブを削除し、削除した job_id を返す。"""
+        ...
+
+
+class MemoryJobStore(JobStore):
+    """プロセス内の dict に保持するストア（単一ワーカー・テスト用）。終了済みは max_finished 件まで保持。"""
+
+    def __init__(self, max_finished: int = 200):
+        self.max_finished = max_finished
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, **fields):
+        job = {"status": "running", "cancelled": False, "logs": [], "results": [], "expected_total": 0}
+        job.update(fields)
+        job["created_at"] = time.time()
+        with self._lock:
+            self._jobs[job_id] = job
+
+    def exists(self, job_id):
+        return job_id in self._jobs
+
+    def get(self, job_id, logs_after=0, results_after=0):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            return dict(job, logs=job["logs"][logs_after:], results=job["results"][results_after:])
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+        if fields.get("status") in FINISHED_STATUSES:
+            self.prune()
+
+    def append_log(self, job_id, type, msg):
+        with self._lock:
+            self._jobs[job_id]["logs"].append({"type": type, "msg": msg})
+
+    def append_result(self, job_id, result):
+        with self._lock:
+            results = self._jobs[job_id]["results"]
+            results.append(result)
+            return len(results) - 1
+
+    def get_result(self, job_id, index):
+        results = self._jobs[job_id]["results"]
+        return results[index] if 0 <= index < len(results) else None
+
+    def set_result(self, job_id, index, result):
+        with self._lock:
+            self._jobs[job_id]["results"][index] = result
+
+    def count_results(self, job_id):
+        return len(self._jobs[job_id]["results"])
+
+    def request_cancel(self, job_id):
+        self.update(job_id, cancelled=True)
+
+    def is_cancelled(self, job_id):
+        job = self._jobs.get(job_id)
+        return bool(job and job.get("cancelled"))
+
+    def list_jobs(self, limit=50):
+        with self._lock:
+            items = sorted(self._jobs.items(), key=lambda kv: kv[1].get("created_at", 0), reverse=True)[:limit]
+            return [
+                {"job_id": job_id, "status": job["status"], "created_at": job.get("created_at"),
+                 "results": len(job["results"]), "expected_total": job.get("expected_total", 0)}
+                for job_id, job in items
+            ]
+
+    def prune(self):
+        with self._lock:
+            finished = sorted(
+                (job_id for job_id, job in self._jobs.items() if job["status"] in FINISHED_STATUSES),
+                key=lambda job_id: self._jobs[job_id].get("created_at", 0),
+            )
+            evicted = finished[:max(0, len(finished) - self.max_finished)]
+            for job_id in evicted:
+                del self._jobs[job_id]
+        return evicted
+
+
+class SQLiteJobStore(JobStore):
+    """
+    SQLite に保存するストア。ログと結果は1件ずつ INSERT され、get() のたびに読み出す。
+    終了済みジョブが max_finished 件を超えると、古いものから archive_dir に JSON で退避して削除する。
+    """
+
+    def __init__(self, path, max_finished: int = 200, archive_dir=None, cancel_poll_sec: float = 0.5):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_finished = max_finished
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        # is_cancelled はストリームのチャンクごとに呼ばれるので、DB の確認は一定間隔に間引く
+        self.cancel_poll_sec = cancel_poll_sec
+        self._cancel_cache: Dict[str, tuple] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.owner = {"host": socket.gethostname(), "pid": os.getpid(), "instance": uuid.uuid4().hex}
+        with self._lock:
+            conn = self._conn()
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    cancelled INTEGER NOT NULL DEFAULT 0,
+                    expected_total INTEGER NOT NULL DEFAULT 0,
+                    data TEXT NOT NULL DEFAULT '{}',
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+                CREATE TABLE IF NOT EXISTS job_logs (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    type TEXT NOT NULL,
+                    msg TEXT NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                );
+                CREATE TABLE IF NOT EXISTS job_results (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (job_id, idx)
+                );
+                """
+            )
+            conn.commit()
+        self.reconcile_orphans()
+
+    def _is_orphan(self, owner) -> bool:
+        if not isinstance(owner, dict):
+            return True  # 持ち主を記録する前のジョブ
+        if owner.get("host") != self.owner["host"]:
+            return False  # 別ホストのプロセスは確認できない
+        if owner.get("pid") == self.owner["pid"]:
+            # 同じ PID でも別のインスタンスなら、以前の（同じ PID を再利用した）プロセスのもの
+            return owner.get("instance") != self.owner["instance"]
+        return not _pid_alive(int(owner.get("pid") or 0))
+
+    def reconcile_orphans(self) -> List[str]:
+        """queued / running のまま持ち主のプロセスがいないジョブを failed にし、その job_id を返す。"""
+        rows = self._conn().execute(
+            "SELECT job_id, data FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchall()
+        orphaned = [job_id for job_id, data in rows if self._is_orphan(json.loads(data).get("owner"))]
+        for job_id in orphaned:
+            self.append_log(job_id, "error", ORPHANED_MESSAGE)
+            self.update(job_id, status="failed")
+        return orphaned
+
+    def _conn(self):
+        # sqlite3 の接続はスレッドごとに持つ（WAL で複数プロセス・スレッドから読み書きする）
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            conn = self._conn()
+            cur = conn.execute(sql, params)
+            conn.commit()
+            return cur
+
+    def create(self, job_id, **fields):
+        status = fields.pop("status", "running")
+        cancelled = int(bool(fields.pop("cancelled", False)))
+        expected_total = int(fields.pop("expected_total", 0) or 0)
+        fields.pop("logs", None)
+        fields.pop("results", None)
+        fields["owner"] = self.owner
+        now = time.time()
+        with self._lock:
+            conn = self._conn()
+            for table in ("job_logs", "job_results"):
+                conn.execute(f"DELETE FROM {table} WHERE job_id = ?", (job_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, status, cancelled, expected_total, data, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, status, cancelled, expected_total, json.dumps(fields, ensure_ascii=False), now, now),
+            )
+            conn.commit()
+        self._cancel_cache.pop(job_id, None)
+
+    def exists(self, job_id):
+        row = self._conn().execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row is not None
+
+    def _job_row(self, job_id):
+        row = self._conn().execute(
+            "SELECT status, cancelled, expected_total, data, created_at FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        status, cancelled, expected_total, data, created_at = row
+        job = json.loads(data)
+        job.update(status=status, cancelled=bool(cancelled), expected_total=expected_total, created_at=created_at)
+        return job
+
+    def get(self, job_id, logs_after=0, results_after=0):
+        job = self._job_row(job_id)
+        if job is None:
+            return None
+        conn = self._conn()
+        # seq / idx はジョブごとに 0 から連番なので、カーソルは主キーの範囲検索になる
+        job["logs"] = [
+            {"type": t, "msg": m}
+            for t, m in conn.execute(
+                "SELECT type, msg FROM job_logs WHERE job_id = ? AND seq >= ? ORDER BY seq", (job_id, logs_after)
+            )
+        ]
+        job["results"] = [
+            json.loads(d)
+            for (d,) in conn.execute(
+                "SELECT data FROM job_results WHERE job_id = ? AND idx >= ? ORDER BY idx", (job_id, results_after)
+            )
+        ]
+        return job
+
+    def update(self, job_id, **fields):
+        columns = {k: fields.pop(k) for k in _COLUMNS if k in fields}
+        with self._lock:
+            conn = self._conn()
+            if fields:
+                row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                data = json.loads(row[0]) if row else {}
+                data.update(fields)
+                conn.execute("UPDATE jobs SET data = ? WHERE job_id = ?", (json.dumps(data, ensure_ascii=False), job_id))
+            for key, value in columns.items():
+                if key == "cancelled":
+                    value = int(bool(value))
+                conn.execute(f"UPDATE jobs SET {key} = ? WHERE job_id = ?", (value, job_id))
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (time.time(), job_id))
+            conn.commit()
+        if "cancelled" in columns:
+            self._cancel_cache.pop(job_id, None)
+        if columns.get("status") in FINISHED_STATUSES:
+            self.prune()
+
+    def append_log(self, job_id, type, msg):
+        self._write(
+            "INSERT INTO job_logs (job_id, seq, type, msg) "
+            "VALUES (?, (SELECT COALESCE(MAX(seq), -1) + 1 FROM job_logs WHERE job_id = ?), ?, ?)",
+            (job_id, job_id, type, str(msg)),
+        )
+
+    def append_result(self, job_id, result):
+        with self._lock:
+            conn = self._conn()
+            (idx,) = conn.execute(
+                "SELECT COALESCE(MAX(idx), -1) + 1 FROM job_results WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO job_results (job_id, idx, data) VALUES (?, ?, ?)",
+                (job_id, idx, json.dumps(result, ensure_ascii=False)),
+            )
+            conn.commit()
+        return idx
+
+    def get_result(self, job_id, index):
+        row = self._conn().execute(
+            "SELECT data FROM job_results WHERE job_id = ? AND idx = ?", (job_id, index)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_result(self, job_id, index, result):
+        self._write(
+            "UPDATE job_results SET data = ? WHERE job_id = ? AND idx = ?",
+            (json.dumps(result, ensure_ascii=False), job_id, index),
+        )
+
+    def count_results(self, job_id):
+        (n,) = self._conn().execute("SELECT COUNT(*) FROM job_results WHERE job_id = ?", (job_id,)).fetchone()
+        return n
+
+    def request_cancel(self, job_id):
+        self.update(job_id, cancelled=True)
+
+    def is_cancelled(self, job_id):
+        now = time.monotonic()
+        cached = self._cancel_cache.get(job_id)
+        if cached is not None and (cached[1] or now - cached[0] < self.cancel_poll_sec):
+            return cached[1]
+        row = self._conn().execute("SELECT cancelled FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        value = bool(row and row[0])
+        self._cancel_cache[job_id] = (now, value)
+        return value
+
+    def list_jobs(self, limit=50):
+        rows = self._conn().execute(
+            "SELECT j.job_id, j.status, j.created_at, j.expected_total, "
+            "(SELECT COUNT(*) FROM job_results r WHERE r.job_id = j.job_id) "
+            "FROM jobs j ORDER BY j.created_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [
+            {"job_id": job_id, "status": status, "created_at": created_at, "results": n, "expected_total": expected_total}
+            for job_id, status, created_at, expected_total, n in rows
+        ]
+
+    def prune(self):
+        placeholders = ",".join("?" for _ in FINISHED_STATUSES)
+        rows = self._conn().execute(
+            f"SELECT job_id FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at DESC LIMIT -1 OFFSET ?",
+            (*FINISHED_STATUSES, self.max_finished),
+        ).fetchall()
+        evicted = [job_id for (job_id,) in rows]
+        for job_id in evicted:
+            if self.archive_dir:
+                self._archive(job_id)
+            with self._lock:
+                conn = self._conn()
+                for table in ("job_logs", "job_results", "jobs"):
+                    conn.execute(f"DELETE FROM {table} WHERE job_id = ?", (job_id,))
+                conn.commit()
+            self._cancel_cache.pop(job_id, None)
+        return evicted
+
+    def _archive(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.archive_dir / f"{job_id}.json", "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False)
+
+
+def create_job_store(base_dir: Path) -> JobStore:
+    """環境変数に従ってジョブストアを作る。"""
+    kind = os.environ.get("BENCH_JOB_STORE", "sqlite").lower()
+    max_finished = int(os.environ.get("BENCH_JOB_MAX_FINISHED", "200"))
+    if kind == "memory":
+        return MemoryJobStore(max_finished=max_finished)
+    if kind != "sqlite":
+        raise ValueError(f"不明なジョブストア: {kind}（sqlite | memory）")
+    db_path = Path(os.environ.get("BENCH_JOB_DB", str(Path(base_dir) / "out" / "jobs.sqlite")))
+    return SQLiteJobStore(db_path, max_finished=max_finished, archive_dir=db_path.parent / "jobs_archive")
@@ -0,0 +1,290 @@
+"""
+LLM ジャッジ（semantic_match）のパイプライン。
+
+従来は use_llm_judge のとき、semantic_match の評価が生成ループの中で1件ずつブロッキングで
+chat.completions.create を呼んでいた（既定ではテスト対象と同じモデル・同じクライアント）。ジャッジの
+待ち時間がそのままベンチマークの所要時間に加わる。ここでは
+
+- 評価を別段のパイプラインにする。生成側は submit して次のリクエストへ進み、ジャッジは専用のキューと
+  ワーカースレッド・専用のクライアント（別エンドポイント・別モデルも可）で処理する
+- キューに溜まった最大 batch_size 件を1つのプロンプトにまとめ、JSON 配列で判定を返させる。パースできない
+  場合や判定が欠けた項目は、従来の1件ずつのプロンプトで判定し直す
+- 判定は (期待値, 正規化した回答, ジャッジモデル) をキーにメモ化する（プロセス内で共有）。複数のモデルが
+  同じ "828" を返しても判定は1回で済む。処理中の同じキーは同じ Future を共有する
+
+ジャッジ自体が失敗した場合は、従来どおり fuzzy_match にフォールバックする（メモ化しない）。
+"""
+import json
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from bench.rules import JUDGE_PROMPT, _normalize_basic, _extract_first_json, judge_expected_text, parse_judge_verdict
+except ImportError:
+    from rules import JUDGE_PROMPT, _normalize_basic, _extract_first_json, judge_expected_text, parse_judge_verdict
+
+JUDGE_BATCH_SIZE = 8
+JUDGE_WORKERS = 2
+JUDGE_BATCH_WAIT_MS = 20
+JUDGE_MEMO_SIZE = 100_000
+
+_BATCH_PROMPT = """以下の各項目について、実際の回答が期待される回答と意味的に一致するかを判定してください。
+
+【判定ルール】
+- 意味が同じであれば正解（表現の違いは許容）
+- 余分な説明があっても、核心部分が正しければ正解
+- 明らかに間違っている場合は不正解
+
+{items}
+
+【回答形式】
+次の形式の JSON 配列のみを出力してください（項目ごとに1要素、説明文は不要）:
+[{{"id": 1, "verdict": "PASS", "reason": "理由"}}, ...]"""
+
+
+def normalize_response(text: str) -> str:
+    """メモ化のキーに使う回答の正規化（NFKC・大小文字・空白の連続を無視）。"""
+    return " ".join(_normalize_basic(text).split())
+
+
+def memo_key(alternatives, response_text: str, judge_model: str) -> tuple:
+    return tuple(list(alternatives)[:3]), normalize_response(response_text), judge_model
+
+
+def parse_batch_verdicts(text: str, count: int) -> Dict[int, Tuple[bool, str]]:
+    """バッチの応答（JSON 配列）を {項目番号(1始まり): (passed, reason)} にする。解釈できない要素は含めない。"""
+    data, _reason = _extract_first_json(text or "")
+    if isinstance(data, dict):
+        data = data.get("results") or data.get("verdicts") or [data]
+    verdicts = {}
+    for entry in data if isinstance(data, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            idx = int(entry.get("id"))
+        except (TypeError, ValueError):
+            continue
+        verdict = str(entry.get("verdict", "")).strip().upper()
+        if 1 <= idx <= count and verdict in ("PASS", "FAIL"):
+            verdicts[idx] = (verdict == "PASS", str(entry.get("reason") or "LLMジャッジ判定"))
+    return verdicts
+
+
+class JudgeMemo:
+    """判定のメモ（LRU、スレッドセーフ）。"""
+
+    def __init__(self, max_entries: int = JUDGE_MEMO_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, Tuple[bool, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[Tuple[bool, str]]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value: Tuple[bool, str]) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# プロセス内で共有するメモ（Web UI サーバーではジョブをまたいで効く）
+JUDGE_MEMO = JudgeMemo()
+
+
+class JudgePipeline:
+    """
+    semantic_match の判定を受け付けるキューとワーカー。
+    submit は Future を返し、結果は (passed, reason)。ジャッジが使えなかった場合は None（呼び出し側で
+    フォールバックする）。
+    """
+
+    def __init__(self, client, judge_model: Optional[str] = None, batch_size: int = JUDGE_BATCH_SIZE,
+                 workers: int = JUDGE_WORKERS, batch_wait_ms: float = JUDGE_BATCH_WAIT_MS,
+                 memo: JudgeMemo = JUDGE_MEMO, max_tokens_per_item: int = 60):
+        self.client = client
+        self.judge_model = judge_model
+        self.batch_size = max(1, int(batch_size))
+        self.batch_wait = max(0.0, batch_wait_ms) / 1000
+        self.memo = memo
+        self.max_tokens_per_item = max_tokens_per_item
+        self.requests = 0  # ジャッジへの API 呼び出し回数
+        self.judged = 0  # API で判定した項目数（メモ・処理中の共有は含まない）
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._inflight: Dict[tuple, Future] = {}
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"judge-{i}", daemon=True) for i in range(max(1, int(workers)))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, alternatives, response_text: str, judge_model: Optional[str] = None) -> Future:
+        model = judge_model or self.judge_model
+        key = memo_key(alternatives, response_text, model)
+        cached = self.memo.get(key)
+        if cached is not None:
+            fut = Future()
+            fut.set_result(cached)
+            return fut
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                return fut
+            fut = self._inflight[key] = Future()
+        self._queue.put((key, list(alternatives), response_text, model, fut))
+        return fut
+
+    def close(self) -> None:
+        """キューに残った判定を処理し終えてからワーカーを止める。"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- ワーカー ---
+
+    def _take_batch(self) -> Optional[list]:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get(timeout=self.batch_wait) if self.batch_wait else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # 停止の合図は他のワーカー（または次の自分）に残す
+                break
+            batch.append(item)
+        return batch
+
+    def _worker(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            by_model: Dict[str, list] = {}
+            for item in batch:
+                by_model.setdefault(item[3], []).append(item)
+            for model, items in by_model.items():
+                try:
+                    self._judge(model, items)
+                except Exception:
+                    for item in items:
+                        self._finish(item, None)
+
+    def _finish(self, item, verdict: Optional[Tuple[bool, str]]) -> None:
+        key, _alts, _resp, _model, fut = item
+        if verdict is not None:
+            self.memo.put(key, verdict)
+        with self._lock:
+            self._inflight.pop(key, None)
+        if not fut.done():
+            fut.set_result(verdict)
+
+    def _create(self, model, prompt, max_tokens):
+        with self._lock:
+            self.requests += 1
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=0,
+        )
+        return response.choices[0].message.content
+
+    def _judge(self, model, items) -> None:
+        verdicts = {}
+        if len(items) > 1:
+            blocks = []
+            for i, (_key, alts, resp, _model, _fut) in enumerate(items, 1):
+                blocks.append(f"【項目 {i}】\n期待される回答: {judge_expected_text(alts)}\n実際の回答: {json.dumps(resp.strip(), ensure_ascii=False)}")
+            try:
+                text = self._create(model, _BATCH_PROMPT.format(items="\n\n".join(blocks)),
+                                    self.max_tokens_per_item * len(items) + 20)
+                verdicts = parse_batch_verdicts(text, len(items))
+            except Exception:
+                verdicts = {}
+        for i, item in enumerate(items, 1):
+            verdict = verdicts.get(i)
+            if verdict is None:
+                # バッチで判定できなかった項目は1件ずつのプロンプトで判定し直す
+                _key, alts, resp, _model, _fut = item
+                try:
+                    verdict = parse_judge_verdict(
+                        self._create(model, JUDGE_PROMPT.format(expected=judge_expected_text(alts), response=resp.strip()), 100)
+                    )
+                except Exception:
+                    verdict = None
+            if verdict is not None:
+                with self._lock:
+                    self.judged += 1
+            self._finish(item, verdict)
+
+
+def judge_details(compiled_rule, verdict: Optional[Tuple[bool, str]], response_text: str) -> Tuple[bool, dict]:
+    """パイプラインの判定を evaluate_result と同じ (passed, details) にする。None ならフォールバックする。"""
+    if verdict is None:
+        return compiled_rule._fallback.evaluate(response_text)
+    passed, reason = verdict
+    details = {'eval_type': 'semantic_match', 'matched': compiled_rule.expected if passed else None,
+               'reason': f"{'意味一致' if passed else '意味不一致'}: {reason}"}
+    return passed, details
+
+
+class OrderedResolver:
+    """
+    入力順に push された結果を、判定待ち（pending(res) が未完了の Future を返すもの）が解決した分だけ
+    入力順に handler へ渡す。finish() で残りを待って全て渡す。生成側を止めずに、再開用ジャーナルや
+    逐次判定の順序を保つために使う。
+    """
+
+    def __init__(self, handler: Callable, pending: Callable):
+        self.handler = handler
+        self.pending = pending
+        self._queue: List[tuple] = []
+
+    def push(self, idx, res) -> None:
+        self._queue.append((idx, res))
+        self._drain(block=False)
+
+    def finish(self) -> None:
+        self._drain(block=True)
+
+    def _drain(self, block: bool) -> None:
+        while self._queue:
+            idx, res = self._queue[0]
+            fut = self.pending(res)
+            if fut is not None and not block and not fut.done():
+                return
+            self._queue.pop(0)
+            self.handler(idx, res)
@@ -0,0 +1,335 @@
+"""
+負荷試験（飽和点探索）モード。
+
+スイートのプロンプトを1台のエンドポイントへ繰り返し投げ、同時実行数やリクエストレートを
+段階的に上げながらスループット・TTFT/E2E 分位・エラー率を計測する。
+
+- closed: N 人の仮想ユーザーがそれぞれ「応答を受け取ったら次を投げる」
+- open:   目標 QPS のポアソン到着でリクエストを投げる（応答を待たない）
+
+使い方:
+    python -m bench.load --suite bench/suite_auto.yaml --model my-model --mode closed --levels 1,2,4,8
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+try:
+    from bench.main import (
+        load_suite,
+        resolve_suite_asset_paths,
+        build_variant_messages,
+        build_legacy_messages,
+        summarize_latencies,
+        _stream_completion,
+        stream_client,
+    )
+except ImportError:
+    from main import (
+        load_suite,
+        resolve_suite_asset_paths,
+        build_variant_messages,
+        build_legacy_messages,
+        summarize_latencies,
+        _stream_completion,
+        stream_client,
+    )
+
+
+# open-loop で同時に待てるリクエスト数の上限（サーバーが詰まったときにスレッドが無限に増えないように）
+DEFAULT_MAX_IN_FLIGHT = 256
+
+
+def collect_prompts(suite: dict, include_vision: bool = False) -> list:
+    """
+    スイートから送信用 messages を集める（variants は1バリエーション=1プロンプト）。
+    include_vision=False の場合、画像付きケースは除外する。
+    """
+    prompts = []
+    meta = suite.get("meta", {}) or {}
+    for case in suite.get("cases", []):
+        if not include_vision and case.get("modality") == "vision":
+            continue
+        if case.get("variants"):
+            for variant in case["variants"]:
+                if not include_vision and variant.get("image_path"):
+                    continue
+                messages, missing_reason = build_variant_messages(case, variant, meta)
+                if missing_reason is None:
+                    prompts.append(messages)
+        elif case.get("request"):
+            prompts.append(build_legacy_messages(case, meta))
+    return prompts
+
+
+def summarize_level(mode: str, level, samples: list, wall_sec: float) -> dict:
+    """1レベル分の計測結果をまとめる。"""
+    ok = [s for s in samples if s["status"] == "ok"]
+    errors = [s for s in samples if s["status"] == "error"]
+    completion_tokens = sum(s.get("completion_tokens") or 0 for s in ok)
+    return {
+        "mode": mode,
+        "level": level,
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": len(errors),
+        "error_rate": (len(errors) / len(samples)) if samples else 0.0,
+        "error_types": sorted({s.get("error_type") for s in errors if s.get("error_type")}),
+        "wall_sec": wall_sec,
+        "throughput_rps": (len(ok) / wall_sec) if wall_sec > 0 else 0.0,
+        "output_tps": (completion_tokens / wall_sec) if wall_sec > 0 else 0.0,
+        "ttft_ms": summarize_latencies(s.get("ttft_ms") for s in ok),
+        "e2e_ms": summarize_latencies(s.get("e2e_ms") for s in ok),
+        "itl_ms": summarize_latencies(x for s in ok for x in (s.get("itl_ms") or [])),
+        "queue_ms": summarize_latencies(s.get("queue_ms") for s in ok),
+    }
+
+
+def check_slo(report: dict, slo: dict) -> list:
+    """
+    SLO 違反の一覧を返す（空なら満たしている）。
+    slo のキー: ttft_p90_ms / e2e_p90_ms / ttft_p99_ms / e2e_p99_ms / error_rate
+    """
+    breached = []
+    for key, limit in (slo or {}).items():
+        if limit is None:
+            continue
+        if key == "error_rate":
+            value = report.get("error_rate", 0.0)
+        else:
+            metric, pct, unit = key.rsplit("_", 2)
+            value = (report.get(f"{metric}_{unit}") or {}).get(pct)
+        if value is None or value > limit:
+            breached.append(f"{key}={value} > {limit}")
+    return breached
+
+
+def find_knee(reports: list, min_gain: float = 0.1):
+    """
+    スループットの伸びが min_gain（相対）を下回る直前のレベルを knee とみなして返す。
+    最後まで伸び続けた場合は最終レベル、レポートが空なら None。
+    """
+    ok_reports = [r for r in reports if r.get("ok")]
+    if not ok_reports:
+        return None
+    for prev, cur in zip(ok_reports, ok_reports[1:]):
+        base = prev["throughput_rps"]
+        if base <= 0:
+            continue
+        if (cur["throughput_rps"] - base) / base < min_gain:
+            return prev["level"]
+    return ok_reports[-1]["level"]
+
+
+def _run_closed_loop(send, users: int, duration_sec: float, max_requests, cancel_check):
+    """N 人の仮想ユーザーで、deadline か max_requests に達するまで投げ続ける。"""
+    samples = []
+    lock = threading.Lock()
+    counter = [0]
+    deadline = time.perf_counter() + duration_sec
+
+    def user_loop():
+        while time.perf_counter() < deadline:
+            if cancel_check and cancel_check():
+                return
+            with lock:
+                if max_requests is not None and counter[0] >= max_requests:
+                    return
+                seq = counter[0]
+                counter[0] += 1
+            out = send(seq)
+            with lock:
+                samples.append(out)
+
+    threads = [threading.Thread(target=user_loop, daemon=True) for _ in range(int(users))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples
+
+
+def _run_open_loop(send, qps: float, duration_sec: float, max_requests, cancel_check, rng,
+                   max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+    """
+    ポアソン到着（平均 qps）でリクエストを投げる。応答は待たずに次の到着時刻まで眠る。
+    TTFT / E2E は到着時刻から数える。max_in_flight を超えて送信を待った時間（queue_ms）も含めないと、
+    飽和してからの遅れが計測から抜け落ちる（coordinated omission）。
+    """
+
+    def timed(seq, arrived_at):
+        queue_ms = max(0.0, (time.perf_counter() - arrived_at) * 1000)
+        out = send(seq)
+        out["queue_ms"] = queue_ms
+        for key in ("ttft_ms", "e2e_ms"):
+            if out.get(key) is not None:
+                out[key] += queue_ms
+        return out
+
+    futures = []
+    start = time.perf_counter()
+    next_at = start
+    seq = 0
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        while True:
+            if cancel_check and cancel_check():
+                break
+            if max_requests is not None and seq >= max_requests:
+                break
+            next_at += rng.expovariate(qps)
+            if next_at - start >= duration_sec:
+                break
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(timed, seq, next_at))
+            seq += 1
+    return [f.result() for f in futures]
+
+
+def run_load(suite, base_url, model, mode="closed", levels=(1, 2, 4, 8), duration_sec=30.0,
+             max_requests_per_level=None, slo=None, timeout=60, progress_callback=None,
+             cancel_check=None, seed=0, knee_min_gain=0.1):
+    """
+    レベルを順に上げながら負荷をかけ、レベルごとのレポートを返す。
+    mode: closed（level = 仮想ユーザー数）| open（level = 目標QPS）
+    SLO を破ったレベルで打ち切る。
+    """
+    if mode not in ("closed", "open"):
+        raise ValueError(f"不明な mode: {mode}")
+    # 途中のレベルで失敗しないよう、掃引を始める前に確認する（open の 0 QPS は expovariate で失敗する）
+    invalid = [level for level in levels if not float(level) > 0]
+    if invalid:
+        raise ValueError(f"レベルは正の数で指定してください: {invalid}")
+    if mode == "closed" and any(float(level) != int(level) for level in levels):
+        raise ValueError(f"closed モードのレベルは整数（ユーザー数）で指定してください: {list(levels)}")
+
+    prompts = collect_prompts(suite)
+    if not prompts:
+        raise ValueError("負荷試験に使えるプロンプトがありません")
+
+    meta = suite.get("meta", {}) or {}
+    client = stream_client(base_url, meta)
+    rng = random.Random(seed)
+    reports = []
+    stopped_reason = ""
+
+    def send(seq):
+        messages = prompts[seq % len(prompts)]
+        return _stream_completion(client, model, messages, meta, timeout, cancel_check)
+
+    for level in levels:
+        if cancel_check and cancel_check():
+            stopped_reason = "cancelled"
+            break
+        if progress_callback: progress_callback("info", f"[load] {mode} level={level} 開始")
+
+        start = time.perf_counter()
+        if mode == "closed":
+            samples = _run_closed_loop(send, int(level), duration_sec, max_requests_per_level, cancel_check)
+        else:
+            samples = _run_open_loop(send, float(level), duration_sec, max_requests_per_level, cancel_check, rng)
+        wall_sec = time.perf_counter() - start
+
+        report = summarize_level(mode, level, samples, wall_sec)
+        report["slo_breaches"] = check_slo(report, slo)
+        reports.append(report)
+        if progress_callback: progress_callback("level", report)
+
+        if report["slo_breaches"]:
+            stopped_reason = f"SLO違反: {', '.join(report['slo_breaches'])}"
+            if progress_callback: progress_callback("info", f"[load] {stopped_reason} のため打ち切り")
+            break
+
+    knee = find_knee(reports, knee_min_gain)
+    within_slo = [r["level"] for r in reports if not r["slo_breaches"]]
+    for r in reports:
+        r["is_knee"] = r["level"] == knee
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "model": model,
+        "base_url": base_url,
+        "mode": mode,
+        "levels": reports,
+        "knee_level": knee,
+        "max_level_within_slo": within_slo[-1] if within_slo else None,
+        "stopped_reason": stopped_reason,
+        "slo": slo or {},
+    }
+
+
+def _format_level(report: dict) -> str:
+    ttft = report["ttft_ms"]
+    e2e = report["e2e_ms"]
+    fmt = lambda v: "-" if v is None else f"{v:.0f}"
+    return (
+        f"[{report['mode']} {report['level']}] req={report['requests']} err={report['error_rate']*100:.1f}% "
+        f"rps={report['throughput_rps']:.2f} out_tps={report['output_tps']:.1f} "
+        f"TTFT p50/p90/p99={fmt(ttft['p50'])}/{fmt(ttft['p90'])}/{fmt(ttft['p99'])}ms "
+        f"E2E p50/p90/p99={fmt(e2e['p50'])}/{fmt(e2e['p90'])}/{fmt(e2e['p99'])}ms"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="負荷試験（同時実行数 / QPS スイープ）")
+    parser.add_argument("--suite", required=True)
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--base-url")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--levels", default="1,2,4,8")  # closed: ユーザー数, open: QPS
+    parser.add_argument("--duration", type=float, default=30.0)  # 1レベルあたりの秒数
+    parser.add_argument("--max-requests", type=int)  # 1レベルあたりの上限
+    parser.add_argument("--timeout", type=int)
+    parser.add_argument("--slo-ttft-p90", type=float)
+    parser.add_argument("--slo-e2e-p90", type=float)
+    parser.add_argument("--slo-error-rate", type=float)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="./out")
+    args = parser.parse_args(argv)
+
+    suite_path = Path(args.suite).resolve()
+    suite = resolve_suite_asset_paths(load_suite(suite_path), suite_path)
+    meta = suite.get("meta", {}) or {}
+    levels = [float(x) if args.mode == "open" else int(x) for x in args.levels.split(",") if x.strip()]
+    slo = {
+        "ttft_p90_ms": args.slo_ttft_p90,
+        "e2e_p90_ms": args.slo_e2e_p90,
+        "error_rate": args.slo_error_rate,
+    }
+
+    def cli_callback(kind, data):
+        if kind == "info":
+            print(data)
+        elif kind == "level":
+            print(_format_level(data))
+
+    summary = run_load(
+        suite,
+        args.base_url or meta.get("base_url", "http://localhost:1234/v1"),
+        args.model,
+        mode=args.mode,
+        levels=levels,
+        duration_sec=args.duration,
+        max_requests_per_level=args.max_requests,
+        slo={k: v for k, v in slo.items() if v is not None},
+        timeout=args.timeout or meta.get("timeout_sec", 30),
+        progress_callback=cli_callback,
+        seed=args.seed,
+    )
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / f"load_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(f"knee: {summary['knee_level']} / SLO内の最大レベル: {summary['max_level_within_slo']}")
+    print(f"Done. Saved to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,106 @@
 import argparse
-import yaml
 import json
 import csv
 import time
 import os
 import sys
+import threading
 import re
 from datetime import datetime
 from pathlib import Path
 import base64
-import html as html_lib
-import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import SimpleNamespace
 from openai import OpenAI, APIConnectionError, APIError
 
+try:
+    from bench.cache import ResponseCache, cache_key, resolve_cache_mode, CACHE_MODES
+    from bench.rules import (
+        compile_rule,
+        compile_suite_rules,
+        _normalize_basic,
+        _normalize_loose,
+        _extract_first_json,
+        _extract_first_number,
+    )
+    from bench.images import IMAGE_CACHE, resolve_preprocess, image_info
+    from bench.suitecache import SUITE_CACHE, file_signature, load_yaml
+    from bench.coordinator import EndpointUnavailable, parse_endpoints, run_work_stealing
+    from bench.resultsdb import create_results_db
+    from bench.report import write_report
+    from bench.stats import percentile, summarize_latencies, request_samples, latency_stats, fmt_pcts as _fmt_pcts
+    from bench.prefix import (
+        PREFIX_ORDERS,
+        PrefixTracker,
+        order_work_items,
+        prefix_cache_stats,
+        resolve_prefix_order,
+        shared_prefix_key,
+    )
+    from bench.warmup import WarmupRegistry, resolve_warmup, run_warmup
+    from bench.earlystop import EARLY_STOP_MODES, VariantDecider, resolve_early_stop
+    from bench.judge import JudgePipeline, OrderedResolver, judge_details
+    from bench.transport import (
+        breaker_for,
+        capture_phases,
+        openai_options,
+        phase_metrics,
+        resolve_transport,
+        shared_http_client,
+    )
+    from bench.sse import STREAM_BACKENDS, RawSSEClient, error_type_name, resolve_stream_backend
+except ImportError:
+    from cache import ResponseCache, cache_key, resolve_cache_mode, CACHE_MODES
+    from rules import (
+        compile_rule,
+        compile_suite_rules,
+        _normalize_basic,
+        _normalize_loose,
+        _extract_first_json,
+        _extract_first_number,
+    )
+    from images import IMAGE_CACHE, resolve_preprocess, image_info
+    from suitecache import SUITE_CACHE, file_signature, load_yaml
+    from coordinator import EndpointUnavailable, parse_endpoints, run_work_stealing
+    from resultsdb import create_results_db
+    from report import write_report
+    from stats import percentile, summarize_latencies, request_samples, latency_stats, fmt_pcts as _fmt_pcts
+    from prefix import (
+        PREFIX_ORDERS,
+        PrefixTracker,
+        order_work_items,
+        prefix_cache_stats,
+        resolve_prefix_order,
+        shared_prefix_key,
+    )
+    from warmup import WarmupRegistry, resolve_warmup, run_warmup
+    from earlystop import EARLY_STOP_MODES, VariantDecider, resolve_early_stop
+    from judge import JudgePipeline, OrderedResolver, judge_details
+    from transport import (
+        breaker_for,
+        capture_phases,
+        openai_options,
+        phase_metrics,
+        resolve_transport,
+        shared_http_client,
+    )
+    from sse import STREAM_BACKENDS, RawSSEClient, error_type_name, resolve_stream_backend
+
 # --- Utils ---
 
 def encode_image(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
-def load_suite(path):
+def _parse_suite(path):
     """
-    スイートファイルを読み込み、includesフィールドがあれば
-    分割されたカテゴリファイルをマージする。
-    各テストケースにカテゴリ情報(category_id, category_name)を付与。
+    スイートファイルをパースし、includes をマージして検証する。
+    (スイート, {読んだファイル: 読む直前の file_signature}) を返す（SUITE_CACHE の build 関数）。
     """
     suite_path = Path(path)
+    deps = {str(suite_path): file_signature(suite_path)}
     with open(suite_path, 'r', encoding='utf-8') as f:
-        suite = yaml.safe_load(f)
+        suite = load_yaml(f)
     
     # includesフィールドがあればファイルを読み込んでマージ
     if 'includes' in suite:
@@ -37,13 +110,15 @@ def load_suite(path):
         for include_path in suite['includes']:
             # 相対パスの場合、スイートファイルからの相対位置として解決
             full_path = suite_path.parent / include_path
+            # 見つからないファイルも記録しておき、後から作られたら読み直す
+            deps[str(full_path)] = file_signature(full_path)
             
             if not full_path.exists():
                 print(f"Warning: Include file not found: {full_path}")
                 continue
             
             with open(full_path, 'r', encoding='utf-8') as f:
-                category_data = yaml.safe_load(f)
+                category_data = load_yaml(f)
             
             # カテゴリ情報を抽出
             cat_info = category_data.get('category', {})
@@ -69,7 +144,27 @@ def load_suite(path):
         del suite['includes']
     
     validate_suite(suite)
-    return suite
+    # 評価ルールはキャッシュに入れるときに一度だけコンパイルしておく（復元したスイートは内容で引く）
+    compile_suite_rules(suite)
+    return suite, deps
+
+
+def load_suite_with_etag(path):
+    """
+    load_suite と同じスイートと、その内容の ETag を返す。
+    ルートと includes の mtime が変わっていなければ、パースせずにキャッシュから復元する。
+    """
+    return SUITE_CACHE.get(path, _parse_suite)
+
+
+def load_suite(path):
+    """
+    スイートファイルを読み込み、includesフィールドがあれば
+    分割されたカテゴリファイルをマージする。
+    各テストケースにカテゴリ情報(category_id, category_name)を付与。
+    戻り値は呼び出しごとに新しいコピー（書き換えてもキャッシュには影響しない）。
+    """
+    return load_suite_with_etag(path)[0]
 
 
 def validate_suite(suite: dict) -> None:
@@ -78,10 +173,19 @@ def validate_suite(suite: dict) -> None:
     破壊的変更はせず、問題があれば例外を投げる。
     """
     cases = suite.get("cases", []) if isinstance(suite, dict) else []
-    ids = [c.get("id") for c in cases if isinstance(c, dict)]
-    duplicates = sorted({i for i in ids if i and ids.count(i) > 1})
+    # id -> 最初に出現した位置。ケース数に対して線形時間で重複を見つける
+    index = {}
+    duplicates = set()
+    for pos, case in enumerate(cases):
+        case_id = case.get("id") if isinstance(case, dict) else None
+        if not case_id:
+            continue
+        if case_id in index:
+            duplicates.add(case_id)
+        else:
+            index[case_id] = pos
     if duplicates:
-        raise ValueError(f"テストケースIDが重複しています: {duplicates}")
+        raise ValueError(f"テストケースIDが重複しています: {sorted(duplicates)}")
 
 
 def resolve_suite_asset_paths(suite: dict, suite_path: Path) -> dict:
@@ -141,8 +245,9 @@ def expected_total_results(suite: dict, models_count: int, runs: int) -> int:
     per_model = sum(expected_result_count_for_case(c, runs) for c in cases if isinstance(c, dict))
     return int(models_count) * int(per_model)
 
+
 def get_models(base_url):
-    client = OpenAI(base_url=base_url, api_key="lm-studio") # dummy key
+    client = OpenAI(base_url=base_url, api_key="lm-studio", **openai_options()) # dummy key
     try:
         models = client.models.list()
         return [m.id for m in models.data]
@@ -155,7 +260,7 @@ def probe_vision_capability(base_url, model_id):
     Probes if the model supports vision by sending a tiny image.
     This is a heuristic.
     """
-    client = OpenAI(base_url=base_url, api_key="lm-studio")
+    client = OpenAI(base_url=base_url, api_key="lm-studio", **openai_options())
     
     # 1x1 transparent png
     dummy_b64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
@@ -185,445 +290,377 @@ def probe_vision_capability(base_url, model_id):
 
 # --- Evaluator ---
 
-def _normalize_basic(text: str) -> str:
-    return unicodedata.normalize("NFKC", (text or "")).casefold().strip()
-
-
-def _normalize_loose(text: str) -> str:
+def evaluate_result(response_text, rule, llm_client=None, judge_model=None):
     """
-    句読点・空白類を落として比較したい用途向け（日本語にも効く）。
+    評価を実行し、結果とその詳細を返す。
+    Returns: (passed: bool, details: dict)
+    
+    強化された評価タイプ:
+    - exact_match: 完全一致
+    - contains_all: 全キーワード含む
+    - contains_any: いずれかのキーワード含む
+    - json_parse: JSON形式チェック
+    - numeric: 数値比較（許容誤差あり）
+    - normalized_contains: 正規化して部分一致（句読点・空白・大小文字を無視）
+    - regex_match / regex_fullmatch: 正規表現
+    - fuzzy_match: 曖昧一致（編集距離ベース）
+    - semantic_match: LLMによる意味的判定（最も正確）
+
+    rule はコンパイル済み（rules.compile_rule）のものがキャッシュから使われる。
     """
-    text = _normalize_basic(text)
-    text = re.sub(r'[\s\.,!?;:、。！？；：「」『』（）\(\)\[\]【】{}<>＜＞"\'`]', '', text)
-    return text
+    return compile_rule(rule).evaluate(response_text, llm_client=llm_client, judge_model=judge_model)
 
 
-def _extract_first_json(text: str):
+def evaluate_result_simple(response_text, rule):
+    """後方互換性のためのシンプルなラッパー"""
+    passed, _ = evaluate_result(response_text, rule)
+    return passed
+
+# --- Runner ---
+
+def image_preprocess_for(meta, case: dict, source: dict):
+    """画像の前処理指定（suite meta → case → variant / content 要素の順に上書き）。"""
+    return resolve_preprocess((meta or {}).get('image_preprocess'), case.get('image_preprocess'), source.get('image_preprocess'))
+
+
+def build_variant_messages(case: dict, variant: dict, meta=None):
     """
-    文字列から最初にパース可能な JSON (object/array) を抽出して返す。
-    見つからない場合は (None, reason) を返す。
+    variants 形式の1バリエーションから送信用 messages を組み立てる。
+    画像は IMAGE_CACHE 経由で data URL にする（同じ画像・同じ前処理なら読み込みとエンコードは1回）。
+    Returns: (messages, missing_reason) 画像が読めない場合 missing_reason に理由が入る。
     """
-    if not text:
-        return None, "空文字"
-
-    # fenced code block
-    fence = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", text, re.IGNORECASE)
-    candidates = []
-    if fence:
-        candidates.append(fence.group(1).strip())
-    candidates.append(text)
-
-    decoder = json.JSONDecoder()
-    for cand in candidates:
-        for m in re.finditer(r"[\{\[]", cand):
-            s = cand[m.start():].lstrip()
+    variant_prompt = variant.get('prompt', '')
+
+    # システムプロンプトがケースレベルにあれば使用
+    system_prompt = case.get('system_prompt', '')
+
+    variant_messages = []
+    if system_prompt:
+        variant_messages.append({"role": "system", "content": system_prompt})
+
+    # 画像が指定されている場合
+    image_path = variant.get('image_path')
+    missing_reason = None
+
+    if image_path:
+        # 画像パスはrun_benchですでに絶対パスに解決されている
+        if os.path.exists(image_path):
             try:
-                obj, _end = decoder.raw_decode(s)
-                return obj, ""
-            except Exception:
-                continue
-    return None, "JSONを検出できません"
+                image_url = IMAGE_CACHE.data_url(image_path, image_preprocess_for(meta, case, variant))
+                user_content = [
+                    {"type": "text", "text": variant_prompt},
+                    {"type": "image_url", "image_url": {"url": image_url}}
+                ]
+                variant_messages.append({"role": "user", "content": user_content})
+            except Exception as e:
+                print(f"Error encoding image {image_path}: {e}")
+                missing_reason = str(e)
+        else:
+            print(f"Error: Image not found at {image_path}")
+            missing_reason = f"File not found: {image_path}"
+    else:
+        variant_messages.append({"role": "user", "content": variant_prompt})
 
+    return variant_messages, missing_reason
 
-def _extract_first_number(text: str, extract_regex=None):
-    """
-    テキストから数値を抽出する。見つからない場合は None。
-    """
-    if not text:
-        return None
-    src = text
-    if extract_regex:
-        m = re.search(extract_regex, src, re.MULTILINE)
-        if not m:
-            return None
-        src = m.group(0)
 
-    src = src.replace(",", "")
-    nums = re.findall(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?", src)
-    if not nums:
+def variant_image_info(case: dict, variant: dict, meta=None):
+    """結果に残す画像情報（解像度・バイト数・前処理）。画像がなければ None。"""
+    image_path = variant.get('image_path')
+    if not image_path:
         return None
     try:
-        return float(nums[0])
+        return image_info(IMAGE_CACHE.payload(image_path, image_preprocess_for(meta, case, variant)))
     except Exception:
         return None
 
 
-def evaluate_result(response_text, rule, llm_client=None, judge_model=None):
+def build_legacy_messages(case: dict, meta=None) -> list:
+    """旧形式ケースの request.messages を送信用 messages に変換する（image_path は data URL 化）。"""
+    messages = case['request']['messages']
+    final_messages = []
+    for msg in messages:
+        new_msg = {"role": msg["role"]}
+        content = msg["content"]
+        if isinstance(content, list):
+            new_content = []
+            for item in content:
+                if item["type"] == "image_url":
+                    image_path = item.get("image_path")
+                    try:
+                        image_url = IMAGE_CACHE.data_url(image_path, image_preprocess_for(meta, case, item))
+                        new_content.append({
+                            "type": "image_url",
+                            "image_url": {"url": image_url}
+                        })
+                    except Exception as e:
+                        print(f"Error loading image {image_path}: {e}")
+                else:
+                    new_content.append(item)
+            new_msg["content"] = new_content
+        else:
+            new_msg["content"] = content
+        final_messages.append(new_msg)
+    return final_messages
+
+
+
+def _map_bounded(fn, items, concurrency=1, on_result=None):
     """
-    評価を実行し、結果とその詳細を返す。
-    Returns: (passed: bool, details: dict)
-    
-    強化された評価タイプ:
-    - exact_match: 完全一致
-    - contains_all: 全キーワード含む
-    - contains_any: いずれかのキーワード含む
-    - json_parse: JSON形式チェック
-    - numeric: 数値比較（許容誤差あり）
-    - regex_match: 正規表現マッチ
-    - normalized_contains: 正規化した上で部分一致（句読点・スペース無視）
-    - fuzzy_match: 曖昧一致（編集距離ベース）
-    - semantic_match: LLMによる意味的判定（最も正確）
+    items の各要素に fn を適用し、入力順の結果リストを返す。
+    concurrency > 1 のときはスレッドプールで同時実行数（in-flight）を concurrency 以下に保つ。
+    on_result(index, result) は完了順ではなく入力順に、先頭から揃った時点で呼ばれる。
+    """
+    items = list(items)
+    results = [None] * len(items)
+    if concurrency <= 1 or len(items) <= 1:
+        for idx, item in enumerate(items):
+            results[idx] = fn(item)
+            if on_result: on_result(idx, results[idx])
+        return results
+
+    done = [False] * len(items)
+    next_emit = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(fn, item): idx for idx, item in enumerate(items)}
+        for fut in as_completed(futures):
+            idx = futures[fut]
+            results[idx] = fut.result()
+            done[idx] = True
+            while next_emit < len(items) and done[next_emit]:
+                if on_result: on_result(next_emit, results[next_emit])
+                next_emit += 1
+    return results
+
+
+def _estimate_tokens(text: str) -> int:
+    """
+    トークナイザがない場合の概算トークン数。
+    英数字の連続を1トークン、それ以外（日本語・記号）は1文字1トークンとみなす。
+    """
+    return len(re.findall(r"[A-Za-z0-9]+|[^\sA-Za-z0-9]", text or ""))
+
+
+def _messages_text(messages) -> str:
+    parts = []
+    for msg in messages or []:
+        content = msg.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(item.get("text", "") for item in content if isinstance(item, dict) and item.get("type") == "text")
+    return "\n".join(parts)
+
+
+def _token_metrics(messages, start_time, chunk_times, usage=None):
     """
-    eval_type = rule.get('type')
-    details = {
-        'eval_type': eval_type,
-        'matched': None,
-        'reason': ''
+    チャンク到着時刻と usage からトークンレート系の指標を計算する。
+    usage がない場合、出力トークン数はチャンク数、入力トークン数は概算で代用する。
+    """
+    if usage is not None and getattr(usage, "completion_tokens", None) is not None:
+        completion_tokens = int(usage.completion_tokens or 0)
+        prompt_tokens = int(getattr(usage, "prompt_tokens", 0) or 0)
+        token_source = "usage"
+    else:
+        completion_tokens = len(chunk_times)
+        prompt_tokens = _estimate_tokens(_messages_text(messages))
+        token_source = "estimate"
+
+    itl_ms = [round((b - a) * 1000, 2) for a, b in zip(chunk_times, chunk_times[1:])]
+
+    decode_tps = None
+    if len(chunk_times) >= 2 and completion_tokens > 1:
+        decode_sec = chunk_times[-1] - chunk_times[0]
+        if decode_sec > 0:
+            decode_tps = (completion_tokens - 1) / decode_sec
+
+    prompt_tps = None
+    if chunk_times and prompt_tokens:
+        prefill_sec = chunk_times[0] - start_time
+        if prefill_sec > 0:
+            prompt_tps = prompt_tokens / prefill_sec
+
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "token_source": token_source,
+        "decode_tps": decode_tps,
+        "prompt_tps": prompt_tps,
+        "itl_ms": itl_ms,
     }
-    
-    # テキストの正規化（NFKC + casefold）
-    normalized = _normalize_basic(response_text)
-    
-    if eval_type == 'exact_match':
-        expected = rule.get('expected', '')
-        # alternativesがあれば複数パターンをチェック
-        alternatives = rule.get('alternatives', [expected])
-        if expected and expected not in alternatives:
-            alternatives.insert(0, expected)
-        
-        for alt in alternatives:
-            if response_text.strip() == alt.strip():
-                details['matched'] = alt
-                details['reason'] = f'完全一致: "{alt}"'
-                return True, details
-        
-        details['reason'] = f'期待値: {alternatives[0] if alternatives else expected}'
-        return False, details
-    
-    elif eval_type == 'normalized_contains':
-        # 正規化して部分一致（句読点・空白・大小文字を無視）
-        expected = rule.get('expected', '')
-        alternatives = rule.get('alternatives', [expected])
-        if expected and expected not in alternatives:
-            alternatives.insert(0, expected)
-        
-        norm_response = _normalize_loose(response_text)
-        
-        for alt in alternatives:
-            norm_alt = _normalize_loose(alt)
-            if norm_alt in norm_response:
-                details['matched'] = alt
-                details['reason'] = f'正規化一致: "{alt}"'
-                return True, details
-        
-        details['reason'] = f'正規化後も不一致: 期待="{alternatives[0]}"'
-        return False, details
-    
-    elif eval_type == 'fuzzy_match':
-        # 曖昧一致（レーベンシュタイン距離）
-        expected = rule.get('expected', '')
-        threshold = rule.get('threshold', 0.8)  # 80%以上の類似度で合格
-        alternatives = rule.get('alternatives', [expected])
-        if expected and expected not in alternatives:
-            alternatives.insert(0, expected)
-        normalize_mode = rule.get('normalize', 'basic')  # basic | loose
-        
-        def levenshtein_ratio(s1, s2):
-            """レーベンシュタイン距離に基づく類似度（0-1）"""
-            if len(s1) == 0 and len(s2) == 0:
-                return 1.0
-            
-            # 簡易実装
-            rows = len(s1) + 1
-            cols = len(s2) + 1
-            dist = [[0] * cols for _ in range(rows)]
-            
-            for i in range(rows):
-                dist[i][0] = i
-            for j in range(cols):
-                dist[0][j] = j
-            
-            for i in range(1, rows):
-                for j in range(1, cols):
-                    cost = 0 if s1[i-1].lower() == s2[j-1].lower() else 1
-                    dist[i][j] = min(
-                        dist[i-1][j] + 1,
-                        dist[i][j-1] + 1,
-                        dist[i-1][j-1] + cost
-                    )
-            
-            max_len = max(len(s1), len(s2))
-            return 1 - (dist[rows-1][cols-1] / max_len) if max_len > 0 else 1.0
-        
-        response_clean = response_text.strip()
-        response_clean = _normalize_loose(response_clean) if normalize_mode == "loose" else _normalize_basic(response_clean)
-        best_ratio = 0
-        best_match = None
-        
-        for alt in alternatives:
-            alt_clean = alt.strip()
-            alt_clean = _normalize_loose(alt_clean) if normalize_mode == "loose" else _normalize_basic(alt_clean)
-            ratio = levenshtein_ratio(response_clean, alt_clean)
-            if ratio > best_ratio:
-                best_ratio = ratio
-                best_match = alt
-        
-        if best_ratio >= threshold:
-            details['matched'] = best_match
-            details['reason'] = f'曖昧一致: {best_ratio*100:.1f}% (閾値: {threshold*100:.0f}%)'
-            return True, details
-        else:
-            details['reason'] = f'類似度不足: {best_ratio*100:.1f}% < {threshold*100:.0f}%'
-            return False, details
-    
-    elif eval_type == 'semantic_match':
-        # LLMを使った意味的判定（最も正確）
-        expected = rule.get('expected', '')
-        alternatives = rule.get('alternatives', [])
-        if expected:
-            alternatives = [expected] + alternatives
-        
-        if not llm_client or not judge_model:
-            # LLMが利用できない場合はfuzzy_matchにフォールバック
-            details['reason'] = 'LLMジャッジ不可、fuzzy_matchにフォールバック'
-            fallback_rule = {**rule, 'type': 'fuzzy_match', 'threshold': 0.7}
-            return evaluate_result(response_text, fallback_rule)
-        
-        # LLMに判定させる
-        expected_str = " または ".join([f'"{a}"' for a in alternatives[:3]])
-        judge_prompt = f"""以下の回答が正しいかどうかを判定してください。
 
-【期待される回答】
-{expected_str}
 
-【実際の回答】
-"{response_text.strip()}"
+def request_params(meta: dict) -> dict:
+    """suite の meta.default_params に既定値（max_tokens=256, temperature=0）を補った送信パラメータ。"""
+    params = dict((meta or {}).get('default_params', {}) or {})
+    params.setdefault('max_tokens', 256)
+    params.setdefault('temperature', 0)
+    return params
 
-【判定ルール】
-- 意味が同じであれば正解（表現の違いは許容）
-- 余分な説明があっても、核心部分が正しければ正解
-- 明らかに間違っている場合は不正解
 
-【回答形式】
-1行目に "PASS" または "FAIL" のみを記載
-2行目に理由を簡潔に記載"""
-        
-        try:
-            judge_response = llm_client.chat.completions.create(
-                model=judge_model,
-                messages=[{"role": "user", "content": judge_prompt}],
-                max_tokens=100,
-                temperature=0
+# _stream_completion の結果のうち、リクエスト単位の結果レコードへ載せる計測値
+_METRIC_KEYS = ("prompt_tokens", "completion_tokens", "token_source", "decode_tps", "prompt_tps", "itl_ms")
+
+
+def stream_client(base_url, meta):
+    """
+    _stream_completion に渡すクライアント。meta.stream_backend が raw なら SDK を通さない RawSSEClient
+    （sse.py）、それ以外は OpenAI クライアント。どちらも共有トランスポートを使う。
+    計測するリクエストはリトライしない。失敗した試行やバックオフの待ち時間が ok の TTFT / E2E に混ざり、
+    負荷試験では 429 / 503 がエラー率から消えてしまうため（エラーのまま記録する）。
+    """
+    config = resolve_transport(meta)._replace(retries=0)
+    if resolve_stream_backend((meta or {}).get('stream_backend')) == "raw":
+        return RawSSEClient(base_url, api_key="lm-studio", http_client=shared_http_client(config))
+    return OpenAI(base_url=base_url, api_key="lm-studio", **openai_options(config))
+
+
+def _stream_completion(client, model, messages, meta, timeout, cancel_check=None):
+    """
+    1リクエストをストリーミングで実行し、計測値を返す。
+    各チャンクの到着時刻を記録し、ITL（チャンク間隔）とトークンレートも算出する。
+    client が RawSSEClient なら SDK を通さずに SSE を読む（結果の形は同じ）。
+    共有トランスポート（transport.py）経由なら、接続・送信・ヘッダー受信・最初のバイトの時刻も http_phases に載せる。
+    Returns: dict(status, error_type, ttft_ms, e2e_ms, response, prompt_tokens,
+                  completion_tokens, token_source, decode_tps, prompt_tps, itl_ms, http_phases)
+    """
+    if isinstance(client, RawSSEClient):
+        return _stream_completion_raw(client, model, messages, meta, timeout, cancel_check)
+
+    start_time = time.perf_counter()
+    ttft = None
+    full_response = ""
+    status = "ok"
+    error_type = ""
+    chunk_times = []
+    usage = None
+    phases = {}
+
+    try:
+        with capture_phases() as phases:
+            stream = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=request_params(meta)['max_tokens'],
+                temperature=request_params(meta)['temperature'],
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=timeout
             )
-            judge_text = judge_response.choices[0].message.content.strip()
-            
-            first_line = judge_text.split('\n')[0].strip().upper()
-            reason_lines = judge_text.split('\n')[1:] if '\n' in judge_text else []
-            reason = ' '.join(reason_lines).strip() if reason_lines else 'LLMジャッジ判定'
-            
-            if 'PASS' in first_line:
-                details['matched'] = expected
-                details['reason'] = f'意味一致: {reason}'
-                return True, details
-            else:
-                details['reason'] = f'意味不一致: {reason}'
-                return False, details
-        except Exception as e:
-            details['reason'] = f'LLMジャッジエラー: {str(e)[:50]}'
-            # エラー時はfuzzy_matchにフォールバック
-            fallback_rule = {**rule, 'type': 'fuzzy_match', 'threshold': 0.7}
-            return evaluate_result(response_text, fallback_rule)
-        
-    elif eval_type == 'contains_all':
-        keywords = rule.get('keywords', [])
-        normalize_mode = rule.get('normalize', 'basic')  # basic | loose
-        haystack = _normalize_loose(response_text) if normalize_mode == "loose" else normalized
-        missing = [
-            k for k in keywords
-            if (_normalize_loose(k) if normalize_mode == "loose" else _normalize_basic(k)) not in haystack
-        ]
-        
-        if not missing:
-            details['matched'] = keywords
-            details['reason'] = f'全キーワード検出: {keywords}'
-            return True, details
-        else:
-            details['reason'] = f'未検出キーワード: {missing}'
-            return False, details
-    
-    elif eval_type == 'contains_any':
-        # いずれかのキーワードを含めば合格
-        keyword_sets = rule.get('keyword_sets', [])
-        keywords = rule.get('keywords', [])
-        normalize_mode = rule.get('normalize', 'basic')  # basic | loose
-        haystack = _normalize_loose(response_text) if normalize_mode == "loose" else normalized
-        
-        # keyword_setsがあればOR条件のセットとして評価
-        if keyword_sets:
-            for kw_set in keyword_sets:
-                if all((_normalize_loose(k) if normalize_mode == "loose" else _normalize_basic(k)) in haystack for k in kw_set):
-                    details['matched'] = kw_set
-                    details['reason'] = f'キーワードセット検出: {kw_set}'
-                    return True, details
-            details['reason'] = f'いずれのキーワードセットも未検出'
-            return False, details
-        
-        # 単純なOR条件
-        found = [
-            k for k in keywords
-            if (_normalize_loose(k) if normalize_mode == "loose" else _normalize_basic(k)) in haystack
-        ]
-        if found:
-            details['matched'] = found
-            details['reason'] = f'キーワード検出: {found}'
-            return True, details
-        else:
-            details['reason'] = f'いずれのキーワードも未検出: {keywords}'
-            return False, details
 
-    elif eval_type == 'json_parse':
-        try:
-            data, reason = _extract_first_json(response_text)
-            if data is None:
-                details['reason'] = f'JSON抽出失敗: {reason}'
-                return False, details
-            must_have = rule.get('must_have_keys', [])
-
-            if isinstance(data, list):
-                if must_have:
-                    details['reason'] = f'JSON配列のためキー検証不可: 必須={must_have}'
-                    return False, details
-                details['matched'] = f"list(len={len(data)})"
-                details['reason'] = 'JSONパース成功（配列）'
-                return True, details
-
-            if not isinstance(data, dict):
-                details['reason'] = f'JSON形式が想定外: {type(data).__name__}'
-                return False, details
-
-            missing_keys = [k for k in must_have if k not in data]
-            
-            if not missing_keys:
-                details['matched'] = list(data.keys())
-                details['reason'] = f'JSONパース成功、必須キー: {must_have}'
-                return True, details
-            else:
-                details['reason'] = f'不足キー: {missing_keys}'
-                return False, details
-        except json.JSONDecodeError as e:
-            details['reason'] = f'JSONパースエラー: {str(e)[:50]}'
-            return False, details
-        except Exception as e:
-            details['reason'] = f'エラー: {str(e)[:50]}'
-            return False, details
+            for chunk in stream:
+                if cancel_check and cancel_check():
+                    status = "skipped"
+                    error_type = "Cancelled"
+                    break
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    now = time.perf_counter()
+                    content_chunk = chunk.choices[0].delta.content
+                    if not chunk_times:
+                        ttft = (now - start_time) * 1000
+                    chunk_times.append(now)
+                    full_response += content_chunk
+
+            end_time = time.perf_counter()
+            e2e = (end_time - start_time) * 1000
+            if ttft is None: ttft = e2e
 
-    elif eval_type == 'numeric':
-        try:
-            extract_regex = rule.get('extract_regex')
-            val = _extract_first_number(response_text, extract_regex=extract_regex)
-            if val is None:
-                details['reason'] = '数値が見つかりません'
-                return False, details
-
-            if 'expected_range' in rule:
-                lo, hi = rule.get('expected_range', [None, None])
-                lo = float(lo)
-                hi = float(hi)
-                if lo <= val <= hi:
-                    details['matched'] = val
-                    details['reason'] = f'数値が範囲内: {val} (期待: {lo}..{hi})'
-                    return True, details
-                details['reason'] = f'数値が範囲外: {val} (期待: {lo}..{hi})'
-                return False, details
-
-            expected = float(rule.get('expected'))
-            tolerance = float(rule.get('tolerance', 0))
-            rel_tol = float(rule.get('relative_tolerance', 0))
-            allowed = max(tolerance, abs(expected) * rel_tol)
-
-            if abs(val - expected) <= allowed:
-                details['matched'] = val
-                details['reason'] = f'数値一致: {val} (期待値: {expected}±{allowed})'
-                return True, details
-
-            details['reason'] = f'数値不一致: {val} ≠ {expected}'
-            return False, details
-        except Exception as e:
-            details['reason'] = f'数値評価エラー: {str(e)[:50]}'
-            return False, details
-    
-    elif eval_type == 'regex_match':
-        pattern = rule.get('pattern', '')
-        # alternativesパターンがあれば複数チェック
-        patterns = rule.get('alternatives', [pattern])
-        if pattern and pattern not in patterns:
-            patterns.insert(0, pattern)
-        
-        for pat in patterns:
-            match = re.search(pat, response_text, re.MULTILINE | re.IGNORECASE)
-            if match:
-                details['matched'] = match.group(0)
-                details['reason'] = f'パターン一致: "{match.group(0)}"'
-                return True, details
-        
-        details['reason'] = f'パターン不一致'
-        return False, details
-
-    elif eval_type == 'regex_fullmatch':
-        pattern = rule.get('pattern', '')
-        patterns = rule.get('alternatives', [pattern])
-        if pattern and pattern not in patterns:
-            patterns.insert(0, pattern)
-
-        flags = 0
-        for f in rule.get('flags', []) or []:
-            if f == "IGNORECASE":
-                flags |= re.IGNORECASE
-            elif f == "MULTILINE":
-                flags |= re.MULTILINE
-            elif f == "DOTALL":
-                flags |= re.DOTALL
-
-        for pat in patterns:
-            m = re.fullmatch(pat, response_text.strip(), flags=flags)
-            if m:
-                details['matched'] = m.group(0)
-                details['reason'] = '完全一致（正規表現）'
-                return True, details
-
-        details['reason'] = '完全一致（正規表現）に失敗'
-        return False, details
-
-    details['reason'] = f'不明な評価タイプ: {eval_type}'
-    return False, details
+    except Exception as e:
+        status = "error"
+        error_type = type(e).__name__
+        e2e = (time.perf_counter() - start_time) * 1000
+        full_response = str(e)
+
+    out = {
+        "status": status,
+        "error_type": error_type,
+        "ttft_ms": ttft,
+        "e2e_ms": e2e,
+        "response": full_response,
+    }
+    out.update(_token_metrics(messages, start_time, chunk_times, usage))
+    out["http_phases"] = phase_metrics(phases, start_time, ttft if chunk_times else None)
+    return out
 
 
-def evaluate_result_simple(response_text, rule):
-    """後方互換性のためのシンプルなラッパー"""
-    passed, _ = evaluate_result(response_text, rule)
-    return passed
+def _stream_completion_raw(client, model, messages, meta, timeout, cancel_check=None):
+    """
+    _stream_completion の RawSSEClient 版。チャンクの時刻は SSE のバイト列が届いた時点で、
+    応答はリストに溜めて最後につなぐ。
+    """
+    start_time = time.perf_counter()
+    ttft = None
+    pieces = []
+    status = "ok"
+    error_type = ""
+    chunk_times = []
+    usage = None
+    phases = {}
+    params = request_params(meta)
 
-# --- Runner ---
+    try:
+        with capture_phases() as phases:
+            events = client.stream_chat(model, messages, timeout, time.perf_counter,
+                                        max_tokens=params['max_tokens'], temperature=params['temperature'])
+            try:
+                for content, chunk_usage, arrived in events:
+                    if cancel_check and cancel_check():
+                        status = "skipped"
+                        error_type = "Cancelled"
+                        break
+                    if chunk_usage is not None:
+                        usage = chunk_usage
+                    if content:
+                        if not chunk_times:
+                            ttft = (arrived - start_time) * 1000
+                        chunk_times.append(arrived)
+                        pieces.append(content)
+            finally:
+                events.close()
+
+        e2e = (time.perf_counter() - start_time) * 1000
+        if ttft is None: ttft = e2e
+        full_response = "".join(pieces)
 
-# --- Runner ---
+    except Exception as e:
+        status = "error"
+        error_type = error_type_name(e)
+        e2e = (time.perf_counter() - start_time) * 1000
+        full_response = str(e)
+
+    out = {
+        "status": status,
+        "error_type": error_type,
+        "ttft_ms": ttft,
+        "e2e_ms": e2e,
+        "response": full_response,
+    }
+    usage = SimpleNamespace(**usage) if isinstance(usage, dict) else None
+    out.update(_token_metrics(messages, start_time, chunk_times, usage))
+    out["http_phases"] = phase_metrics(phases, start_time, ttft if chunk_times else None)
+    return out
 
-def run_bench_logic(suite, base_url, model_pattern, runs, warmup, timeout, 
-                    progress_callback=None, use_llm_judge=False, judge_model=None,
-                    cancel_check=None):
+
+def _variant_verdict(variant_results, pass_threshold):
     """
-    Core benchmark logic.
-    progress_callback: function(event_type, data)
-    use_llm_judge: bool - LLMをジャッジとして使用するか
-    judge_model: str - ジャッジに使うモデル（Noneの場合はテスト対象と同じ）
+    variant × run の結果から総合判定を計算する（status が ok のものだけを母数にする）。
+    Returns: (pass_count, total_count, pass_rate, overall_passed)
     """
-    if progress_callback: progress_callback("info", f"Connecting to {base_url}...")
-    
-    available_models = get_models(base_url)
-    if not available_models:
-        if progress_callback: progress_callback("error", "No models found.")
-        return []
+    valid_results = [v for v in variant_results if v['status'] == 'ok']
+    pass_count = sum(1 for v in valid_results if v['passed'])
+    total_count = len(valid_results)
+    pass_rate = pass_count / total_count if total_count > 0 else 0
+    return pass_count, total_count, pass_rate, pass_rate >= pass_threshold
 
-    target_models = []
-    for m in available_models:
-        if re.match(model_pattern, m):
-            target_models.append(m)
-    
-    if progress_callback: progress_callback("info", f"Target Models: {target_models}")
 
+def detect_model_tags(suite, base_url, models, progress_callback=None) -> dict:
+    """各モデルの対応タグ（text / vision）を調べる。vision ケースがなければ判定リクエストは送らない。"""
     model_tags = {}
     has_vision_cases = any(c.get('modality') == 'vision' for c in suite['cases'])
-    
-    for m in target_models:
+
+    for m in models:
         tags = set(["text"])
         if has_vision_cases:
             if progress_callback: progress_callback("info", f"Probing vision capability for {m}...")
@@ -631,348 +668,475 @@ def run_bench_logic(suite, base_url, model_pattern, runs, warmup, timeout,
                 tags.add("vision")
         model_tags[m] = tags
         if progress_callback: progress_callback("info", f"Model {m} tags: {tags}")
+    return model_tags
+
+
+def run_bench_logic(suite, base_url, model_pattern, runs, warmup, timeout,
+                    progress_callback=None, use_llm_judge=False, judge_model=None,
+                    cancel_check=None, concurrency=1, cache=None, resume=None, model_tags=None,
+                    prefix_order="suite", prefix_tracker=None, warmup_registry=None, early_stop="off",
+                    judge_base_url=None, judge=None):
+    """
+    Core benchmark logic.
+    progress_callback: function(event_type, data)
+    use_llm_judge: bool - LLMをジャッジとして使用するか
+    judge_model: str - ジャッジに使うモデル（Noneの場合はテスト対象と同じ）
+    judge_base_url: str - ジャッジのエンドポイント（None なら base_url）
+    judge: JudgePipeline - semantic_match の判定パイプライン（None で use_llm_judge なら新しく作り、終了時に閉じる）。
+                           生成は判定を待たずに進み、結果の通知は判定が済んだものから入力順に行う
+    concurrency: int - 同時に投げるリクエスト数（1 なら従来どおり逐次）
+    cache: ResponseCache - レスポンスキャッシュ（None なら使わない）
+    resume: dict - build_resume_state の戻り値。完了済みの結果は再実行せず "resumed" として通知する
+    model_tags: dict - {model: tags}。指定するとモデル一覧の取得と vision 判定を省き、このモデルだけを実行する
+                       （coordinator が作業単位ごとに呼ぶ場合など）
+    prefix_order: str - variants の実行順（prefix.PREFIX_ORDERS）。suite 以外ではモデルごとに全ケースの
+                        variant × run をまとめて並べ替えて実行し、結果はケースの順に通知する
+    prefix_tracker: PrefixTracker - cold / warm の判定（None なら同時実行数を slots として新しく作る）
+    warmup: int - モデルごとのウォームアップの上限件数（0 で無効）。直近の E2E が安定したら打ち切る（warmup.py）
+    warmup_registry: WarmupRegistry - ウォームアップ済みのモデル（None なら新しく作る。分散実行では共有する）
+    early_stop: str - variants ケースの逐次判定（earlystop.EARLY_STOP_MODES）。off 以外では判定が決まった時点で
+                      残りの variant × run を送らず、集約レコードに "early_stop" を記録する
+
+    progress_callback の event_type:
+    - "result":  ケース単位の結果（variants は集約1件）
+    - "variant": variants の1実行分（集約より先に通知される。再開用のジャーナル）
+    - "resumed": resume から復元した完了済みの結果
+    """
+    concurrency = max(1, int(concurrency or 1))
+    prefix_order = resolve_prefix_order(prefix_order)
+    early_stop = resolve_early_stop(early_stop)
+    if prefix_tracker is None:
+        prefix_tracker = PrefixTracker(slots=concurrency)
+    if warmup_registry is None:
+        warmup_registry = WarmupRegistry()
+    if model_tags is not None:
+        target_models = list(model_tags)
+    else:
+        if progress_callback: progress_callback("info", f"Connecting to {base_url}...")
+
+        available_models = get_models(base_url)
+        if not available_models:
+            if progress_callback: progress_callback("error", "No models found.")
+            return []
+
+        target_models = []
+        for m in available_models:
+            if re.match(model_pattern, m):
+                target_models.append(m)
+
+        if progress_callback: progress_callback("info", f"Target Models: {target_models}")
+        if progress_callback and concurrency > 1: progress_callback("info", f"Concurrency: {concurrency}")
+
+        model_tags = detect_model_tags(suite, base_url, target_models, progress_callback)
 
-    client = OpenAI(base_url=base_url, api_key="lm-studio")
-    results = []
-    
     timestamp = datetime.now().isoformat()
     meta = suite.get('meta', {})
+    client = stream_client(base_url, meta)
+    stream_backend = resolve_stream_backend(meta.get('stream_backend'))
+    results = []
+    params = request_params(meta)
+    warmup_config = resolve_warmup(meta, warmup)
 
-    for model in target_models:
+    def warm(model, messages):
+        """モデルの最初のリクエストの前に1回だけウォームアップする（採点・集計には含めない）。"""
+        if warmup_config["max_requests"] <= 0:
+            return None
+
+        def run():
+            warm_meta = dict(meta, default_params=dict(params, max_tokens=warmup_config["max_tokens"]))
+
+            def send():
+                prefix_tracker.observe((base_url, model), messages)
+                return _stream_completion(client, model, messages, warm_meta, timeout, cancel_check)
+
+            record = run_warmup(send, warmup_config, cancel_check)
+            if progress_callback:
+                state = {True: "安定", False: "上限到達", None: "判定なし"}[record["stable"]]
+                curve = " → ".join(f"{v:.0f}" for v in record["e2e_ms"])
+                cv = "-" if record["cv"] is None else f"{record['cv'] * 100:.1f}%"
+                progress_callback("info", f"[{model}] ウォームアップ: {record['requests']} 件, {state} (CV {cv}), E2E {curve or '-'} ms"
+                                          + (f", エラー: {record['error']}" if record["error"] else ""))
+            return record
+
+        return warmup_registry.ensure((base_url, model), run)
+
+    def stream(model, messages):
+        # 送信する時点でプレフィックスキャッシュの cold / warm を判定する
+        prefix_cache = prefix_tracker.observe((base_url, model), messages)
+        out = _stream_completion(client, model, messages, meta, timeout, cancel_check)
+        out["prefix_cache"] = prefix_cache
+        return out
+
+    def complete(model, messages, run_index):
+        """キャッシュがあればそこから、なければ実際に推論して結果を返す。"""
+        if cache is None:
+            out = stream(model, messages)
+            out["cached"] = False
+            return out
+        key = cache_key(model, messages, params, run_index, base_url, stream_backend)
+        out = cache.get(key)
+        if out is not None:
+            out["cached"] = True
+            out["prefix_cache"] = None
+            out["http_phases"] = None
+            return out
+        out = stream(model, messages)
+        cache.put(key, model, out)
+        out["cached"] = False
+        return out
+
+    def evaluate(model, response_text, rule):
+        """
+        採点する。LLM ジャッジを使う semantic_match はパイプラインに回し、(None, {"_judge": Future, ...}) を返す
+        （resolve_judged で確定させる）。
+        """
+        if judge is not None:
+            compiled = compile_rule(rule)
+            if compiled.eval_type == 'semantic_match':
+                return None, {"_judge": judge.submit(compiled.alternatives, response_text, judge_model or model),
+                              "_judge_rule": compiled}
+        return evaluate_result(response_text, rule)
+
+    def pending_judge(res):
+        return res.get("_judge") if isinstance(res, dict) else None
+
+    def resolve_judged(res, response_key):
+        """判定待ちの結果を確定させる（判定を待ち、passed / eval_reason を書き込む）。"""
+        fut = res.pop("_judge", None) if isinstance(res, dict) else None
+        if fut is None:
+            return res
+        passed, details = judge_details(res.pop("_judge_rule"), fut.result(), res.get(response_key) or "")
+        res["passed"] = passed
+        res["eval_reason"] = details.get('reason', '')
+        if "eval_matched" in res:
+            res["eval_matched"] = details.get('matched')
+        return res
+
+    def variant_work_items(case):
+        """variants 形式のケースの作業単位（variant -> run の順）。"""
+        work_items = []
+        for v_idx, variant in enumerate(case['variants']):
+            # バリエーションのプロンプトを構築
+            variant_prompt = variant.get('prompt', '')
+            variant_eval = variant.get('evaluation', {})
+
+            variant_messages, missing_reason = build_variant_messages(case, variant, meta)
+            image = variant_image_info(case, variant, meta) if missing_reason is None else None
+
+            # 各バリエーションをruns回実行
+            for i in range(runs):
+                work_items.append((v_idx, i, variant_prompt, variant_eval, variant_messages, missing_reason, image))
+        return work_items
+
+    def run_variant(model, journaled, item):
+        v_idx, i, variant_prompt, variant_eval, variant_messages, missing_reason, image = item
+        if (v_idx, i) in journaled:
+            return journaled[(v_idx, i)]
+        expected_answer = variant_eval.get('expected', '')
+        if missing_reason is not None:
+            # 画像エラー時はAPI呼び出しをスキップしてエラー記録
+            return {
+                "variant_index": v_idx,
+                "run_index": i,
+                "passed": False,
+                "status": "error",
+                "ttft_ms": 0,
+                "e2e_ms": 0,
+                "prompt": variant_prompt,
+                "response": f"Image Error: {missing_reason}",
+                "eval_reason": "Image load failed",
+                "expected": expected_answer,
+                "concurrency": concurrency
+            }
         if cancel_check and cancel_check():
-            if progress_callback: progress_callback("info", "キャンセルされました（モデル開始前）")
-            break
-        tags = model_tags[model]
-        
+            return {
+                "variant_index": v_idx,
+                "run_index": i,
+                "passed": False,
+                "status": "skipped",
+                "ttft_ms": 0,
+                "e2e_ms": 0,
+                "prompt": variant_prompt,
+                "response": "Cancelled",
+                "eval_reason": "キャンセル",
+                "expected": expected_answer,
+                "concurrency": concurrency
+            }
+
+        out = complete(model, variant_messages, i)
+
+        passed = False
+        eval_details = {}
+
+        if out["status"] == "ok":
+            passed, eval_details = evaluate(model, out["response"], variant_eval)
+
+        return {
+            "variant_index": v_idx,
+            "run_index": i,
+            "passed": passed,
+            "status": out["status"],
+            "ttft_ms": out["ttft_ms"],
+            "e2e_ms": out["e2e_ms"],
+            "prompt": variant_prompt,
+            "response": out["response"],
+            "eval_reason": eval_details.get('reason', ''),
+            "expected": expected_answer,
+            "concurrency": concurrency,
+            "cached": out["cached"],
+            "prefix_cache": out.get("prefix_cache"),
+            "http_phases": out.get("http_phases"),
+            **({"image": image} if image else {}),
+            **{k: out[k] for k in _METRIC_KEYS},
+            **{k: v for k, v in eval_details.items() if k.startswith("_judge")}
+        }
+
+    def journal_variant(model, case, journaled, vres):
+        # 集約結果より先に1実行ずつ通知しておき、中断時に variant 単位で再開できるようにする
+        if (vres["variant_index"], vres["run_index"]) in journaled or vres["status"] == "skipped":
+            return
+        if progress_callback:
+            progress_callback("variant", {"record_type": "variant", "model": model, "case_id": case['id'], **vres})
+
+    def new_decider(case, work_items):
+        """early_stop が off でなければ、ケースの逐次判定を作る。"""
+        if early_stop == "off":
+            return None
+        return VariantDecider(
+            len(work_items), case.get('pass_threshold', 0.8), early_stop,
+            alpha=meta.get('early_stop_alpha', 0.05), beta=meta.get('early_stop_beta', 0.05),
+            delta=meta.get('early_stop_delta', 0.1),
+        )
+
+    def run_decided(model, journaled, decider, item):
+        # 判定が決まったケースの残りは送らない（None は未実行）
+        if decider is not None and decider.decided:
+            return None
+        return run_variant(model, journaled, item)
+
+    def record_variant(model, case, journaled, decider, vres):
+        if vres is None:
+            return
+        resolve_judged(vres, "response")
+        if decider is not None:
+            decider.add(vres)
+        journal_variant(model, case, journaled, vres)
+
+    def run_variant_pool(model, tags):
+        """
+        prefix_order に従い、モデルの全 variants ケースの作業単位をまとめて並べ替えて実行する。
+        戻り値: {case_id: (variant_results, ケースの最初の送信から最後の完了までの ms, VariantDecider | None)}
+        """
+        plans = []
         for case in suite['cases']:
+            if not case.get('variants') or (resume and (model, case['id'], None) in resume["done"]):
+                continue
+            if not set(case.get('required_tags', [])).issubset(tags):
+                continue
+            journaled = resume["variants"].get((model, case['id']), {}) if resume else {}
+            items = variant_work_items(case)
+            plans.append((case, journaled, items, shared_prefix_key(items[0][4]) if items else None,
+                          new_decider(case, items)))
+
+        ordered = order_work_items([(key, items) for _case, _j, items, key, _d in plans], prefix_order,
+                                   seed=meta.get('prefix_seed', 0))
+        pending = [item for p_idx, item in ordered if (item[0], item[1]) not in plans[p_idx][1]]
+        if pending:
+            warm(model, pending[0][4])
+        if progress_callback and ordered:
+            progress_callback("info", f"[{model}] 実行順 {prefix_order}: {len(plans)} ケース / {len(ordered)} 件の variant 実行")
+        spans = [[None, None] for _ in plans]
+        span_lock = threading.Lock()
+
+        def run_pooled(pair):
+            p_idx, item = pair
+            case, journaled, _items, _key, decider = plans[p_idx]
+            if decider is not None and decider.decided:
+                return p_idx, item, None
+            start = time.perf_counter()
+            vres = run_variant(model, journaled, item)
+            end = time.perf_counter()
+            with span_lock:
+                span = spans[p_idx]
+                span[0] = start if span[0] is None else min(span[0], start)
+                span[1] = end if span[1] is None else max(span[1], end)
+            return p_idx, item, vres
+
+        def journal_pooled(_idx, out):
+            p_idx, _item, vres = out
+            case, journaled, _items, _key, decider = plans[p_idx]
+            record_variant(model, case, journaled, decider, vres)
+
+        # ジャッジの判定待ちがあっても生成は止めず、判定が済んだものから入力順に記録する
+        resolver = OrderedResolver(journal_pooled, lambda out: pending_judge(out[2]))
+        by_item = {}
+        for p_idx, item, vres in _map_bounded(run_pooled, ordered, concurrency, on_result=resolver.push):
+            by_item[(p_idx, item[0], item[1])] = vres
+        resolver.finish()
+        pooled = {}
+        for p_idx, (case, _journaled, items, _key, decider) in enumerate(plans):
+            start, end = spans[p_idx]
+            wall_ms = (end - start) * 1000 if start is not None else 0.0
+            executed = [by_item[(p_idx, it[0], it[1])] for it in items]
+            pooled[case['id']] = ([v for v in executed if v is not None], wall_ms, decider)
+        return pooled
+
+    own_judge = None
+    if use_llm_judge and judge is None:
+        judge_meta = suite.get('meta', {}) or {}
+        judge = own_judge = JudgePipeline(
+            OpenAI(base_url=judge_base_url or base_url, api_key="lm-studio", **openai_options(resolve_transport(judge_meta))),
+            judge_model,
+            batch_size=judge_meta.get('judge_batch_size', 8), workers=judge_meta.get('judge_workers', 2),
+        )
+    try:
+        for model in target_models:
             if cancel_check and cancel_check():
-                if progress_callback: progress_callback("info", "キャンセルされました（ケース開始前）")
+                if progress_callback: progress_callback("info", "キャンセルされました（モデル開始前）")
                 break
-            req_tags = set(case.get('required_tags', []))
-            if not req_tags.issubset(tags):
-                res = {
-                    "timestamp": datetime.now().isoformat(),
-                    "model": model,
-                    "case_id": case['id'],
-                    "case_name": case.get('name', case['id']),
-                    "case_description": case.get('description', ''),
-                    "category_id": case.get('category_id', ''),
-                    "category_name": case.get('category_name', ''),
-                    "status": "skipped",
-                    "reason": "missing_capabilities"
-                }
-                results.append(res)
-                if progress_callback: progress_callback("result", res)
-                continue
+            tags = model_tags[model]
+            # suite 以外の実行順では、variants の作業単位をケースをまたいで並べ替えて先に実行しておく
+            pooled = run_variant_pool(model, tags) if prefix_order != "suite" else {}
+
+            for case in suite['cases']:
+                if cancel_check and cancel_check():
+                    if progress_callback: progress_callback("info", "キャンセルされました（ケース開始前）")
+                    break
+
+                # 前回の実行で完了済みのケースは再実行しない
+                prior = resume["done"].get((model, case['id'], None)) if resume else None
+                if prior is not None:
+                    results.append(prior)
+                    if progress_callback: progress_callback("resumed", prior)
+                    continue
+
+                req_tags = set(case.get('required_tags', []))
+                if not req_tags.issubset(tags):
+                    res = {
+                        "timestamp": datetime.now().isoformat(),
+                        "model": model,
+                        "case_id": case['id'],
+                        "case_name": case.get('name', case['id']),
+                        "case_description": case.get('description', ''),
+                        "category_id": case.get('category_id', ''),
+                        "category_name": case.get('category_name', ''),
+                        "status": "skipped",
+                        "reason": "missing_capabilities"
+                    }
+                    results.append(res)
+                    if progress_callback: progress_callback("result", res)
+                    continue
 
-            # ========================================
-            # variants形式のテストケースかどうかをチェック
-            # ========================================
-            variants = case.get('variants', None)
-            
-            if variants:
-                # ========================================
-                # 新形式: variants を持つテストケース
                 # ========================================
-                pass_threshold = case.get('pass_threshold', 0.8)
-                variant_results = []
-                
-                for v_idx, variant in enumerate(variants):
-                    # バリエーションのプロンプトを構築
-                    variant_prompt = variant.get('prompt', '')
-                    variant_eval = variant.get('evaluation', {})
-                    
-                    # システムプロンプトがケースレベルにあれば使用
-                    system_prompt = case.get('system_prompt', '')
-                    
-                    variant_messages = []
-                    if system_prompt:
-                        variant_messages.append({"role": "system", "content": system_prompt})
-                    
-                    # 画像が指定されている場合
-                    image_path = variant.get('image_path')
-                    image_missing = False
-                    
-                    if image_path:
-                        # 画像パスはrun_benchですでに絶対パスに解決されている
-                        if os.path.exists(image_path):
-                            try:
-                                base64_image = encode_image(image_path)
-                                user_content = [
-                                    {"type": "text", "text": variant_prompt},
-                                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
-                                ]
-                                variant_messages.append({"role": "user", "content": user_content})
-                            except Exception as e:
-                                print(f"Error encoding image {image_path}: {e}")
-                                image_missing = True
-                                missing_reason = str(e)
-                        else:
-                            print(f"Error: Image not found at {image_path}")
-                            image_missing = True
-                            missing_reason = f"File not found: {image_path}"
-                    else:
-                        variant_messages.append({"role": "user", "content": variant_prompt})
-                    
-                    if image_missing:
-                         # 画像エラー時はAPI呼び出しをスキップしてエラー記録
-                        for i in range(runs):
-                            variant_results.append({
-                                "variant_index": v_idx,
-                                "run_index": i,
-                                "passed": False,
-                                "status": "error",
-                                "ttft_ms": 0,
-                                "e2e_ms": 0,
-                                "prompt": variant_prompt,
-                                "response": f"Image Error: {missing_reason}",
-                                "eval_reason": "Image load failed",
-                                "expected": variant_eval.get('expected', '')
-                            })
-                        continue
-
-                    # 各バリエーションをruns回実行
-                    for i in range(runs):
-                        if cancel_check and cancel_check():
-                            variant_results.append({
-                                "variant_index": v_idx,
-                                "run_index": i,
-                                "passed": False,
-                                "status": "skipped",
-                                "ttft_ms": 0,
-                                "e2e_ms": 0,
-                                "prompt": variant_prompt,
-                                "response": "Cancelled",
-                                "eval_reason": "キャンセル",
-                                "expected": variant_eval.get('expected', '')
-                            })
-                            continue
-                        start_time = time.perf_counter()
-                        ttft = None
-                        full_response = ""
-                        status = "ok"
-                        error_type = ""
-                        
-                        try:
-                            stream = client.chat.completions.create(
-                                model=model,
-                                messages=variant_messages,
-                                max_tokens=meta.get('default_params', {}).get('max_tokens', 256),
-                                temperature=meta.get('default_params', {}).get('temperature', 0),
-                                stream=True,
-                                timeout=timeout
-                            )
-                            
-                            first_chunk = True
-                            for chunk in stream:
-                                if cancel_check and cancel_check():
-                                    status = "skipped"
-                                    error_type = "Cancelled"
-                                    break
-                                if chunk.choices and chunk.choices[0].delta.content:
-                                    content_chunk = chunk.choices[0].delta.content
-                                    if first_chunk:
-                                        ttft = (time.perf_counter() - start_time) * 1000
-                                        first_chunk = False
-                                    full_response += content_chunk
-                            
-                            end_time = time.perf_counter()
-                            e2e = (end_time - start_time) * 1000
-                            if ttft is None: ttft = e2e
-
-                        except Exception as e:
-                            status = "error"
-                            error_type = type(e).__name__
-                            e2e = (time.perf_counter() - start_time) * 1000
-                            full_response = str(e)
-                        
-                        passed = False
-                        eval_details = {}
-                        expected_answer = variant_eval.get('expected', '')
-                        
-                        if status == "ok":
-                            judge_llm_client = client if use_llm_judge else None
-                            judge_llm_model = judge_model if judge_model else model
-                            passed, eval_details = evaluate_result(
-                                full_response, 
-                                variant_eval, 
-                                llm_client=judge_llm_client if use_llm_judge else None,
-                                judge_model=judge_llm_model if use_llm_judge else None
-                            )
-                        
-                        variant_results.append({
-                            "variant_index": v_idx,
-                            "run_index": i,
-                            "passed": passed,
-                            "status": status,
-                            "ttft_ms": ttft,
-                            "e2e_ms": e2e,
-                            "prompt": variant_prompt,
-                            "response": full_response,
-                            "eval_reason": eval_details.get('reason', ''),
-                            "expected": expected_answer
-                        })
-                
-                # 総合判定
-                valid_results = [v for v in variant_results if v['status'] == 'ok']
-                pass_count = sum(1 for v in valid_results if v['passed'])
-                total_count = len(valid_results)
-                pass_rate = pass_count / total_count if total_count > 0 else 0
-                overall_passed = pass_rate >= pass_threshold
-                
-                # 平均レイテンシ計算
-                ok_lat = [v for v in variant_results if v.get("status") == "ok"]
-                avg_ttft = (sum(v['ttft_ms'] or 0 for v in ok_lat) / len(ok_lat)) if ok_lat else 0
-                avg_e2e = (sum(v['e2e_ms'] or 0 for v in ok_lat) / len(ok_lat)) if ok_lat else 0
-                
-                # 総合結果を記録
-                res = {
-                    "timestamp": datetime.now().isoformat(),
-                    "model": model,
-                    "case_id": case['id'],
-                    "case_name": case.get('name', case['id']),
-                    "case_description": case.get('description', ''),
-                    "category_id": case.get('category_id', ''),
-                    "category_name": case.get('category_name', ''),
-                    "run_index": 0,
-                    "status": "ok",
-                    "error_type": "",
-                    "ttft_ms": avg_ttft,
-                    "e2e_ms": avg_e2e,
-                    "passed": overall_passed,
-                    "human_override": None,
-                    "eval_reason": f"合格率: {pass_count}/{total_count} = {pass_rate*100:.0f}% (閾値: {pass_threshold*100:.0f}%)",
-                    "eval_matched": None,
-                    "expected_answer": f"閾値 {pass_threshold*100:.0f}% 以上",
-                    "test_prompt": f"[{len(variants)}個のバリエーション]",
-                    "response_preview": f"合格: {pass_count}/{total_count}",
-                    "full_response": json.dumps(variant_results, ensure_ascii=False, indent=2),
-                    # 追加フィールド
-                    "is_variant_test": True,
-                    "variant_count": len(variants),
-                    "variant_pass_count": pass_count,
-                    "variant_total_count": total_count,
-                    "variant_pass_rate": pass_rate,
-                    "variant_threshold": pass_threshold,
-                    "variant_details": variant_results
-                }
-                
-                results.append(res)
-                if progress_callback: progress_callback("result", res)
-            
-            else:
-                # ========================================
-                # 旧形式: 単一テストケース（後方互換性）
+                # variants形式のテストケースかどうかをチェック
                 # ========================================
-                # Prepare Messages
-                messages = case['request']['messages']
-                final_messages = []
-                for msg in messages:
-                    new_msg = {"role": msg["role"]}
-                    content = msg["content"]
-                    if isinstance(content, list):
-                        new_content = []
-                        for item in content:
-                            if item["type"] == "image_url":
-                                image_path = item.get("image_path")
-                                if not os.path.exists(image_path):
-                                    pass
-                                
-                                try:
-                                    b64 = encode_image(image_path)
-                                    new_content.append({
-                                        "type": "image_url",
-                                        "image_url": {"url": f"data:image/png;base64,{b64}"}
-                                    })
-                                except Exception as e:
-                                    print(f"Error loading image {image_path}: {e}")
-                            else:
-                                new_content.append(item)
-                        new_msg["content"] = new_content
-                    else:
-                        new_msg["content"] = content
-                    final_messages.append(new_msg)
+                variants = case.get('variants', None)
 
-                # Warmup
-                for _ in range(warmup):
-                    try:
-                        client.chat.completions.create(
-                            model=model,
-                            messages=final_messages,
-                            max_tokens=10,
-                            stream=False
-                        )
-                    except: pass
+                if variants:
+                    # ========================================
+                    # 新形式: variants を持つテストケース
+                    # ========================================
+                    pass_threshold = case.get('pass_threshold', 0.8)
 
-                # Runs
-                for i in range(runs):
-                    if cancel_check and cancel_check():
-                        if progress_callback: progress_callback("info", "キャンセルされました（run開始前）")
-                        break
-                    start_time = time.perf_counter()
-                    ttft = None
-                    full_response = ""
-                    status = "ok"
-                    error_type = ""
-                    
-                    try:
-                        stream = client.chat.completions.create(
-                            model=model,
-                            messages=final_messages,
-                            max_tokens=meta.get('default_params', {}).get('max_tokens', 256),
-                            temperature=meta.get('default_params', {}).get('temperature', 0),
-                            stream=True,
-                            timeout=timeout
+                    if case['id'] in pooled:
+                        variant_results, case_wall_ms, decider = pooled[case['id']]
+                    else:
+                        journaled = resume["variants"].get((model, case['id']), {}) if resume else {}
+                        work_items = variant_work_items(case)
+                        decider = new_decider(case, work_items)
+                        pending = [item for item in work_items if (item[0], item[1]) not in journaled]
+                        if pending:
+                            warm(model, pending[0][4])
+                        case_start = time.perf_counter()
+                        resolver = OrderedResolver(lambda _idx, vres: record_variant(model, case, journaled, decider, vres),
+                                                   pending_judge)
+                        variant_results = _map_bounded(
+                            lambda item: run_decided(model, journaled, decider, item), work_items, concurrency,
+                            on_result=resolver.push,
                         )
-                        
-                        first_chunk = True
-                        for chunk in stream:
-                            if cancel_check and cancel_check():
-                                status = "skipped"
-                                error_type = "Cancelled"
-                                break
-                            if chunk.choices and chunk.choices[0].delta.content:
-                                content_chunk = chunk.choices[0].delta.content
-                                if first_chunk:
-                                    ttft = (time.perf_counter() - start_time) * 1000
-                                    first_chunk = False
-                                full_response += content_chunk
-                        
-                        end_time = time.perf_counter()
-                        e2e = (end_time - start_time) * 1000
-                        if ttft is None: ttft = e2e
+                        resolver.finish()
+                        variant_results = [v for v in variant_results if v is not None]
+                        case_wall_ms = (time.perf_counter() - case_start) * 1000
+
+                    # 総合判定（early stop で決まった場合はその判定。合格率は実行した分だけのもの）
+                    pass_count, total_count, pass_rate, overall_passed = _variant_verdict(variant_results, pass_threshold)
+                    early_stop_record = None
+                    if decider is not None:
+                        early_stop_record = decider.summary(len({v['variant_index'] for v in variant_results}))
+                        if decider.decided:
+                            overall_passed = decider.decision
+
+                    # 平均レイテンシ計算
+                    ok_lat = [v for v in variant_results if v.get("status") == "ok"]
+                    avg_ttft = (sum(v['ttft_ms'] or 0 for v in ok_lat) / len(ok_lat)) if ok_lat else 0
+                    avg_e2e = (sum(v['e2e_ms'] or 0 for v in ok_lat) / len(ok_lat)) if ok_lat else 0
+
+                    # 総合結果を記録
+                    res = {
+                        "timestamp": datetime.now().isoformat(),
+                        "model": model,
+                        "case_id": case['id'],
+                        "case_name": case.get('name', case['id']),
+                        "case_description": case.get('description', ''),
+                        "category_id": case.get('category_id', ''),
+                        "category_name": case.get('category_name', ''),
+                        "run_index": 0,
+                        "status": "ok",
+                        "error_type": "",
+                        "ttft_ms": avg_ttft,
+                        "e2e_ms": avg_e2e,
+                        "passed": overall_passed,
+                        "human_override": None,
+                        "eval_reason": f"合格率: {pass_count}/{total_count} = {pass_rate*100:.0f}% (閾値: {pass_threshold*100:.0f}%)"
+                                       + (f" [early stop: {decider.decided_at}/{decider.total} 件で判定 ({decider.reason})]"
+                                          if decider is not None and decider.decided else ""),
+                        "eval_matched": None,
+                        "expected_answer": f"閾値 {pass_threshold*100:.0f}% 以上",
+                        "test_prompt": f"[{len(variants)}個のバリエーション]",
+                        "response_preview": f"合格: {pass_count}/{total_count}",
+                        "full_response": json.dumps(variant_results, ensure_ascii=False, indent=2),
+                        # 追加フィールド
+                        "is_variant_test": True,
+                        "variant_count": len(variants),
+                        "variant_pass_count": pass_count,
+                        "variant_total_count": total_count,
+                        "variant_pass_rate": pass_rate,
+                        "variant_threshold": pass_threshold,
+                        "variant_details": variant_results,
+                        # 逐次判定（early_stop が off なら None）。executed / total が実際に送った割合
+                        "early_stop": early_stop_record,
+                        # 同時実行数とケース全体の所要時間（スループット比較用）
+                        "concurrency": concurrency,
+                        "wall_ms": case_wall_ms,
+                        "throughput_rps": (len(ok_lat) / (case_wall_ms / 1000)) if case_wall_ms > 0 else 0,
+                        # variant × run 全体の分位・トークン数
+                        "latency_stats": latency_stats(ok_lat),
+                        # プレフィックスキャッシュの cold / warm 別（最初のバリエーションとそれ以降の差）
+                        "prefix_cache_stats": prefix_cache_stats(ok_lat),
+                        # モデルのウォームアップ曲線（このケースの計測には含まれない）
+                        "warmup": warmup_registry.get((base_url, model)),
+                        "prompt_tokens": sum(v.get('prompt_tokens') or 0 for v in ok_lat),
+                        "completion_tokens": sum(v.get('completion_tokens') or 0 for v in ok_lat)
+                    }
+
+                    results.append(res)
+                    if progress_callback: progress_callback("result", res)
+
+                else:
+                    # ========================================
+                    # 旧形式: 単一テストケース（後方互換性）
+                    # ========================================
+                    # Prepare Messages
+                    final_messages = build_legacy_messages(case, meta)
+                    prior_runs = {
+                        i: resume["done"][(model, case['id'], i)]
+                        for i in range(runs) if resume and (model, case['id'], i) in resume["done"]
+                    }
+
+                    # ウォームアップはモデルごとに1回（完了済みの run しかなければ送らない）
+                    if len(prior_runs) < runs:
+                        warm(model, final_messages)
 
-                    except Exception as e:
-                        status = "error"
-                        error_type = type(e).__name__
-                        e2e = (time.perf_counter() - start_time) * 1000
-                        full_response = str(e)
-                    
-                    passed = False
-                    eval_details = {}
-                    expected_answer = ""
-                    
-                    if status == "ok":
-                        eval_rule = case.get('eval', {})
-                        expected_answer = case.get('expected_answer', '')
-                        
-                        if not expected_answer:
-                            if eval_rule.get('expected'):
-                                expected_answer = str(eval_rule['expected'])
-                            elif eval_rule.get('keywords'):
-                                expected_answer = f"キーワード: {', '.join(eval_rule['keywords'])}"
-                            elif eval_rule.get('pattern'):
-                                expected_answer = f"パターン: {eval_rule['pattern']}"
-                        
-                        judge_llm_client = client if use_llm_judge else None
-                        judge_llm_model = judge_model if judge_model else model
-                        passed, eval_details = evaluate_result(
-                            full_response, 
-                            eval_rule, 
-                            llm_client=judge_llm_client if use_llm_judge else None,
-                            judge_model=judge_llm_model if use_llm_judge else None
-                        )
-                    
                     # プロンプトを抽出
                     test_prompt = ""
                     for msg in case['request']['messages']:
@@ -986,36 +1150,364 @@ def run_bench_logic(suite, base_url, model_pattern, runs, warmup, timeout,
                                     test_prompt += f"[{role}]\n{item.get('text', '')}\n\n"
                                 elif item.get('type') == 'image_url':
                                     test_prompt += f"[{role}]\n[画像: {item.get('image_path', 'image')}]\n\n"
-                    
-                    res = {
-                        "timestamp": datetime.now().isoformat(),
-                        "model": model,
-                        "case_id": case['id'],
-                        "case_name": case.get('name', case['id']),
-                        "case_description": case.get('description', ''),
-                        "category_id": case.get('category_id', ''),
-                        "category_name": case.get('category_name', ''),
-                        "run_index": i,
-                        "status": status,
-                        "error_type": error_type,
-                        "ttft_ms": ttft,
-                        "e2e_ms": e2e,
-                        "passed": passed,
-                        "human_override": None,
-                        "eval_reason": eval_details.get('reason', ''),
-                        "eval_matched": eval_details.get('matched'),
-                        "expected_answer": expected_answer,
-                        "test_prompt": test_prompt.strip(),
-                        "response_preview": full_response[:100].replace("\n", " "),
-                        "full_response": full_response,
-                        "is_variant_test": False
-                    }
-                    
-                    results.append(res)
-                    if progress_callback: progress_callback("result", res)
 
+                    # Runs
+                    def run_legacy(i):
+                        if i in prior_runs:
+                            return prior_runs[i]
+                        if cancel_check and cancel_check():
+                            return None
+
+                        out = complete(model, final_messages, i)
+                        full_response = out["response"]
+
+                        passed = False
+                        eval_details = {}
+                        expected_answer = ""
+
+                        if out["status"] == "ok":
+                            eval_rule = case.get('eval', {})
+                            expected_answer = case.get('expected_answer', '')
+
+                            if not expected_answer:
+                                if eval_rule.get('expected'):
+                                    expected_answer = str(eval_rule['expected'])
+                                elif eval_rule.get('keywords'):
+                                    expected_answer = f"キーワード: {', '.join(eval_rule['keywords'])}"
+                                elif eval_rule.get('pattern'):
+                                    expected_answer = f"パターン: {eval_rule['pattern']}"
+
+                            passed, eval_details = evaluate(model, full_response, eval_rule)
+
+                        return {
+                            "timestamp": datetime.now().isoformat(),
+                            "model": model,
+                            "case_id": case['id'],
+                            "case_name": case.get('name', case['id']),
+                            "case_description": case.get('description', ''),
+                            "category_id": case.get('category_id', ''),
+                            "category_name": case.get('category_name', ''),
+                            "run_index": i,
+                            "status": out["status"],
+                            "error_type": out["error_type"],
+                            "ttft_ms": out["ttft_ms"],
+                            "e2e_ms": out["e2e_ms"],
+                            "passed": passed,
+                            "human_override": None,
+                            "eval_reason": eval_details.get('reason', ''),
+                            "eval_matched": eval_details.get('matched'),
+                            "expected_answer": expected_answer,
+                            "test_prompt": test_prompt.strip(),
+                            "response_preview": full_response[:100].replace("\n", " "),
+                            "full_response": full_response,
+                            "is_variant_test": False,
+                            "concurrency": concurrency,
+                            "cached": out["cached"],
+                            "prefix_cache": out.get("prefix_cache"),
+                            "http_phases": out.get("http_phases"),
+                            "warmup": warmup_registry.get((base_url, model)),
+                            **{k: out[k] for k in _METRIC_KEYS},
+                            **{k: v for k, v in eval_details.items() if k.startswith("_judge")}
+                        }
+
+                    cancelled_runs = []
+
+                    def emit_legacy(_idx, res):
+                        if res is None:
+                            if not cancelled_runs and progress_callback:
+                                progress_callback("info", "キャンセルされました（run開始前）")
+                            cancelled_runs.append(_idx)
+                            return
+                        results.append(resolve_judged(res, "full_response"))
+                        if progress_callback: progress_callback("resumed" if _idx in prior_runs else "result", res)
+
+                    resolver = OrderedResolver(emit_legacy, pending_judge)
+                    _map_bounded(run_legacy, range(runs), concurrency, on_result=resolver.push)
+                    resolver.finish()
+    finally:
+        if own_judge is not None:
+            own_judge.close()
+
+    if own_judge is not None and progress_callback and own_judge.requests:
+        progress_callback("info", f"LLM judge: {own_judge.judged} 件を {own_judge.requests} 回の呼び出しで判定"
+                                  f"（メモ: {own_judge.memo.hits} hits）")
     return results
 
+def reeval_results(results, suite):
+    """
+    保存済み結果のレスポンスを、現在のスイートの評価ルールで採点し直す（推論はしない）。
+    スイートに存在しないケースや status が ok でない結果はそのまま返す。
+    human_override が付いている結果は、その判定を優先する。
+    """
+    cases = {c.get('id'): c for c in suite.get('cases', []) if isinstance(c, dict)}
+    reevaluated = []
+    for r in results:
+        case = cases.get(r.get('case_id'))
+        if case is None or r.get('status') != 'ok':
+            reevaluated.append(r)
+            continue
+
+        r = dict(r)
+        if r.get('is_variant_test'):
+            variants = case.get('variants') or []
+            details = []
+            for v in r.get('variant_details') or []:
+                v = dict(v)
+                idx = v.get('variant_index')
+                if v.get('status') == 'ok' and isinstance(idx, int) and 0 <= idx < len(variants):
+                    rule = variants[idx].get('evaluation', {})
+                    passed, eval_details = evaluate_result(v.get('response', ''), rule)
+                    v['passed'] = passed
+                    v['eval_reason'] = eval_details.get('reason', '')
+                    v['expected'] = rule.get('expected', '')
+                details.append(v)
+
+            pass_threshold = case.get('pass_threshold', 0.8)
+            pass_count, total_count, pass_rate, overall_passed = _variant_verdict(details, pass_threshold)
+            r.update({
+                "passed": overall_passed,
+                "eval_reason": f"合格率: {pass_count}/{total_count} = {pass_rate*100:.0f}% (閾値: {pass_threshold*100:.0f}%)",
+                "expected_answer": f"閾値 {pass_threshold*100:.0f}% 以上",
+                "response_preview": f"合格: {pass_count}/{total_count}",
+                "full_response": json.dumps(details, ensure_ascii=False, indent=2),
+                "variant_pass_count": pass_count,
+                "variant_total_count": total_count,
+                "variant_pass_rate": pass_rate,
+                "variant_threshold": pass_threshold,
+                "variant_details": details,
+            })
+        else:
+            passed, eval_details = evaluate_result(r.get('full_response', ''), case.get('eval', {}))
+            r.update({
+                "passed": passed,
+                "eval_reason": eval_details.get('reason', ''),
+                "eval_matched": eval_details.get('matched'),
+            })
+
+        if r.get('human_override') is not None:
+            r['passed'] = r['human_override']
+        r['reevaluated_at'] = datetime.now().isoformat()
+        reevaluated.append(r)
+    return reevaluated
+
+
+def load_journal(path):
+    """
+    results_*.jsonl の全レコードを読み込む（壊れた行は読み飛ばす）。
+    ケース単位の結果に加え、record_type 付きのレコード（variant など）も含む。
+    """
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def _result_key(r):
+    """結果レコードの一意キー。variants の集約とスキップは run_index を持たないので None。"""
+    if r.get('is_variant_test') or r.get('reason') == 'missing_capabilities':
+        return (r.get('model'), r.get('case_id'), None)
+    return (r.get('model'), r.get('case_id'), r.get('run_index'))
+
+
+def load_results_jsonl(path):
+    """
+    results_*.jsonl からケース単位の結果だけを読み込む。
+    再開により同じキーの結果が複数ある場合は、最初に出現した位置に最後の結果を残す。
+    """
+    by_key = {}
+    for r in load_journal(path):
+        if r.get('record_type', 'result') != 'result':
+            continue
+        by_key[_result_key(r)] = r
+    return list(by_key.values())
+
+
+def build_resume_state(records) -> dict:
+    """
+    ジャーナル（load_journal の戻り値）から再開用の状態を作る。
+    - done: 完了済みの結果 {(model, case_id, run_index|None): result}
+    - variants: variants の完了済み実行 {(model, case_id): {(variant_index, run_index): variant_result}}
+    status が ok のものだけを完了とみなし、エラー・キャンセル分は再実行する。
+    """
+    done = {}
+    variants = {}
+
+    def add_variant(model, case_id, v):
+        if v.get('status') != 'ok':
+            return
+        v = {k: val for k, val in v.items() if k not in ('record_type', 'model', 'case_id')}
+        variants.setdefault((model, case_id), {})[(v.get('variant_index'), v.get('run_index'))] = v
+
+    for r in records:
+        kind = r.get('record_type', 'result')
+        if kind == 'variant':
+            add_variant(r.get('model'), r.get('case_id'), r)
+        elif kind != 'result':
+            continue
+        elif r.get('reason') == 'missing_capabilities':
+            done[_result_key(r)] = r
+        elif r.get('is_variant_test'):
+            details = r.get('variant_details') or []
+            if details and all(v.get('status') == 'ok' for v in details):
+                done[_result_key(r)] = r
+            else:
+                for v in details:
+                    add_variant(r.get('model'), r.get('case_id'), v)
+        elif r.get('status') == 'ok':
+            done[_result_key(r)] = r
+
+    return {"done": done, "variants": variants}
+
+
+# 接続エラーで失敗した作業単位を同じエンドポイントで実行する回数の上限（超えたらエンドポイントを切り離す）
+UNIT_ATTEMPTS = 3
+
+
+def _connection_errors(results) -> int:
+    """結果（variants は各実行）のうち、エンドポイントに接続できなかったものの数。"""
+    records = []
+    for r in results:
+        records += r.get("variant_details") or [r]
+    return sum(1 for r in records if r.get("status") == "error" and r.get("error_type") == "APIConnectionError")
+
+
+def run_bench_distributed(suite, endpoints, model_pattern, runs, warmup, timeout,
+                          progress_callback=None, use_llm_judge=False, judge_model=None,
+                          cancel_check=None, concurrency=1, cache=None, resume=None, prefix_order="suite",
+                          early_stop="off", judge_base_url=None):
+    """
+    複数のエンドポイントに (モデル, ケース) 単位で作業を分配して実行する（coordinator モード）。
+    endpoints: parse_endpoints の戻り値（または同じ形式の指定）
+    prefix_order: 作業単位が1ケースなので、並べ替えはケースの中の variant × run だけに効く。
+                  cold / warm の判定はエンドポイント × モデルごとに作業単位をまたいで引き継ぐ
+    judge_base_url: 指定するとジャッジのパイプラインを全作業単位で共有する（なければ作業単位ごとに、
+                    そのエンドポイントでジャッジする。判定のメモはどちらでも共有される）
+    その他の引数と progress_callback のイベントは run_bench_logic と同じ。結果には "endpoint" が付き、
+    戻り値はエンドポイントの処理順ではなく (モデル, ケース) の順に並ぶ。
+    接続できなかった（APIConnectionError の）実行を含む作業単位は記録せずに戻し、落ちたエンドポイントは
+    切り離して他のエンドポイントで実行し直す。作業単位のイベントはその作業単位が終わってから通知する。
+    """
+    endpoints = parse_endpoints(endpoints)
+    emit_lock = threading.Lock()
+    prefix_tracker = PrefixTracker(slots=max(1, int(concurrency or 1)) * max(ep["capacity"] for ep in endpoints))
+    warmup_registry = WarmupRegistry()  # ウォームアップはエンドポイント × モデルごとに1回
+    judge = None
+    if use_llm_judge and judge_base_url:
+        judge_meta = suite.get('meta', {}) or {}
+        judge = JudgePipeline(OpenAI(base_url=judge_base_url, api_key="lm-studio", **openai_options(resolve_transport(judge_meta))),
+                              judge_model,
+                              batch_size=judge_meta.get('judge_batch_size', 8), workers=judge_meta.get('judge_workers', 2))
+
+    def emit(kind, data):
+        if progress_callback:
+            with emit_lock:
+                progress_callback(kind, data)
+
+    # 各エンドポイントのモデル一覧から、対象モデルとそれを持つエンドポイントを決める
+    target_models = []
+    for ep in endpoints:
+        emit("info", f"Connecting to {ep['base_url']} (capacity {ep['capacity']})...")
+        try:
+            available = get_models(ep["base_url"])
+        except Exception as e:
+            available = []
+            emit("error", f"{ep['base_url']}: モデル一覧を取得できません: {e}")
+        ep["models"] = {m for m in available if re.match(model_pattern, m)}
+        target_models += [m for m in available if m in ep["models"] and m not in target_models]
+    if not target_models:
+        emit("error", "No models found.")
+        return []
+    emit("info", f"Target Models: {target_models}")
+
+    # vision 判定はモデルごとに1回（最初にそのモデルを持つエンドポイントで行う）
+    model_tags = {}
+    for m in target_models:
+        ep = next(e for e in endpoints if m in e["models"])
+        model_tags.update(detect_model_tags(suite, ep["base_url"], [m], emit))
+
+    units = [(m_idx, c_idx) for m_idx in range(len(target_models)) for c_idx in range(len(suite['cases']))]
+    unit_results = {}
+    unit_attempts = {}
+
+    def run_unit(endpoint, unit):
+        m_idx, c_idx = unit
+        model = target_models[m_idx]
+        # 接続できずに失敗した作業単位は記録せずに戻すので、イベントは作業単位が終わってから通知する
+        events = []
+
+        def unit_callback(kind, data):
+            if kind == "info":
+                return  # 作業単位ごとの接続メッセージ等は出さない
+            if kind in ("result", "variant", "resumed") and isinstance(data, dict):
+                data["endpoint"] = endpoint["base_url"]
+            events.append((kind, data))
+
+        results = run_bench_logic(
+            {**suite, "cases": [suite['cases'][c_idx]]}, endpoint["base_url"], model_pattern, runs, warmup, timeout,
+            progress_callback=unit_callback, use_llm_judge=use_llm_judge, judge_model=judge_model,
+            cancel_check=cancel_check, concurrency=concurrency, cache=cache, resume=resume,
+            model_tags={model: model_tags[model]}, prefix_order=prefix_order, prefix_tracker=prefix_tracker,
+            warmup_registry=warmup_registry, early_stop=early_stop, judge=judge,
+        )
+        failed = _connection_errors(results)
+        if failed and not (cancel_check and cancel_check()):
+            # 接続できなかった結果は記録せずに戻す。ブレーカーが開いているか、同じエンドポイントで
+            # UNIT_ATTEMPTS 回続けて失敗したら切り離し、他のエンドポイントで実行し直す
+            key = (endpoint["base_url"], unit)
+            unit_attempts[key] = unit_attempts.get(key, 0) + 1
+            detach = breaker_for(endpoint["base_url"]).state != "closed" or unit_attempts[key] >= UNIT_ATTEMPTS
+            raise EndpointUnavailable(f"{endpoint['base_url']}: 接続エラー {failed} 件", detach=detach)
+        for kind, data in events:
+            emit(kind, data)
+        unit_results[unit] = results
+
+    try:
+        summary = run_work_stealing(
+            endpoints, units, run_unit,
+            eligible=lambda ep, unit: target_models[unit[0]] in ep["models"],
+            cancel_check=cancel_check, progress_callback=emit,
+        )
+    finally:
+        if judge is not None:
+            judge.close()
+    for st in summary["endpoints"]:
+        emit("info", f"{st['base_url']}: {st['completed']} 件完了（盗んだ作業 {st['stolen']} 件, "
+                     f"稼働 {st['busy_ms'] / 1000:.1f}s）" + (f" 切り離し: {st['failed']}" if st['failed'] else ""))
+    if summary["unassigned"] and not (cancel_check and cancel_check()):
+        emit("error", f"{len(summary['unassigned'])} 件の作業を実行できるエンドポイントがありませんでした")
+
+    return [r for unit in sorted(unit_results) for r in unit_results[unit]]
+
+
+def parse_shard(spec: str) -> tuple:
+    """"i/n" を (i, n) にする（1 <= i <= n）。"""
+    try:
+        index, count = (int(x) for x in str(spec).split("/"))
+    except ValueError:
+        raise ValueError(f"--shard は i/n 形式で指定してください: {spec}")
+    if not 1 <= index <= count:
+        raise ValueError(f"--shard の範囲が不正です（1 <= i <= n）: {spec}")
+    return index, count
+
+
+def shard_suite(suite: dict, index: int, count: int) -> dict:
+    """
+    ケースをスイート内の位置で round-robin に分け、index 番目（1始まり）の分担だけを持つスイートを返す。
+    モデル一覧に依存しないので、マシンごとに使えるモデルが違っても分担は変わらない。
+    結果は python -m bench.merge でまとめる。
+    """
+    cases = [c for pos, c in enumerate(suite.get("cases", [])) if pos % count == index - 1]
+    meta = dict(suite.get("meta", {}) or {}, shard=f"{index}/{count}")
+    return {**suite, "cases": cases, "meta": meta}
+
+
 def run_bench(args):
     # Ensure suite path is absolute to resolve image paths correctly
     suite_path = Path(args.suite).resolve()
@@ -1023,17 +1515,62 @@ def run_bench(args):
     suite_dir = suite_path.parent
     
     suite = resolve_suite_asset_paths(suite, suite_path)
-
+    if getattr(args, 'shard', None):
+        # 別のマシンと分担する場合は自分の担当ケースだけを実行する（結果は bench.merge でまとめる）
+        suite = shard_suite(suite, *parse_shard(args.shard))
+        print(f"Shard {suite['meta']['shard']}: {len(suite['cases'])} cases")
+
+    for key in ('warmup_cv', 'warmup_window', 'http_retries', 'http_max_connections', 'stream_backend'):
+        if getattr(args, key, None) is not None:
+            suite['meta'] = dict(suite.get('meta', {}) or {}, **{key: getattr(args, key)})
     meta = suite.get('meta', {})
     base_url = args.base_url or meta.get('base_url', "http://localhost:1234/v1")
     runs = args.runs or meta.get('runs', 1)
     warmup = args.warmup if args.warmup is not None else meta.get('warmup', 0)
     timeout = args.timeout or meta.get('timeout_sec', 30)
+    concurrency = args.concurrency or meta.get('concurrency', 1)
+    prefix_order = resolve_prefix_order(getattr(args, 'prefix_order', None) or meta.get('prefix_order'))
+    early_stop = "off" if getattr(args, 'full', False) else resolve_early_stop(getattr(args, 'early_stop', None) or meta.get('early_stop'))
     model_pattern = args.models or ".*"
     out_dir = Path(args.out)
     out_dir.mkdir(parents=True, exist_ok=True)
     timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-    jsonl_path = out_dir / f"results_{timestamp_str}.jsonl"
+
+    if getattr(args, 'reeval', None):
+        # 推論せず、保存済みレスポンスを現在の評価ルールで採点し直す
+        results = reeval_results(load_results_jsonl(args.reeval), suite)
+        reeval_path = out_dir / f"results_reeval_{timestamp_str}.jsonl"
+        with open(reeval_path, 'w', encoding='utf-8') as f:
+            for r in results:
+                f.write(json.dumps(r) + "\n")
+        passed = sum(1 for r in results if r.get('status') == 'ok' and r.get('passed'))
+        valid = sum(1 for r in results if r.get('status') == 'ok')
+        print(f"Re-evaluated {len(results)} results: {passed}/{valid} passed")
+        results_db = create_results_db(out_dir, getattr(args, 'results_db', None))
+        if results_db is not None:
+            with results_db:
+                results_db.ingest(results, reeval_path.stem, source="reeval")
+        generate_html_report(results, out_dir / f"report_{timestamp_str}.html")
+        print(f"Done. Report saved to {out_dir}")
+        return
+
+    resume = None
+    if getattr(args, 'resume', None):
+        # 既存の JSONL に追記しながら、完了済みの (model, case, variant, run) を飛ばして続きから実行
+        jsonl_path = Path(args.resume)
+        resume = build_resume_state(load_journal(jsonl_path)) if jsonl_path.exists() else None
+        if resume:
+            print(f"Resuming from {jsonl_path}: {len(resume['done'])} results, "
+                  f"{sum(len(v) for v in resume['variants'].values())} variant runs already done")
+    else:
+        jsonl_path = out_dir / f"results_{timestamp_str}.jsonl"
+    cache_mode = resolve_cache_mode(getattr(args, 'cache', None), request_params(meta))
+    cache = ResponseCache(out_dir / "cache", mode=cache_mode) if cache_mode != "off" else None
+    # 結果DB（run_id は JSONL のファイル名。再開時は同じ run に追記される）
+    results_db = create_results_db(out_dir, getattr(args, 'results_db', None))
+    run_id = jsonl_path.stem
+    if results_db is not None:
+        results_db.start_run(run_id, source="cli", suite_path=str(suite_path), meta=meta)
 
     def cli_callback(kind, data):
         if kind == "info":
@@ -1064,242 +1601,76 @@ def run_bench(args):
             # Write to file immediately
             with open(jsonl_path, 'a', encoding='utf-8') as f:
                 f.write(json.dumps(data) + "\n")
+            if results_db is not None:
+                results_db.add_result(run_id, data)
+        elif kind == "resumed":
+            # 結果DBを使う前に始めた実行を再開した場合も、DB には揃えておく
+            if results_db is not None:
+                results_db.add_result(run_id, data)
+        elif kind == "variant":
+            # 再開用のジャーナル（load_results_jsonl では読み飛ばされる）
+            with open(jsonl_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(data) + "\n")
+
+    judge_options = {
+        "use_llm_judge": bool(getattr(args, 'llm_judge', False) or getattr(args, 'judge_model', None)),
+        "judge_model": getattr(args, 'judge_model', None),
+        "judge_base_url": getattr(args, 'judge_base_url', None),
+    }
 
-    results = run_bench_logic(suite, base_url, model_pattern, runs, warmup, timeout, cli_callback)
+    try:
+        if getattr(args, 'endpoints', None):
+            results = run_bench_distributed(suite, args.endpoints, model_pattern, runs, warmup, timeout, cli_callback,
+                                            concurrency=concurrency, cache=cache, resume=resume,
+                                            prefix_order=prefix_order, early_stop=early_stop, **judge_options)
+        else:
+            results = run_bench_logic(suite, base_url, model_pattern, runs, warmup, timeout, cli_callback,
+                                      concurrency=concurrency, cache=cache, resume=resume, prefix_order=prefix_order,
+                                      early_stop=early_stop, **judge_options)
+    finally:
+        if cache is not None:
+            print(f"Cache ({cache_mode}): {cache.hits} hits / {cache.misses} misses")
+            cache.close()
+        if results_db is not None:
+            results_db.close()
     
+    print_prefix_cache_summary(results)
+    stopped = [r['early_stop'] for r in results if r.get('early_stop')]
+    if stopped:
+        executed, total = sum(e['executed'] for e in stopped), sum(e['total'] for e in stopped)
+        print(f"Early stop ({early_stop}): {sum(1 for e in stopped if e['decision'])}/{len(stopped)} cases decided early, "
+              f"{executed}/{total} variant runs executed")
     generate_html_report(results, out_dir / f"report_{timestamp_str}.html")
     print(f"Done. Report saved to {out_dir}")
 
-def generate_html_report(results, path):
-    """Generate an HTML report with category-based organization and modern dark UI."""
-    html = """
-    <!DOCTYPE html>
-    <html lang="ja">
-    <head>
-        <meta charset="UTF-8">
-        <title>LLM Benchmark Report</title>
-        <style>
-            :root {
-                --bg-primary: #1a1a2e;
-                --bg-secondary: #16213e;
-                --bg-card: #0f3460;
-                --text-primary: #eee;
-                --text-secondary: #aaa;
-                --accent: #e94560;
-                --success: #4ade80;
-                --error: #f87171;
-                --warning: #fbbf24;
-                --border: #334155;
-            }
-            * { box-sizing: border-box; }
-            body { 
-                font-family: 'Segoe UI', 'Meiryo', sans-serif;
-                background: var(--bg-primary);
-                color: var(--text-primary);
-                padding: 2rem;
-                margin: 0;
-                line-height: 1.6;
-            }
-            h1 { 
-                color: var(--accent);
-                border-bottom: 2px solid var(--accent);
-                padding-bottom: 0.5rem;
-                margin-bottom: 1.5rem;
-            }
-            h2 { 
-                color: var(--text-primary);
-                margin-top: 2rem;
-                margin-bottom: 1rem;
-            }
-            h3 { color: var(--text-secondary); margin-top: 1.5rem; }
-            table { 
-                border-collapse: collapse;
-                width: 100%;
-                margin-bottom: 1.5rem;
-                background: var(--bg-secondary);
-                border-radius: 8px;
-                overflow: hidden;
-            }
-            th, td { 
-                border: 1px solid var(--border);
-                padding: 0.75rem 1rem;
-                text-align: left;
-            }
-            th { background-color: var(--bg-card); color: var(--text-primary); }
-            tr:hover { background-color: rgba(233, 69, 96, 0.1); }
-            .pass { color: var(--success); font-weight: bold; }
-            .fail { color: var(--error); }
-            .error { color: var(--warning); }
-            .skipped { color: var(--text-secondary); font-style: italic; }
-            .category-tag {
-                display: inline-block;
-                background: var(--accent);
-                color: white;
-                padding: 0.2rem 0.6rem;
-                border-radius: 4px;
-                font-size: 0.85rem;
-                margin-right: 0.5rem;
-            }
-            .description { 
-                font-size: 0.9rem;
-                color: var(--text-secondary);
-                margin-top: 0.25rem;
-            }
-            pre { 
-                background: var(--bg-primary);
-                padding: 0.5rem;
-                border-radius: 4px;
-                overflow-x: auto;
-                font-size: 0.85rem;
-                margin: 0;
-                max-width: 400px;
-                white-space: pre-wrap;
-                word-break: break-word;
-            }
-            .summary-grid {
-                display: grid;
-                grid-template-columns: repeat(auto-fill, minmax(280px, 1fr));
-                gap: 1rem;
-                margin-bottom: 2rem;
-            }
-            .summary-card {
-                background: var(--bg-secondary);
-                border-radius: 8px;
-                padding: 1rem;
-                border-left: 4px solid var(--accent);
-            }
-            .summary-card h4 { margin: 0 0 0.5rem 0; color: var(--text-primary); }
-            .summary-card .stats { display: flex; gap: 1rem; flex-wrap: wrap; }
-            .stat { text-align: center; }
-            .stat-value { font-size: 1.5rem; font-weight: bold; color: var(--accent); }
-            .stat-label { font-size: 0.8rem; color: var(--text-secondary); }
-        </style>
-    </head>
-    <body>
-    <h1>🔬 LLM Benchmark Report</h1>
-    """
-    
-    if not results:
-        html += "<p>No results.</p></body></html>"
-        with open(path, 'w', encoding='utf-8') as f:
-            f.write(html)
-        return
 
-    # --- Category Summary Cards ---
-    html += "<h2>📊 カテゴリ別サマリ</h2><div class='summary-grid'>"
-    
-    # Group by category
-    by_category = {}
+def print_prefix_cache_summary(results):
+    """モデル（とエンドポイント）ごとの cold / warm の TTFT を表示する。判定のある結果がなければ何もしない。"""
+    groups = {}
     for r in results:
-        cat = r.get('category_name', 'Unknown')
-        if cat not in by_category:
-            by_category[cat] = []
-        by_category[cat].append(r)
-    
-    for cat_name, cat_results in by_category.items():
-        valid = [r for r in cat_results if r['status'] == 'ok']
-        passed = [r for r in valid if r.get('passed')]
-        pass_rate = (len(passed) / len(valid) * 100) if valid else 0
-        avg_ttft = sum(r.get('ttft_ms', 0) or 0 for r in valid) / len(valid) if valid else 0
-        
-        html += f"""
-        <div class="summary-card">
-            <h4>{cat_name}</h4>
-            <div class="stats">
-                <div class="stat">
-                    <div class="stat-value">{pass_rate:.0f}%</div>
-                    <div class="stat-label">正解率</div>
-                </div>
-                <div class="stat">
-                    <div class="stat-value">{len(valid)}</div>
-                    <div class="stat-label">テスト数</div>
-                </div>
-                <div class="stat">
-                    <div class="stat-value">{avg_ttft:.0f}ms</div>
-                    <div class="stat-label">平均TTFT</div>
-                </div>
-            </div>
-        </div>
-        """
-    html += "</div>"
+        # variant_details には model がないので、集約から引き継ぐ
+        if r.get('is_variant_test') and r.get('status') == 'ok':
+            for v in r.get('variant_details') or []:
+                if v.get('status') == 'ok' and v.get('prefix_cache'):
+                    groups.setdefault((r.get('model'), r.get('endpoint')), []).append(v)
+        elif r.get('status') == 'ok' and r.get('prefix_cache'):
+            groups.setdefault((r.get('model'), r.get('endpoint')), []).append(r)
+    for (model, endpoint), samples in groups.items():
+        stats = prefix_cache_stats(samples)
+        cold, warm = stats["cold"], stats["warm"]
+        line = (f"Prefix cache [{model}{' @ ' + endpoint if endpoint else ''}]: "
+                f"cold {cold['count']} (TTFT {_fmt_pcts(cold['ttft_ms'])}), warm {warm['count']} (TTFT {_fmt_pcts(warm['ttft_ms'])})")
+        if cold['ttft_ms']['p50'] and warm['ttft_ms']['p50'] is not None:
+            line += f", warm/cold p50 {warm['ttft_ms']['p50'] / cold['ttft_ms']['p50']:.2f}x"
+        print(line)
 
-    # --- Summary Table by Model & Case ---
-    html += "<h2>📋 モデル別詳細</h2>"
-    html += "<table><tr><th>モデル</th><th>カテゴリ</th><th>テスト名</th><th>正解率</th><th>Avg TTFT</th><th>Avg E2E</th></tr>"
-    
-    grouped = {}
-    for r in results:
-        key = (r['model'], r['case_id'])
-        if key not in grouped:
-            grouped[key] = {
-                'items': [],
-                'case_name': r.get('case_name', r['case_id']),
-                'category_name': r.get('category_name', ''),
-                'description': r.get('case_description', '')
-            }
-        grouped[key]['items'].append(r)
-        
-    for key, data in grouped.items():
-        model, case_id = key
-        items = data['items']
-        valid_runs = [x for x in items if x['status'] == 'ok']
-        pass_runs = [x for x in valid_runs if x['passed']]
-        
-        valid_count = len(valid_runs)
-        pass_rate = (len(pass_runs) / valid_count) * 100 if valid_count else 0
-        
-        ttfts = [x['ttft_ms'] for x in valid_runs if x['ttft_ms'] is not None]
-        avg_ttft = sum(ttfts)/len(ttfts) if ttfts else 0
-        
-        e2es = [x['e2e_ms'] for x in valid_runs]
-        avg_e2e = sum(e2es)/len(e2es) if e2es else 0
-        
-        pass_class = "pass" if pass_rate >= 80 else ("fail" if pass_rate < 50 else "")
-        
-        html += f"<tr><td>{html_lib.escape(model)}</td>"
-        html += f"<td><span class='category-tag'>{html_lib.escape(data['category_name'])}</span></td>"
-        html += f"<td>{html_lib.escape(data['case_name'])}<div class='description'>{html_lib.escape(data['description'])}</div></td>"
-        html += f"<td class='{pass_class}'>{pass_rate:.1f}%</td>"
-        html += f"<td>{avg_ttft:.1f}ms</td><td>{avg_e2e:.1f}ms</td></tr>"
 
-    html += "</table>"
-    
-    # --- Details Table ---
-    html += "<h2>📝 全結果詳細</h2>"
-    html += "<table><tr><th>時刻</th><th>モデル</th><th>カテゴリ</th><th>テスト</th><th>結果</th><th>TTFT</th><th>レスポンス</th></tr>"
-    
-    for r in results:
-        if r['status'] == 'skipped':
-            status_class = 'skipped'
-            result_str = "SKIP"
-        elif r['status'] == 'error':
-            status_class = 'error'
-            result_str = "ERROR"
-        elif r.get('passed'):
-            status_class = 'pass'
-            result_str = "✓ PASS"
-        else:
-            status_class = 'fail'
-            result_str = "✗ FAIL"
-        
-        preview = html_lib.escape(r.get('response_preview', ''))
-        case_name = html_lib.escape(r.get('case_name', r['case_id']))
-        cat_name = html_lib.escape(r.get('category_name', ''))
-        ttft = r.get('ttft_ms', 0) or 0
-        
-        html += f"<tr class='{status_class}'>"
-        html += f"<td>{r['timestamp']}</td>"
-        html += f"<td>{html_lib.escape(r['model'])}</td>"
-        html += f"<td><span class='category-tag'>{cat_name}</span></td>"
-        html += f"<td>{case_name}</td>"
-        html += f"<td>{result_str}</td>"
-        html += f"<td>{ttft:.1f}ms</td>"
-        html += f"<td><pre>{preview}</pre></td></tr>"
-        
-    html += "</table></body></html>"
-    
-    with open(path, 'w', encoding='utf-8') as f:
-        f.write(html)
+def generate_html_report(results, path):
+    """
+    Generate an HTML report with category-based organization and modern dark UI.
+    1回の走査で集計し、全結果詳細は仮想スクロールの表に JSON チャンクで渡す（bench.report）。
+    """
+    return write_report(results, path)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -1308,8 +1679,26 @@ if __name__ == "__main__":
     parser.add_argument("--base-url")
     parser.add_argument("--models") # regex
     parser.add_argument("--runs", type=int)
-    parser.add_argument("--warmup", type=int)
+    parser.add_argument("--warmup", type=int)  # モデルごとのウォームアップの上限件数（安定したら打ち切る）
+    parser.add_argument("--warmup-cv", type=float)  # 安定とみなす直近の E2E の変動係数（既定 0.10）
+    parser.add_argument("--warmup-window", type=int)  # 変動係数を計算する直近の件数（既定 3）
     parser.add_argument("--timeout", type=int)
+    parser.add_argument("--http-retries", type=int)  # 接続エラー・429/5xx のリトライ回数（既定 2）
+    parser.add_argument("--http-max-connections", type=int)  # 接続プールの上限（既定 64）
+    parser.add_argument("--stream-backend", choices=STREAM_BACKENDS)  # raw: SDK を通さずに SSE を読む（既定: meta.stream_backend、なければ sdk）
+    parser.add_argument("--concurrency", type=int)  # 同時リクエスト数
+    parser.add_argument("--cache", choices=CACHE_MODES, default="auto")  # auto: temperature 0 のみキャッシュ利用
+    parser.add_argument("--reeval")  # results_*.jsonl を推論なしで再評価
+    parser.add_argument("--resume")  # 中断した results_*.jsonl に追記しながら続きから実行
+    parser.add_argument("--shard")  # i/n: ケースを n 分割した i 番目だけを実行（bench.merge でまとめる）
+    parser.add_argument("--results-db")  # 結果DBのパス（既定: <out>/results.sqlite、off で書き込まない）
+    parser.add_argument("--prefix-order", choices=PREFIX_ORDERS)  # variants の実行順（既定: meta.prefix_order、なければ suite）
+    parser.add_argument("--early-stop", choices=EARLY_STOP_MODES)  # variants ケースの逐次判定（既定: meta.early_stop、なければ off）
+    parser.add_argument("--full", action="store_true")  # early stop を使わず全件実行する（正確な合格率）
+    parser.add_argument("--llm-judge", action="store_true")  # semantic_match を LLM ジャッジで判定する
+    parser.add_argument("--judge-model")  # ジャッジのモデル（省略時はテスト対象と同じ）
+    parser.add_argument("--judge-base-url")  # ジャッジのエンドポイント（省略時は --base-url）
+    parser.add_argument("--endpoints")  # URL[=容量],...: 複数のエンドポイントに作業を分配（--base-url の代わり）
     
     args = parser.parse_args()
     run_bench(args)
@@ -0,0 +1,92 @@
+"""
+結果ファイル（results_*.jsonl）のマージ。
+
+`--shard i/n` で別々のマシンに分担させた結果を1つにまとめる。同じキーの結果は後のファイルを優先し、
+variants のジャーナルも残す（マージ結果は --resume にもそのまま使える）。
+
+使い方:
+    python -m bench.main --suite bench/suite.yaml --shard 1/2   # マシンA
+    python -m bench.main --suite bench/suite.yaml --shard 2/2   # マシンB
+    python -m bench.merge out_a/results_*.jsonl out_b/results_*.jsonl --suite bench/suite.yaml --out merged.jsonl
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+try:
+    from bench.main import load_journal, load_suite, _result_key, generate_html_report
+except ImportError:
+    from main import load_journal, load_suite, _result_key, generate_html_report
+
+
+def _variant_key(r):
+    return (r.get("model"), r.get("case_id"), r.get("variant_index"), r.get("run_index"))
+
+
+def merge_journals(paths: List[str], suite: Optional[dict] = None) -> Tuple[List[dict], int]:
+    """
+    複数のジャーナルをまとめ、(レコード列, 重複キー数) を返す。
+    レコードは (モデルの初出順, スイート内のケース順, run_index) で並べ、各ケースの variant レコードを
+    集約結果の直前に置く（元の results_*.jsonl と同じ並び）。集約結果のない variant は末尾に残す。
+    """
+    results = {}
+    variants = {}
+    duplicates = 0
+    model_order = {}
+    case_order = {c.get("id"): pos for pos, c in enumerate((suite or {}).get("cases", []))}
+
+    for path in paths:
+        for r in load_journal(path):
+            kind = r.get("record_type", "result")
+            model_order.setdefault(r.get("model"), len(model_order))
+            case_order.setdefault(r.get("case_id"), len(case_order))
+            if kind == "variant":
+                variants[_variant_key(r)] = r
+            elif kind == "result":
+                key = _result_key(r)
+                if key in results:
+                    duplicates += 1
+                    del results[key]  # 後のファイルの位置・内容を優先する
+                results[key] = r
+
+    def order(key):
+        model, case_id, run_index = key
+        return (model_order[model], case_order[case_id], -1 if run_index is None else run_index)
+
+    by_case = {}
+    for key, v in variants.items():
+        by_case.setdefault(key[:2], []).append(v)
+
+    records = []
+    for key in sorted(results, key=order):
+        records.extend(sorted(by_case.pop(key[:2], []), key=lambda v: (v.get("variant_index"), v.get("run_index"))))
+        records.append(results[key])
+    for rest in by_case.values():
+        records.extend(rest)
+    return records, duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="シャードごとの results_*.jsonl を1つにまとめる")
+    parser.add_argument("journals", nargs="+")
+    parser.add_argument("--out", required=True)  # マージ後の JSONL
+    parser.add_argument("--suite")  # 指定するとスイートのケース順に並べる
+    parser.add_argument("--report")  # HTML レポートの出力先
+    args = parser.parse_args()
+
+    suite = load_suite(Path(args.suite).resolve()) if args.suite else None
+    records, duplicates = merge_journals(args.journals, suite)
+    with open(args.out, "w", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(r) + "\n")
+    results = [r for r in records if r.get("record_type", "result") == "result"]
+    print(f"Merged {len(args.journals)} files: {len(results)} results"
+          + (f" ({duplicates} duplicates replaced)" if duplicates else ""))
+    if args.report:
+        generate_html_report(results, args.report)
+        print(f"Report saved to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
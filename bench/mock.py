@@ -0,0 +1,360 @@
+"""
+OpenAI 互換のモックサーバー（LM Studio の代わり）。
+
+ベンチマークの性能まわりの機能（同時実行・スケジューリング・ハーネス自体のオーバーヘッドなど）を、
+実機の LM Studio なしに、どの Linux マシンでも決まった挙動で試すためのもの。
+
+- /v1/models、/api/v0/models（LM Studio REST API v0 の形）、/v1/chat/completions（ストリーミング・
+  非ストリーミング。stream_options.include_usage なら usage のチャンクも返す）
+- TTFT・ITL（トークン間隔）は分布で指定する（固定値、または uniform / normal / lognormal / exponential）
+- モデルごとのスロット数（同時に生成できるリクエスト数）。空くまで待った時間は TTFT に含まれる
+- エラーの注入（生成前の HTTP エラー、生成途中の SSE エラーイベント）
+- プロンプトごとの応答の台本（最後のユーザーメッセージへの正規表現）。台本がなければ最後の
+  ユーザーメッセージをそのまま返す
+- 乱数は (seed, モデル, プロンプト, そのプロンプトの何回目か) で決めるので、同じ順で送れば同じ結果になる
+
+設定（YAML / JSON）の例:
+    models:
+      - mock-llm
+      - {id: mock-vlm, type: vlm, slots: 2, ttft_ms: {dist: lognormal, median: 300, sigma: 0.3}}
+    ttft_ms: {dist: uniform, min: 50, max: 80}
+    itl_ms: 10
+    slots: 4
+    errors: {rate: 0.01, status: 503, stream_rate: 0.01}
+    script:
+      - {match: "2\\\\+2", answer: "4"}
+      - {match: "timeout", ttft_ms: 5000}
+      - {match: "overload", error: 429}
+    seed: 0
+
+使い方:
+    python -m bench.mock --port 1234 --config mock.yaml
+    python -m bench.main --suite bench/suite_slm.yaml --models ".*" --base-url http://127.0.0.1:1234/v1
+
+テストやスクリプトからは MockServer(config) を with で使う（空いているポートで起動し、base_url を返す）。
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+import yaml
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_MODELS = ["mock-llm"]
+DEFAULT_TTFT_MS = 20.0
+DEFAULT_ITL_MS = 5.0
+DEFAULT_SLOTS = 4
+DEFAULT_MAX_TOKENS = 256
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+
+def sample_ms(spec, rng: random.Random) -> float:
+    """遅延の指定（数値、または {dist: ...} の dict）から1つ値を引く（ms、負にはしない）。"""
+    if spec is None:
+        return 0.0
+    if isinstance(spec, (int, float)):
+        return max(0.0, float(spec))
+    dist = spec.get("dist", "fixed")
+    if dist == "fixed":
+        value = spec.get("ms", 0)
+    elif dist == "uniform":
+        value = rng.uniform(spec.get("min", 0), spec.get("max", 0))
+    elif dist == "normal":
+        value = rng.gauss(spec.get("mean", 0), spec.get("sd", 0))
+    elif dist == "lognormal":
+        value = rng.lognormvariate(math.log(max(spec.get("median", 1), 1e-9)), spec.get("sigma", 0))
+    elif dist == "exponential":
+        mean = spec.get("mean", 0)
+        value = rng.expovariate(1 / mean) if mean > 0 else 0
+    else:
+        raise ValueError(f"不明な分布: {dist}（{', '.join(DISTRIBUTIONS)}）")
+    return max(0.0, float(value))
+
+
+def resolve_mock_config(config: Optional[dict] = None) -> dict:
+    """設定に既定値を補い、models を {id, type, state, ...} の dict のリストにする。"""
+    config = dict(config or {})
+    config.setdefault("ttft_ms", DEFAULT_TTFT_MS)
+    config.setdefault("itl_ms", DEFAULT_ITL_MS)
+    config.setdefault("slots", DEFAULT_SLOTS)
+    config.setdefault("seed", 0)
+    config["errors"] = dict(config.get("errors") or {})
+    models = []
+    for m in config.get("models") or DEFAULT_MODELS:
+        m = {"id": m} if isinstance(m, str) else dict(m)
+        m.setdefault("type", "vlm" if any(k in m["id"].lower() for k in ("vl", "vision")) else "llm")
+        m.setdefault("state", "loaded")
+        models.append(m)
+    config["models"] = models
+    config["script"] = [dict(entry, pattern=re.compile(entry.get("match", ""), re.S))
+                        for entry in config.get("script") or []]
+    return config
+
+
+def load_mock_config(path) -> dict:
+    """YAML / JSON の設定ファイルを読む。"""
+    with open(path, encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content")
+    if isinstance(content, list):
+        return " ".join(p.get("text", "") for p in content if isinstance(p, dict) and p.get("type") == "text")
+    return content or ""
+
+
+def _has_image(messages: List[dict]) -> bool:
+    return any(isinstance(m.get("content"), list) and any(p.get("type") == "image_url" for p in m["content"]
+                                                           if isinstance(p, dict))
+               for m in messages)
+
+
+def _tokens(text: str) -> List[str]:
+    """応答を単語ごと（空白は前の単語に付ける）のトークンに分ける。"""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+class MockState:
+    """サーバーの状態（スロット・乱数の回数・統計）。"""
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.models = {m["id"]: m for m in config["models"]}
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._occurrences: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "completed": 0, "errors": 0, "in_flight": {}, "max_in_flight": {}}
+
+    def slots(self, model: str) -> asyncio.Semaphore:
+        sem = self._slots.get(model)
+        if sem is None:
+            limit = self.models.get(model, {}).get("slots", self.config["slots"])
+            sem = self._slots[model] = asyncio.Semaphore(max(1, int(limit)))
+        return sem
+
+    def rng(self, model: str, prompt: str) -> random.Random:
+        with self._lock:
+            key = (model, prompt)
+            n = self._occurrences.get(key, 0)
+            self._occurrences[key] = n + 1
+        return random.Random(f"{self.config['seed']}:{model}:{prompt}:{n}")
+
+    def plan(self, body: dict) -> dict:
+        """1リクエストの応答・遅延・エラーを決める。"""
+        model = body.get("model") or ""
+        messages = body.get("messages") or []
+        user = [m for m in messages if m.get("role") == "user"]
+        prompt = _message_text(user[-1] if user else (messages[-1] if messages else {}))
+        rng = self.rng(model, prompt)
+        spec = dict(self.models.get(model, {}))
+        entry = next((e for e in self.config["script"] if e["pattern"].search(prompt)), {})
+        errors = self.config["errors"]
+
+        error = entry.get("error")
+        if error is None and errors.get("rate") and rng.random() < errors["rate"]:
+            error = errors.get("status", 500)
+        tokens = _tokens(entry["answer"] if "answer" in entry else prompt)
+        max_tokens = body.get("max_tokens") or body.get("max_completion_tokens") or DEFAULT_MAX_TOKENS
+        truncated = len(tokens) > max_tokens
+        tokens = tokens[:max_tokens]
+        stream_error_at = None
+        if errors.get("stream_rate") and rng.random() < errors["stream_rate"]:
+            stream_error_at = rng.randrange(len(tokens) + 1)
+        ttft_spec = entry.get("ttft_ms", spec.get("ttft_ms", self.config["ttft_ms"]))
+        itl_spec = entry.get("itl_ms", spec.get("itl_ms", self.config["itl_ms"]))
+        return {
+            "model": model,
+            "error": error,
+            "vision_error": _has_image(messages) and spec.get("type") != "vlm",
+            "tokens": tokens,
+            "finish_reason": "length" if truncated else "stop",
+            "prompt_tokens": sum(len(_tokens(_message_text(m))) for m in messages),
+            "ttft": sample_ms(ttft_spec, rng) / 1000,
+            "itl": [sample_ms(itl_spec, rng) / 1000 for _ in tokens[1:]],
+            "stream_error_at": stream_error_at,
+        }
+
+    def enter(self, model: str) -> None:
+        in_flight = self.stats["in_flight"]
+        in_flight[model] = in_flight.get(model, 0) + 1
+        self.stats["max_in_flight"][model] = max(self.stats["max_in_flight"].get(model, 0), in_flight[model])
+
+    def leave(self, model: str) -> None:
+        self.stats["in_flight"][model] -= 1
+
+
+def _chunk(plan: dict, delta: dict, finish_reason=None) -> bytes:
+    data = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": plan["model"], "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+
+def _usage(plan: dict) -> dict:
+    return {"prompt_tokens": plan["prompt_tokens"], "completion_tokens": len(plan["tokens"]),
+            "total_tokens": plan["prompt_tokens"] + len(plan["tokens"])}
+
+
+def _error(status: int, message: str) -> JSONResponse:
+    return JSONResponse({"error": {"message": message, "type": "mock_error", "code": status}}, status_code=status)
+
+
+def create_app(config: Optional[dict] = None) -> FastAPI:
+    """モックサーバーの FastAPI アプリ。状態は app.state.mock（MockState）、統計は GET /mock/stats。"""
+    state = MockState(resolve_mock_config(config))
+    app = FastAPI(title="bench mock server")
+    app.state.mock = state
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list",
+                "data": [{"id": m["id"], "object": "model", "owned_by": "mock"} for m in state.config["models"]]}
+
+    @app.get("/api/v0/models")
+    async def list_models_v0():
+        return {"object": "list", "data": [
+            {"id": m["id"], "object": "model", "type": m["type"], "state": m["state"],
+             "quantization": m.get("quantization", "Q4_K_M"), "arch": m.get("arch", "mock")}
+            for m in state.config["models"]
+        ]}
+
+    @app.get("/mock/stats")
+    async def stats():
+        return state.stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        state.stats["requests"] += 1
+        plan = state.plan(body)
+        if plan["model"] not in state.models:
+            state.stats["errors"] += 1
+            return _error(404, f"Model not found: {plan['model']}")
+        if plan["vision_error"]:
+            state.stats["errors"] += 1
+            return _error(400, "Model does not support images")
+        if plan["error"]:
+            state.stats["errors"] += 1
+            return _error(int(plan["error"]), "injected error")
+
+        if not body.get("stream"):
+            async with state.slots(plan["model"]):
+                state.enter(plan["model"])
+                try:
+                    await asyncio.sleep(plan["ttft"] + sum(plan["itl"]))
+                finally:
+                    state.leave(plan["model"])
+            state.stats["completed"] += 1
+            return {"id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+                    "model": plan["model"],
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(plan["tokens"])},
+                                 "finish_reason": plan["finish_reason"]}],
+                    "usage": _usage(plan)}
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+        async def events():
+            async with state.slots(plan["model"]):
+                state.enter(plan["model"])
+                try:
+                    yield _chunk(plan, {"role": "assistant", "content": ""})
+                    await asyncio.sleep(plan["ttft"])
+                    for i, token in enumerate(plan["tokens"]):
+                        if i == plan["stream_error_at"]:
+                            state.stats["errors"] += 1
+                            yield f"data: {json.dumps({'error': {'message': 'injected stream error'}})}\n\n".encode()
+                            return
+                        if i:
+                            await asyncio.sleep(plan["itl"][i - 1])
+                        yield _chunk(plan, {"content": token})
+                    yield _chunk(plan, {}, plan["finish_reason"])
+                    if include_usage:
+                        data = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                                "model": plan["model"], "choices": [], "usage": _usage(plan)}
+                        yield f"data: {json.dumps(data)}\n\n".encode()
+                    yield b"data: [DONE]\n\n"
+                    state.stats["completed"] += 1
+                finally:
+                    state.leave(plan["model"])
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+class MockServer:
+    """
+    モックサーバーを別スレッドの uvicorn で起動する（port=0 なら空いているポート）。
+    with MockServer(config) as server: で base_url（.../v1）と state を使う。
+    """
+
+    def __init__(self, config: Optional[dict] = None, host: str = "127.0.0.1", port: int = 0):
+        self.app = create_app(config)
+        self.state: MockState = self.app.state.mock
+        self.host = host
+        self.port = port
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning", lifespan="off"))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self._server.run, name="bench-mock", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if not self._thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("モックサーバーを起動できませんでした")
+            time.sleep(0.01)
+        self.port = self._server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    def __enter__(self) -> "MockServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI 互換のモックサーバー（LM Studio の代わり）")
+    parser.add_argument("--config", help="設定ファイル（YAML / JSON）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--models", help="モデル ID のカンマ区切り（設定ファイルの models より優先）")
+    parser.add_argument("--ttft-ms", type=float, help="TTFT（固定値）")
+    parser.add_argument("--itl-ms", type=float, help="トークン間隔（固定値）")
+    parser.add_argument("--slots", type=int, help="モデルごとの同時生成数")
+    parser.add_argument("--error-rate", type=float, help="生成前に HTTP エラーを返す割合")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    config: Dict[str, Any] = load_mock_config(Path(args.config)) if args.config else {}
+    if args.models:
+        config["models"] = [m.strip() for m in args.models.split(",") if m.strip()]
+    for key in ("ttft_ms", "itl_ms", "slots", "seed"):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+    if args.error_rate is not None:
+        config["errors"] = dict(config.get("errors") or {}, rate=args.error_rate)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
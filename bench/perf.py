@@ -0,0 +1,379 @@
+"""
+ハーネス自体の性能のマイクロベンチマーク（コミット間の比較用）。
+
+ベンチマークツール自身の処理（スイートの読み込み・採点・レポート生成・Web UI の API）の所要時間を測り、
+JSON に保存して以前の結果（ベースライン）と比べる。asv と同じく、各ベンチマークは1回の所要時間が
+min_time 以上になるように反復回数を決め、その平均を1標本として samples 個集める。
+
+- load_suite: suite_auto.yaml（キャッシュなしのパース / キャッシュあり）
+- evaluate_result: スイートに実際にある評価タイプごとに、長い応答（約 6KB）に対して
+- _extract_first_json: 閉じない括弧や引用符が続く敵対的なテキスト
+- generate_html_report: 10k / 100k 件（--quick では 10k のみ）
+- /api/bm/{id}: 結果 20k 件のジョブのシリアライズ（メモリのジョブストア）
+- _stream_completion: 3000 チャンクの SSE を読むクライアント側の処理（sdk / raw。通信は httpx.MockTransport）
+
+比較は bench.compare と同じく、中央値の比と Mann–Whitney の U 検定で行い、p < alpha かつ
+閾値を超えて遅くなったものを回帰とする（1つでもあれば終了コード 1）。
+
+使い方:
+    python -m bench.perf --save out/perf/baseline.json
+    python -m bench.perf --baseline out/perf/baseline.json --threshold 0.1
+    python -m bench.perf --filter evaluate_result --quick
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+try:
+    from bench.compare import mann_whitney_u
+    from bench.main import OpenAI, _stream_completion, evaluate_result, generate_html_report, load_suite
+    from bench.rules import _extract_first_json
+    from bench.sse import RawSSEClient
+    from bench.suitecache import SUITE_CACHE
+    from bench.transport import BenchTransport, TransportConfig
+except ImportError:
+    from compare import mann_whitney_u
+    from main import OpenAI, _stream_completion, evaluate_result, generate_html_report, load_suite
+    from rules import _extract_first_json
+    from sse import RawSSEClient
+    from suitecache import SUITE_CACHE
+    from transport import BenchTransport, TransportConfig
+
+BASE_DIR = Path(__file__).resolve().parent
+SAMPLES = 7
+MIN_TIME = 0.05
+QUICK_SAMPLES = 3
+QUICK_MIN_TIME = 0.01
+
+# name -> (setup, quick で実行するか)。setup は計測する引数なしの関数を返す。
+# 後片付けが要るものは setup をジェネレータにして関数を yield し、yield の後に片付けを書く
+BENCHMARKS: Dict[str, tuple] = {}
+
+
+def benchmark(name: str, quick: bool = True):
+    def register(setup: Callable[[], Callable[[], object]]):
+        BENCHMARKS[name] = (setup, quick)
+        return setup
+    return register
+
+
+# --- データの生成 ---
+
+_WORDS = ("the model answer is based on following context because result value table item step "
+          "つまり 結果 は 次の とおり です 計算 すると 答え に なります ため 確認 して").split()
+
+
+def long_response(rng: random.Random, answer: str = "", size: int = 6000) -> str:
+    """約 size 文字のもっともらしい応答（途中に answer を含む）。"""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word + ("\n" if rng.random() < 0.05 else " "))
+        length += len(words[-1])
+    words.insert(int(len(words) * 0.8), f"{answer} ")
+    return "".join(words)
+
+
+def adversarial_json_text(size: int = 20000) -> str:
+    """閉じない { [ や引用符、壊れた JSON が続いた後に、やっと正しい JSON がある。"""
+    noise = '{"a": [1, 2, {"b": "x\\" ' + "{ [ ' \" " * 20 + "\n"
+    return noise * (size // len(noise)) + '```json\n{"answer": 42, "items": [1, 2, 3]}\n```'
+
+
+def synthetic_results(n: int, seed: int = 0) -> List[dict]:
+    """レポート・API 用の結果レコード（旧形式と variants 形式を混ぜる）。"""
+    rng = random.Random(seed)
+    results = []
+    for i in range(n):
+        ttft = rng.lognormvariate(5, 0.4)
+        record = {
+            "timestamp": "2026-01-01T00:00:00", "model": f"model-{i % 4}", "case_id": f"case-{i % 500}",
+            "case_name": f"ケース {i % 500}", "category_name": f"カテゴリ {i % 9}", "case_description": "説明文" * 5,
+            "run_index": 0, "status": "ok" if rng.random() > 0.02 else "error", "passed": rng.random() > 0.3,
+            "ttft_ms": ttft, "e2e_ms": ttft + rng.uniform(100, 2000), "decode_tps": rng.uniform(20, 80),
+            "prompt_tps": rng.uniform(200, 800), "itl_ms": [rng.uniform(5, 30) for _ in range(32)],
+            "response_preview": "応答のプレビュー " * 6, "full_response": "応答の本文 " * 40,
+            "prefix_cache": rng.choice(("cold", "warm")), "is_variant_test": False,
+        }
+        if i % 10 == 0:
+            record["is_variant_test"] = True
+            record["variant_details"] = [
+                {"variant_index": v, "run_index": 0, "status": "ok", "passed": rng.random() > 0.3,
+                 "ttft_ms": ttft, "e2e_ms": ttft + 500, "itl_ms": [10.0] * 16, "response": "variant の応答 " * 10}
+                for v in range(5)
+            ]
+        results.append(record)
+    return results
+
+
+def suite_rules(path: Path) -> Dict[str, dict]:
+    """スイートに実際にある評価ルールを、評価タイプごとに1つ集める。"""
+    rules = {}
+    for case in load_suite(path)["cases"]:
+        for rule in [case.get("eval")] + [v.get("evaluation") for v in case.get("variants") or []]:
+            if isinstance(rule, dict) and rule.get("type") and rule["type"] not in rules:
+                rules[rule["type"]] = rule
+    return rules
+
+
+def _rule_answer(rule: dict) -> str:
+    for key in ("expected", "keywords", "pattern"):
+        value = rule.get(key)
+        if isinstance(value, list):
+            return " ".join(str(v) for v in value)
+        if value is not None:
+            return str(value)
+    return ""
+
+
+# --- ベンチマーク ---
+
+SUITE_AUTO = BASE_DIR / "suite_auto.yaml"
+
+
+@benchmark("load_suite.suite_auto.cold")
+def bench_load_suite_cold():
+    def run():
+        SUITE_CACHE.clear()
+        load_suite(SUITE_AUTO)
+    return run
+
+
+@benchmark("load_suite.suite_auto.cached")
+def bench_load_suite_cached():
+    load_suite(SUITE_AUTO)
+    return lambda: load_suite(SUITE_AUTO)
+
+
+def _evaluate_benchmarks():
+    # 評価タイプはスイートから集めるので、登録時にスイートを読む（読めなければ登録しない）
+    try:
+        rules = {**suite_rules(BASE_DIR / "suite.yaml"), **suite_rules(SUITE_AUTO)}
+    except Exception:
+        return
+    for eval_type, rule in sorted(rules.items()):
+        def setup(rule=rule):
+            response = long_response(random.Random(0), _rule_answer(rule))
+            return lambda: evaluate_result(response, rule)
+        benchmark(f"evaluate_result.{eval_type}")(setup)
+
+
+_evaluate_benchmarks()
+
+
+@benchmark("extract_first_json.adversarial")
+def bench_extract_first_json():
+    text = adversarial_json_text()
+    return lambda: _extract_first_json(text)
+
+
+def _report_benchmark(n: int):
+    def setup():
+        results = synthetic_results(n)
+        out_dir = Path(tempfile.mkdtemp(prefix="bench-perf-"))
+        try:
+            yield lambda: generate_html_report(results, out_dir / "report.html")
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+    return setup
+
+
+benchmark("generate_html_report.10k")(_report_benchmark(10_000))
+benchmark("generate_html_report.100k", quick=False)(_report_benchmark(100_000))
+
+
+@benchmark("api.bm_status.20k")
+def bench_bm_status():
+    # 未設定なら、import 時に bench/out のジョブストア・結果DBを開かないようにする
+    os.environ.setdefault("BENCH_JOB_STORE", "memory")
+    os.environ.setdefault("BENCH_RESULTS_DB", "off")
+    from fastapi.testclient import TestClient
+    try:
+        import bench.server as server
+        from bench.jobstore import MemoryJobStore
+    except ImportError:
+        import server
+        from jobstore import MemoryJobStore
+
+    # 計測用のジョブは、環境変数の設定にかかわらず専用のメモリのストアに置き、終わったら元に戻す
+    store = MemoryJobStore()
+    job_id = "perf-bm-status"
+    store.create(job_id, kind="bm", status="done", expected_total=20_000)
+    for r in synthetic_results(20_000):
+        store.append_result(job_id, r)
+    original, server.JOBS = server.JOBS, store
+    try:
+        client = TestClient(server.app)
+        yield lambda: client.get(f"/api/bm/{job_id}").content
+    finally:
+        server.JOBS = original
+
+
+def sse_body(tokens: int) -> bytes:
+    """1トークン1チャンクのストリーミング応答（最後に usage と [DONE]）。"""
+    events = [{"choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}}]}]
+    events += [{"id": "c", "object": "chat.completion.chunk", "model": "m",
+                "choices": [{"index": 0, "delta": {"content": f"t{i} "}, "finish_reason": None}]}
+               for i in range(tokens)]
+    events.append({"choices": [], "usage": {"prompt_tokens": 7, "completion_tokens": tokens, "total_tokens": tokens + 7}})
+    return b"".join(f"data: {json.dumps(e)}\n\n".encode() for e in events) + b"data: [DONE]\n\n"
+
+
+def _stream_benchmark(backend: str, tokens: int = 3000):
+    def setup():
+        body = sse_body(tokens)
+
+        def handler(request):
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=httpx.ByteStream(body))
+
+        http_client = httpx.Client(transport=BenchTransport(TransportConfig(retries=0), inner=httpx.MockTransport(handler)))
+        if backend == "raw":
+            client = RawSSEClient("http://perf.test/v1", api_key="x", http_client=http_client)
+        else:
+            client = OpenAI(base_url="http://perf.test/v1", api_key="x", http_client=http_client, max_retries=0)
+        messages = [{"role": "user", "content": "hi"}]
+        meta = {"default_params": {"max_tokens": tokens * 2}}
+        try:
+            yield lambda: _stream_completion(client, "m", messages, meta, 30)
+        finally:
+            http_client.close()
+    return setup
+
+
+benchmark("stream_completion.sdk.3000")(_stream_benchmark("sdk"))
+benchmark("stream_completion.raw.3000")(_stream_benchmark("raw"))
+
+
+# --- 実行と比較 ---
+
+def measure(fn: Callable[[], object], samples: int = SAMPLES, min_time: float = MIN_TIME) -> dict:
+    """1回あたりの所要時間（秒）を samples 個測る。反復回数は1標本が min_time 以上になるように決める。"""
+    start = time.perf_counter()
+    fn()  # ウォームアップ（キャッシュ・遅延 import）を兼ねて1回の時間を見る
+    once = time.perf_counter() - start
+    number = max(1, int(min_time / once)) if once > 0 else 1000
+    values = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        values.append((time.perf_counter() - start) / number)
+    ordered = sorted(values)
+    return {"samples": values, "number": number, "median": statistics.median(values), "min": ordered[0],
+            "iqr": ordered[(3 * len(ordered)) // 4] - ordered[len(ordered) // 4]}
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(pattern: Optional[str] = None, quick: bool = False, samples: Optional[int] = None,
+                   min_time: Optional[float] = None, progress: Optional[Callable[[str], None]] = None) -> dict:
+    """登録済みのベンチマークを実行し、保存・比較用の dict を返す。"""
+    samples = samples or (QUICK_SAMPLES if quick else SAMPLES)
+    min_time = min_time if min_time is not None else (QUICK_MIN_TIME if quick else MIN_TIME)
+    results = {}
+    for name, (setup, in_quick) in BENCHMARKS.items():
+        if (quick and not in_quick) or (pattern and not re.search(pattern, name)):
+            continue
+        prepared = setup()
+        if inspect.isgenerator(prepared):
+            try:
+                results[name] = measure(next(prepared), samples, min_time)
+            finally:
+                next(prepared, None)
+        else:
+            results[name] = measure(prepared, samples, min_time)
+        if progress:
+            progress(f"{name:<45} {results[name]['median'] * 1000:10.3f} ms  (x{results[name]['number']})")
+    return {
+        "commit": _commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "benchmarks": results,
+    }
+
+
+def compare_runs(baseline: dict, current: dict, threshold: float = 0.10, alpha: float = 0.05) -> List[dict]:
+    """両方にあるベンチマークについて中央値の比と U 検定の p 値を出す。遅くなりすぎたものは regression。"""
+    rows = []
+    for name, cur in current["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if base is None:
+            continue
+        ratio = cur["median"] / base["median"] if base["median"] else None
+        p = mann_whitney_u(base["samples"], cur["samples"])
+        regression = ratio is not None and ratio > 1 + threshold and p is not None and p < alpha
+        rows.append({"name": name, "baseline_ms": base["median"] * 1000, "current_ms": cur["median"] * 1000,
+                     "ratio": ratio, "p_value": p, "regression": regression})
+    return rows
+
+
+def format_comparison(rows: List[dict]) -> str:
+    lines = [f"{'benchmark':<45} {'baseline':>12} {'current':>12} {'ratio':>8} {'p':>7}"]
+    for row in rows:
+        ratio = "-" if row["ratio"] is None else f"{row['ratio']:.2f}x"
+        p = "-" if row["p_value"] is None else f"{row['p_value']:.3f}"
+        mark = "  REGRESSION" if row["regression"] else ""
+        lines.append(f"{row['name']:<45} {row['baseline_ms']:10.3f}ms {row['current_ms']:10.3f}ms {ratio:>8} {p:>7}{mark}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ハーネス自体のマイクロベンチマーク（ベースラインとの比較で回帰なら終了コード 1）")
+    parser.add_argument("--filter", help="ベンチマーク名の正規表現")
+    parser.add_argument("--quick", action="store_true", help="標本数を減らし、100k 件のレポートを省く")
+    parser.add_argument("--samples", type=int)
+    parser.add_argument("--min-time", type=float, help="1標本の最小時間（秒）")
+    parser.add_argument("--save", help="結果の保存先（JSON。ベースラインとして使える）")
+    parser.add_argument("--baseline", help="比較するベースライン（--save で保存した JSON）")
+    parser.add_argument("--threshold", type=float, default=0.10, help="中央値の悪化率（0.10 = +10%%）")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--list", action="store_true", help="ベンチマーク名の一覧を表示して終わる")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return 0
+    current = run_benchmarks(args.filter, args.quick, args.samples, args.min_time, progress=print)
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"Saved: {args.save}")
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    rows = compare_runs(baseline, current, args.threshold, args.alpha)
+    print(f"\nBaseline: {baseline.get('commit') or '-'} ({baseline.get('timestamp', '-')})")
+    print(format_comparison(rows))
+    regressions = sum(row["regression"] for row in rows)
+    print(f"Regressions: {regressions}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+プレフィックス（KV）キャッシュを意識した実行順と、cold / warm の判定。
+
+variants 形式のケースは最大100個のバリエーションで同じ system_prompt を共有する。ローカルの推論サーバーは
+直前に処理したプロンプトと先頭が一致する部分の KV キャッシュを再利用するので、最初のバリエーションだけ
+TTFT が大きく、集約の avg_ttft ではその差が見えない。
+
+- PrefixTracker: モデル（とエンドポイント）ごとに直近 slots 件のリクエストの先頭部分を覚えておき、
+  送信するリクエストが先頭のメッセージ（system_prompt など）を共有していれば "warm"、していなければ
+  "cold" と判定する。slots は推論サーバーが保持するシーケンス数の目安（同時実行数に合わせる）
+- order_work_items: 作業単位の実行順のポリシー
+    suite:       スイート・variant・run の順（従来どおり）
+    grouped:     先頭部分が同じケースを隣接させ、キャッシュの再利用を最大にする
+    random:      全体をシャッフルする（キャッシュの再利用を崩す）
+    interleaved: ケースを1件ずつ順に回し、連続するリクエストの先頭部分が変わるようにする
+- prefix_cache_stats: cold / warm の母集団ごとのレイテンシのサマリ
+
+判定は送信側から見た推定で、サーバーが実際に再利用したかどうかではない（ウォームアップの送信も含めて数える。
+レスポンスキャッシュから返した結果は判定しない）。
+"""
+import hashlib
+import json
+import random
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+try:
+    from bench.stats import summarize_latencies
+except ImportError:
+    from stats import summarize_latencies
+
+PREFIX_ORDERS = ("suite", "grouped", "random", "interleaved")
+PREFIX_STATES = ("cold", "warm")
+
+
+def resolve_prefix_order(order) -> str:
+    order = (order or "suite").lower()
+    if order not in PREFIX_ORDERS:
+        raise ValueError(f"不明な実行順: {order}（{', '.join(PREFIX_ORDERS)}）")
+    return order
+
+
+def message_prefix_keys(messages) -> List[str]:
+    """messages[:1], messages[:2], ... のそれぞれのハッシュ（先頭から順に連鎖させて計算する）。"""
+    keys = []
+    h = hashlib.sha1()
+    for msg in messages or []:
+        h.update(json.dumps(msg, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+        h.update(b"\x00")
+        keys.append(h.copy().hexdigest())
+    return keys
+
+
+def shared_prefix_key(messages) -> Optional[str]:
+    """最後のメッセージ（バリエーションごとのプロンプト）を除いた先頭部分のキー。なければ None。"""
+    keys = message_prefix_keys(messages)
+    return keys[-2] if len(keys) >= 2 else None
+
+
+class PrefixTracker:
+    """スコープ（(base_url, model) など）ごとに、直近 slots 件のリクエストの先頭部分を覚えておく。"""
+
+    def __init__(self, slots: int = 1):
+        self.slots = max(1, int(slots or 1))
+        self._lock = threading.Lock()
+        self._recent: Dict[Hashable, deque] = {}
+
+    def observe(self, scope: Hashable, messages) -> str:
+        """送信するリクエストを記録し、"cold" / "warm" を返す。"""
+        keys = message_prefix_keys(messages)
+        with self._lock:
+            recent = self._recent.setdefault(scope, deque(maxlen=self.slots))
+            warm = any(k in prev for prev in recent for k in keys)
+            recent.append(frozenset(keys))
+        return "warm" if warm else "cold"
+
+    def reset(self, scope: Hashable = None) -> None:
+        """モデルのロードし直しなどでキャッシュが消えた場合に呼ぶ。"""
+        with self._lock:
+            if scope is None:
+                self._recent.clear()
+            else:
+                self._recent.pop(scope, None)
+
+
+def order_work_items(groups: Sequence[Tuple[Optional[str], Sequence]], order: str, seed: int = 0) -> List[tuple]:
+    """
+    groups: [(先頭部分のキー, [作業単位, ...]), ...]（ケースごと）
+    ポリシーに従って並べた [(グループの位置, 作業単位), ...] を返す。
+    """
+    order = resolve_prefix_order(order)
+    indexed = [[(g_idx, item) for item in items] for g_idx, (_key, items) in enumerate(groups)]
+    if order == "grouped":
+        # 最初に現れた順を保ったまま、同じキーのケースを隣接させる
+        first = OrderedDict()
+        for g_idx, (key, _items) in enumerate(groups):
+            first.setdefault(key if key is not None else ("none", g_idx), []).append(g_idx)
+        return [pair for g_list in first.values() for g_idx in g_list for pair in indexed[g_idx]]
+    if order == "interleaved":
+        out = []
+        for pos in range(max((len(g) for g in indexed), default=0)):
+            out.extend(g[pos] for g in indexed if pos < len(g))
+        return out
+    flat = [pair for g in indexed for pair in g]
+    if order == "random":
+        random.Random(seed).shuffle(flat)
+    return flat
+
+
+def prefix_cache_stats(samples) -> Dict[str, dict]:
+    """cold / warm ごとの {"count", "ttft_ms", "e2e_ms"}（判定のないものは数えない）。"""
+    samples = list(samples)
+    stats = {}
+    for state in PREFIX_STATES:
+        pop = [s for s in samples if s.get("prefix_cache") == state]
+        stats[state] = {
+            "count": len(pop),
+            "ttft_ms": summarize_latencies(s.get("ttft_ms") for s in pop),
+            "e2e_ms": summarize_latencies(s.get("e2e_ms") for s in pop),
+        }
+    return stats
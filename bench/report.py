@@ -0,0 +1,551 @@
+"""
+HTML レポートの生成（ストリーミング）。
+
+従来は文字列の連結で1ページを組み立て、カテゴリ別・(モデル, ケース) 別・全件詳細のために結果を
+3回グループ化していた。大量のスイートでは生成に時間がかかり、ブラウザでも開けないほど大きくなる。
+
+- 結果は1回だけ走査し、集計に必要な値（件数・レイテンシの標本）だけを保持する
+- 出力はバッファ付きのファイルへ順に書き出す（ページ全体を文字列として持たない）
+- 全結果詳細は CHUNK_SIZE 件ずつの JSON チャンクにし、仮想スクロールの表で見えている範囲だけ描画する。
+  件数が INLINE_LIMIT 以下ならチャンクを HTML に埋め込んで1ファイルに収め、超える場合は
+  `<レポート名>_files/details_NNNNN.js` に分けて、スクロールに合わせて読み込む（file:// でも動くよう
+  fetch ではなく script 要素で読む）
+- ITL はリクエストごとに多数の値があるので、モデルごとに最大 ITL_RESERVOIR 個の標本（reservoir
+  sampling）から分位を求める
+
+使い方（JSONL から直接）:
+    python -m bench.report out/results_YYYYMMDD_HHMMSS.jsonl --out out/report.html
+"""
+import argparse
+import html as html_lib
+import json
+import math
+import random
+from pathlib import Path
+from typing import Iterable, Iterator
+
+try:
+    from bench.stats import percentile, summarize_latencies, fmt_pcts
+except ImportError:
+    from stats import percentile, summarize_latencies, fmt_pcts
+
+CHUNK_SIZE = 1000
+INLINE_LIMIT = 5000
+ITL_RESERVOIR = 100_000
+WRITE_BUFFER = 1 << 20
+
+_STYLE = """
+        <style>
+            :root {
+                --bg-primary: #1a1a2e;
+                --bg-secondary: #16213e;
+                --bg-card: #0f3460;
+                --text-primary: #eee;
+                --text-secondary: #aaa;
+                --accent: #e94560;
+                --success: #4ade80;
+                --error: #f87171;
+                --warning: #fbbf24;
+                --border: #334155;
+            }
+            * { box-sizing: border-box; }
+            body {
+                font-family: 'Segoe UI', 'Meiryo', sans-serif;
+                background: var(--bg-primary);
+                color: var(--text-primary);
+                padding: 2rem;
+                margin: 0;
+                line-height: 1.6;
+            }
+            h1 {
+                color: var(--accent);
+                border-bottom: 2px solid var(--accent);
+                padding-bottom: 0.5rem;
+                margin-bottom: 1.5rem;
+            }
+            h2 {
+                color: var(--text-primary);
+                margin-top: 2rem;
+                margin-bottom: 1rem;
+            }
+            h3 { color: var(--text-secondary); margin-top: 1.5rem; }
+            table {
+                border-collapse: collapse;
+                width: 100%;
+                margin-bottom: 1.5rem;
+                background: var(--bg-secondary);
+                border-radius: 8px;
+                overflow: hidden;
+            }
+            th, td {
+                border: 1px solid var(--border);
+                padding: 0.75rem 1rem;
+                text-align: left;
+            }
+            th { background-color: var(--bg-card); color: var(--text-primary); }
+            tr:hover { background-color: rgba(233, 69, 96, 0.1); }
+            .pass { color: var(--success); font-weight: bold; }
+            .fail { color: var(--error); }
+            .error { color: var(--warning); }
+            .skipped { color: var(--text-secondary); font-style: italic; }
+            .category-tag {
+                display: inline-block;
+                background: var(--accent);
+                color: white;
+                padding: 0.2rem 0.6rem;
+                border-radius: 4px;
+                font-size: 0.85rem;
+                margin-right: 0.5rem;
+            }
+            .description {
+                font-size: 0.9rem;
+                color: var(--text-secondary);
+                margin-top: 0.25rem;
+            }
+            .summary-grid {
+                display: grid;
+                grid-template-columns: repeat(auto-fill, minmax(280px, 1fr));
+                gap: 1rem;
+                margin-bottom: 2rem;
+            }
+            .summary-card {
+                background: var(--bg-secondary);
+                border-radius: 8px;
+                padding: 1rem;
+                border-left: 4px solid var(--accent);
+            }
+            .summary-card h4 { margin: 0 0 0.5rem 0; color: var(--text-primary); }
+            .summary-card .stats { display: flex; gap: 1rem; flex-wrap: wrap; }
+            .stat { text-align: center; }
+            .stat-value { font-size: 1.5rem; font-weight: bold; color: var(--accent); }
+            .stat-label { font-size: 0.8rem; color: var(--text-secondary); }
+            /* 全結果詳細（仮想スクロール） */
+            .details-viewport {
+                height: 70vh;
+                overflow-y: auto;
+                position: relative;
+                background: var(--bg-secondary);
+                border: 1px solid var(--border);
+                border-radius: 8px;
+            }
+            .details-viewport table { table-layout: fixed; margin: 0; border-radius: 0; }
+            .details-viewport th { position: sticky; top: 0; z-index: 1; }
+            .details-viewport td {
+                height: 36px;
+                padding: 0 0.75rem;
+                white-space: nowrap;
+                overflow: hidden;
+                text-overflow: ellipsis;
+            }
+            .details-viewport td.preview { font-family: monospace; font-size: 0.85rem; }
+        </style>
+"""
+
+_DETAILS_SCRIPT = """
+<script>
+(function () {
+    const R = window.BENCH_REPORT;
+    const ROW_HEIGHT = 36;
+    const viewport = document.getElementById('details-viewport');
+    const body = document.getElementById('details-body');
+    const LABELS = {pass: '✓ PASS', fail: '✗ FAIL', error: 'ERROR', skipped: 'SKIP'};
+    const requested = {};
+    let scheduled = false;
+
+    function esc(s) {
+        return String(s == null ? '' : s).replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c]));
+    }
+    function row(i) {
+        const chunk = R.chunks[Math.floor(i / R.chunkSize)];
+        if (!chunk) return `<tr><td colspan="7">…</td></tr>`;
+        const [ts, model, cat, name, cls, ttft, preview] = chunk[i % R.chunkSize];
+        return `<tr class="${cls}"><td>${esc(ts)}</td><td title="${esc(model)}">${esc(model)}</td>` +
+            `<td><span class="category-tag">${esc(cat)}</span></td><td title="${esc(name)}">${esc(name)}</td>` +
+            `<td>${LABELS[cls]}</td><td>${(ttft || 0).toFixed(1)}ms</td>` +
+            `<td class="preview" title="${esc(preview)}">${esc(preview)}</td></tr>`;
+    }
+    function load(c) {
+        if (R.chunks[c] || requested[c] || !R.chunkDir) return;
+        requested[c] = true;
+        const s = document.createElement('script');
+        s.src = `${R.chunkDir}/details_${String(c).padStart(5, '0')}.js`;
+        document.head.appendChild(s);
+    }
+    function render() {
+        scheduled = false;
+        const first = Math.max(0, Math.floor(viewport.scrollTop / ROW_HEIGHT) - 10);
+        const last = Math.min(R.total, first + Math.ceil(viewport.clientHeight / ROW_HEIGHT) + 20);
+        for (let c = Math.floor(first / R.chunkSize); c <= Math.floor(Math.max(first, last - 1) / R.chunkSize); c++) load(c);
+        let html = `<tr style="height:${first * ROW_HEIGHT}px"></tr>`;
+        for (let i = first; i < last; i++) html += row(i);
+        html += `<tr style="height:${(R.total - last) * ROW_HEIGHT}px"></tr>`;
+        body.innerHTML = html;
+    }
+    R.render = function () {
+        if (!scheduled) { scheduled = true; requestAnimationFrame(render); }
+    };
+    viewport.addEventListener('scroll', R.render);
+    window.addEventListener('resize', R.render);
+    R.render();
+})();
+</script>
+"""
+
+
+def _status_class(r: dict) -> str:
+    if r.get('status') == 'skipped':
+        return 'skipped'
+    if r.get('status') == 'error':
+        return 'error'
+    return 'pass' if r.get('passed') else 'fail'
+
+
+def _script_json(value) -> str:
+    """<script> 内に埋め込める JSON（</script> で途切れないようにする）。"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+
+
+class ReportAggregator:
+    """
+    結果を1回の走査で集計する。保持するのは件数とレイテンシの標本だけで、結果レコードは持たない。
+    """
+
+    def __init__(self, itl_reservoir: int = ITL_RESERVOIR):
+        self.count = 0
+        self.by_category = {}  # category_name -> {valid, passed, ttft}
+        self.by_case = {}  # (model, case_id) -> {case_name, category_name, description, valid, passed, ttft, e2e}
+        self.by_model = {}  # model -> {ttft, e2e, decode_tps, prompt_tps, itl, itl_seen}
+        self.by_prefix = {}  # (model, endpoint) -> {cold: [ttft], warm: [ttft]}
+        self.by_warmup = {}  # (model, endpoint) -> ウォームアップ曲線（main.run_bench_logic の "warmup"）
+        self.by_http = {}  # (model, endpoint) -> {connect, request_sent, headers, first_byte, client, requests, reused, retries}
+        self.itl_reservoir = itl_reservoir
+        self._rng = random.Random(0)
+
+    def _add_itl(self, m: dict, values) -> None:
+        # reservoir sampling（Algorithm L）。満杯になった後は次に採る位置まで読み飛ばすので、
+        # 乱数を引くのは採用する値の分だけで済む
+        values = [x for x in values or [] if x is not None]
+        reservoir = m['itl']
+        k = self.itl_reservoir
+        start = m['itl_seen']
+        i = 0
+        if len(reservoir) < k:
+            i = min(len(values), k - len(reservoir))
+            reservoir.extend(values[:i])
+            if len(reservoir) == k:
+                m['itl_w'] = math.exp(math.log(1.0 - self._rng.random()) / k)
+                m['itl_next'] = start + i + self._skip(m['itl_w'])
+        end = start + len(values)
+        while len(reservoir) == k and m['itl_next'] < end:
+            reservoir[self._rng.randrange(k)] = values[m['itl_next'] - start]
+            m['itl_w'] *= math.exp(math.log(1.0 - self._rng.random()) / k)
+            m['itl_next'] += 1 + self._skip(m['itl_w'])
+        m['itl_seen'] = end
+
+    def _skip(self, w: float) -> int:
+        if w >= 1.0:
+            return 0
+        return int(math.log(1.0 - self._rng.random()) / math.log(1.0 - w)) if w > 0 else 0
+
+    def add(self, r: dict) -> None:
+        self.count += 1
+        ok = r.get('status') == 'ok'
+        # 1リクエスト = 1標本（variants は variant_details を展開。main.request_samples と同じ）
+        samples = []
+        if ok:
+            if r.get('is_variant_test'):
+                samples = [v for v in r.get('variant_details') or [] if v.get('status') == 'ok']
+            else:
+                samples = [r]
+
+        cat = self.by_category.setdefault(r.get('category_name', 'Unknown'), {'valid': 0, 'passed': 0, 'ttft': []})
+        case = self.by_case.get((r['model'], r['case_id']))
+        if case is None:
+            case = self.by_case[(r['model'], r['case_id'])] = {
+                'case_name': r.get('case_name', r['case_id']),
+                'category_name': r.get('category_name', ''),
+                'description': r.get('case_description', ''),
+                'valid': 0, 'passed': 0, 'ttft': [], 'e2e': [],
+            }
+        if r.get('warmup'):
+            self.by_warmup.setdefault((r['model'], r.get('endpoint') or ''), r['warmup'])
+        model = self.by_model.setdefault(r['model'], {
+            'ttft': [], 'e2e': [], 'decode_tps': [], 'prompt_tps': [], 'itl': [], 'itl_seen': 0,
+            'itl_w': 0.0, 'itl_next': 0,
+        })
+
+        if ok:
+            for bucket in (cat, case):
+                bucket['valid'] += 1
+                bucket['passed'] += 1 if r.get('passed') else 0
+        for s in samples:
+            cat['ttft'].append(s.get('ttft_ms'))
+            case['ttft'].append(s.get('ttft_ms'))
+            case['e2e'].append(s.get('e2e_ms'))
+            for key, src in (('ttft', 'ttft_ms'), ('e2e', 'e2e_ms'), ('decode_tps', 'decode_tps'), ('prompt_tps', 'prompt_tps')):
+                model[key].append(s.get(src))
+            self._add_itl(model, s.get('itl_ms'))
+            if s.get('prefix_cache') in ('cold', 'warm'):
+                prefix = self.by_prefix.setdefault((r['model'], r.get('endpoint') or ''), {'cold': [], 'warm': []})
+                prefix[s['prefix_cache']].append(s.get('ttft_ms'))
+            phases = s.get('http_phases')
+            if phases:
+                h = self.by_http.setdefault((r['model'], r.get('endpoint') or ''), {
+                    'connect': [], 'request_sent': [], 'headers': [], 'first_byte': [], 'client': [],
+                    'requests': 0, 'reused': 0, 'retries': 0,
+                })
+                for key in ('connect', 'request_sent', 'headers', 'first_byte', 'client'):
+                    h[key].append(phases.get(f'{key}_ms'))
+                h['requests'] += 1
+                h['reused'] += 1 if phases.get('reused') else 0
+                h['retries'] += phases.get('retries') or 0
+
+    def write_summary(self, out) -> None:
+        """カテゴリ別サマリ・モデル別詳細・レイテンシの各表を書き出す。"""
+        out.write("<h2>📊 カテゴリ別サマリ</h2><div class='summary-grid'>")
+        for cat_name, c in self.by_category.items():
+            pass_rate = (c['passed'] / c['valid'] * 100) if c['valid'] else 0
+            p50_ttft = percentile(c['ttft'], 50) or 0
+            out.write(f"""
+        <div class="summary-card">
+            <h4>{html_lib.escape(str(cat_name))}</h4>
+            <div class="stats">
+                <div class="stat">
+                    <div class="stat-value">{pass_rate:.0f}%</div>
+                    <div class="stat-label">正解率</div>
+                </div>
+                <div class="stat">
+                    <div class="stat-value">{c['valid']}</div>
+                    <div class="stat-label">テスト数</div>
+                </div>
+                <div class="stat">
+                    <div class="stat-value">{p50_ttft:.0f}ms</div>
+                    <div class="stat-label">TTFT p50</div>
+                </div>
+            </div>
+        </div>
+        """)
+        out.write("</div>")
+
+        out.write("<h2>📋 モデル別詳細</h2>")
+        out.write("<table><tr><th>モデル</th><th>カテゴリ</th><th>テスト名</th><th>正解率</th>"
+                  "<th>TTFT p50 / p90 / p99</th><th>E2E p50 / p90 / p99</th></tr>")
+        for (model, _case_id), c in self.by_case.items():
+            pass_rate = (c['passed'] / c['valid']) * 100 if c['valid'] else 0
+            pass_class = "pass" if pass_rate >= 80 else ("fail" if pass_rate < 50 else "")
+            out.write(
+                f"<tr><td>{html_lib.escape(model)}</td>"
+                f"<td><span class='category-tag'>{html_lib.escape(c['category_name'])}</span></td>"
+                f"<td>{html_lib.escape(c['case_name'])}<div class='description'>{html_lib.escape(c['description'])}</div></td>"
+                f"<td class='{pass_class}'>{pass_rate:.1f}%</td>"
+                f"<td>{fmt_pcts(summarize_latencies(c['ttft']))}</td><td>{fmt_pcts(summarize_latencies(c['e2e']))}</td></tr>"
+            )
+        out.write("</table>")
+
+        out.write("<h2>⏱ レイテンシ・スループット（モデル別）</h2>")
+        out.write("<table><tr><th>モデル</th><th>リクエスト数</th><th>TTFT p50 / p90 / p99</th><th>E2E p50 / p90 / p99</th>"
+                  "<th>ITL p50 / p90 / p99</th><th>Decode tok/s p50</th><th>Prompt tok/s p50</th></tr>")
+        for model, m in self.by_model.items():
+            e2e = summarize_latencies(m['e2e'])
+            decode = percentile(m['decode_tps'], 50)
+            prompt = percentile(m['prompt_tps'], 50)
+            out.write(
+                f"<tr><td>{html_lib.escape(model)}</td><td>{e2e['count']}</td>"
+                f"<td>{fmt_pcts(summarize_latencies(m['ttft']))}</td><td>{fmt_pcts(e2e)}</td>"
+                f"<td>{fmt_pcts(summarize_latencies(m['itl']))}</td>"
+                f"<td>{'-' if decode is None else f'{decode:.1f}'}</td><td>{'-' if prompt is None else f'{prompt:.1f}'}</td></tr>"
+            )
+        out.write("</table>")
+
+        if self.by_warmup:
+            out.write("<h2>🌡 ウォームアップ（計測・採点には含まない）</h2>")
+            out.write("<table><tr><th>モデル</th><th>エンドポイント</th><th>件数</th><th>判定</th><th>最終 CV</th>"
+                      "<th>E2E 曲線 (ms)</th><th>所要時間</th></tr>")
+            for (model, endpoint), w in self.by_warmup.items():
+                state = {True: "安定", False: "上限到達", None: "判定なし"}.get(w.get('stable'), "-")
+                if w.get('error'):
+                    state += f"（エラー: {w['error']}）"
+                curve = " → ".join(f"{v:.0f}" for v in w.get('e2e_ms') or [] if v is not None) or "-"
+                cv = "-" if w.get('cv') is None else f"{w['cv'] * 100:.1f}%"
+                out.write(
+                    f"<tr><td>{html_lib.escape(model)}</td><td>{html_lib.escape(endpoint or '-')}</td>"
+                    f"<td>{w.get('requests', 0)}</td><td>{html_lib.escape(state)}</td><td>{cv}</td>"
+                    f"<td>{curve}</td><td>{(w.get('wall_ms') or 0) / 1000:.1f}s</td></tr>"
+                )
+            out.write("</table>")
+
+        if self.by_prefix:
+            # 同じ先頭部分（system_prompt など）を直前に送ったかどうかで TTFT を分けて比べる
+            out.write("<h2>🔥 プレフィックスキャッシュ（cold / warm）</h2>")
+            out.write("<table><tr><th>モデル</th><th>エンドポイント</th><th>cold 件数</th><th>cold TTFT p50 / p90 / p99</th>"
+                      "<th>warm 件数</th><th>warm TTFT p50 / p90 / p99</th><th>warm / cold (p50)</th></tr>")
+            for (model, endpoint), p in self.by_prefix.items():
+                cold, warm = summarize_latencies(p['cold']), summarize_latencies(p['warm'])
+                ratio = f"{warm['p50'] / cold['p50']:.2f}x" if cold['p50'] and warm['p50'] is not None else "-"
+                out.write(
+                    f"<tr><td>{html_lib.escape(model)}</td><td>{html_lib.escape(endpoint or '-')}</td>"
+                    f"<td>{cold['count']}</td><td>{fmt_pcts(cold)}</td><td>{warm['count']}</td><td>{fmt_pcts(warm)}</td>"
+                    f"<td>{ratio}</td></tr>"
+                )
+            out.write("</table>")
+
+        if self.by_http:
+            # リクエスト開始からの経過（p50）。ヘッダー受信までが接続・ネットワーク・サーバーの受付、
+            # 最初のバイトまでがプレフィル、最初のトークンまでの残りがクライアント側（SSE のパース）
+            out.write("<h2>🌐 HTTP フェーズ（p50）</h2>")
+            out.write("<table><tr><th>モデル</th><th>エンドポイント</th><th>件数</th><th>接続再利用</th><th>リトライ</th>"
+                      "<th>接続</th><th>送信完了</th><th>ヘッダー受信</th><th>最初のバイト</th><th>クライアント側</th></tr>")
+            for (model, endpoint), h in self.by_http.items():
+                cells = "".join(
+                    f"<td>{'-' if percentile(h[key], 50) is None else f'{percentile(h[key], 50):.1f} ms'}</td>"
+                    for key in ('connect', 'request_sent', 'headers', 'first_byte', 'client')
+                )
+                out.write(
+                    f"<tr><td>{html_lib.escape(model)}</td><td>{html_lib.escape(endpoint or '-')}</td>"
+                    f"<td>{h['requests']}</td><td>{h['reused'] / h['requests'] * 100:.0f}%</td><td>{h['retries']}</td>{cells}</tr>"
+                )
+            out.write("</table>")
+
+
+def detail_row(r: dict) -> list:
+    """全結果詳細の1行（JSON チャンクの要素）。"""
+    return [
+        r.get('timestamp', ''),
+        r.get('model', ''),
+        r.get('category_name', ''),
+        r.get('case_name', r.get('case_id', '')),
+        _status_class(r),
+        r.get('ttft_ms', 0) or 0,
+        r.get('response_preview', ''),
+    ]
+
+
+class _DetailChunks:
+    """詳細行をチャンクにまとめる。INLINE_LIMIT を超えた時点で外部ファイルへの書き出しに切り替える。"""
+
+    def __init__(self, path: Path, chunk_size: int, inline_limit: int):
+        self.chunk_dir = path.parent / f"{path.stem}_files"
+        self.chunk_size = chunk_size
+        self.inline_limit = inline_limit
+        self.external = False
+        self.total = 0
+        self.pending = []  # インラインのまま終われば全行、外部なら書き出し前の1チャンク分
+        self.written = 0  # 書き出したチャンク数
+
+    def add(self, row: list) -> None:
+        self.total += 1
+        self.pending.append(row)
+        if not self.external and self.total > self.inline_limit:
+            self.external = True
+            self.chunk_dir.mkdir(parents=True, exist_ok=True)
+        if self.external:
+            while len(self.pending) >= self.chunk_size:
+                self._flush(self.pending[:self.chunk_size])
+                del self.pending[:self.chunk_size]
+
+    def _flush(self, rows: list) -> None:
+        target = self.chunk_dir / f"details_{self.written:05d}.js"
+        with open(target, "w", encoding="utf-8") as f:
+            f.write(f"BENCH_REPORT.addChunk({self.written},{_script_json(rows)});\n")
+        self.written += 1
+
+    def finish(self) -> None:
+        if self.external and self.pending:
+            self._flush(self.pending)
+            self.pending = []
+
+    def write_inline(self, out) -> None:
+        """インラインの場合はチャンクを <script> として HTML に埋め込む。"""
+        if self.external:
+            return
+        for i in range(0, len(self.pending), self.chunk_size):
+            out.write(f"<script>BENCH_REPORT.addChunk({i // self.chunk_size},"
+                      f"{_script_json(self.pending[i:i + self.chunk_size])});</script>\n")
+
+
+def write_report(results: Iterable[dict], path, chunk_size: int = CHUNK_SIZE, inline_limit: int = INLINE_LIMIT) -> dict:
+    """
+    結果（リストでもジェネレータでもよい）から HTML レポートを書き出す。
+    戻り値: {"results": 件数, "chunks": 外部チャンクファイル数（インラインなら 0）}
+    """
+    path = Path(path)
+    aggregator = ReportAggregator()
+    details = _DetailChunks(path, chunk_size, inline_limit)
+    for r in results:
+        aggregator.add(r)
+        details.add(detail_row(r))
+    details.finish()
+
+    with open(path, "w", encoding="utf-8", buffering=WRITE_BUFFER) as out:
+        out.write('\n    <!DOCTYPE html>\n    <html lang="ja">\n    <head>\n        <meta charset="UTF-8">\n'
+                  '        <title>LLM Benchmark Report</title>')
+        out.write(_STYLE)
+        out.write("    </head>\n    <body>\n    <h1>🔬 LLM Benchmark Report</h1>\n    ")
+        if not aggregator.count:
+            out.write("<p>No results.</p></body></html>")
+            return {"results": 0, "chunks": 0}
+
+        aggregator.write_summary(out)
+
+        chunk_dir = details.chunk_dir.name if details.external else None
+        out.write(f"<h2>📝 全結果詳細</h2><p class='description'>{details.total} 件"
+                  + (f"（{details.chunk_dir.name}/ から順次読み込み）" if details.external else "") + "</p>")
+        out.write("<div class='details-viewport' id='details-viewport'><table><colgroup>"
+                  "<col style='width:14rem'><col style='width:14rem'><col style='width:9rem'><col style='width:14rem'>"
+                  "<col style='width:7rem'><col style='width:7rem'><col></colgroup>"
+                  "<thead><tr><th>時刻</th><th>モデル</th><th>カテゴリ</th><th>テスト</th><th>結果</th><th>TTFT</th>"
+                  "<th>レスポンス</th></tr></thead><tbody id='details-body'></tbody></table></div>\n")
+        out.write("<script>window.BENCH_REPORT = {"
+                  f"total: {details.total}, chunkSize: {chunk_size}, chunkDir: {_script_json(chunk_dir)}, chunks: {{}}, "
+                  "addChunk(i, rows) { this.chunks[i] = rows; if (this.render) this.render(); }};</script>\n")
+        details.write_inline(out)
+        out.write(_DETAILS_SCRIPT)
+        out.write("</body></html>")
+    return {"results": aggregator.count, "chunks": details.written}
+
+
+def iter_jsonl_results(path) -> Iterator[dict]:
+    """
+    results_*.jsonl のケース単位の結果を、ファイル全体を読み込まずに順に返す。
+    再開で同じキーが複数回出る場合は main.load_results_jsonl と同じく、最初の位置に最後の内容を返す
+    （1回目の走査でキーごとの「最初の位置」と「最後の行のオフセット」だけを覚え、2回目でその行を読む）。
+    """
+    def key(r):
+        if r.get("is_variant_test") or r.get("reason") == "missing_capabilities":
+            return (r.get("model"), r.get("case_id"), None)
+        return (r.get("model"), r.get("case_id"), r.get("run_index"))
+
+    def parse(line: bytes):
+        try:
+            r = json.loads(line)
+        except ValueError:
+            return None
+        return r if isinstance(r, dict) and r.get("record_type", "result") == "result" else None
+
+    last_offset = {}  # key -> 最後の行のオフセット（dict の順序 = 最初に出現した順）
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            r = parse(line) if line.strip() else None
+            if r is not None:
+                last_offset[key(r)] = offset
+            offset += len(line)
+
+        for k, offset in last_offset.items():
+            f.seek(offset)
+            yield parse(f.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="results_*.jsonl から HTML レポートを生成する")
+    parser.add_argument("jsonl")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--inline-limit", type=int, default=INLINE_LIMIT)
+    args = parser.parse_args()
+    info = write_report(iter_jsonl_results(args.jsonl), args.out, args.chunk_size, args.inline_limit)
+    print(f"{info['results']} results -> {args.out}" + (f" ({info['chunks']} detail chunks)" if info['chunks'] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+結果データベース（SQLite）。
+
+results_*.jsonl はファイル単位でしか読めないので、モデルを週をまたいで比べるには全ファイルを
+読み直す必要があった。ここでは結果を1つの SQLite に実行（run）ごとに蓄積し、インデックス付きで
+問い合わせられるようにする（DuckDB からも sqlite 拡張でそのまま読める）。
+
+テーブル:
+- runs:     1回の実行（CLI は results_*.jsonl のファイル名、Web UI はジョブ ID が run_id）
+- models:   モデルと初出・最終の記録時刻
+- cases:    ケース ID とカテゴリ
+- results:  ケース単位の結果（variants は集約1行、run_index = -1）。record に元のレコード全体
+- requests: 1リクエスト = 1行の計測値（旧形式の各 run と variants の各 variant × run）
+
+run_bench / run_bm_task は結果が出るたびに add_result で書き込む。同じ (run_id, model, case_id,
+run_index) の結果は上書きされるので、再開（resume）で同じ結果が再度届いても重複しない。
+
+- BENCH_RESULTS_DB: DB ファイルのパス（既定: bench/out/results.sqlite）。off で書き込まない
+
+使い方:
+    python -m bench.resultsdb ingest out/results_*.jsonl          # 既存の結果を取り込む
+    python -m bench.resultsdb runs                                # 実行の一覧
+    python -m bench.resultsdb latency --model my-model --category math --metric ttft_ms --q 90 --last 10
+    python -m bench.resultsdb sql "SELECT model, COUNT(*) FROM requests GROUP BY model"
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+try:
+    from bench.stats import percentile
+except ImportError:
+    from stats import percentile
+
+DEFAULT_DB_FILE = "results.sqlite"
+
+# requests テーブルで分位を計算できる列（SQL に埋め込むので固定のものだけ許可する）
+METRICS = ("ttft_ms", "e2e_ms", "decode_tps", "prompt_tps", "prompt_tokens", "completion_tokens")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    source TEXT,
+    started_at TEXT,
+    suite_path TEXT,
+    meta TEXT
+);
+CREATE TABLE IF NOT EXISTS models (
+    model TEXT PRIMARY KEY,
+    first_seen TEXT,
+    last_seen TEXT
+);
+CREATE TABLE IF NOT EXISTS cases (
+    case_id TEXT PRIMARY KEY,
+    case_name TEXT,
+    category_id TEXT,
+    category_name TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    case_id TEXT NOT NULL,
+    run_index INTEGER NOT NULL,
+    category_id TEXT,
+    timestamp TEXT,
+    status TEXT,
+    passed INTEGER,
+    ttft_ms REAL,
+    e2e_ms REAL,
+    is_variant_test INTEGER,
+    record TEXT,
+    PRIMARY KEY (run_id, model, case_id, run_index)
+);
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    case_id TEXT NOT NULL,
+    category_id TEXT,
+    variant_index INTEGER,
+    run_index INTEGER,
+    result_run_index INTEGER NOT NULL,
+    timestamp TEXT,
+    status TEXT,
+    passed INTEGER,
+    cached INTEGER,
+    ttft_ms REAL,
+    e2e_ms REAL,
+    decode_tps REAL,
+    prompt_tps REAL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_runs_started ON runs (started_at);
+CREATE INDEX IF NOT EXISTS idx_results_model ON results (model, timestamp);
+CREATE INDEX IF NOT EXISTS idx_results_case ON results (case_id);
+CREATE INDEX IF NOT EXISTS idx_results_category ON results (category_id);
+CREATE INDEX IF NOT EXISTS idx_results_timestamp ON results (timestamp);
+CREATE INDEX IF NOT EXISTS idx_requests_model ON requests (model, category_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_requests_case ON requests (case_id);
+CREATE INDEX IF NOT EXISTS idx_requests_category ON requests (category_id);
+CREATE INDEX IF NOT EXISTS idx_requests_timestamp ON requests (timestamp);
+CREATE INDEX IF NOT EXISTS idx_requests_result ON requests (run_id, model, case_id, result_run_index);
+"""
+
+
+def _request_rows(result: dict):
+    """結果レコードを requests の行（1リクエスト = 1行）に展開する。実行されなかったものは含めない。"""
+    if result.get("reason") == "missing_capabilities":
+        return
+    if result.get("is_variant_test"):
+        for v in result.get("variant_details") or []:
+            if v.get("status") != "skipped":
+                yield v.get("variant_index"), v
+    elif result.get("status") != "skipped":
+        yield None, result
+
+
+class ResultsDB:
+    """スレッドセーフな結果データベース。"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        if self.path.suffix == "":
+            self.path = self.path / DEFAULT_DB_FILE
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    # --- 書き込み ---
+
+    def start_run(self, run_id: str, source: str = "cli", suite_path: str = None, meta: dict = None,
+                  started_at: str = None) -> None:
+        """実行を登録する（既にあれば何もしない。再開時に開始時刻が変わらないように）。"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO runs (run_id, source, started_at, suite_path, meta) VALUES (?, ?, ?, ?, ?)",
+                (run_id, source, started_at or datetime.now().isoformat(), suite_path,
+                 json.dumps(meta or {}, ensure_ascii=False)),
+            )
+            self._conn.commit()
+
+    def add_result(self, run_id: str, result: dict) -> None:
+        """ケース単位の結果を1件書き込む（同じキーの結果と、その requests 行は置き換える）。"""
+        if result.get("record_type", "result") != "result":
+            return
+        model = result.get("model")
+        case_id = result.get("case_id")
+        timestamp = result.get("timestamp") or datetime.now().isoformat()
+        category_id = result.get("category_id")
+        aggregate = result.get("is_variant_test") or result.get("reason") == "missing_capabilities"
+        run_index = -1 if aggregate else int(result.get("run_index") or 0)
+        key = (run_id, model, case_id, run_index)
+
+        with self._lock, self._conn:
+            conn = self._conn
+            conn.execute("INSERT OR IGNORE INTO runs (run_id, source, started_at, meta) VALUES (?, 'import', ?, '{}')",
+                         (run_id, timestamp))
+            conn.execute(
+                "INSERT INTO models (model, first_seen, last_seen) VALUES (?, ?, ?) "
+                "ON CONFLICT(model) DO UPDATE SET first_seen = MIN(first_seen, excluded.first_seen), "
+                "last_seen = MAX(last_seen, excluded.last_seen)",
+                (model, timestamp, timestamp),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO cases (case_id, case_name, category_id, category_name) VALUES (?, ?, ?, ?)",
+                (case_id, result.get("case_name"), category_id, result.get("category_name")),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO results (run_id, model, case_id, run_index, category_id, timestamp, status, "
+                "passed, ttft_ms, e2e_ms, is_variant_test, record) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                key + (category_id, timestamp, result.get("status"), int(bool(result.get("passed"))),
+                       result.get("ttft_ms"), result.get("e2e_ms"), int(bool(result.get("is_variant_test"))),
+                       json.dumps(result, ensure_ascii=False)),
+            )
+            conn.execute(
+                "DELETE FROM requests WHERE run_id = ? AND model = ? AND case_id = ? AND result_run_index = ?", key
+            )
+            conn.executemany(
+                "INSERT INTO requests (run_id, model, case_id, category_id, variant_index, run_index, result_run_index, "
+                "timestamp, status, passed, cached, ttft_ms, e2e_ms, decode_tps, prompt_tps, prompt_tokens, "
+                "completion_tokens) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (run_id, model, case_id, category_id, variant_index, r.get("run_index"), run_index, timestamp,
+                     r.get("status"), int(bool(r.get("passed"))), int(bool(r.get("cached"))), r.get("ttft_ms"),
+                     r.get("e2e_ms"), r.get("decode_tps"), r.get("prompt_tps"), r.get("prompt_tokens"),
+                     r.get("completion_tokens"))
+                    for variant_index, r in _request_rows(result)
+                ],
+            )
+
+    def ingest(self, records: Iterable[dict], run_id: str, source: str = "import") -> int:
+        """レコード列（load_journal の戻り値など）を取り込み、ケース単位の結果の件数を返す。"""
+        count = 0
+        for r in records:
+            if r.get("record_type", "result") != "result":
+                continue
+            if count == 0:
+                self.start_run(run_id, source=source, started_at=r.get("timestamp"))
+            self.add_result(run_id, r)
+            count += 1
+        return count
+
+    # --- 問い合わせ ---
+
+    def query(self, sql: str, params: tuple = ()) -> List[dict]:
+        with self._lock:
+            cur = self._conn.execute(sql, params)
+            columns = [d[0] for d in cur.description or []]
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+    def list_runs(self, limit: int = 20) -> List[dict]:
+        return self.query(
+            "SELECT r.run_id, r.source, r.started_at, r.suite_path, COUNT(DISTINCT x.model) AS models, "
+            "COUNT(x.case_id) AS results, SUM(x.passed) AS passed FROM runs r "
+            "LEFT JOIN results x ON x.run_id = r.run_id GROUP BY r.run_id ORDER BY r.started_at DESC LIMIT ?",
+            (limit,),
+        )
+
+    def latency_history(self, model: str, metric: str = "ttft_ms", q: float = 90, category_id: str = None,
+                        case_id: str = None, last_runs: int = 10) -> dict:
+        """
+        直近 last_runs 回の実行（そのモデルの結果を含むもの）について、正常終了したリクエストの
+        metric の q パーセンタイルを実行ごと・全体で返す。例: モデル X のカテゴリ Y の TTFT p90。
+        キャッシュから再生したリクエストは前回の計測値なので含めず、その件数を "cached" で返す。
+        """
+        if metric not in METRICS:
+            raise ValueError(f"不明な metric: {metric}（{', '.join(METRICS)}）")
+        where = "q.model = ? AND q.status = 'ok'"
+        params = [model]
+        if category_id:
+            where += " AND q.category_id = ?"
+            params.append(category_id)
+        if case_id:
+            where += " AND q.case_id = ?"
+            params.append(case_id)
+
+        runs = self.query(
+            f"SELECT q.run_id, r.started_at FROM requests q JOIN runs r ON r.run_id = q.run_id WHERE {where} "
+            "GROUP BY q.run_id ORDER BY r.started_at DESC LIMIT ?",
+            tuple(params) + (int(last_runs),),
+        )
+        values = {}
+        cached = {}
+        if runs:
+            marks = ",".join("?" * len(runs))
+            for row in self.query(
+                f"SELECT q.run_id, q.{metric} AS value, q.cached FROM requests q WHERE {where} "
+                f"AND q.{metric} IS NOT NULL AND q.run_id IN ({marks})",
+                tuple(params) + tuple(r["run_id"] for r in runs),
+            ):
+                if row["cached"]:
+                    cached[row["run_id"]] = cached.get(row["run_id"], 0) + 1
+                else:
+                    values.setdefault(row["run_id"], []).append(row["value"])
+
+        everything = [v for vals in values.values() for v in vals]
+        return {
+            "model": model,
+            "metric": metric,
+            "q": q,
+            "category_id": category_id,
+            "case_id": case_id,
+            "runs": [
+                {"run_id": r["run_id"], "started_at": r["started_at"], "count": len(values.get(r["run_id"], [])),
+                 "cached": cached.get(r["run_id"], 0), "value": percentile(values.get(r["run_id"], []), q)}
+                for r in runs
+            ],
+            "count": len(everything),
+            "cached": sum(cached.values()),
+            "value": percentile(everything, q),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def create_results_db(default_dir, path: str = None) -> Optional[ResultsDB]:
+    """
+    path（なければ BENCH_RESULTS_DB、それもなければ default_dir/results.sqlite）の DB を開く。
+    "off" なら None（書き込まない）。
+    """
+    path = path or os.environ.get("BENCH_RESULTS_DB") or str(Path(default_dir) / DEFAULT_DB_FILE)
+    if path.lower() == "off":
+        return None
+    return ResultsDB(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="結果データベースの取り込み・問い合わせ")
+    parser.add_argument("--db", default=os.environ.get("BENCH_RESULTS_DB") or str(Path("out") / DEFAULT_DB_FILE))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_ingest = sub.add_parser("ingest", help="results_*.jsonl を取り込む（run_id はファイル名）")
+    p_ingest.add_argument("journals", nargs="+")
+
+    p_runs = sub.add_parser("runs", help="実行の一覧")
+    p_runs.add_argument("--limit", type=int, default=20)
+
+    p_lat = sub.add_parser("latency", help="直近の実行ごとのレイテンシ分位")
+    p_lat.add_argument("--model", required=True)
+    p_lat.add_argument("--category")
+    p_lat.add_argument("--case")
+    p_lat.add_argument("--metric", choices=METRICS, default="ttft_ms")
+    p_lat.add_argument("--q", type=float, default=90)
+    p_lat.add_argument("--last", type=int, default=10)
+
+    p_sql = sub.add_parser("sql", help="任意の SELECT を実行して JSON Lines で出力")
+    p_sql.add_argument("statement")
+
+    args = parser.parse_args()
+    with ResultsDB(args.db) as db:
+        if args.command == "ingest":
+            for path in args.journals:
+                with open(path, "r", encoding="utf-8") as f:
+                    records = [json.loads(line) for line in f if line.strip()]
+                print(f"{path}: {db.ingest(records, Path(path).stem)} results")
+        elif args.command == "runs":
+            for r in db.list_runs(args.limit):
+                print(f"{r['started_at']}  {r['run_id']:<40} {r['source']:<7} models={r['models']} "
+                      f"results={r['results']} passed={r['passed'] or 0}")
+        elif args.command == "latency":
+            h = db.latency_history(args.model, args.metric, args.q, args.category, args.case, args.last)
+            for r in h["runs"]:
+                value = "-" if r["value"] is None else f"{r['value']:.1f}"
+                print(f"{r['started_at']}  {r['run_id']:<40} n={r['count']:<5} cached={r['cached']:<5} "
+                      f"p{args.q:g}={value}")
+            overall = "-" if h["value"] is None else f"{h['value']:.1f}"
+            print(f"overall ({len(h['runs'])} runs, n={h['count']}, cached={h['cached']} excluded): "
+                  f"p{args.q:g} {args.metric} = {overall}")
+        elif args.command == "sql":
+            for row in db.query(args.statement):
+                print(json.dumps(row, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
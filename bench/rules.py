@@ -0,0 +1,619 @@
+"""
+評価ルールのコンパイル。
+
+スイートの evaluation / eval（dict）を一度だけ CompiledRule に変換し、キーワードの正規化・
+正規表現のコンパイル・alternatives の組み立てを前もって済ませておく。evaluate_result は
+compile_rule(rule).evaluate(...) の薄いラッパーで、判定結果と details は従来と同じ。
+
+- キーワードの多い contains_all / contains_any は Aho–Corasick で応答を1回走査して判定する
+- compile_rule は rule の内容をキーに結果をキャッシュする。スイートを読み込んだとき（SUITE_CACHE に
+  入れるとき）に compile_suite_rules で一度だけ作っておき、キャッシュから復元したスイートはそれを使う
+  （ディスクのキャッシュから復元した新しいプロセスでは、各ルールを最初に評価するときにコンパイルする）。
+  dict がその場で書き換えられていれば、書き換え後の内容で引き直す
+- expected / keywords / pattern などの文字列の値は str にそろえる（YAML の `expected: 828` や `keywords: [1, 2]`）
+- 不正な正規表現などは従来どおり評価時にエラーになる（コンパイル時には例外を投げない。
+  想定外の値でコンパイルに失敗したルールも、そのケースの評価時に不合格とエラー理由を返す）
+"""
+import copy
+import json
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from bench.similarity import compile_pattern, levenshtein_ratio
+except ImportError:
+    from similarity import compile_pattern, levenshtein_ratio
+
+_LOOSE_RE = re.compile(r'[\s\.,!?;:、。！？；：「」『』（）\(\)\[\]【】{}<>＜＞"\'`]')
+_FENCE_RE = re.compile(r"```(?:json)?\s*([\s\S]*?)\s*```", re.IGNORECASE)
+_JSON_START_RE = re.compile(r"[\{\[]")
+_NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+# この数以上のキーワードは Aho–Corasick でまとめて探す（純 Python の走査なので、少ないうちは `in` の方が速い）
+AHO_CORASICK_MIN_KEYWORDS = 128
+# compile_rule のキャッシュ件数
+RULE_CACHE_SIZE = 8192
+
+_REGEX_FLAGS = {"IGNORECASE": re.IGNORECASE, "MULTILINE": re.MULTILINE, "DOTALL": re.DOTALL}
+
+
+# --- 正規化・抽出 ---
+
+def _normalize_basic(text: str) -> str:
+    return unicodedata.normalize("NFKC", (text or "")).casefold().strip()
+
+
+def _normalize_loose(text: str) -> str:
+    """
+    句読点・空白類を落として比較したい用途向け（日本語にも効く）。
+    """
+    return _LOOSE_RE.sub('', _normalize_basic(text))
+
+
+def _normalize(text: str, mode: str) -> str:
+    return _normalize_loose(text) if mode == "loose" else _normalize_basic(text)
+
+
+@lru_cache(maxsize=4096)
+def _normalize_fuzzy(text: str, mode: str = "basic") -> str:
+    """fuzzy_match の期待値側の正規化。"""
+    return _normalize(text.strip(), mode)
+
+
+def _extract_first_json(text: str):
+    """
+    文字列から最初にパース可能な JSON (object/array) を抽出して返す。
+    見つからない場合は (None, reason) を返す。
+    """
+    if not text:
+        return None, "空文字"
+
+    # fenced code block
+    fence = _FENCE_RE.search(text)
+    candidates = []
+    if fence:
+        candidates.append(fence.group(1).strip())
+    candidates.append(text)
+
+    decoder = json.JSONDecoder()
+    for cand in candidates:
+        for m in _JSON_START_RE.finditer(cand):
+            s = cand[m.start():].lstrip()
+            try:
+                obj, _end = decoder.raw_decode(s)
+                return obj, ""
+            except Exception:
+                continue
+    return None, "JSONを検出できません"
+
+
+def _extract_first_number(text: str, extract_regex=None):
+    """
+    テキストから数値を抽出する。見つからない場合は None。
+    extract_regex は文字列でもコンパイル済みパターンでもよい。
+    """
+    if not text:
+        return None
+    src = text
+    if extract_regex:
+        m = (extract_regex.search(src) if isinstance(extract_regex, re.Pattern)
+             else re.search(extract_regex, src, re.MULTILINE))
+        if not m:
+            return None
+        src = m.group(0)
+
+    src = src.replace(",", "")
+    nums = _NUMBER_RE.findall(src)
+    if not nums:
+        return None
+    try:
+        return float(nums[0])
+    except Exception:
+        return None
+
+
+# --- キーワード検索 ---
+
+class AhoCorasick:
+    """複数キーワードの出現を1回の走査で調べるオートマトン。"""
+
+    def __init__(self, keywords: Sequence[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        outputs: List[List[int]] = [[]]
+        for idx, kw in enumerate(keywords):
+            node = 0
+            for ch in kw:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outputs.append([])
+                node = nxt
+            outputs[node].append(idx)
+
+        # 幅優先で失敗遷移を張り、出力を失敗先から引き継ぐ
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                outputs[nxt].extend(outputs[self._fail[nxt]])
+        self._out = [tuple(o) for o in outputs]
+        self._empty = tuple(outputs[0])  # 空文字のキーワードは常に見つかる
+
+    def find(self, text: str) -> set:
+        """text に含まれるキーワードの添字集合を返す。"""
+        found = set(self._empty)
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class KeywordSet:
+    """正規化済みキーワードの集合。多いときは Aho–Corasick、少ないときは `in` で調べる。"""
+
+    def __init__(self, normalized: Sequence[str]):
+        self.keywords = tuple(normalized)
+        self._automaton = AhoCorasick(self.keywords) if len(self.keywords) >= AHO_CORASICK_MIN_KEYWORDS else None
+
+    def present(self, haystack: str) -> List[bool]:
+        if self._automaton is None:
+            return [k in haystack for k in self.keywords]
+        found = self._automaton.find(haystack)
+        return [i in found for i in range(len(self.keywords))]
+
+
+# --- コンパイル済みルール ---
+
+def _text(value) -> str:
+    """ルールの文字列の値（YAML では数値になりうる）を str にそろえる。None は空文字。"""
+    return '' if value is None else str(value)
+
+
+def _texts(values) -> list:
+    return [_text(v) for v in values or []]
+
+
+def _alternatives(rule: dict, key: str) -> list:
+    """rule[key] を先頭に置いた alternatives（元の rule は変更しない）。"""
+    head = _text(rule.get(key, ''))
+    alternatives = _texts(rule.get('alternatives', [head]))
+    if head and head not in alternatives:
+        alternatives.insert(0, head)
+    return alternatives
+
+
+def _compile_regex(pattern, flags):
+    """コンパイルできない場合は文字列のまま返し、評価時に従来どおりエラーにする。"""
+    try:
+        return re.compile(pattern, flags)
+    except (re.error, TypeError):
+        return pattern
+
+
+# semantic_match の LLM ジャッジに送るプロンプト（judge.JudgePipeline でも1件ずつ判定し直す際に使う）
+JUDGE_PROMPT = """以下の回答が正しいかどうかを判定してください。
+
+【期待される回答】
+{expected}
+
+【実際の回答】
+"{response}"
+
+【判定ルール】
+- 意味が同じであれば正解（表現の違いは許容）
+- 余分な説明があっても、核心部分が正しければ正解
+- 明らかに間違っている場合は不正解
+
+【回答形式】
+1行目に "PASS" または "FAIL" のみを記載
+2行目に理由を簡潔に記載"""
+
+
+def judge_expected_text(alternatives) -> str:
+    return " または ".join(f'"{a}"' for a in list(alternatives)[:3])
+
+
+def parse_judge_verdict(text):
+    """JUDGE_PROMPT の応答（1行目 PASS/FAIL、2行目以降が理由）を (passed, reason) にする。"""
+    text = (text or "").strip()
+    first_line = text.split('\n')[0].strip().upper()
+    reason_lines = text.split('\n')[1:] if '\n' in text else []
+    reason = ' '.join(reason_lines).strip() if reason_lines else 'LLMジャッジ判定'
+    return 'PASS' in first_line, reason
+
+
+class CompiledRule:
+    """
+    1つの評価ルールをコンパイルしたもの。evaluate() は evaluate_result と同じ (passed, details) を返す。
+    """
+
+    def __init__(self, rule: dict):
+        self.rule = rule
+        self.eval_type = rule.get('type')
+        self.normalize_mode = rule.get('normalize', 'basic')
+        self._fallback: Optional["CompiledRule"] = None
+        self._error: Optional[Exception] = None
+        self._compile_error: Optional[Exception] = None
+        compile_fn = getattr(self, f"_compile_{self.eval_type}", None)
+        if compile_fn is not None:
+            try:
+                compile_fn(rule)
+            except Exception as e:
+                # スイート全体の読み込みを止めないよう、このルールを評価するときに報告する
+                self._compile_error = e
+
+    def evaluate(self, response_text, llm_client=None, judge_model=None):
+        details = {
+            'eval_type': self.eval_type,
+            'matched': None,
+            'reason': ''
+        }
+        evaluate_fn = getattr(self, f"_eval_{self.eval_type}", None)
+        if evaluate_fn is None:
+            details['reason'] = f'不明な評価タイプ: {self.eval_type}'
+            return False, details
+        if self._compile_error is not None:
+            details['reason'] = f'評価ルールのエラー: {str(self._compile_error)[:50]}'
+            return False, details
+        return evaluate_fn(response_text, details, llm_client, judge_model)
+
+    # exact_match: 完全一致
+    def _compile_exact_match(self, rule):
+        self.alternatives = _alternatives(rule, 'expected')
+        self.stripped = [alt.strip() for alt in self.alternatives]
+        self.expected = _text(rule.get('expected', ''))
+
+    def _eval_exact_match(self, response_text, details, *_):
+        text = response_text.strip()
+        for alt, stripped in zip(self.alternatives, self.stripped):
+            if text == stripped:
+                details['matched'] = alt
+                details['reason'] = f'完全一致: "{alt}"'
+                return True, details
+        details['reason'] = f'期待値: {self.alternatives[0] if self.alternatives else self.expected}'
+        return False, details
+
+    # normalized_contains: 正規化して部分一致（句読点・空白・大小文字を無視）
+    def _compile_normalized_contains(self, rule):
+        self.alternatives = _alternatives(rule, 'expected')
+        self.normalized = [_normalize_loose(alt) for alt in self.alternatives]
+
+    def _eval_normalized_contains(self, response_text, details, *_):
+        norm_response = _normalize_loose(response_text)
+        for alt, norm_alt in zip(self.alternatives, self.normalized):
+            if norm_alt in norm_response:
+                details['matched'] = alt
+                details['reason'] = f'正規化一致: "{alt}"'
+                return True, details
+        details['reason'] = f'正規化後も不一致: 期待="{self.alternatives[0]}"'
+        return False, details
+
+    # fuzzy_match: 曖昧一致（レーベンシュタイン距離）
+    def _compile_fuzzy_match(self, rule):
+        self.threshold = rule.get('threshold', 0.8)  # 80%以上の類似度で合格
+        self.alternatives = _alternatives(rule, 'expected')
+        self.patterns = []
+        for alt in self.alternatives:
+            alt_clean = _normalize_fuzzy(alt, self.normalize_mode)
+            self.patterns.append((alt_clean, compile_pattern(alt_clean)))
+
+    def _eval_fuzzy_match(self, response_text, details, *_):
+        response_clean = _normalize(response_text.strip(), self.normalize_mode)
+        best_ratio = 0
+        best_match = None
+        for alt, (alt_clean, pattern) in zip(self.alternatives, self.patterns):
+            # 現在の最良値に届かない候補は途中で打ち切る（最良値と一致する候補は採用しないので結果は変わらない）
+            ratio = levenshtein_ratio(response_clean, alt_clean, score_cutoff=best_ratio, pattern=pattern)
+            if ratio > best_ratio:
+                best_ratio = ratio
+                best_match = alt
+            if best_ratio >= 1.0:
+                break
+
+        threshold = self.threshold
+        if best_ratio >= threshold:
+            details['matched'] = best_match
+            details['reason'] = f'曖昧一致: {best_ratio*100:.1f}% (閾値: {threshold*100:.0f}%)'
+            return True, details
+        details['reason'] = f'類似度不足: {best_ratio*100:.1f}% < {threshold*100:.0f}%'
+        return False, details
+
+    # semantic_match: LLMによる意味的判定（使えない場合は fuzzy_match にフォールバック）
+    def _compile_semantic_match(self, rule):
+        self.expected = _text(rule.get('expected', ''))
+        self.alternatives = _texts(rule.get('alternatives', []))
+        if self.expected:
+            self.alternatives = [self.expected] + self.alternatives
+        self._fallback = CompiledRule({**rule, 'type': 'fuzzy_match', 'threshold': 0.7})
+
+    def _eval_semantic_match(self, response_text, details, llm_client, judge_model):
+        if not llm_client or not judge_model:
+            return self._fallback.evaluate(response_text)
+
+        try:
+            judge_response = llm_client.chat.completions.create(
+                model=judge_model,
+                messages=[{"role": "user", "content": JUDGE_PROMPT.format(
+                    expected=judge_expected_text(self.alternatives), response=response_text.strip())}],
+                max_tokens=100,
+                temperature=0
+            )
+            passed, reason = parse_judge_verdict(judge_response.choices[0].message.content)
+
+            if passed:
+                details['matched'] = self.expected
+                details['reason'] = f'意味一致: {reason}'
+                return True, details
+            details['reason'] = f'意味不一致: {reason}'
+            return False, details
+        except Exception:
+            # エラー時はfuzzy_matchにフォールバック
+            return self._fallback.evaluate(response_text)
+
+    def _haystack(self, response_text):
+        return _normalize(response_text, self.normalize_mode)
+
+    # contains_all: 全キーワード含む
+    def _compile_contains_all(self, rule):
+        self.keywords = _texts(rule.get('keywords', []))
+        self.keyword_set = KeywordSet([_normalize(k, self.normalize_mode) for k in self.keywords])
+
+    def _eval_contains_all(self, response_text, details, *_):
+        present = self.keyword_set.present(self._haystack(response_text))
+        missing = [k for k, ok in zip(self.keywords, present) if not ok]
+        if not missing:
+            details['matched'] = list(self.keywords)
+            details['reason'] = f'全キーワード検出: {self.keywords}'
+            return True, details
+        details['reason'] = f'未検出キーワード: {missing}'
+        return False, details
+
+    # contains_any: いずれかのキーワード（keyword_sets があればいずれかのセット全部）を含む
+    def _compile_contains_any(self, rule):
+        self.keyword_sets = [_texts(kw_set) for kw_set in rule.get('keyword_sets', [])]
+        self.keywords = _texts(rule.get('keywords', []))
+        if self.keyword_sets:
+            # 全セットのキーワードを1つの集合にまとめ、各セットはその添字で判定する
+            flat = []
+            index = {}
+            self.set_indices = []
+            for kw_set in self.keyword_sets:
+                ids = []
+                for k in kw_set:
+                    norm = _normalize(k, self.normalize_mode)
+                    if norm not in index:
+                        index[norm] = len(flat)
+                        flat.append(norm)
+                    ids.append(index[norm])
+                self.set_indices.append(ids)
+            self.keyword_set = KeywordSet(flat)
+        else:
+            self.keyword_set = KeywordSet([_normalize(k, self.normalize_mode) for k in self.keywords])
+
+    def _eval_contains_any(self, response_text, details, *_):
+        present = self.keyword_set.present(self._haystack(response_text))
+        if self.keyword_sets:
+            for kw_set, ids in zip(self.keyword_sets, self.set_indices):
+                if all(present[i] for i in ids):
+                    details['matched'] = list(kw_set)
+                    details['reason'] = f'キーワードセット検出: {kw_set}'
+                    return True, details
+            details['reason'] = f'いずれのキーワードセットも未検出'
+            return False, details
+
+        found = [k for k, ok in zip(self.keywords, present) if ok]
+        if found:
+            details['matched'] = found
+            details['reason'] = f'キーワード検出: {found}'
+            return True, details
+        details['reason'] = f'いずれのキーワードも未検出: {self.keywords}'
+        return False, details
+
+    # json_parse: JSON形式チェック
+    def _compile_json_parse(self, rule):
+        self.must_have = _texts(rule.get('must_have_keys', []))
+
+    def _eval_json_parse(self, response_text, details, *_):
+        try:
+            data, reason = _extract_first_json(response_text)
+            if data is None:
+                details['reason'] = f'JSON抽出失敗: {reason}'
+                return False, details
+            must_have = self.must_have
+
+            if isinstance(data, list):
+                if must_have:
+                    details['reason'] = f'JSON配列のためキー検証不可: 必須={must_have}'
+                    return False, details
+                details['matched'] = f"list(len={len(data)})"
+                details['reason'] = 'JSONパース成功（配列）'
+                return True, details
+
+            if not isinstance(data, dict):
+                details['reason'] = f'JSON形式が想定外: {type(data).__name__}'
+                return False, details
+
+            missing_keys = [k for k in must_have if k not in data]
+            if not missing_keys:
+                details['matched'] = list(data.keys())
+                details['reason'] = f'JSONパース成功、必須キー: {must_have}'
+                return True, details
+            details['reason'] = f'不足キー: {missing_keys}'
+            return False, details
+        except Exception as e:
+            details['reason'] = f'エラー: {str(e)[:50]}'
+            return False, details
+
+    # numeric: 数値比較（許容誤差あり）
+    def _compile_numeric(self, rule):
+        extract_regex = rule.get('extract_regex')
+        self.extract_regex = _compile_regex(extract_regex, re.MULTILINE) if extract_regex else None
+        try:
+            if 'expected_range' in rule:
+                lo, hi = rule.get('expected_range', [None, None])
+                self.range = (float(lo), float(hi))
+            else:
+                self.range = None
+                self.expected = float(rule.get('expected'))
+                tolerance = float(rule.get('tolerance', 0))
+                rel_tol = float(rule.get('relative_tolerance', 0))
+                self.allowed = max(tolerance, abs(self.expected) * rel_tol)
+        except Exception as e:
+            # 数値が見つからない場合の判定を優先するため、エラーは評価時に報告する
+            self._error = e
+
+    def _eval_numeric(self, response_text, details, *_):
+        try:
+            val = _extract_first_number(response_text, extract_regex=self.extract_regex)
+            if val is None:
+                details['reason'] = '数値が見つかりません'
+                return False, details
+            if self._error is not None:
+                raise self._error
+
+            if self.range is not None:
+                lo, hi = self.range
+                if lo <= val <= hi:
+                    details['matched'] = val
+                    details['reason'] = f'数値が範囲内: {val} (期待: {lo}..{hi})'
+                    return True, details
+                details['reason'] = f'数値が範囲外: {val} (期待: {lo}..{hi})'
+                return False, details
+
+            expected, allowed = self.expected, self.allowed
+            if abs(val - expected) <= allowed:
+                details['matched'] = val
+                details['reason'] = f'数値一致: {val} (期待値: {expected}±{allowed})'
+                return True, details
+            details['reason'] = f'数値不一致: {val} ≠ {expected}'
+            return False, details
+        except Exception as e:
+            details['reason'] = f'数値評価エラー: {str(e)[:50]}'
+            return False, details
+
+    # regex_match: 正規表現の部分一致（MULTILINE | IGNORECASE）
+    def _compile_regex_match(self, rule):
+        self.patterns = [_compile_regex(p, re.MULTILINE | re.IGNORECASE) for p in _alternatives(rule, 'pattern')]
+
+    def _eval_regex_match(self, response_text, details, *_):
+        for pat in self.patterns:
+            match = (pat.search(response_text) if isinstance(pat, re.Pattern)
+                     else re.search(pat, response_text, re.MULTILINE | re.IGNORECASE))
+            if match:
+                details['matched'] = match.group(0)
+                details['reason'] = f'パターン一致: "{match.group(0)}"'
+                return True, details
+        details['reason'] = f'パターン不一致'
+        return False, details
+
+    # regex_fullmatch: 正規表現の完全一致（flags: IGNORECASE / MULTILINE / DOTALL）
+    def _compile_regex_fullmatch(self, rule):
+        self.flags = 0
+        for f in rule.get('flags', []) or []:
+            self.flags |= _REGEX_FLAGS.get(f, 0)
+        self.patterns = [_compile_regex(p, self.flags) for p in _alternatives(rule, 'pattern')]
+
+    def _eval_regex_fullmatch(self, response_text, details, *_):
+        text = response_text.strip()
+        for pat in self.patterns:
+            m = pat.fullmatch(text) if isinstance(pat, re.Pattern) else re.fullmatch(pat, text, flags=self.flags)
+            if m:
+                details['matched'] = m.group(0)
+                details['reason'] = '完全一致（正規表現）'
+                return True, details
+        details['reason'] = '完全一致（正規表現）に失敗'
+        return False, details
+
+
+_cache_lock = threading.Lock()
+# 内容（正規化した JSON）→ コンパイル結果。同じ内容のルールは、別の dict でも1回だけコンパイルする
+_compiled: "OrderedDict[str, CompiledRule]" = OrderedDict()
+# id(rule) → (コンパイル時のコピー, コンパイル結果)。評価のたびに内容のキーを作らないための近道
+_by_id: "OrderedDict[int, Tuple[dict, CompiledRule]]" = OrderedDict()
+
+
+def _content_key(rule: dict) -> str:
+    try:
+        return json.dumps(rule, sort_keys=True, ensure_ascii=False, default=repr)
+    except TypeError:  # str 以外のキーが混ざっていて並べられない
+        return repr(rule)
+
+
+def _remember(cache: OrderedDict, key, value) -> None:
+    cache[key] = value
+    while len(cache) > RULE_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def _compile_content(rule: dict) -> CompiledRule:
+    """rule の内容をキーにコンパイル結果を返す（なければコピーからコンパイルして覚える）。"""
+    key = _content_key(rule)
+    with _cache_lock:
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            _compiled.move_to_end(key)
+            return compiled
+    compiled = CompiledRule(copy.deepcopy(rule))
+    with _cache_lock:
+        compiled = _compiled.get(key, compiled)  # 他のスレッドが先にコンパイルしていればそちらにそろえる
+        _remember(_compiled, key, compiled)
+    return compiled
+
+
+def compile_rule(rule) -> CompiledRule:
+    """
+    rule dict をコンパイルする。コンパイル結果は rule の内容で共有するので、スイートをキャッシュから
+    復元するたびに dict が新しくなってもコンパイルし直さない。
+    同じ dict の2回目以降は id から引き、コンパイル時のコピーと一致するか（C の dict 比較）だけを確かめる。
+    dict 自体は保持しないので、id が別の dict に再利用されても、内容が同じときにしか一致しない。
+    その場で書き換えられた dict は内容のキーから引き直す。
+    """
+    if isinstance(rule, CompiledRule):
+        return rule
+    rule = rule or {}
+    key = id(rule)
+    with _cache_lock:
+        hit = _by_id.get(key)
+        if hit is not None and hit[0] == rule:
+            _by_id.move_to_end(key)
+            return hit[1]
+    compiled = _compile_content(rule)
+    with _cache_lock:
+        _remember(_by_id, key, (compiled.rule, compiled))
+    return compiled
+
+
+def compile_suite_rules(suite: dict) -> int:
+    """
+    スイート内の全ルール（case.eval / variant.evaluation）を内容のキャッシュにコンパイルし、件数を返す。
+    id の近道は作らない（キャッシュから復元したスイートは使い捨てなので、評価したルールの分だけで足りる）。
+    """
+    count = 0
+    for case in suite.get("cases", []) if isinstance(suite, dict) else []:
+        if not isinstance(case, dict):
+            continue
+        rules = [case.get("eval")] + [v.get("evaluation") for v in case.get("variants") or [] if isinstance(v, dict)]
+        for rule in rules:
+            if isinstance(rule, dict):
+                _compile_content(rule)
+                count += 1
+    return count
@@ -0,0 +1,91 @@
+"""
+Web UI サーバーのジョブランナー。
+
+ジョブ（run_bm_task / run_load_task）をキューに積み、専用のワーカースレッドで実行する。
+FastAPI の BackgroundTasks はリクエスト処理と同じスレッドプールを使うため、モデルのロード待ちや
+ベンチマーク本体が長時間スレッドを占有すると、状態取得や /api/models まで詰まってしまう。
+ランナーは独立したスレッドで最大 max_parallel 件ずつ実行し、残りは queued のまま待たせる。
+
+- BENCH_MAX_PARALLEL_JOBS: 同時に実行するジョブ数（既定 1）
+"""
+import os
+import queue
+import threading
+import traceback
+from typing import Callable, List
+
+
+class JobRunner:
+    """ジョブストアと連携する FIFO ジョブキュー。"""
+
+    def __init__(self, store, max_parallel: int = 1):
+        self.store = store
+        self.max_parallel = max(1, int(max_parallel))
+        self._queue: "queue.Queue" = queue.Queue()
+        self._workers: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending: List[str] = []  # queued の job_id（投入順）
+        self._running: List[str] = []
+
+    def submit(self, job_id: str, fn: Callable, *args, **kwargs) -> int:
+        """
+        ジョブをキューに積み、待ち順（0 = すぐに実行される）を返す。
+        ジョブは store 上で queued になり、ワーカーが取り出した時点で running になる。
+        """
+        with self._lock:
+            position = max(0, len(self._pending) + len(self._running) - self.max_parallel + 1)
+            self._pending.append(job_id)
+            self._ensure_workers()
+        self.store.update(job_id, status="queued")
+        self._queue.put((job_id, fn, args, kwargs))
+        return position
+
+    def _ensure_workers(self):
+        # 呼び出し側で self._lock を保持していること
+        self._workers = [t for t in self._workers if t.is_alive()]
+        while len(self._workers) < self.max_parallel:
+            t = threading.Thread(target=self._worker, name=f"job-runner-{len(self._workers)}", daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def _worker(self):
+        while True:
+            job_id, fn, args, kwargs = self._queue.get()
+            with self._lock:
+                self._pending.remove(job_id)
+                self._running.append(job_id)
+            try:
+                self._run(job_id, fn, args, kwargs)
+            finally:
+                with self._lock:
+                    self._running.remove(job_id)
+                    self._idle.notify_all()
+                self._queue.task_done()
+
+    def _run(self, job_id, fn, args, kwargs):
+        if self.store.is_cancelled(job_id):
+            # 待機中にキャンセルされたジョブは実行しない
+            self.store.update(job_id, status="cancelled")
+            return
+        self.store.update(job_id, status="running")
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            # ジョブ関数は自前で failed にするが、想定外の例外でもワーカーは止めない
+            self.store.append_log(job_id, "error", f"エラー: {e}\n{traceback.format_exc()}")
+            self.store.update(job_id, status="failed")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"max_parallel": self.max_parallel, "running": list(self._running), "queued": list(self._pending)}
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """キューが空になり実行中のジョブがなくなるまで待つ（テスト・終了処理用）。"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending and not self._running, timeout)
+
+
+def create_job_runner(store) -> JobRunner:
+    """環境変数に従ってジョブランナーを作る。"""
+    return JobRunner(store, max_parallel=int(os.environ.get("BENCH_MAX_PARALLEL_JOBS", "1")))
@@ -0,0 +1,62 @@
+"""
+モデルのロード計画（Web UI サーバー用）。
+
+- order_models: すでにロード済みのモデルを先頭に回して、ロード/アンロードの回数を減らす
+- model_sizes_from_lms_ls: `lms ls --json` の出力からモデルごとのサイズ（バイト）を取る
+- can_preload: 現在のモデルと次のモデルが同時にメモリ予算へ収まるか判定する
+- readiness_delays: ロード完了確認のポーリング間隔（指数バックオフ）
+
+ロード時間そのものの計測は server.py の load_model / unload_model が行い、
+結果レコードの model_load に記録する。
+"""
+import json
+from typing import Dict, Iterable, Iterator, List, Optional
+
+GIB = 1024 ** 3
+
+
+def order_models(models: List[str], loaded_ids: Iterable[str]) -> List[str]:
+    """
+    ロード済みのモデルを先頭に移す（それ以外は指定順のまま）。
+    最初のモデルでロードが不要になり、直前のジョブの状態をそのまま使える。
+    """
+    loaded = set(loaded_ids or [])
+    head = [m for m in models if m in loaded]
+    tail = [m for m in models if m not in loaded]
+    return head + tail
+
+
+def model_sizes_from_lms_ls(output: str) -> Dict[str, int]:
+    """`lms ls --json` の出力を {model_key: sizeBytes} にする。読めなければ空 dict。"""
+    try:
+        items = json.loads(output)
+    except (TypeError, ValueError):
+        return {}
+    sizes = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or not item.get("sizeBytes"):
+            continue
+        for key in ("modelKey", "path", "id"):
+            if item.get(key):
+                sizes[item[key]] = int(item["sizeBytes"])
+    return sizes
+
+
+def can_preload(current_id: str, next_id: str, sizes: Dict[str, int], budget_gb: Optional[float]) -> bool:
+    """
+    current と next を同時にロードしても budget_gb（GiB）に収まるなら True。
+    予算未設定、またはどちらかのサイズが不明な場合は安全側に倒して False。
+    """
+    if not budget_gb or current_id not in sizes or next_id not in sizes:
+        return False
+    return sizes[current_id] + sizes[next_id] <= budget_gb * GIB
+
+
+def readiness_delays(total_sec: float = 60.0, first: float = 0.05, cap: float = 1.0) -> Iterator[float]:
+    """ロード完了確認の待ち時間列。最初は短く、cap まで倍々に伸ばし、合計 total_sec で打ち切る。"""
+    elapsed = 0.0
+    delay = first
+    while elapsed < total_sec:
+        yield delay
+        elapsed += delay
+        delay = min(cap, delay * 2)
@@ -1,6 +1,7 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import uuid
 from typing import Optional, List, Dict, Any
@@ -10,44 +11,129 @@ from pathlib import Path
 import httpx
 import traceback
 import re
+import asyncio
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 
 # Fix imports to work from both root and bench dir
 try:
+    from bench.load import run_load
     from bench.main import (
         run_bench_logic,
+        run_bench_distributed,
         load_suite,
+        load_suite_with_etag,
         get_models as get_models_sync,
         resolve_suite_asset_paths,
         expected_total_results,
+        request_params,
+        load_journal,
+        build_resume_state,
     )
+    from bench.cache import ResponseCache, resolve_cache_mode
+    from bench.jobstore import create_job_store
+    from bench.runner import create_job_runner
+    from bench.scheduler import order_models, model_sizes_from_lms_ls, can_preload, readiness_delays
+    from bench.suitecache import SUITE_CACHE
+    from bench.resultsdb import create_results_db
+    from bench.prefix import resolve_prefix_order
+    from bench.earlystop import resolve_early_stop
+    from bench.transport import AsyncRunner, shared_async_client
+    from bench.sse import resolve_stream_backend
 except ImportError:
+    from load import run_load
     from main import (
         run_bench_logic,
+        run_bench_distributed,
         load_suite,
+        load_suite_with_etag,
         get_models as get_models_sync,
         resolve_suite_asset_paths,
         expected_total_results,
+        request_params,
+        load_journal,
+        build_resume_state,
     )
+    from cache import ResponseCache, resolve_cache_mode
+    from jobstore import create_job_store
+    from runner import create_job_runner
+    from scheduler import order_models, model_sizes_from_lms_ls, can_preload, readiness_delays
+    from suitecache import SUITE_CACHE
+    from resultsdb import create_results_db
+    from prefix import resolve_prefix_order
+    from earlystop import resolve_early_stop
+    from transport import AsyncRunner, shared_async_client
+    from sse import resolve_stream_backend
 
 app = FastAPI()
 
 # Make sure static dir exists
 BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / "static"
+CACHE_DIR = BASE_DIR / "out" / "cache"
+JOURNAL_DIR = BASE_DIR / "out" / "jobs"  # ジョブごとの結果ジャーナル（再開用）
 os.makedirs(STATIC_DIR, exist_ok=True)
 
-# State
-JOBS = {}
+# SSE: ストアを読みに行く間隔と、無通信時に送るハートビートの間隔（秒）
+EVENTS_POLL_SEC = 0.25
+EVENTS_HEARTBEAT_SEC = 15.0
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+# State（ジョブストア。既定は SQLite で、再起動後・複数ワーカー間でも共有される）
+JOBS = create_job_store(BASE_DIR)
+# ジョブはリクエスト処理のスレッドプールではなく、専用ランナーのキューで実行する
+RUNNER = create_job_runner(JOBS)
+# 結果DB（ジョブ ID を run_id として結果を蓄積する。BENCH_RESULTS_DB=off で無効）
+RESULTS_DB = create_results_db(BASE_DIR / "out")
+# GPU 上のモデルは常に1つなので、並列ジョブでも「ロード〜実行〜アンロード」は1つずつ行う
+MODEL_LOCK = threading.RLock()
+
+class EndpointSpec(BaseModel):
+    base_url: str
+    capacity: int = 1  # このエンドポイントで同時に処理する (モデル, ケース) の数
+
 
 class BenchRequest(BaseModel):
     suite_path: str = "bench/suite.yaml"
     base_url: str = "http://localhost:1234/v1"
     models: List[str] = []  # Explicit list of model IDs
     runs: int = 1
-    warmup: int = 0
+    warmup: int = 0  # モデルごとのウォームアップの上限件数（直近の E2E が安定したら打ち切る）
+    warmup_cv: Optional[float] = None  # 安定とみなす変動係数（None なら meta.warmup_cv、なければ 0.10）
+    warmup_window: Optional[int] = None  # 変動係数を計算する直近の件数（None なら meta.warmup_window、なければ 3）
     timeout: int = 60
+    http_retries: Optional[int] = None  # 接続エラー・429/5xx のリトライ回数（None なら meta.http_retries、なければ 2）
+    http_max_connections: Optional[int] = None  # 接続プールの上限（None なら meta.http_max_connections、なければ 64）
+    stream_backend: Optional[str] = None  # ストリーミングの読み方: sdk | raw（None なら meta.stream_backend、なければ sdk）
     use_llm_judge: bool = False  # LLMジャッジを使用するか
     judge_model: Optional[str] = None  # ジャッジに使用するモデル（Noneの場合はテスト対象と同じ）
+    judge_base_url: Optional[str] = None  # ジャッジのエンドポイント（Noneの場合は base_url。分散実行では各エンドポイント）
+    concurrency: Optional[int] = None  # 同時リクエスト数（Noneの場合は suite の meta.concurrency、なければ 1）
+    cache: str = "auto"  # レスポンスキャッシュ: auto | read | write | off
+    prefix_order: Optional[str] = None  # variants の実行順: suite | grouped | random | interleaved（None なら meta.prefix_order）
+    early_stop: Optional[str] = None  # variants ケースの逐次判定: off | deterministic | sprt（None なら meta.early_stop、なければ off）
+    reorder_models: bool = True  # ロード済みのモデルから実行してロード回数を減らす
+    preload_next: bool = False  # 評価中に次のモデルを先読みロードする（memory_budget_gb に収まる場合のみ）
+    memory_budget_gb: Optional[float] = None  # 同時ロードを許すモデルサイズ合計（GiB）
+    # 指定すると base_url の代わりに複数のエンドポイントへ作業を分配する（coordinator モード）。
+    # モデルのロード/アンロードは行わないので、各エンドポイントで対象モデルを使える状態にしておくこと
+    endpoints: List[EndpointSpec] = []
+
+
+class LoadRequest(BaseModel):
+    suite_path: str = "bench/suite.yaml"
+    base_url: str = "http://localhost:1234/v1"
+    model: str
+    mode: str = "closed"  # closed（仮想ユーザー数）| open（ポアソン到着のQPS）
+    levels: List[float] = [1, 2, 4, 8]
+    duration_sec: float = 30.0  # 1レベルあたりの計測時間
+    max_requests_per_level: Optional[int] = None
+    timeout: int = 60
+    slo_ttft_p90_ms: Optional[float] = None
+    slo_e2e_p90_ms: Optional[float] = None
+    slo_error_rate: Optional[float] = None
 
 
 @app.get("/api/models")
@@ -60,27 +146,27 @@ async def get_models(base_url: str = "http://localhost:1234/v1"):
         # Use LM Studio's native REST API for richer info
         api_v0_url = base_url.replace("/v1", "/api/v0/models")
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(api_v0_url)
-            
-            if resp.status_code == 200:
-                data = resp.json()
-                models = []
-                for m in data.get("data", []):
-                    # Filter out embedding models
-                    if m.get("type") == "embeddings":
-                        continue
-                    models.append({
-                        "id": m.get("id"),
-                        "type": m.get("type", "llm"),  # llm or vlm
-                        "state": m.get("state", "not-loaded"),
-                        "quantization": m.get("quantization"),
-                        "arch": m.get("arch")
-                    })
-                return {"models": models}
-            else:
-                # Fallback to OpenAI-compatible endpoint
-                return await get_models_fallback(base_url)
+        client = shared_async_client()
+        resp = await client.get(api_v0_url)
+
+        if resp.status_code == 200:
+            data = resp.json()
+            models = []
+            for m in data.get("data", []):
+                # Filter out embedding models
+                if m.get("type") == "embeddings":
+                    continue
+                models.append({
+                    "id": m.get("id"),
+                    "type": m.get("type", "llm"),  # llm or vlm
+                    "state": m.get("state", "not-loaded"),
+                    "quantization": m.get("quantization"),
+                    "arch": m.get("arch")
+                })
+            return {"models": models}
+        else:
+            # Fallback to OpenAI-compatible endpoint
+            return await get_models_fallback(base_url)
                 
     except httpx.ConnectError:
         return {"error": "LM Studioに接続できません。サーバーが起動しているか確認してください。", "models": []}
@@ -91,195 +177,468 @@ async def get_models(base_url: str = "http://localhost:1234/v1"):
 async def get_models_fallback(base_url: str):
     """Fallback to OpenAI-compatible /v1/models endpoint"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(f"{base_url}/models")
-            if resp.status_code == 200:
-                data = resp.json()
-                models = []
-                for m in data.get("data", []):
-                    model_id = m.get("id", "")
-                    # Heuristic: VLM detection by name
-                    is_vlm = any(kw in model_id.lower() for kw in ["vl", "vision", "llava", "qwen2-vl"])
-                    models.append({
-                        "id": model_id,
-                        "type": "vlm" if is_vlm else "llm",
-                        "state": "loaded"  # If returned by /v1/models, assume loaded
-                    })
-                return {"models": models}
+        resp = await shared_async_client().get(f"{base_url}/models")
+        if resp.status_code == 200:
+            data = resp.json()
+            models = []
+            for m in data.get("data", []):
+                model_id = m.get("id", "")
+                # Heuristic: VLM detection by name
+                is_vlm = any(kw in model_id.lower() for kw in ["vl", "vision", "llava", "qwen2-vl"])
+                models.append({
+                    "id": model_id,
+                    "type": "vlm" if is_vlm else "llm",
+                    "state": "loaded"  # If returned by /v1/models, assume loaded
+                })
+            return {"models": models}
     except:
         pass
     return {"error": "モデル一覧の取得に失敗しました", "models": []}
 
-def run_lms_command_sync(args: list, timeout: int = 60) -> dict:
-    """Run lms command synchronously and return result dict"""
-    import subprocess
+# lms コマンドの待機中にキャンセルを確認する間隔（秒）
+LMS_CANCEL_POLL_SEC = 0.5
+
+
+async def run_lms_command(args: list, timeout: int = 60, cancel_check=None) -> dict:
+    """
+    Run lms command asynchronously and return result dict
+    待機中は cancel_check を定期的に確認し、キャンセルされたらプロセスを止める。
+    """
     try:
-        result = subprocess.run(
-            args,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            encoding='utf-8',
-            errors='replace',
-            shell=False
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
         )
-        stdout = result.stdout.strip()
-        stderr = result.stderr.strip()
-        
-        if result.returncode == 0:
-            return {"success": True, "output": stdout or "完了"}
-        else:
-            return {"success": False, "output": stderr or stdout or "コマンドが失敗しました"}
-            
-    except subprocess.TimeoutExpired:
-        return {"success": False, "output": "タイムアウト: 処理に時間がかかりすぎています"}
     except FileNotFoundError:
         return {"success": False, "output": "'lms' コマンドが見つかりません。LM Studio CLIをインストールしてください。"}
     except Exception as e:
         return {"success": False, "output": f"エラー: {str(e)}"}
 
+    communicate = asyncio.ensure_future(proc.communicate())
+    deadline = time.monotonic() + timeout
+    try:
+        while not communicate.done():
+            if cancel_check and cancel_check():
+                proc.kill()
+                await communicate
+                return {"success": False, "output": "キャンセルされました"}
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                proc.kill()
+                await communicate
+                return {"success": False, "output": "タイムアウト: 処理に時間がかかりすぎています"}
+            await asyncio.wait({communicate}, timeout=min(LMS_CANCEL_POLL_SEC, remaining))
+        stdout_b, stderr_b = communicate.result()
+    except Exception as e:
+        return {"success": False, "output": f"エラー: {str(e)}"}
+
+    stdout = stdout_b.decode("utf-8", errors="replace").strip()
+    stderr = stderr_b.decode("utf-8", errors="replace").strip()
+    if proc.returncode == 0:
+        return {"success": True, "output": stdout or "完了"}
+    return {"success": False, "output": stderr or stdout or "コマンドが失敗しました"}
 
-def list_models_v0_sync(base_url: str) -> Optional[List[Dict[str, Any]]]:
-    """LM Studio REST API v0 /api/v0/models からモデル一覧を取得（同期）。失敗時は None。"""
+
+async def list_models_v0(base_url: str) -> Optional[List[Dict[str, Any]]]:
+    """LM Studio REST API v0 /api/v0/models からモデル一覧を取得。失敗時は None。"""
     try:
         api_v0_url = base_url.replace("/v1", "/api/v0/models")
-        with httpx.Client(timeout=10.0) as client:
-            resp = client.get(api_v0_url)
-            if resp.status_code != 200:
-                return None
-            data = resp.json()
-            return data.get("data", [])
+        resp = await shared_async_client().get(api_v0_url)
+        if resp.status_code != 200:
+            return None
+        data = resp.json()
+        return data.get("data", [])
     except Exception:
         return None
 
 
-def ensure_single_loaded_model(base_url: str, target_model_id: str, job: dict) -> bool:
+def _is_loaded(models: List[Dict[str, Any]], model_id: str) -> bool:
+    return any(m.get("id") == model_id and m.get("state") == "loaded" for m in models)
+
+
+async def wait_until_loaded(base_url: str, model_id: str, cancel_check=None, total_sec: float = 60.0) -> Optional[bool]:
+    """
+    target がロード済みになるまで待つ。`lms load` は完了まで戻らないので通常は最初の確認で済み、
+    まだなら短い間隔から倍々に伸ばして確認する（1秒固定のポーリングはしない）。
+    Returns: True=ロード済み / False=タイムアウト・キャンセル / None=状態を取得できない
+    """
+    for delay in readiness_delays(total_sec):
+        if cancel_check and cancel_check():
+            return False
+        models = await list_models_v0(base_url)
+        if models is None:
+            return None
+        if _is_loaded(models, model_id):
+            return True
+        await asyncio.sleep(delay)
+    return False
+
+
+async def load_model(base_url: str, model_id: str, log, cancel_check=None) -> Optional[dict]:
+    """
+    model_id をロードして使えるようになるまで待ち、計測値を返す（失敗時は None）。
+    - cold_start: ロードが必要だったか
+    - load_ms:    `lms load` の所要時間
+    - ready_ms:   ロード開始からロード済みを確認するまで（time-to-ready）
+    """
+    start = time.perf_counter()
+    models = await list_models_v0(base_url) or []
+    if _is_loaded(models, model_id):
+        return {"cold_start": False, "load_ms": 0.0, "ready_ms": 0.0}
+
+    log("info", f"ロード: {model_id}（数分かかる場合があります）")
+    r = await run_lms_command(["lms", "load", model_id], timeout=300, cancel_check=cancel_check)
+    load_ms = (time.perf_counter() - start) * 1000
+    if not r.get("success"):
+        log("error", f"ロード失敗: {model_id} ({r.get('output')})")
+        return None
+
+    ready = await wait_until_loaded(base_url, model_id, cancel_check=cancel_check)
+    if ready is False and not (cancel_check and cancel_check()):
+        log("warn", f"ロード確認がタイムアウトしました: {model_id}")
+    ready_ms = (time.perf_counter() - start) * 1000
+    log("info", f"ロード完了: {model_id}（load {load_ms / 1000:.1f}s / ready {ready_ms / 1000:.1f}s）")
+    return {"cold_start": True, "load_ms": load_ms, "ready_ms": ready_ms}
+
+
+async def unload_model(model_id: str, log) -> float:
+    """model_id をアンロードし、所要時間（ms）を返す。"""
+    log("info", f"アンロード: {model_id}")
+    start = time.perf_counter()
+    r = await run_lms_command(["lms", "unload", model_id], timeout=60)
+    if not r.get("success"):
+        log("warn", f"アンロード失敗: {model_id} ({r.get('output')})")
+    return (time.perf_counter() - start) * 1000
+
+
+async def ensure_single_loaded_model(base_url: str, target_model_id: str, log, cancel_check=None) -> Optional[dict]:
     """
     できるだけ「ロード済みは最大1つ」を保証する。
     - 先に他のロード済みモデルをアンロード
     - target が未ロードならロード
-    - 最後に target がロード済みか軽く確認
-    Returns: 成功なら True
+    - 最後に target がロード済みか確認
+    log: function(type, msg) - ジョブログへの出力
+    cancel_check: ロード待ちの途中でもキャンセルできるように定期的に確認する
+    Returns: 成功なら load_model の計測値（+ unload_others_ms）、失敗なら None
     """
-    models = list_models_v0_sync(base_url)
+    unload_ms = 0.0
+    models = await list_models_v0(base_url)
     if models is None:
-        job["logs"].append({"type": "warn", "msg": "モデル状態の取得に失敗しました（/api/v0/models）。単一ロードを完全に保証できない可能性があります。"})
+        log("warn", "モデル状態の取得に失敗しました（/api/v0/models）。単一ロードを完全に保証できない可能性があります。")
     else:
         loaded = [m.get("id") for m in models if m.get("state") == "loaded" and m.get("id")]
         for mid in loaded:
             if mid != target_model_id:
-                job["logs"].append({"type": "info", "msg": f"アンロード: {mid}"})
-                r = run_lms_command_sync(["lms", "unload", mid], timeout=60)
-                if not r.get("success"):
-                    job["logs"].append({"type": "warn", "msg": f"アンロード失敗: {mid} ({r.get('output')})"})
-
-    # load target if needed
-    models_after = list_models_v0_sync(base_url) or []
-    is_loaded = any(m.get("id") == target_model_id and m.get("state") == "loaded" for m in models_after)
-    if not is_loaded:
-        job["logs"].append({"type": "info", "msg": f"ロード: {target_model_id}（数分かかる場合があります）"})
-        r = run_lms_command_sync(["lms", "load", target_model_id], timeout=300)
-        if not r.get("success"):
-            job["logs"].append({"type": "error", "msg": f"ロード失敗: {target_model_id} ({r.get('output')})"})
-            return False
+                unload_ms += await unload_model(mid, log)
+
+    timing = await load_model(base_url, target_model_id, log, cancel_check=cancel_check)
+    if timing is not None:
+        timing["unload_others_ms"] = unload_ms
+    return timing
+
+
+async def plan_models(base_url: str, models: List[str], reorder: bool, need_sizes: bool):
+    """実行順（ロード済みを先頭）と、先読み判定用のモデルサイズを返す。"""
+    ordered = list(models)
+    if reorder:
+        current = await list_models_v0(base_url) or []
+        ordered = order_models(ordered, [m.get("id") for m in current if m.get("state") == "loaded"])
+    sizes = {}
+    if need_sizes:
+        r = await run_lms_command(["lms", "ls", "--json"], timeout=30)
+        if r.get("success"):
+            sizes = model_sizes_from_lms_ls(r["output"])
+    return ordered, sizes
 
-    # best-effort wait until loaded
-    for _ in range(60):  # up to ~60s
-        models_wait = list_models_v0_sync(base_url)
-        if models_wait is None:
-            return True
-        if any(m.get("id") == target_model_id and m.get("state") == "loaded" for m in models_wait):
-            return True
-        import time
-        time.sleep(1)
 
-    job["logs"].append({"type": "warn", "msg": f"ロード確認がタイムアウトしました: {target_model_id}"})
-    return True
+# /api/suite の応答（(suite_path, ETag) -> 応答本体）。スイートが変わると ETag も変わる
+SUITE_INFO_CACHE: Dict[tuple, dict] = {}
+
+
+def _suite_info(suite: dict, suite_path: str) -> dict:
+    # カテゴリ情報を整理
+    cases = suite.get('cases', [])
+    meta = suite.get("meta", {}) or {}
+    
+    # カテゴリ別にテストをグループ化
+    by_category = {}
+    for case in cases:
+        cat_id = case.get('category_id', 'unknown')
+        if cat_id not in by_category:
+            by_category[cat_id] = {
+                'id': cat_id,
+                'name': case.get('category_name', 'Unknown'),
+                'tests': []
+            }
+            by_category[cat_id]['tests'].append({
+                'id': case.get('id'),
+                'name': case.get('name', case.get('id')),
+                'description': case.get('description', ''),
+                'modality': case.get('modality', 'text'),
+                'weight': case.get('weight', 3)
+            })
+    
+    return {
+        'total_tests': len(cases),
+        'categories': list(by_category.values()),
+        'meta': meta,
+        'suite_path': Path(suite_path).as_posix()
+    }
 
 
 @app.get("/api/suite")
-def get_suite_info(suite_path: str = "bench/suite.yaml"):
-    """Get test suite information with categories and test cases"""
+def get_suite_info(request: Request, suite_path: str = "bench/suite.yaml"):
+    """
+    Get test suite information with categories and test cases.
+    スイートが変わっていなければメモリ上の応答を返し、If-None-Match が一致すれば 304 を返す。
+    """
     try:
-        suite = load_suite(Path(suite_path).resolve())
-        
-        # カテゴリ情報を整理
-        categories = suite.get('categories', [])
-        cases = suite.get('cases', [])
-        meta = suite.get("meta", {}) or {}
-        
-        # カテゴリ別にテストをグループ化
-        by_category = {}
-        for case in cases:
-            cat_id = case.get('category_id', 'unknown')
-            if cat_id not in by_category:
-                by_category[cat_id] = {
-                    'id': cat_id,
-                    'name': case.get('category_name', 'Unknown'),
-                    'tests': []
-                }
-                by_category[cat_id]['tests'].append({
-                    'id': case.get('id'),
-                    'name': case.get('name', case.get('id')),
-                    'description': case.get('description', ''),
-                    'modality': case.get('modality', 'text'),
-                    'weight': case.get('weight', 3)
-                })
-        
-        return {
-            'total_tests': len(cases),
-            'categories': list(by_category.values()),
-            'meta': meta,
-            'suite_path': Path(suite_path).as_posix()
-        }
+        resolved = Path(suite_path).resolve()
+        etag = SUITE_CACHE.peek_etag(resolved)
+        info = SUITE_INFO_CACHE.get((suite_path, etag)) if etag else None
+        if info is None:
+            suite, etag = load_suite_with_etag(resolved)
+            info = _suite_info(suite, suite_path)
+            if len(SUITE_INFO_CACHE) > 64:
+                SUITE_INFO_CACHE.clear()
+            SUITE_INFO_CACHE[(suite_path, etag)] = info
+        headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(info, headers=headers)
     except Exception as e:
         return {'error': str(e), 'categories': [], 'total_tests': 0, 'meta': {}, 'suite_path': Path(suite_path).as_posix()}
 
 
 @app.post("/api/bm/start")
-async def start_bm(req: BenchRequest, background_tasks: BackgroundTasks):
+async def start_bm(req: BenchRequest):
     """Start a benchmark job"""
     if not req.models:
         return {"error": "モデルが選択されていません"}
+    try:
+        resolve_prefix_order(req.prefix_order)
+        resolve_early_stop(req.early_stop)
+        resolve_stream_backend(req.stream_backend)
+    except ValueError as e:
+        return {"error": str(e)}
     
     job_id = str(uuid.uuid4())
     
     # Load suite to validate
     try:
-        suite = load_suite(req.suite_path)
+        suite = await run_in_threadpool(load_suite, req.suite_path)
     except Exception as e:
         return {"error": f"スイートファイルの読み込みに失敗: {str(e)}"}
     
-    JOBS[job_id] = {
-        "status": "running",
-        "cancelled": False,
-        "logs": [],
-        "results": [],
-        "expected_total": expected_total_results(suite, len(req.models), req.runs),
-        "suite_path": req.suite_path,
-        "suite_meta": suite.get("meta", {}) or {},
-    }
+    expected_total = expected_total_results(suite, len(req.models), req.runs)
+    JOBS.create(
+        job_id,
+        status="queued",
+        expected_total=expected_total,
+        suite_path=req.suite_path,
+        suite_meta=suite.get("meta", {}) or {},
+    )
     
-    background_tasks.add_task(run_bm_task, job_id, req)
-    return {"job_id": job_id, "expected_total": JOBS[job_id]["expected_total"]}
+    position = RUNNER.submit(job_id, run_bm_task, job_id, req)
+    return {"job_id": job_id, "expected_total": expected_total, "queue_position": position}
+
+
+@app.post("/api/load/start")
+async def start_load(req: LoadRequest):
+    """Start a load-test (saturation sweep) job. 進捗は /api/bm/{job_id} で取得できる。"""
+    if req.mode not in ("closed", "open"):
+        return {"error": f"不明な mode: {req.mode}"}
+    if not req.levels:
+        return {"error": "levels が指定されていません"}
+    if any(level <= 0 for level in req.levels):
+        return {"error": f"levels は正の数で指定してください: {req.levels}"}
+    # closed の level は仮想ユーザー数（0.5 を切り捨てて 0 人にすると、モデルをロードした後で失敗する）
+    if req.mode == "closed" and any(level != int(level) for level in req.levels):
+        return {"error": f"closed モードの levels は整数（ユーザー数）で指定してください: {req.levels}"}
+
+    try:
+        await run_in_threadpool(load_suite, req.suite_path)
+    except Exception as e:
+        return {"error": f"スイートファイルの読み込みに失敗: {str(e)}"}
+
+    job_id = str(uuid.uuid4())
+    JOBS.create(
+        job_id,
+        kind="load",
+        status="queued",
+        expected_total=len(req.levels),
+        suite_path=req.suite_path,
+        summary=None,
+    )
+
+    position = RUNNER.submit(job_id, run_load_task, job_id, req)
+    return {"job_id": job_id, "expected_total": len(req.levels), "queue_position": position}
+
+
+def job_journal_path(job_id: str) -> Path:
+    return JOURNAL_DIR / f"{job_id}.jsonl"
+
+
+def append_journal(job_id: str, record: dict) -> None:
+    """ジョブのジャーナルに1レコード追記する（再開用。失敗してもジョブは止めない）。"""
+    try:
+        JOURNAL_DIR.mkdir(parents=True, exist_ok=True)
+        with open(job_journal_path(job_id), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+
+@app.post("/api/bm/{job_id}/resume")
+async def resume_bm(job_id: str):
+    """
+    中断・失敗・サーバー再起動で止まったジョブを、ジャーナルから続きで再実行する。
+    完了済みの (model, case, variant, run) はスキップされる。
+    """
+    job = await run_in_threadpool(JOBS.get, job_id)
+    if job is not None and job.get("status") in ("queued", "running"):
+        return JSONResponse({"error": "ジョブは実行中です"}, status_code=409)
+
+    path = job_journal_path(job_id)
+    if not path.exists():
+        return JSONResponse({"error": "ジョブのジャーナルが見つかりません"}, status_code=404)
+
+    records = await run_in_threadpool(load_journal, path)
+    request_record = next((r for r in records if r.get("record_type") == "request"), None)
+    if request_record is None:
+        return JSONResponse({"error": "ジャーナルにリクエスト情報がありません"}, status_code=400)
+
+    req = BenchRequest(**request_record["request"])
+    try:
+        suite = await run_in_threadpool(load_suite, req.suite_path)
+    except Exception as e:
+        return {"error": f"スイートファイルの読み込みに失敗: {str(e)}"}
+
+    expected_total = expected_total_results(suite, len(req.models), req.runs)
+    JOBS.create(
+        job_id,
+        status="queued",
+        expected_total=expected_total,
+        suite_path=req.suite_path,
+        suite_meta=suite.get("meta", {}) or {},
+    )
+    JOBS.append_log(job_id, "info", "ジャーナルから再開します")
+    position = RUNNER.submit(job_id, run_bm_task, job_id, req, resume=build_resume_state(records))
+    return {"job_id": job_id, "expected_total": expected_total, "queue_position": position}
 
 
 @app.post("/api/bm/{job_id}/cancel")
 def cancel_bm(job_id: str):
     """Cancel a running benchmark job (best-effort)."""
-    if job_id not in JOBS:
+    if not JOBS.exists(job_id):
         return JSONResponse({"error": "ジョブが見つかりません"}, status_code=404)
-    JOBS[job_id]["cancelled"] = True
-    JOBS[job_id]["logs"].append({"type": "warn", "msg": "キャンセル要求を受け付けました"})
+    JOBS.request_cancel(job_id)
+    JOBS.append_log(job_id, "warn", "キャンセル要求を受け付けました")
     return {"success": True}
 
 
+@app.get("/api/bm")
+def list_bm_jobs(limit: int = 50):
+    """List recent jobs (newest first) and the runner queue"""
+    return {"jobs": JOBS.list_jobs(limit), "runner": RUNNER.snapshot()}
+
+
 @app.get("/api/bm/{job_id}")
-def get_bm_status(job_id: str):
-    """Get benchmark job status"""
-    if job_id not in JOBS:
+def get_bm_status(job_id: str, logs_after: int = 0, results_after: int = 0):
+    """
+    Get benchmark job status
+    logs_after / results_after（既に受け取った件数）を渡すと、それより後ろの差分だけを返す。
+    """
+    job = JOBS.get(job_id, logs_after=max(0, logs_after), results_after=max(0, results_after))
+    if job is None:
+        return JSONResponse({"error": "ジョブが見つかりません"}, status_code=404)
+    job["logs_after"] = max(0, logs_after)
+    job["results_after"] = max(0, results_after)
+    return job
+
+
+def _sse(event: str, data, event_id: Optional[str] = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False))
+    return "\n".join(lines) + "\n\n"
+
+
+def _parse_event_cursor(last_event_id: Optional[str]):
+    """Last-Event-ID（"<ログ件数>:<結果件数>"）をカーソルに戻す。不正なら None。"""
+    try:
+        logs_after, results_after = (int(x) for x in (last_event_id or "").split(":"))
+    except ValueError:
+        return None
+    return max(0, logs_after), max(0, results_after)
+
+
+async def job_event_stream(job_id: str, logs_after: int, results_after: int):
+    """
+    ジョブの新しいログ・結果だけを SSE で送り続け、ジョブが終了したら end を送って閉じる。
+    ストアをカーソル位置から読むので、別ワーカーで実行中のジョブでも同じように追える。
+    """
+    last_state = None
+    last_sent = time.monotonic()
+    while True:
+        job = await run_in_threadpool(JOBS.get, job_id, logs_after, results_after)
+        if job is None:
+            yield _sse("error", {"error": "ジョブが見つかりません"})
+            return
+
+        chunks = []
+        for log in job["logs"]:
+            logs_after += 1
+            chunks.append(_sse("log", log, f"{logs_after}:{results_after}"))
+        for result in job["results"]:
+            chunks.append(_sse("result", {"index": results_after, "result": result}, f"{logs_after}:{results_after + 1}"))
+            results_after += 1
+
+        state = (job["status"], job.get("expected_total"), logs_after, results_after)
+        if state != last_state:
+            status = {
+                "status": job["status"],
+                "expected_total": job.get("expected_total"),
+                "logs": logs_after,
+                "results": results_after,
+            }
+            if last_state is None:
+                # 最初の1回だけスイート情報も送る（サマリー描画用）
+                status.update(suite_meta=job.get("suite_meta"), suite_path=job.get("suite_path"))
+            chunks.append(_sse("status", status))
+            last_state = state
+
+        if chunks:
+            yield "".join(chunks)
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= EVENTS_HEARTBEAT_SEC:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+
+        if job["status"] in FINISHED_STATUSES:
+            yield _sse("end", {"status": job["status"]})
+            return
+        await asyncio.sleep(EVENTS_POLL_SEC)
+
+
+@app.get("/api/bm/{job_id}/events")
+async def stream_bm_events(job_id: str, request: Request, logs_after: int = 0, results_after: int = 0):
+    """
+    Server-Sent Events でジョブの進捗を配信する。
+    event: log / result / status / end。再接続時はブラウザが送る Last-Event-ID から続きを送る。
+    """
+    if not await run_in_threadpool(JOBS.exists, job_id):
         return JSONResponse({"error": "ジョブが見つかりません"}, status_code=404)
-    return JOBS[job_id]
+    cursor = _parse_event_cursor(request.headers.get("last-event-id"))
+    if cursor is None:
+        cursor = (max(0, logs_after), max(0, results_after))
+    return StreamingResponse(
+        job_event_stream(job_id, *cursor),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 class OverrideRequest(BaseModel):
@@ -295,26 +654,24 @@ def override_result(job_id: str, req: OverrideRequest):
     """
     人間が結果の合格/不合格を手動で変更する
     """
-    if job_id not in JOBS:
+    if not JOBS.exists(job_id):
         return JSONResponse({"error": "ジョブが見つかりません"}, status_code=404)
     
-    job = JOBS[job_id]
-    
-    if req.result_index < 0 or req.result_index >= len(job["results"]):
+    result = JOBS.get_result(job_id, req.result_index) if req.result_index >= 0 else None
+    if result is None:
         return JSONResponse({"error": "結果インデックスが無効です"}, status_code=400)
     
-    result = job["results"][req.result_index]
     old_passed = result.get("passed")
     
     # 人間による上書き
     result["human_override"] = req.new_passed
     result["passed"] = req.new_passed
+    JOBS.set_result(job_id, req.result_index, result)
+    if RESULTS_DB is not None:
+        RESULTS_DB.add_result(job_id, result)
     
     action = "合格に変更" if req.new_passed else "不合格に変更"
-    job["logs"].append({
-        "type": "info", 
-        "msg": f"[手動変更] {result['case_name']}: {action}"
-    })
+    JOBS.append_log(job_id, "info", f"[手動変更] {result['case_name']}: {action}")
     
     return {
         "success": True, 
@@ -323,17 +680,101 @@ def override_result(job_id: str, req: OverrideRequest):
         "new_passed": req.new_passed
     }
 
-def run_bm_task(job_id: str, req: BenchRequest):
+def _resumed_results_for_model(resume: Optional[dict], suite: dict, model_id: str, runs: int):
+    """model_id の全ケースが完了済みなら、その結果一覧を返す（未完了があれば None）。"""
+    if not resume:
+        return None
+    done = resume["done"]
+    out = []
+    for case in suite.get("cases", []):
+        key = (model_id, case.get("id"), None)
+        if key in done:
+            out.append(done[key])
+            continue
+        if case.get("variants"):
+            return None
+        for i in range(runs):
+            if (model_id, case.get("id"), i) not in done:
+                return None
+            out.append(done[(model_id, case.get("id"), i)])
+    return out
+
+
+def _finish_bm_job(job_id: str):
+    result_count = JOBS.count_results(job_id)
+    if result_count:
+        JOBS.update(job_id, expected_total=result_count)
+    if JOBS.is_cancelled(job_id):
+        JOBS.append_log(job_id, "warn", "ベンチマークをキャンセルしました")
+        JOBS.update(job_id, status="cancelled")
+    else:
+        JOBS.append_log(job_id, "success", "ベンチマーク完了")
+        JOBS.update(job_id, status="done")
+
+
+def run_distributed_models(job_id: str, req: BenchRequest, suite: dict, concurrency, cache, callback, cancelled,
+                           resume: Optional[dict] = None, prefix_order: str = "suite", early_stop: str = "off"):
+    """
+    coordinator モード: 選択したモデル × ケースを req.endpoints に分配して実行し、1つのジョブにまとめる。
+    リモートのエンドポイントは lms で管理できないので、モデルのロード計画は使わない。
+    """
+    endpoints = [e.model_dump() if hasattr(e, "model_dump") else e.dict() for e in req.endpoints]
+    JOBS.update(job_id, expected_total=expected_total_results(suite, len(req.models), req.runs))
+    JOBS.append_log(job_id, "info", "分散実行: " + ", ".join(f"{e['base_url']} x{e['capacity']}" for e in endpoints))
+    run_bench_distributed(
+        suite=suite,
+        endpoints=endpoints,
+        model_pattern="^(?:" + "|".join(re.escape(m) for m in req.models) + ")$",
+        runs=req.runs,
+        warmup=req.warmup,
+        timeout=req.timeout,
+        progress_callback=callback,
+        use_llm_judge=req.use_llm_judge,
+        judge_model=req.judge_model,
+        judge_base_url=req.judge_base_url,
+        cancel_check=cancelled,
+        concurrency=concurrency,
+        cache=cache,
+        resume=resume,
+        prefix_order=prefix_order,
+        early_stop=early_stop,
+    )
+    _finish_bm_job(job_id)
+
+
+def run_bm_task(job_id: str, req: BenchRequest, resume: Optional[dict] = None):
     """Background task to run benchmark"""
-    job = JOBS[job_id]
+    if resume is None:
+        request_dump = req.model_dump() if hasattr(req, "model_dump") else req.dict()
+        append_journal(job_id, {"record_type": "request", "request": request_dump})
+
+    def log(type, msg):
+        JOBS.append_log(job_id, type, msg)
+
+    def cancelled():
+        return JOBS.is_cancelled(job_id)
+
+    model_load = {}  # model_id -> load_model の計測値（+ unload_ms）
     
     def callback(kind, data):
         if kind == "info":
-            job["logs"].append({"type": "info", "msg": data})
+            log("info", data)
         elif kind == "error":
-            job["logs"].append({"type": "error", "msg": data})
+            log("error", data)
+        elif kind == "variant":
+            append_journal(job_id, data)
+        elif kind == "resumed":
+            JOBS.append_result(job_id, data)
+            if RESULTS_DB is not None:
+                RESULTS_DB.add_result(job_id, data)
         elif kind == "result":
-            job["results"].append(data)
+            # モデルのロード時間（cold start / time-to-ready）も結果と一緒に残す
+            if data.get("model") in model_load:
+                data["model_load"] = model_load[data["model"]]
+            JOBS.append_result(job_id, data)
+            append_journal(job_id, data)
+            if RESULTS_DB is not None:
+                RESULTS_DB.add_result(job_id, data)
             
             # Create log message with test name and category
             case_name = data.get('case_name', data['case_id'])
@@ -350,55 +791,188 @@ def run_bm_task(job_id: str, req: BenchRequest):
                 ttft = data.get("ttft_ms", 0) or 0
                 e2e = data.get("e2e_ms", 0) or 0
                 msg = f"[{model_short}] [{category}] {case_name} #{data.get('run_index', 0)}: {icon} (TTFT: {ttft:.0f}ms, E2E: {e2e:.0f}ms)"
-            job["logs"].append({"type": "log", "msg": msg})
+            log("log", msg)
 
+    cache = None
+    # ジョブ内の非同期処理（ロード・アンロード）は1つのループで実行し、共有クライアントの接続を使い回す
+    runner = AsyncRunner()
     try:
         suite_path = Path(req.suite_path).resolve()
         suite = load_suite(suite_path)
         suite = resolve_suite_asset_paths(suite, suite_path)
+        for key in ("warmup_cv", "warmup_window", "http_retries", "http_max_connections", "stream_backend"):
+            if getattr(req, key, None) is not None:
+                suite["meta"] = dict(suite.get("meta", {}) or {}, **{key: getattr(req, key)})
+        if RESULTS_DB is not None:
+            RESULTS_DB.start_run(job_id, source="server", suite_path=req.suite_path, meta=suite.get("meta", {}) or {})
+
+        cache_mode = resolve_cache_mode(req.cache, request_params(suite.get("meta", {}) or {}))
+        if cache_mode != "off":
+            cache = ResponseCache(CACHE_DIR, mode=cache_mode)
+            log("info", f"レスポンスキャッシュ: {cache_mode}")
+
+        concurrency = req.concurrency or (suite.get("meta", {}) or {}).get("concurrency", 1)
+        prefix_order = resolve_prefix_order(req.prefix_order or (suite.get("meta", {}) or {}).get("prefix_order"))
+        early_stop = resolve_early_stop(req.early_stop or (suite.get("meta", {}) or {}).get("early_stop"))
+        if req.endpoints:
+            run_distributed_models(job_id, req, suite, concurrency, cache, callback, cancelled, resume, prefix_order,
+                                   early_stop)
+            return
+
+        preload = bool(req.preload_next and req.memory_budget_gb)
+        selected_models, sizes = runner.run(
+            plan_models(req.base_url, list(req.models or []), req.reorder_models, need_sizes=preload)
+        )
+        JOBS.update(job_id, expected_total=expected_total_results(suite, len(selected_models), req.runs))
+        log("info", f"対象モデル（逐次実行）: {', '.join(selected_models) if selected_models else 'なし'}")
+
+        # 完了済みのモデルはロードせずに結果だけ復元する（先読みの対象からも外す）
+        resumed_by_model = {m: _resumed_results_for_model(resume, suite, m, req.runs) for m in selected_models}
+        pending_models = [m for m in selected_models if resumed_by_model[m] is None]
+        preloads = {}
+
+        # GPUメモリ節約のため、モデルは原則1つずつロードして実行する。
+        # 先読みする場合は、他のジョブに先読み中のモデルをアンロードされないようジョブ全体でロックを持つ
+        with (MODEL_LOCK if preload else contextlib.nullcontext()), ThreadPoolExecutor(max_workers=1) as preloader:
+            for model_id in selected_models:
+                if cancelled():
+                    break
+
+                resumed = resumed_by_model[model_id]
+                if resumed is not None:
+                    for res in resumed:
+                        callback("resumed", res)
+                    log("info", f"完了済みのためスキップ: {model_id}")
+                    continue
+
+                with MODEL_LOCK:
+                    timing = None
+                    if model_id in preloads:
+                        timing = preloads.pop(model_id).result()
+                        if timing is not None:
+                            timing = dict(timing, preloaded=True, unload_others_ms=0.0)
+                    if timing is None:
+                        timing = runner.run(ensure_single_loaded_model(req.base_url, model_id, log, cancel_check=cancelled))
+                    if cancelled():
+                        break
+                    if timing is None:
+                        raise RuntimeError(f"モデルのロードに失敗しました: {model_id}")
+                    timing.setdefault("preloaded", False)
+                    model_load[model_id] = timing
+
+                    # 評価している間に次のモデルを先読みする（メモリ予算に収まる場合のみ）
+                    idx = pending_models.index(model_id)
+                    next_model = pending_models[idx + 1] if idx + 1 < len(pending_models) else None
+                    if preload and next_model and can_preload(model_id, next_model, sizes, req.memory_budget_gb):
+                        log("info", f"先読みロード開始: {next_model}")
+                        preloads[next_model] = preloader.submit(
+                            runner.run, load_model(req.base_url, next_model, log, cancel_check=cancelled)
+                        )
+
+                    model_pattern = f"^{re.escape(model_id)}$"
+                    run_bench_logic(
+                        suite=suite,
+                        base_url=req.base_url,
+                        model_pattern=model_pattern,
+                        runs=req.runs,
+                        warmup=req.warmup,
+                        timeout=req.timeout,
+                        progress_callback=callback,
+                        use_llm_judge=req.use_llm_judge,
+                        judge_model=req.judge_model,
+                        judge_base_url=req.judge_base_url,
+                        cancel_check=cancelled,
+                        concurrency=concurrency,
+                        cache=cache,
+                        resume=resume,
+                        prefix_order=prefix_order,
+                        early_stop=early_stop
+                    )
+
+                    # 実行後はアンロードして次へ（先読みしていなければ常に最大1つロードを維持）
+                    timing["unload_ms"] = runner.run(unload_model(model_id, log))
+                    JOBS.update(job_id, model_load=model_load)
+
+            # キャンセル等で使われなかった先読みは、完了を待ってからアンロードする
+            for model_id, future in preloads.items():
+                if future.result() is not None:
+                    runner.run(unload_model(model_id, log))
+
+        _finish_bm_job(job_id)
+        
+    except Exception as e:
+        error_msg = f"エラー: {str(e)}\n{traceback.format_exc()}"
+        log("error", error_msg)
+        JOBS.update(job_id, status="failed")
+    finally:
+        runner.close()
+        if cache is not None:
+            cache.close()
+
+
+def run_load_task(job_id: str, req: LoadRequest):
+    """Background task to run a load test against one model"""
+
+    def log(type, msg):
+        JOBS.append_log(job_id, type, msg)
+
+    def cancelled():
+        return JOBS.is_cancelled(job_id)
 
-        selected_models = list(req.models or [])
-        job["expected_total"] = expected_total_results(suite, len(selected_models), req.runs)
-        job["logs"].append({"type": "info", "msg": f"対象モデル（逐次実行）: {', '.join(selected_models) if selected_models else 'なし'}"})
-
-        # GPUメモリ節約のため、モデルは必ず1つずつロードして実行する
-        for model_id in selected_models:
-            if job.get("cancelled"):
-                break
-
-            if not ensure_single_loaded_model(req.base_url, model_id, job):
-                raise RuntimeError(f"モデルのロードに失敗しました: {model_id}")
-
-            model_pattern = f"^{re.escape(model_id)}$"
-            run_bench_logic(
-                suite=suite,
-                base_url=req.base_url,
-                model_pattern=model_pattern,
-                runs=req.runs,
-                warmup=req.warmup,
+    def callback(kind, data):
+        if kind == "level":
+            JOBS.append_result(job_id, data)
+            ttft = data["ttft_ms"].get("p90")
+            log("log", f"[{data['mode']} {data['level']}] rps={data['throughput_rps']:.2f} "
+                       f"TTFT p90={ttft or 0:.0f}ms err={data['error_rate']*100:.1f}%")
+        else:
+            log(kind, data)
+
+    runner = AsyncRunner()
+    try:
+        suite_path = Path(req.suite_path).resolve()
+        suite = resolve_suite_asset_paths(load_suite(suite_path), suite_path)
+
+        with MODEL_LOCK:
+            loaded = runner.run(ensure_single_loaded_model(req.base_url, req.model, log, cancel_check=cancelled))
+            if not loaded and not cancelled():
+                raise RuntimeError(f"モデルのロードに失敗しました: {req.model}")
+
+            levels = [int(x) for x in req.levels] if req.mode == "closed" else list(req.levels)
+            slo = {
+                "ttft_p90_ms": req.slo_ttft_p90_ms,
+                "e2e_p90_ms": req.slo_e2e_p90_ms,
+                "error_rate": req.slo_error_rate,
+            }
+            summary = run_load(
+                suite,
+                req.base_url,
+                req.model,
+                mode=req.mode,
+                levels=levels,
+                duration_sec=req.duration_sec,
+                max_requests_per_level=req.max_requests_per_level,
+                slo={k: v for k, v in slo.items() if v is not None},
                 timeout=req.timeout,
                 progress_callback=callback,
-                use_llm_judge=req.use_llm_judge,
-                judge_model=req.judge_model,
-                cancel_check=lambda: bool(job.get("cancelled"))
+                cancel_check=cancelled,
             )
+        summary["model_load"] = loaded
+        JOBS.update(job_id, summary=summary)
 
-            # 実行後はアンロードして次へ（常に最大1つロードを維持）
-            job["logs"].append({"type": "info", "msg": f"アンロード: {model_id}"})
-            run_lms_command_sync(["lms", "unload", model_id], timeout=60)
-        
-        job["expected_total"] = len(job["results"]) or job.get("expected_total", 0)
-        if job.get("cancelled"):
-            job["status"] = "cancelled"
-            job["logs"].append({"type": "warn", "msg": "ベンチマークをキャンセルしました"})
+        if cancelled():
+            log("warn", "負荷試験をキャンセルしました")
+            JOBS.update(job_id, status="cancelled")
         else:
-            job["status"] = "done"
-            job["logs"].append({"type": "success", "msg": "ベンチマーク完了"})
-        
+            log("success", f"負荷試験完了（knee: {summary['knee_level']}）")
+            JOBS.update(job_id, status="done")
+
     except Exception as e:
-        job["status"] = "failed"
         error_msg = f"エラー: {str(e)}\n{traceback.format_exc()}"
-        job["logs"].append({"type": "error", "msg": error_msg})
+        log("error", error_msg)
+        JOBS.update(job_id, status="failed")
+    finally:
+        runner.close()
 
 
 # Mount static files AFTER API routes
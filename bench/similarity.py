@@ -0,0 +1,145 @@
+"""
+文字列の類似度（fuzzy_match 用）。
+
+レーベンシュタイン距離をビット並列（Myers / Hyyrö）で計算する。パターン（期待値側）の各文字の
+出現位置をビットマスクにしておき、応答を1文字ずつ走査して DP の1列分をまとめて更新する。
+Python の int は任意長なので、長いパターンでも1列あたり数回の整数演算で済む。
+
+- score_cutoff を渡すと、その類似度に届かないことが確定した時点で打ち切って 0.0 を返す
+- compile_pattern はパターンのビットマスクをキャッシュする（同じ期待値を何度も評価するため）
+- 文字の比較は従来どおり文字ごとの str.lower() で行う
+
+使い方（ベンチマーク）:
+    python -m bench.similarity
+"""
+import time
+from functools import lru_cache
+from typing import Dict, Hashable, Sequence, Tuple
+
+Pattern = Tuple[Tuple[Hashable, ...], Dict[Hashable, int]]
+
+
+def _symbols(text: str) -> Tuple[str, ...]:
+    # 比較単位は「1文字を lower() したもの」（'İ'.lower() のように2文字になる場合もそのまま1単位として扱う）
+    return tuple(c.lower() for c in text)
+
+
+@lru_cache(maxsize=4096)
+def compile_pattern(text: str) -> Pattern:
+    """パターン文字列を (比較単位の列, {比較単位: 出現位置のビットマスク}) にする。"""
+    symbols = _symbols(text)
+    peq: Dict[Hashable, int] = {}
+    for i, sym in enumerate(symbols):
+        peq[sym] = peq.get(sym, 0) | (1 << i)
+    return symbols, peq
+
+
+def _myers_distance(pattern: Pattern, text: Sequence[Hashable], max_distance=None):
+    """
+    pattern と text の編集距離。max_distance を超えることが確定したら None を返す。
+    最終行のスコア D[m][j] からは、残り (n - j) 文字で高々 (n - j) しか減らないことを使って打ち切る。
+    """
+    symbols, peq = pattern
+    m = len(symbols)
+    n = len(text)
+    if m == 0:
+        return n if max_distance is None or n <= max_distance else None
+
+    full = (1 << m) - 1
+    last = 1 << (m - 1)
+    vp = full
+    vn = 0
+    score = m
+    for j, sym in enumerate(text, 1):
+        eq = peq.get(sym, 0)
+        xv = eq | vn
+        xh = (((eq & vp) + vp) ^ vp) | eq
+        hp = (vn | ~(xh | vp)) & full
+        hn = vp & xh
+        if hp & last:
+            score += 1
+        elif hn & last:
+            score -= 1
+        if max_distance is not None and score - (n - j) > max_distance:
+            return None
+        hp = ((hp << 1) | 1) & full
+        hn = (hn << 1) & full
+        vp = (hn | ~(xv | hp)) & full
+        vn = hp & xv
+    return score
+
+
+def levenshtein(s1: str, s2: str) -> int:
+    """レーベンシュタイン距離（文字ごとに lower() して比較）。"""
+    return _myers_distance(compile_pattern(s2), _symbols(s1))
+
+
+def levenshtein_ratio(s1: str, s2: str, score_cutoff: float = 0.0, pattern: Pattern = None) -> float:
+    """
+    1 - 距離 / max(len) の類似度（0-1）。両方空なら 1.0。
+    score_cutoff 未満になることが確定したら計算を打ち切って 0.0 を返す。
+    pattern に compile_pattern(s2) を渡すとビットマスクの構築を省ける。
+    """
+    max_len = max(len(s1), len(s2))
+    if max_len == 0:
+        return 1.0
+    # ratio >= score_cutoff  <=>  distance <= (1 - score_cutoff) * max_len
+    max_distance = None
+    if score_cutoff > 0:
+        max_distance = int((1 - score_cutoff) * max_len + 1e-9)
+        if abs(len(s1) - len(s2)) > max_distance:
+            return 0.0
+    dist = _myers_distance(pattern or compile_pattern(s2), _symbols(s1), max_distance)
+    if dist is None:
+        return 0.0
+    ratio = 1 - (dist / max_len)
+    return ratio if ratio >= score_cutoff else 0.0
+
+
+def levenshtein_reference(s1: str, s2: str) -> int:
+    """従来の全 DP 行列による実装（等価性テスト・ベンチマークの比較用）。"""
+    rows = len(s1) + 1
+    cols = len(s2) + 1
+    dist = [[0] * cols for _ in range(rows)]
+    for i in range(rows):
+        dist[i][0] = i
+    for j in range(cols):
+        dist[0][j] = j
+    for i in range(1, rows):
+        for j in range(1, cols):
+            cost = 0 if s1[i-1].lower() == s2[j-1].lower() else 1
+            dist[i][j] = min(
+                dist[i-1][j] + 1,
+                dist[i][j-1] + 1,
+                dist[i-1][j-1] + cost
+            )
+    return dist[rows-1][cols-1]
+
+
+def _bench(label, fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{label:<40} {elapsed * 1000:9.3f} ms")
+    return elapsed
+
+
+def main():
+    import random
+
+    rng = random.Random(0)
+    alphabet = "abcdefghijklmnopqrstuvwxyzあいうえおかきくけこ 、。"
+    for n in (50, 500, 2000):
+        a = "".join(rng.choice(alphabet) for _ in range(n))
+        b = "".join(c if rng.random() > 0.1 else rng.choice(alphabet) for c in a)
+        short = a[: max(1, n // 10)]
+        print(f"--- len={n}")
+        ref = _bench("reference DP", lambda: levenshtein_reference(a, b), 1 if n > 500 else 5)
+        fast = _bench("bit-parallel", lambda: levenshtein(a, b), 20)
+        _bench("bit-parallel + cutoff 0.8 (short alt)", lambda: levenshtein_ratio(a, short, 0.8), 20)
+        print(f"speedup: x{ref / fast:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+/v1/chat/completions のストリーミングを SDK を通さずに読むクライアント（--stream-backend raw）。
+
+SDK 経由では、チャンクごとに SSE のパースに加えて pydantic のモデルを組み立てる。小さな CPU 推論の
+モデルのようにトークンが速く届く場合、この処理が ITL の計測に混ざり、1コアを使い切ることもある。
+ここでは共有トランスポート（transport.py）の httpx クライアントで SSE のバイト列を直接読み、
+必要なフィールド（choices[0].delta.content と usage）だけを json.loads で取り出す。
+時刻はバイト列が届いた時点（1回の読み取りに複数のイベントが入っていれば同じ時刻）で記録する。
+
+エラーは SDK の例外名（APIConnectionError / APITimeoutError / BadRequestError など）に揃え、
+結果レコードは SDK 経由と同じ形になるようにしている（main._stream_completion）。
+"""
+import json
+from typing import Iterator, Optional, Tuple
+
+import httpx
+
+try:
+    from bench.transport import shared_http_client
+except ImportError:
+    from transport import shared_http_client
+
+STREAM_BACKENDS = ("sdk", "raw")
+
+# SDK（openai._exceptions）の HTTP ステータスごとの例外名
+_STATUS_ERRORS = {
+    400: "BadRequestError",
+    401: "AuthenticationError",
+    403: "PermissionDeniedError",
+    404: "NotFoundError",
+    409: "ConflictError",
+    422: "UnprocessableEntityError",
+    429: "RateLimitError",
+}
+
+
+def resolve_stream_backend(backend) -> str:
+    backend = (backend or "sdk").lower()
+    if backend not in STREAM_BACKENDS:
+        raise ValueError(f"不明なストリーミングのバックエンド: {backend}（{', '.join(STREAM_BACKENDS)}）")
+    return backend
+
+
+class SSEError(Exception):
+    """SDK の APIError / APIStatusError に相当するエラー。error_type に SDK での例外名を持つ。"""
+
+    def __init__(self, message: str, error_type: str = "APIError"):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+def error_type_name(exc: Exception) -> str:
+    """結果レコードの error_type（SDK 経由の場合と同じ名前）。"""
+    if isinstance(exc, SSEError):
+        return exc.error_type
+    if isinstance(exc, httpx.TimeoutException):
+        return "APITimeoutError"
+    if isinstance(exc, httpx.TransportError):
+        return "APIConnectionError"
+    return type(exc).__name__
+
+
+def iter_sse_data(chunks) -> Iterator[Tuple[bytes, float]]:
+    """
+    (バイト列, 届いた時刻) の並びから、SSE イベントの data を (data, 時刻) で返す。
+    イベントは空行で区切られ、data: の行が複数あれば改行でつなぐ。
+    """
+    buffer = b""
+    for chunk, arrived in chunks:
+        buffer += chunk.replace(b"\r\n", b"\n") if b"\r" in chunk else chunk
+        while True:
+            end = buffer.find(b"\n\n")
+            if end < 0:
+                break
+            event, buffer = buffer[:end], buffer[end + 2:]
+            data = [line[5:].lstrip(b" ") if line.startswith(b"data:") else None for line in event.split(b"\n")]
+            data = [d for d in data if d is not None]
+            if data:
+                yield b"\n".join(data), arrived
+
+
+class RawSSEClient:
+    """chat.completions のストリーミングだけを扱う軽量クライアント。"""
+
+    def __init__(self, base_url: str, api_key: str = "lm-studio", http_client: Optional[httpx.Client] = None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.http_client = http_client or shared_http_client()
+
+    def stream_chat(self, model, messages, timeout, clock, **params) -> Iterator[Tuple[Optional[str], Optional[dict], float]]:
+        """
+        (content, usage, 届いた時刻) を返す。content は delta.content（なければ None）、usage は最後のチャンクの usage。
+        途中でやめた場合も、ジェネレータを閉じればレスポンスを閉じる。
+        """
+        body = dict(params, model=model, messages=messages, stream=True, stream_options={"include_usage": True})
+        headers = {"Authorization": f"Bearer {self.api_key}", "Accept": "text/event-stream"}
+        with self.http_client.stream("POST", f"{self.base_url}/chat/completions", json=body, headers=headers,
+                                     timeout=timeout) as response:
+            if response.status_code >= 400:
+                response.read()
+                raise _status_error(response)
+            chunks = ((chunk, clock()) for chunk in response.iter_bytes())
+            for data, arrived in iter_sse_data(chunks):
+                if data.startswith(b"[DONE]"):
+                    break
+                payload = json.loads(data)
+                if isinstance(payload, dict) and payload.get("error"):
+                    error = payload["error"]
+                    message = error.get("message") if isinstance(error, dict) else None
+                    raise SSEError(message if isinstance(message, str) and message else "An error occurred during streaming")
+                choices = payload.get("choices") or []
+                delta = (choices[0].get("delta") or {}) if choices else {}
+                yield delta.get("content"), payload.get("usage"), arrived
+
+
+def _status_error(response: httpx.Response) -> SSEError:
+    # SDK の APIStatusError と同じ形（JSON なら "Error code: 400 - {...}"、でなければ本文）にする
+    text = response.text.strip()
+    try:
+        message = f"Error code: {response.status_code} - {json.loads(text)}"
+    except ValueError:
+        message = text or f"Error code: {response.status_code}"
+    if response.status_code >= 500:
+        name = "InternalServerError"
+    else:
+        name = _STATUS_ERRORS.get(response.status_code, "APIStatusError")
+    return SSEError(message, name)
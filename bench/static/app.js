@@ -46,6 +46,8 @@ document.addEventListener('DOMContentLoaded', () => {
     // State
     let currentJobId = null;
     let pollInterval = null;
+    let eventSource = null;
+    let logsCursor = 0;
     let timerInterval = null;
     let startTime = null;
     let availableModels = [];
@@ -411,6 +413,7 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         allResults = [];
+        logsCursor = 0;
         resultsGrid.innerHTML = '';
         resultsTableBody.innerHTML = '';
         logsContainer.innerHTML = '';
@@ -451,8 +454,16 @@ document.addEventListener('DOMContentLoaded', () => {
 
             currentJobId = data.job_id;
             expectedTotal = data.expected_total || 0;
+            if (data.queue_position > 0) {
+                addLog('info', `実行待ち: 前に ${data.queue_position} 件のジョブがあります`);
+            }
 
-            pollInterval = setInterval(pollStatus, 800);
+            // 進捗は SSE で差分だけ受け取る（未対応のブラウザはカーソル付きポーリング）
+            if (window.EventSource) {
+                openEventStream();
+            } else {
+                pollInterval = setInterval(pollStatus, 800);
+            }
             timerInterval = setInterval(updateTimer, 1000);
         } catch (err) {
             addLog('error', `開始エラー: ${err.message}`);
@@ -467,49 +478,81 @@ document.addEventListener('DOMContentLoaded', () => {
         statTimer.textContent = `${m}:${s}`;
     }
 
+    function applyStatus(data) {
+        if (typeof data.expected_total === "number") {
+            expectedTotal = data.expected_total;
+        }
+        if (data.suite_meta) currentSuiteMeta = data.suite_meta;
+        if (data.suite_path) currentSuitePath = data.suite_path;
+    }
+
+    function applyResult(r, idx) {
+        // 再接続などで同じ結果が重複して届いた場合は無視する
+        if (idx < allResults.length) return;
+        allResults.push(r);
+        addResultCard(r, idx);
+        addResultRow(r, idx);
+    }
+
+    function finishJob(status) {
+        stopPolling();
+        if (status === 'done') {
+            addLog('success', 'ベンチマーク完了');
+            globalProgressBar.style.width = '100%';
+        } else if (status === 'cancelled') {
+            addLog('warn', 'ベンチマークをキャンセルしました');
+        } else {
+            addLog('error', 'ベンチマーク失敗');
+        }
+        renderSummary();
+        activateTab('summary');
+        resetUI();
+    }
+
+    function openEventStream() {
+        const url = `/api/bm/${currentJobId}/events?logs_after=${logsCursor}&results_after=${allResults.length}`;
+        eventSource = new EventSource(url);
+
+        eventSource.addEventListener('log', (e) => {
+            const log = JSON.parse(e.data);
+            logsCursor++;
+            addLogElement(log.type, log.msg);
+        });
+        eventSource.addEventListener('result', (e) => {
+            const data = JSON.parse(e.data);
+            applyResult(data.result, data.index);
+        });
+        eventSource.addEventListener('status', (e) => {
+            applyStatus(JSON.parse(e.data));
+            updateStats();
+        });
+        eventSource.addEventListener('end', (e) => {
+            finishJob(JSON.parse(e.data).status);
+        });
+        // 切断時は EventSource が Last-Event-ID 付きで自動再接続する
+        eventSource.onerror = (err) => console.error(err);
+    }
+
     async function pollStatus() {
         if (!currentJobId) return;
 
         try {
-            const res = await fetch(`/api/bm/${currentJobId}`);
+            const res = await fetch(`/api/bm/${currentJobId}?logs_after=${logsCursor}&results_after=${allResults.length}`);
             const data = await res.json();
 
-            if (typeof data.expected_total === "number") {
-                expectedTotal = data.expected_total;
-            }
-            if (data && data.suite_meta) currentSuiteMeta = data.suite_meta;
-            if (data && data.suite_path) currentSuitePath = data.suite_path;
+            applyStatus(data);
 
-            data.logs.forEach((log, i) => {
-                if (i >= logsContainer.children.length) {
-                    addLogElement(log.type, log.msg);
-                }
+            data.logs.forEach((log) => {
+                logsCursor++;
+                addLogElement(log.type, log.msg);
             });
 
-            const startIndex = allResults.length;
-            const newResults = data.results.slice(startIndex);
-            newResults.forEach((r, i) => {
-                const idx = startIndex + i;
-                allResults.push(r);
-                addResultCard(r, idx);
-                addResultRow(r, idx);
-            });
+            data.results.forEach((r, i) => applyResult(r, data.results_after + i));
 
             updateStats();
 
             if (data.status === 'done' || data.status === 'failed' || data.status === 'cancelled') {
-                stopPolling();
-                if (data.status === 'done') {
-                    addLog('success', 'ベンチマーク完了');
-                    globalProgressBar.style.width = '100%';
-                } else if (data.status === 'cancelled') {
-                    addLog('warn', 'ベンチマークをキャンセルしました');
-                } else {
-                    addLog('error', 'ベンチマーク失敗');
-                }
-                renderSummary();
-                activateTab('summary');
-                resetUI();
+                finishJob(data.status);
             }
         } catch (err) {
             console.error(err);
@@ -517,6 +560,10 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     function stopPolling() {
+        if (eventSource) {
+            eventSource.close();
+            eventSource = null;
+        }
         clearInterval(pollInterval);
         clearInterval(timerInterval);
         pollInterval = null;
@@ -568,6 +615,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
         const ttftLabel = isVariant ? 'Avg TTFT' : 'TTFT';
         const e2eLabel = isVariant ? 'Avg E2E' : 'E2E';
+        const decodeTps = isVariant
+            ? (res.latency_stats && res.latency_stats.decode_tps ? res.latency_stats.decode_tps.p50 : null)
+            : res.decode_tps;
 
         // A11y: Make card interactive
         card.setAttribute('role', 'button');
@@ -597,6 +647,10 @@ document.addEventListener('DOMContentLoaded', () => {
                         <span class="card-stat-label">${e2eLabel}</span>
                         <span class="card-stat-value">${e2e} ms</span>
                     </div>
+                    <div class="card-stat">
+                        <span class="card-stat-label">tok/s</span>
+                        <span class="card-stat-value">${decodeTps ? decodeTps.toFixed(1) : '-'}</span>
+                    </div>
                 </div>
                 <div class="card-response">${escapeHtml(preview)}</div>
             </div>
@@ -837,8 +891,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
         const modelNames = Object.keys(byModel);
         const passRates = [];
-        const avgTtfts = [];
-        const avgE2es = [];
+        const p50Ttfts = [];
+        const p50E2es = [];
 
         const meta = currentSuiteMeta || (suiteInfo ? suiteInfo.meta : {}) || {};
         const passCriteria = getPassCriteria(meta);
@@ -850,7 +904,7 @@ document.addEventListener('DOMContentLoaded', () => {
             html += '<div class="summary-charts">';
             html += '<div class="chart-container chart-container-wide"><h4>カテゴリ別 合格率</h4><canvas id="chart-category-pass" class="chart-canvas"></canvas></div>';
             html += `<div class="chart-container"><h4>${ICONS.barChart} 合格率比較</h4><canvas id="chart-pass-rate" class="chart-canvas"></canvas></div>`;
-            html += '<div class="chart-container"><h4>速度比較（平均レイテンシ）</h4><canvas id="chart-latency" class="chart-canvas"></canvas></div>';
+            html += '<div class="chart-container"><h4>速度比較（p50 レイテンシ）</h4><canvas id="chart-latency" class="chart-canvas"></canvas></div>';
             html += '</div>';
         }
 
@@ -858,10 +912,13 @@ document.addEventListener('DOMContentLoaded', () => {
 
         for (const [model, results] of Object.entries(byModel)) {
             const { passed, valid, rate } = computePassRate(results);
-            const ttfts = results.filter(r => r.ttft_ms).map(r => r.ttft_ms);
-            const e2es = results.filter(r => r.e2e_ms).map(r => r.e2e_ms);
-            const avgTtft = ttfts.length > 0 ? Math.round(ttfts.reduce((a, b) => a + b, 0) / ttfts.length) : '-';
-            const avgE2e = e2es.length > 0 ? Math.round(e2es.reduce((a, b) => a + b, 0) / e2es.length) : '-';
+            const samples = requestSamples(results);
+            const latency = {
+                ttft: samples.map(s => s.ttft_ms),
+                e2e: samples.map(s => s.e2e_ms),
+                itl: samples.flatMap(s => s.itl_ms || []),
+                tps: samples.map(s => s.decode_tps),
+            };
 
             const rateClass = rate >= 70 ? 'good' : rate >= 40 ? '' : 'bad';
 
@@ -873,8 +930,8 @@ document.addEventListener('DOMContentLoaded', () => {
             const overallClass = overallPassed ? 'good' : 'bad';
 
             passRates.push(rate);
-            avgTtfts.push(typeof avgTtft === 'number' ? avgTtft : 0);
-            avgE2es.push(typeof avgE2e === 'number' ? avgE2e : 0);
+            p50Ttfts.push(percentile(latency.ttft, 50) || 0);
+            p50E2es.push(percentile(latency.e2e, 50) || 0);
 
             html += `
                 <div class="summary-card">
@@ -897,15 +954,8 @@ document.addEventListener('DOMContentLoaded', () => {
                             <div class="summary-stat-label">テスト数</div>
                             <div class="summary-stat-value">${results.length}</div>
                         </div>
-                        <div class="summary-stat">
-                            <div class="summary-stat-label">平均 TTFT</div>
-                            <div class="summary-stat-value">${avgTtft} ms</div>
-                        </div>
-                        <div class="summary-stat">
-                            <div class="summary-stat-label">平均 E2E</div>
-                            <div class="summary-stat-value">${avgE2e} ms</div>
-                        </div>
                     </div>
+                    ${renderLatencyTable(latency)}
                     ${renderCategoryBreakdown(model, catStats, passCriteria)}
                 </div>
             `;
@@ -961,13 +1011,13 @@ document.addEventListener('DOMContentLoaded', () => {
                         datasets: [
                             {
                                 label: 'TTFT (ms)',
-                                data: avgTtfts,
+                                data: p50Ttfts,
                                 backgroundColor: 'rgba(59, 130, 246, 0.8)',
                                 borderRadius: 4
                             },
                             {
                                 label: 'E2E (ms)',
-                                data: avgE2es,
+                                data: p50E2es,
                                 backgroundColor: 'rgba(168, 85, 247, 0.8)',
                                 borderRadius: 4
                             }
@@ -1031,6 +1081,52 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // ... (helper functions remain mostly the same) ...
+    // 1リクエスト = 1要素の計測値（variants は variant_details を展開）
+    function requestSamples(results) {
+        const out = [];
+        results.forEach(r => {
+            if (r.status !== 'ok') return;
+            if (r.is_variant_test) {
+                (r.variant_details || []).forEach(v => { if (v.status === 'ok') out.push(v); });
+            } else {
+                out.push(r);
+            }
+        });
+        return out;
+    }
+
+    // 線形補間パーセンタイル（q: 0-100）。空なら null
+    function percentile(values, q) {
+        const vals = values.filter(v => v !== null && v !== undefined).sort((a, b) => a - b);
+        if (vals.length === 0) return null;
+        const pos = (vals.length - 1) * (q / 100);
+        const lo = Math.floor(pos);
+        const hi = Math.min(lo + 1, vals.length - 1);
+        return vals[lo] + (vals[hi] - vals[lo]) * (pos - lo);
+    }
+
+    function renderLatencyTable(latency) {
+        const fmt = (v, digits) => (v === null ? '-' : v.toFixed(digits));
+        const row = (label, values, unit, digits) => `
+            <tr>
+                <th scope="row">${label}</th>
+                <td>${fmt(percentile(values, 50), digits)}</td>
+                <td>${fmt(percentile(values, 90), digits)}</td>
+                <td>${fmt(percentile(values, 99), digits)}</td>
+                <td>${unit}</td>
+            </tr>`;
+        return `
+            <table class="latency-table">
+                <thead><tr><th></th><th>p50</th><th>p90</th><th>p99</th><th></th></tr></thead>
+                <tbody>
+                    ${row('TTFT', latency.ttft, 'ms', 0)}
+                    ${row('E2E', latency.e2e, 'ms', 0)}
+                    ${row('ITL', latency.itl, 'ms', 1)}
+                    ${row('Decode', latency.tps, 'tok/s', 1)}
+                </tbody>
+            </table>`;
+    }
+
     function escapeHtml(text) {
         const div = document.createElement('div');
         div.textContent = text;
@@ -0,0 +1,68 @@
+"""
+計測値の集計（パーセンタイル・レイテンシのサマリ）。
+
+main（結果レコード・HTML レポート）、load（負荷試験）、resultsdb、report から共通で使う。
+"""
+
+
+def _percentile_sorted(vals, q):
+    if not vals:
+        return None
+    if len(vals) == 1:
+        return float(vals[0])
+    pos = (len(vals) - 1) * (q / 100.0)
+    lo = int(pos)
+    hi = min(lo + 1, len(vals) - 1)
+    return vals[lo] + (vals[hi] - vals[lo]) * (pos - lo)
+
+
+def percentile(values, q):
+    """線形補間によるパーセンタイル（q: 0-100）。空なら None。"""
+    return _percentile_sorted(sorted(v for v in values if v is not None), q)
+
+
+def summarize_latencies(values) -> dict:
+    """count / mean / p50 / p90 / p99 をまとめて返す（ソートは1回だけ）。"""
+    vals = sorted(v for v in values if v is not None)
+    return {
+        "count": len(vals),
+        "mean": (sum(vals) / len(vals)) if vals else None,
+        "p50": _percentile_sorted(vals, 50),
+        "p90": _percentile_sorted(vals, 90),
+        "p99": _percentile_sorted(vals, 99),
+    }
+
+
+def request_samples(results):
+    """
+    結果レコードから「1リクエスト = 1要素」の計測値を取り出す。
+    variants 形式は variant_details を展開し、status が ok のものだけを返す。
+    """
+    for r in results:
+        if r.get("status") != "ok":
+            continue
+        if r.get("is_variant_test"):
+            for v in r.get("variant_details") or []:
+                if v.get("status") == "ok":
+                    yield v
+        else:
+            yield r
+
+
+def latency_stats(samples) -> dict:
+    """TTFT/E2E/ITL/トークンレートの分位サマリ。"""
+    samples = list(samples)
+    return {
+        "ttft_ms": summarize_latencies(s.get("ttft_ms") for s in samples),
+        "e2e_ms": summarize_latencies(s.get("e2e_ms") for s in samples),
+        "itl_ms": summarize_latencies(x for s in samples for x in (s.get("itl_ms") or [])),
+        "decode_tps": summarize_latencies(s.get("decode_tps") for s in samples),
+        "prompt_tps": summarize_latencies(s.get("prompt_tps") for s in samples),
+    }
+
+
+def fmt_pcts(summary):
+    """summarize_latencies の結果を "p50 / p90 / p99 ms" 表記にする。"""
+    if not summary or summary.get('p50') is None:
+        return "-"
+    return f"{summary['p50']:.1f} / {summary['p90']:.1f} / {summary['p99']:.1f} ms"
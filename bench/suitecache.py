@@ -0,0 +1,149 @@
+"""
+スイートの読み込みキャッシュ。
+
+load_suite は CLI 実行・/api/bm/start・run_bm_task・/api/suite のたびにルート YAML と includes の
+全ファイルをパースし直していた。ここでは
+
+- libyaml が使えれば CSafeLoader でパースする（純 Python の SafeLoader より大幅に速い）
+- マージ済みスイートを pickle でシリアライズして保持し、ルートと全 includes の (mtime, サイズ) が
+  変わっていなければパースせずに復元する（呼び出し側が書き換えても良いよう、毎回新しいコピーを返す）
+- シリアライズ結果の sha256 を ETag として返す（/api/suite の条件付きリクエスト用）
+- pickle と依存ファイルの (mtime, サイズ) をディスク（既定 bench/out/cache/suites/）にも書き、
+  新しいプロセス（CLI の実行ごと）でも、依存ファイルが変わっていなければパースせずに復元する
+
+ディスクのキャッシュは環境変数 BENCH_SUITE_CACHE でディレクトリを変えられる（off で無効。プロセス内だけになる）。
+読めない・壊れたキャッシュファイルは無視してパースし直す。
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import yaml
+
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def load_yaml(stream):
+    """yaml.safe_load と同じ結果を、使えれば libyaml で返す。"""
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def file_signature(path) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size)。ファイルがなければ None（後から作られたら無効化される）。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class SuiteCache:
+    """パス → マージ済みスイートのキャッシュ（依存ファイルの mtime で無効化）。directory があればディスクにも保存する。"""
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory) if directory else None
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, entry: dict) -> bool:
+        return all(file_signature(p) == sig for p, sig in entry["deps"].items())
+
+    def _disk_path(self, key: str) -> Path:
+        return self.directory / (hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + ".pickle")
+
+    def _read_disk(self, key: str) -> Optional[dict]:
+        if self.directory is None:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                entry = pickle.load(f)
+        except Exception:
+            return None
+        return entry if isinstance(entry, dict) and entry.get("path") == key else None
+
+    def _write_disk(self, key: str, entry: dict) -> None:
+        if self.directory is None:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # 別プロセスが読みかけのファイルを壊さないよう、一時ファイルに書いてから置き換える
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(dict(entry, path=key), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._disk_path(key))
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def _lookup(self, key: str) -> Optional[dict]:
+        """最新のエントリを返す（プロセス内になければディスクから読む）。"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and self._fresh(entry):
+            return entry
+        entry = self._read_disk(key)
+        if entry is not None and self._fresh(entry):
+            with self._lock:
+                self._entries[key] = entry
+            return entry
+        return None
+
+    def get(self, path, build: Callable[[str], Tuple[dict, Dict[str, Optional[Tuple[int, int]]]]]) -> Tuple[dict, str]:
+        """
+        (スイート, ETag) を返す。build(path) は (スイート, {依存ファイル: 読む直前の file_signature}) を
+        返す関数（読んでいる最中に書き換えられても、次回の確認で読み直される）。
+        build が例外を投げた場合（検証エラーなど）はキャッシュせずにそのまま伝える。
+        """
+        key = os.path.abspath(path)
+        entry = self._lookup(key)
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            return pickle.loads(entry["blob"]), entry["etag"]
+
+        suite, deps = build(key)
+        signatures = {os.path.abspath(p): sig for p, sig in deps.items()}
+        blob = pickle.dumps(suite, protocol=pickle.HIGHEST_PROTOCOL)
+        entry = {"deps": signatures, "blob": blob, "etag": hashlib.sha256(blob).hexdigest()[:32]}
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = entry
+        self._write_disk(key, entry)
+        return pickle.loads(blob), entry["etag"]
+
+    def peek_etag(self, path) -> Optional[str]:
+        """キャッシュが最新ならその ETag を返す（スイート本体は復元しない）。"""
+        entry = self._lookup(os.path.abspath(path))
+        return entry["etag"] if entry is not None else None
+
+    def clear(self) -> None:
+        """プロセス内のキャッシュを空にする（ディスクのファイルも消す）。"""
+        with self._lock:
+            self._entries.clear()
+        if self.directory is not None and self.directory.is_dir():
+            for f in self.directory.glob("*.pickle"):
+                try:
+                    f.unlink()
+                except OSError:
+                    pass
+
+
+def default_cache_dir() -> Optional[Path]:
+    """BENCH_SUITE_CACHE（なければ bench/out/cache/suites）。"off" なら None（プロセス内だけ）。"""
+    path = os.environ.get("BENCH_SUITE_CACHE") or str(Path(__file__).resolve().parent / "out" / "cache" / "suites")
+    return None if path.lower() == "off" else Path(path)
+
+
+# プロセス内で共有するキャッシュ（ディスクのキャッシュはプロセス間で共有される）
+SUITE_CACHE = SuiteCache(default_cache_dir())
@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+# テストでは bench/out/jobs.sqlite・results.sqlite・cache/suites を作らない（server の import より前に設定する）
+os.environ.setdefault("BENCH_JOB_STORE", "memory")
+os.environ.setdefault("BENCH_RESULTS_DB", "off")
+os.environ.setdefault("BENCH_SUITE_CACHE", "off")
+
+
+class FakeCompletions:
+    """chat.completions.create の代わりに、プロンプトをそのまま返すストリームを作る。"""
+
+    def __init__(self, delay=0.0, usage=None):
+        self.delay = delay
+        self.usage = usage
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def create(self, model, messages, stream=False, **kwargs):
+        with self.lock:
+            self.calls.append(dict(kwargs, model=model, stream=stream))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            content = messages[-1]["content"]
+            if isinstance(content, list):
+                content = content[0]["text"]
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+        chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None)
+            for piece in content.split(" ")
+        ]
+        for c in chunks[:-1]:
+            c.choices[0].delta.content += " "
+        if self.usage:
+            chunks.append(SimpleNamespace(choices=[], usage=SimpleNamespace(**self.usage)))
+        return iter(chunks)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch: pytest.MonkeyPatch):
+    """
+    OpenAI クライアントを FakeCompletions に差し替える。
+    使い方: completions, client = fake_llm(delay=0.01, usage={...})
+    """
+    import bench.main as main
+
+    def install(delay=0.0, usage=None, models=("m1",), modules=()):
+        completions = FakeCompletions(delay=delay, usage=usage)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        for module in (main,) + tuple(modules):
+            monkeypatch.setattr(module, "OpenAI", lambda **kwargs: client)
+        monkeypatch.setattr(main, "get_models", lambda base_url: list(models))
+        return completions, client
+
+    return install
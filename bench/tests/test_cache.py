@@ -0,0 +1,97 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import bench.main as main
+from bench.cache import ResponseCache, cache_key, resolve_cache_mode
+
+
+def suite_with(keyword):
+    return {
+        "meta": {"default_params": {"temperature": 0, "max_tokens": 32}},
+        "cases": [
+            {
+                "id": "v",
+                "pass_threshold": 1.0,
+                "variants": [{"prompt": f"answer {i}", "evaluation": {"type": "contains_all", "keywords": [keyword]}} for i in range(3)],
+            },
+            {
+                "id": "legacy",
+                "request": {"messages": [{"role": "user", "content": "hello world"}]},
+                "eval": {"type": "contains_all", "keywords": [keyword]},
+            },
+        ],
+    }
+
+
+def test_cache_key_is_stable_and_sensitive():
+    msgs = [{"role": "user", "content": "hi"}]
+    k = cache_key("m", msgs, {"temperature": 0, "max_tokens": 5})
+    assert k == cache_key("m", [dict(msgs[0])], {"max_tokens": 5, "temperature": 0})
+    assert k != cache_key("m2", msgs, {"temperature": 0, "max_tokens": 5})
+    assert k != cache_key("m", msgs, {"temperature": 0, "max_tokens": 5}, run_index=1)
+    # 計測値はエンドポイントとストリームの読み方ごとに別
+    k = cache_key("m", msgs, {}, 0, "http://a/v1", "sdk")
+    assert k == cache_key("m", msgs, {}, 0, "http://a/v1/", "sdk")
+    assert k != cache_key("m", msgs, {}, 0, "http://b/v1", "sdk")
+    assert k != cache_key("m", msgs, {}, 0, "http://a/v1", "raw")
+
+
+def test_resolve_cache_mode():
+    assert resolve_cache_mode("auto", {"temperature": 0}) == "read"
+    assert resolve_cache_mode(None, {"temperature": 0.7}) == "off"
+    assert resolve_cache_mode("write", {"temperature": 0.7}) == "write"
+    with pytest.raises(ValueError):
+        resolve_cache_mode("bogus", {})
+
+
+def test_second_run_is_served_from_cache(tmp_path: Path, fake_llm):
+    completions, _ = fake_llm()
+    with ResponseCache(tmp_path / "cache", mode="read") as cache:
+        first = main.run_bench_logic(suite_with("answer"), "http://x/v1", ".*", runs=2, warmup=0, timeout=5, cache=cache)
+        calls_after_first = len(completions.calls)
+        second = main.run_bench_logic(suite_with("answer"), "http://x/v1", ".*", runs=2, warmup=0, timeout=5, cache=cache)
+
+    assert calls_after_first == 3 * 2 + 2
+    assert len(completions.calls) == calls_after_first
+    assert cache.hits == calls_after_first
+    assert all(d["cached"] for d in second[0]["variant_details"])
+    assert [d["ttft_ms"] for d in second[0]["variant_details"]] == [d["ttft_ms"] for d in first[0]["variant_details"]]
+
+
+def test_other_endpoint_does_not_replay_cached_latency(tmp_path: Path, fake_llm):
+    completions, _ = fake_llm()
+    with ResponseCache(tmp_path / "cache", mode="read") as cache:
+        main.run_bench_logic(suite_with("answer"), "http://x/v1", ".*", runs=1, warmup=0, timeout=5, cache=cache)
+        calls = len(completions.calls)
+        other = main.run_bench_logic(suite_with("answer"), "http://y/v1", ".*", runs=1, warmup=0, timeout=5,
+                                     cache=cache)
+    assert len(completions.calls) == 2 * calls and cache.hits == 0
+    assert not any(d["cached"] for d in other[0]["variant_details"])
+
+
+def test_write_mode_always_runs(tmp_path: Path, fake_llm):
+    completions, _ = fake_llm()
+    with ResponseCache(tmp_path / "cache", mode="write") as cache:
+        main.run_bench_logic(suite_with("answer"), "http://x/v1", ".*", runs=1, warmup=0, timeout=5, cache=cache)
+        main.run_bench_logic(suite_with("answer"), "http://x/v1", ".*", runs=1, warmup=0, timeout=5, cache=cache)
+    assert len(completions.calls) == 2 * (3 + 1)
+
+
+def test_reeval_rescores_stored_responses(tmp_path: Path, fake_llm):
+    fake_llm()
+    results = main.run_bench_logic(suite_with("answer"), "http://x/v1", ".*", runs=1, warmup=0, timeout=5)
+    path = tmp_path / "results.jsonl"
+    path.write_text("".join(json.dumps(r) + "\n" for r in results) + "not json\n", encoding="utf-8")
+
+    loaded = main.load_results_jsonl(path)
+    assert len(loaded) == len(results)
+    assert loaded[0]["passed"] is True
+
+    rescored = main.reeval_results(loaded, suite_with("world"))
+    variant, legacy = rescored
+    assert variant["passed"] is False
+    assert variant["variant_pass_count"] == 0
+    assert legacy["passed"] is True
+    assert "reevaluated_at" in legacy
@@ -0,0 +1,99 @@
+import json
+import random
+from pathlib import Path
+
+import bench.compare as compare
+from bench.resultsdb import ResultsDB
+
+
+def legacy(model, case_id, run_index, ttft, passed=True, category="math"):
+    return {"model": model, "case_id": case_id, "category_id": category, "run_index": run_index,
+            "status": "ok", "passed": passed, "ttft_ms": ttft, "e2e_ms": ttft * 2, "is_variant_test": False}
+
+
+def write_jsonl(path: Path, results):
+    path.write_text("".join(json.dumps(r) + "\n" for r in results), encoding="utf-8")
+    return str(path)
+
+
+def test_tests_match_reference_values():
+    # scipy.stats.mannwhitneyu([1,2,3,4,5], [6,7,8,9,10]) -> p≈0.0122（正規近似・連続性補正）
+    assert abs(compare.mann_whitney_u([1, 2, 3, 4, 5], [6, 7, 8, 9, 10]) - 0.0122) < 0.001
+    assert compare.mann_whitney_u([1, 1, 1], [1, 1, 1]) == 1.0
+    # 正確二項: b=10, c=1 -> p = 2 * (1 + 11) / 2^11
+    assert abs(compare.mcnemar_exact(10, 1) - 24 / 2048) < 1e-12
+    assert compare.mcnemar_exact(0, 0) == 1.0
+    assert compare.wilcoxon_signed_rank([1, 2, 3], [1, 2, 3]) == 1.0
+    assert compare.wilcoxon_signed_rank(list(range(20)), [x + 5 for x in range(20)]) < 0.001
+
+
+def test_noise_is_not_flagged_but_real_regression_is():
+    rng = random.Random(1)
+    base = [legacy("m1", f"c{i}", r, 100 + rng.gauss(0, 5)) for i in range(10) for r in range(3)]
+    noisy = [legacy("m1", f"c{i}", r, 100 + rng.gauss(0, 5)) for i in range(10) for r in range(3)]
+    slow = [dict(r, ttft_ms=r["ttft_ms"] * 1.3, e2e_ms=r["e2e_ms"] * 1.3) for r in base]
+
+    rows = compare.compare_sets(base, noisy, bootstrap=200)
+    assert not any(r["regression"] for r in rows)
+
+    rows = {r["metric"]: r for r in compare.compare_sets(base, slow, bootstrap=200)}
+    assert rows["ttft_ms (median)"]["regression"] and rows["ttft_ms (median)"]["test"] == "wilcoxon"
+    lo, hi = rows["ttft_ms (median)"]["ci"]
+    assert lo <= 0.3 <= hi + 1e-9
+    assert not rows["pass_rate"]["regression"]
+
+
+def test_pass_rate_drop_uses_paired_outcomes_and_variants():
+    def variant_result(model, passes):
+        return {"model": model, "case_id": "v", "category_id": "math", "status": "ok", "is_variant_test": True,
+                "variant_details": [{"variant_index": i, "run_index": 0, "status": "ok", "passed": p,
+                                     "ttft_ms": 10, "e2e_ms": 20} for i, p in enumerate(passes)]}
+
+    base = [variant_result("m1", [True] * 30)]
+    cand = [variant_result("m1", [True] * 18 + [False] * 12)]
+    rows = {r["metric"]: r for r in compare.compare_sets(base, cand, group="case", bootstrap=0)}
+    acc = rows["pass_rate"]
+    assert acc["group"] == ["m1", "v"] and acc["n"] == [30, 30]
+    assert acc["test"] == "mcnemar (b=12, c=0)" and acc["regression"]
+    assert not rows["ttft_ms (median)"]["regression"]
+
+
+def test_cached_records_are_left_out_of_latency_samples():
+    base = [legacy("m1", f"c{i}", 0, 100 + i) for i in range(10)]
+    # 比較対象は半分がキャッシュ再生（ベースラインの値の焼き直し）で、残りが 2 倍遅い
+    cand = [dict(r, cached=True) if i < 5 else dict(r, ttft_ms=r["ttft_ms"] * 2, e2e_ms=r["e2e_ms"] * 2)
+            for i, r in enumerate(base)]
+    rows = {r["metric"]: r for r in compare.compare_sets(base, cand, bootstrap=0, min_pairs=5)}
+    ttft = rows["ttft_ms (median)"]
+    assert ttft["cached"] == [0, 5] and ttft["n"] == [5, 5] and ttft["test"] == "wilcoxon"
+    assert ttft["baseline"] == 107 and ttft["candidate"] == 214
+    assert "cached 0/5" in compare.format_text([{"baseline": "a", "candidate": "b", "rows": list(rows.values())}])
+    assert rows["pass_rate"]["n"] == [10, 10]  # 合否はキャッシュでも比べる
+
+    all_cached = [dict(r, cached=True) for r in base]
+    rows = {r["metric"]: r for r in compare.compare_sets(base, all_cached, bootstrap=0)}
+    assert rows["ttft_ms (median)"]["cached"] == [0, 10] and rows["ttft_ms (median)"]["candidate"] is None
+    assert not rows["ttft_ms (median)"]["regression"]
+
+
+def test_cli_exit_code_and_db_sources(tmp_path: Path, capsys):
+    base = [legacy("m1", f"c{i}", 0, 100 + i) for i in range(10)]
+    slow = [dict(r, ttft_ms=r["ttft_ms"] * 2, e2e_ms=r["e2e_ms"] * 2) for r in base]
+    a = write_jsonl(tmp_path / "a.jsonl", base)
+    b = write_jsonl(tmp_path / "b.jsonl", slow)
+
+    assert compare.main([a, a, "--bootstrap", "0"]) == 0
+    html = tmp_path / "cmp.html"
+    out_json = tmp_path / "cmp.json"
+    assert compare.main([a, b, "--bootstrap", "50", "--html", str(html), "--json", str(out_json)]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
+    assert "回帰: 2 件" in html.read_text(encoding="utf-8")
+    assert json.loads(out_json.read_text(encoding="utf-8"))[0]["candidate"] == b
+    # 閾値を緩めれば通る
+    assert compare.main([a, b, "--bootstrap", "0", "--latency-threshold", "1.5"]) == 0
+
+    db_path = tmp_path / "r.sqlite"
+    with ResultsDB(db_path) as db:
+        db.ingest(base, run_id="base", source="cli")
+        db.ingest(slow, run_id="new", source="cli")
+    assert compare.main(["--db", str(db_path), "base", "new", "--bootstrap", "0"]) == 1
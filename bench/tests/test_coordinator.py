@@ -0,0 +1,195 @@
+import json
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import bench.main as main
+from bench.coordinator import EndpointUnavailable, WorkStealingQueues, parse_endpoints, run_work_stealing
+from bench.merge import merge_journals
+from bench.mock import MockServer
+from conftest import FakeCompletions
+
+
+def test_parse_endpoints():
+    assert parse_endpoints("http://a/v1=2, http://b/v1") == [
+        {"base_url": "http://a/v1", "capacity": 2},
+        {"base_url": "http://b/v1", "capacity": 1},
+    ]
+    assert parse_endpoints([{"base_url": "http://a/v1", "capacity": 3}])[0]["capacity"] == 3
+    with pytest.raises(ValueError):
+        parse_endpoints("http://a/v1=0")
+    with pytest.raises(ValueError):
+        parse_endpoints("")
+
+
+def test_queues_steal_from_tail_of_longest_queue():
+    q = WorkStealingQueues(3)
+    for i in range(4):
+        q.push(1, i)
+    q.push(2, "x")
+    assert q.pop(1) == 0
+    assert q.pop(0) == 3  # 最も長いキューの末尾から盗む
+    assert q.pop(0, accept=lambda u: u == "x") == "x"
+    assert q.steals == [2, 0, 0]
+
+
+def test_fast_endpoint_steals_work_from_slow_one():
+    endpoints = parse_endpoints("fast,slow")
+    done = {"fast": [], "slow": []}
+    lock = threading.Lock()
+
+    def run(ep, unit):
+        time.sleep(0.001 if ep["base_url"] == "fast" else 0.05)
+        with lock:
+            done[ep["base_url"]].append(unit)
+
+    summary = run_work_stealing(endpoints, list(range(20)), run)
+    assert sorted(done["fast"] + done["slow"]) == list(range(20))
+    assert len(done["fast"]) > len(done["slow"])
+    assert summary["endpoints"][0]["stolen"] > 0
+    assert summary["unassigned"] == []
+
+
+def test_failed_endpoint_is_dropped_and_its_work_reassigned():
+    endpoints = parse_endpoints("ok,bad")
+    done = []
+
+    def run(ep, unit):
+        if ep["base_url"] == "bad":
+            raise ConnectionError("down")
+        time.sleep(0.005)
+        done.append(unit)
+
+    errors = []
+    summary = run_work_stealing(endpoints, list(range(6)), run, progress_callback=lambda k, d: errors.append(d))
+    assert sorted(done) == list(range(6))
+    assert summary["endpoints"][1]["failed"] == "down"
+    assert errors and "bad" in errors[0]
+
+
+def test_work_returned_after_other_workers_exit_is_rerun():
+    endpoints = parse_endpoints("ok,late")
+    done = []
+    tries = []
+
+    def run(ep, unit):
+        if ep["base_url"] == "late":
+            time.sleep(0.1)  # ok のワーカーが終わった後に失敗して作業単位を戻す
+            raise EndpointUnavailable("down")
+        time.sleep(0.02)  # late が自分の作業単位を取るより先に盗まないように
+        if unit == 0 and not tries:
+            tries.append(unit)
+            raise EndpointUnavailable("blip", detach=False)  # 切り離さずに同じエンドポイントで実行し直す
+        done.append(unit)
+
+    summary = run_work_stealing(endpoints, [0, 1], run)
+    assert sorted(done) == [0, 1] and tries == [0]
+    assert summary["unassigned"] == [] and summary["endpoints"][0]["failed"] is None
+    assert summary["endpoints"][1]["failed"] == "down"
+
+
+def test_unreachable_endpoint_is_detached_instead_of_recording_errors(monkeypatch: pytest.MonkeyPatch):
+    # モデル一覧の取得後に落ちたエンドポイント（接続拒否）。結果は全部生きている方で取り直す
+    dead = "http://127.0.0.1:9/v1"
+    with MockServer({"models": ["m1"], "ttft_ms": 0, "itl_ms": 0}) as server:
+        monkeypatch.setattr(main, "get_models", lambda base_url: ["m1"])
+        events = []
+        results = main.run_bench_distributed(
+            SUITE, f"{server.base_url},{dead}=2", ".*", runs=1, warmup=0, timeout=5,
+            progress_callback=lambda kind, data: events.append((kind, data)),
+        )
+    assert [r["case_id"] for r in results] == [c["id"] for c in SUITE["cases"]]
+    assert all(r["status"] == "ok" and r["endpoint"] == server.base_url for r in results)
+    assert not any(kind == "result" and d["endpoint"] == dead for kind, d in events)
+    assert any(kind == "error" and "切り離しました" in d for kind, d in events)
+
+
+def install_endpoints(monkeypatch, models_by_url):
+    """base_url ごとに別のモデル一覧・FakeCompletions を持つ偽エンドポイント群。"""
+    completions = {url: FakeCompletions(delay=0.002) for url in models_by_url}
+
+    def fake_openai(base_url=None, **kwargs):
+        return SimpleNamespace(chat=SimpleNamespace(completions=completions[base_url]))
+
+    monkeypatch.setattr(main, "OpenAI", fake_openai)
+    monkeypatch.setattr(main, "get_models", lambda base_url: list(models_by_url[base_url]))
+    return completions
+
+
+SUITE = {
+    "meta": {},
+    "cases": [
+        {"id": f"c{i}", "request": {"messages": [{"role": "user", "content": f"hello {i}"}]},
+         "eval": {"type": "contains_any", "keywords": ["hello"]}}
+        for i in range(6)
+    ] + [
+        {"id": "v", "variants": [{"prompt": "p q", "evaluation": {"type": "contains_any", "keywords": ["p"]}}]},
+    ],
+}
+
+
+def test_run_bench_distributed_spreads_cases_and_keeps_order(monkeypatch: pytest.MonkeyPatch):
+    completions = install_endpoints(monkeypatch, {"http://a/v1": ["m1", "m2"], "http://b/v1": ["m1"]})
+    events = []
+    results = main.run_bench_distributed(
+        SUITE, "http://a/v1=2,http://b/v1", ".*", runs=1, warmup=0, timeout=5,
+        progress_callback=lambda kind, data: events.append((kind, data)),
+    )
+    # (モデル, ケース) の順に並び、m2 は持っているエンドポイントでだけ実行される
+    assert [(r["model"], r["case_id"]) for r in results] == [(m, c["id"]) for m in ("m1", "m2") for c in SUITE["cases"]]
+    assert all(r["passed"] for r in results)
+    assert {r["endpoint"] for r in results if r["model"] == "m2"} == {"http://a/v1"}
+    assert completions["http://b/v1"].calls, "2台目にも作業が分配される"
+    assert sum(1 for kind, _ in events if kind == "result") == len(results)
+    assert any(kind == "variant" and d["endpoint"] for kind, d in events)
+
+
+def test_shard_and_merge_round_trip(tmp_path: Path, fake_llm):
+    fake_llm()
+    journals = []
+    for index in (1, 2):
+        suite = main.shard_suite(SUITE, *main.parse_shard(f"{index}/2"))
+        path = tmp_path / f"results_{index}.jsonl"
+        with open(path, "w", encoding="utf-8") as f:
+            main.run_bench_logic(suite, "http://x/v1", ".*", runs=1, warmup=0, timeout=5,
+                                 progress_callback=lambda kind, data: kind in ("result", "variant")
+                                 and f.write(json.dumps(data) + "\n"))
+        journals.append(str(path))
+
+    assert [c["id"] for c in main.shard_suite(SUITE, 2, 2)["cases"]] == ["c1", "c3", "c5"]
+    records, duplicates = merge_journals(journals + journals[:1], SUITE)
+    assert duplicates == 4
+    results = [r for r in records if r.get("record_type", "result") == "result"]
+    assert [r["case_id"] for r in results] == [c["id"] for c in SUITE["cases"]]
+    # variants のジャーナルは集約結果の直前に残る
+    assert records[-2]["record_type"] == "variant" and records[-1]["case_id"] == "v"
+
+    with pytest.raises(ValueError):
+        main.parse_shard("3/2")
+
+
+def test_server_job_with_endpoints_skips_model_loading(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    import bench.server as server
+
+    install_endpoints(monkeypatch, {"http://a/v1": ["m1"], "http://b/v1": ["m1"]})
+    monkeypatch.setattr(server, "JOURNAL_DIR", tmp_path)
+
+    async def no_lms(*args, **kwargs):
+        raise AssertionError("coordinator モードでは lms を呼ばない")
+
+    monkeypatch.setattr(server, "run_lms_command", no_lms)
+    suite_path = tmp_path / "suite.yaml"
+    suite_path.write_text(json.dumps(SUITE), encoding="utf-8")
+
+    req = server.BenchRequest(suite_path=str(suite_path), models=["m1"], cache="off",
+                              endpoints=[{"base_url": "http://a/v1", "capacity": 2}, {"base_url": "http://b/v1"}])
+    server.JOBS.create("job-dist", status="running", expected_total=0)
+    server.run_bm_task("job-dist", req)
+
+    job = server.JOBS.get("job-dist")
+    assert job["status"] == "done"
+    assert len(job["results"]) == job["expected_total"] == len(SUITE["cases"])
+    assert {r["endpoint"] for r in job["results"]} == {"http://a/v1", "http://b/v1"}
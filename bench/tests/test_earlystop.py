@@ -0,0 +1,69 @@
+import itertools
+
+import bench.main as main
+from bench.earlystop import VariantDecider, deterministic_decision
+
+
+def variant_suite(n, threshold=0.8, failing=()):
+    return {
+        "meta": {},
+        "cases": [
+            {
+                "id": "v",
+                "pass_threshold": threshold,
+                "variants": [
+                    {"prompt": f"answer {i}",
+                     "evaluation": {"type": "contains_all", "keywords": ["never" if i in failing else f"answer {i}"]}}
+                    for i in range(n)
+                ],
+            }
+        ],
+    }
+
+
+def test_deterministic_decision_matches_full_verdict_for_every_outcome():
+    # 全ての結果列について、途中で決まった判定が全件実行の判定と一致する
+    for outcomes in itertools.product(("pass", "fail", "error"), repeat=5):
+        valid = [o for o in outcomes if o != "error"]
+        final = (valid.count("pass") / len(valid) if valid else 0) >= 0.6
+        for k in range(len(outcomes) + 1):
+            seen = outcomes[:k]
+            decision = deterministic_decision(seen.count("pass"), k - seen.count("error"), len(outcomes) - k, 0.6)
+            assert decision is None or decision == final
+
+
+def test_sprt_decides_before_deterministic_cutoff():
+    decider = VariantDecider(total=100, threshold=0.5, mode="sprt", delta=0.2)
+    for _ in range(100):
+        if decider.decided:
+            break
+        decider.add({"status": "ok", "passed": True})
+    assert decider.decision is True and decider.reason == "sprt"
+    assert decider.decided_at < 50  # deterministic なら 50 件必要
+
+
+def test_run_bench_logic_stops_after_verdict_is_fixed(fake_llm):
+    completions, _ = fake_llm()
+
+    res = main.run_bench_logic(variant_suite(10, threshold=0.5), "http://x/v1", ".*", runs=2, warmup=0, timeout=5,
+                               early_stop="deterministic")[0]
+
+    assert res["passed"] is True
+    assert res["early_stop"]["executed"] == 10 and res["early_stop"]["total"] == 20
+    assert res["early_stop"]["executed_variants"] == 5 and res["early_stop"]["decision"] == "pass"
+    assert len(completions.calls) == 10 and len(res["variant_details"]) == 10
+    assert "early stop: 10/20" in res["eval_reason"]
+
+
+def test_early_fail_and_full_mode(fake_llm):
+    completions, _ = fake_llm(delay=0.005)
+    suite = variant_suite(10, threshold=0.8, failing={0, 1, 2})
+
+    res = main.run_bench_logic(suite, "http://x/v1", ".*", runs=1, warmup=0, timeout=5,
+                               early_stop="deterministic", concurrency=2)[0]
+    assert res["passed"] is False and res["early_stop"]["decision"] == "fail"
+    assert res["early_stop"]["executed"] < 10 and len(completions.calls) <= res["early_stop"]["executed"] + 2
+
+    full = main.run_bench_logic(suite, "http://x/v1", ".*", runs=1, warmup=0, timeout=5)[0]
+    assert full["passed"] is False and full["early_stop"] is None
+    assert full["variant_total_count"] == 10 and full["variant_pass_rate"] == 0.7
@@ -0,0 +1,105 @@
+import os
+import shutil
+import struct
+import zlib
+from pathlib import Path
+
+import pytest
+
+import bench.main as main
+from bench.images import ImagePayloadCache, image_size, normalize_preprocess, resolve_preprocess, sniff_mime
+
+BENCH_DIR = Path(__file__).resolve().parents[1]
+
+
+def tiny_png(width=3, height=2) -> bytes:
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    raw = b"".join(b"\x00" + b"\xff\x00\x00" * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+def test_sniff_mime_uses_content_not_extension():
+    # リポジトリの ocr_code.png は中身が JPEG
+    data = (BENCH_DIR / "images" / "ocr_code.png").read_bytes()
+    assert sniff_mime(data, "ocr_code.png") == "image/jpeg"
+    assert image_size(data) == (1024, 1024)
+    assert sniff_mime(tiny_png()) == "image/png"
+    assert image_size(tiny_png(5, 4)) == (5, 4)
+    assert sniff_mime(b"????", "x.webp") == "image/webp"
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_payload_cache_reads_once_and_is_content_addressed(tmp_path: Path, use_mmap):
+    a = tmp_path / "a.png"
+    a.write_bytes(tiny_png())
+    b = tmp_path / "b.png"
+    shutil.copy(a, b)
+
+    cache = ImagePayloadCache(use_mmap=use_mmap)
+    first = cache.payload(str(a))
+    assert first["url"].startswith("data:image/png;base64,")
+    assert (first["width"], first["height"]) == (3, 2)
+    assert cache.payload(str(a)) is first
+    # 同じ内容の別ファイルも同じペイロードを共有する
+    assert cache.payload(str(b)) is first
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    # ファイルが変われば読み直す
+    a.write_bytes(tiny_png(4, 4))
+    os.utime(a, ns=(1, 1))
+    assert cache.payload(str(a))["width"] == 4
+
+
+def test_payload_cache_lru_cap(tmp_path: Path):
+    paths = []
+    for i in range(3):
+        p = tmp_path / f"{i}.png"
+        p.write_bytes(tiny_png(i + 1, 1))
+        paths.append(str(p))
+    sizes = [len(ImagePayloadCache().data_url(p)) for p in paths]
+    cache = ImagePayloadCache(max_bytes=sizes[1] + sizes[2])
+    for p in paths:
+        cache.payload(p)
+    assert len(cache._payloads) == 2
+    cache.payload(paths[0])
+    assert cache.misses == 4
+
+
+def test_preprocess_spec_resolution():
+    assert resolve_preprocess({"max_side": 512, "format": "JPEG"}, None, {"quality": 70}) == {
+        "max_side": 512, "format": "jpeg", "quality": 70}
+    assert resolve_preprocess(None, {}) is None
+    with pytest.raises(ValueError):
+        normalize_preprocess({"format": "bmp"})
+
+
+def test_preprocess_resizes_and_reencodes(tmp_path: Path):
+    pytest.importorskip("PIL")
+    src = tmp_path / "big.png"
+    src.write_bytes(tiny_png(40, 20))
+    payload = ImagePayloadCache().payload(str(src), {"max_side": 10, "format": "jpeg", "quality": 80})
+    assert payload["mime"] == "image/jpeg"
+    assert (payload["width"], payload["height"]) == (10, 5)
+
+
+def test_variant_messages_use_cache_and_record_image(tmp_path: Path, fake_llm):
+    img = tmp_path / "x.png"
+    img.write_bytes(tiny_png())
+    suite = {
+        "meta": {},
+        "cases": [{
+            "id": "v",
+            "variants": [{"prompt": "what", "image_path": str(img), "evaluation": {"type": "contains_any", "keywords": ["what"]}}],
+        }],
+    }
+    fake_llm()
+    results = main.run_bench_logic(suite, "http://x/v1", ".*", runs=2, warmup=0, timeout=5)
+    details = results[0]["variant_details"]
+    assert all(d["image"] == {"mime": "image/png", "bytes": img.stat().st_size, "width": 3, "height": 2, "preprocess": None}
+               for d in details)
+
+    messages, missing = main.build_variant_messages(suite["cases"][0], suite["cases"][0]["variants"][0])
+    assert missing is None
+    assert messages[-1]["content"][1]["image_url"]["url"].startswith("data:image/png;base64,")
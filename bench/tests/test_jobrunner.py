@@ -0,0 +1,64 @@
+import asyncio
+import sys
+import threading
+
+import bench.server as server
+from bench.jobstore import MemoryJobStore
+from bench.runner import JobRunner
+
+
+def test_runner_queues_jobs_fifo_with_max_parallel():
+    store = MemoryJobStore()
+    runner = JobRunner(store, max_parallel=1)
+    gate = threading.Event()
+    order = []
+
+    def job(name):
+        order.append(name)
+        if name == "a":
+            gate.wait(5)
+
+    positions = []
+    for name in ["a", "b", "c"]:
+        store.create(name)
+        positions.append(runner.submit(name, job, name))
+
+    assert positions[1:] == [1, 2]
+    assert store.get("c")["status"] == "queued"
+    store.request_cancel("c")
+    gate.set()
+    assert runner.wait_idle(5)
+
+    assert order == ["a", "b"]
+    assert store.get("b")["status"] == "running"  # ジョブ関数が状態を更新しなければ running のまま
+    assert store.get("c")["status"] == "cancelled"
+
+
+def test_runner_marks_unexpected_errors_failed():
+    store = MemoryJobStore()
+    runner = JobRunner(store)
+    store.create("x")
+
+    def boom():
+        raise RuntimeError("boom")
+
+    runner.submit("x", boom)
+    assert runner.wait_idle(5)
+    job = store.get("x")
+    assert job["status"] == "failed"
+    assert "boom" in job["logs"][-1]["msg"]
+
+
+def test_run_lms_command_handles_timeout_and_cancel():
+    ok = asyncio.run(server.run_lms_command([sys.executable, "-c", "print('hi')"], timeout=10))
+    assert ok == {"success": True, "output": "hi"}
+
+    slow = [sys.executable, "-c", "import time; time.sleep(10)"]
+    timed_out = asyncio.run(server.run_lms_command(slow, timeout=0.3))
+    assert not timed_out["success"] and "タイムアウト" in timed_out["output"]
+
+    cancelled = asyncio.run(server.run_lms_command(slow, timeout=10, cancel_check=lambda: True))
+    assert cancelled == {"success": False, "output": "キャンセルされました"}
+
+    missing = asyncio.run(server.run_lms_command(["definitely-not-a-command-xyz"], timeout=1))
+    assert not missing["success"]
@@ -0,0 +1,111 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from bench.jobstore import ORPHANED_MESSAGE, JobStore, MemoryJobStore, SQLiteJobStore, create_job_store
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path: Path):
+    if request.param == "memory":
+        return MemoryJobStore(max_finished=2)
+    return SQLiteJobStore(tmp_path / "jobs.sqlite", max_finished=2, archive_dir=tmp_path / "archive", cancel_poll_sec=0)
+
+
+def test_round_trip(store):
+    store.create("a", kind="bm", expected_total=3)
+    store.append_log("a", "info", "start")
+    assert store.append_result("a", {"case_id": "c1", "passed": True}) == 0
+    assert store.append_result("a", {"case_id": "c2", "passed": False}) == 1
+    store.set_result("a", 1, {"case_id": "c2", "passed": True})
+    store.update("a", summary={"knee_level": 4})
+
+    job = store.get("a")
+    assert job["status"] == "running"
+    assert job["kind"] == "bm"
+    assert job["expected_total"] == 3
+    assert job["logs"] == [{"type": "info", "msg": "start"}]
+    assert [r["passed"] for r in job["results"]] == [True, True]
+    assert job["summary"] == {"knee_level": 4}
+    assert store.count_results("a") == 2
+    assert store.get_result("a", 5) is None
+    assert store.get("missing") is None
+
+
+def test_cancel_flag(store):
+    store.create("a")
+    assert not store.is_cancelled("a")
+    store.request_cancel("a")
+    assert store.is_cancelled("a")
+    assert store.get("a")["cancelled"] is True
+
+
+def test_prune_keeps_running_jobs(store):
+    for job_id in ["j1", "j2", "j3", "live"]:
+        store.create(job_id)
+    for job_id in ["j1", "j2", "j3"]:
+        store.update(job_id, status="done")
+
+    assert not store.exists("j1")
+    assert store.exists("j2") and store.exists("j3") and store.exists("live")
+    assert [j["job_id"] for j in store.list_jobs()][0] == "live"
+
+
+def test_sqlite_survives_restart_and_archives(tmp_path: Path):
+    db = tmp_path / "jobs.sqlite"
+    first = SQLiteJobStore(db, max_finished=1, archive_dir=tmp_path / "archive")
+    first.create("old")
+    first.append_result("old", {"case_id": "c"})
+    first.update("old", status="done")
+
+    second = SQLiteJobStore(db, max_finished=1, archive_dir=tmp_path / "archive")
+    assert second.get("old")["results"] == [{"case_id": "c"}]
+    second.create("new")
+    second.update("new", status="failed")
+
+    assert not second.exists("old")
+    archived = json.loads((tmp_path / "archive" / "old.json").read_text(encoding="utf-8"))
+    assert archived["results"] == [{"case_id": "c"}]
+
+
+def test_reopening_the_db_fails_jobs_left_running_by_a_dead_server(tmp_path: Path):
+    db = tmp_path / "jobs.sqlite"
+    first = SQLiteJobStore(db)
+    first.create("queued", status="queued")
+    first.create("running")
+    first.create("finished")
+    first.update("finished", status="done")
+    # 別のワーカー（生きているプロセス）のジョブには触らない
+    first.create("other-worker")
+    first.update("other-worker", owner={"host": first.owner["host"], "pid": os.getppid(), "instance": "x"})
+
+    second = SQLiteJobStore(db)  # 同じ PID の新しいインスタンス = 再起動後のサーバー
+    assert sorted(j["job_id"] for j in second.list_jobs() if j["status"] == "failed") == ["queued", "running"]
+    assert second.get("running")["logs"][-1]["msg"] == ORPHANED_MESSAGE
+    assert second.get("finished")["status"] == "done"
+    assert second.get("other-worker")["status"] == "running"
+
+    # 再開（create し直し）したジョブは今のインスタンスのもの。次の再起動でまた回収される
+    second.create("running", status="queued")
+    assert second.reconcile_orphans() == []
+    assert SQLiteJobStore(db).get("running")["status"] == "failed"
+
+
+def test_create_job_store_from_env(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("BENCH_JOB_STORE", "sqlite")
+    monkeypatch.setenv("BENCH_JOB_DB", str(tmp_path / "x.sqlite"))
+    assert isinstance(create_job_store(tmp_path), SQLiteJobStore)
+    monkeypatch.setenv("BENCH_JOB_STORE", "redis")
+    with pytest.raises(ValueError):
+        create_job_store(tmp_path)
+
+
+def test_incomplete_store_fails_at_construction():
+    class Partial(JobStore):
+        def create(self, job_id, **fields):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,117 @@
+import json
+import re
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import bench.main as main
+from bench.judge import JudgeMemo, JudgePipeline, parse_batch_verdicts
+from bench.rules import compile_rule
+
+
+class FakeJudge:
+    """バッチのプロンプトには JSON 配列、1件ずつのプロンプトには PASS/FAIL を返す（回答に "828" があれば PASS）。"""
+
+    def __init__(self, batch_ok=True):
+        self.batch_ok = batch_ok
+        self.prompts = []
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        with self.lock:
+            self.prompts.append(prompt)
+        if "【項目 1】" in prompt:
+            answers = re.findall(r"実際の回答: (.*)", prompt)
+            verdicts = [{"id": i, "verdict": "PASS" if "828" in a else "FAIL", "reason": "ok"}
+                        for i, a in enumerate(answers, 1)]
+            text = json.dumps(verdicts) if self.batch_ok else "すみません、判定できません"
+        else:
+            text = "PASS\n一致" if "828" in prompt.split("【実際の回答】")[1] else "FAIL\n不一致"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def test_batches_and_memoizes_by_normalized_response():
+    client = FakeJudge()
+    memo = JudgeMemo()
+    with JudgePipeline(client, "judge", batch_size=8, workers=1, batch_wait_ms=50, memo=memo) as judge:
+        futures = [judge.submit(["828"], r) for r in ("828", " 828 ", "答えは828です", "827")]
+        verdicts = [f.result(timeout=5) for f in futures]
+    assert [v[0] for v in verdicts] == [True, True, True, False]
+    assert futures[0] is futures[1]  # 正規化すると同じ回答は処理中の Future を共有する
+    assert client.prompts and all("【項目 1】" in p for p in client.prompts)
+    assert judge.judged == 3
+
+    # 2回目はメモから返り、API は呼ばない
+    with JudgePipeline(client, "judge", workers=1, memo=memo) as judge:
+        assert judge.submit(["828"], "828").result(timeout=5)[0] is True
+        assert judge.requests == 0
+
+
+def test_unparseable_batch_falls_back_to_single_prompts_and_errors_to_fuzzy():
+    client = FakeJudge(batch_ok=False)
+    with JudgePipeline(client, "judge", batch_size=4, workers=1, batch_wait_ms=50, memo=JudgeMemo()) as judge:
+        futures = [judge.submit(["828"], r) for r in ("828", "827")]
+        assert [f.result(timeout=5)[0] for f in futures] == [True, False]
+    assert judge.judged == 2
+
+    assert parse_batch_verdicts('[{"id": 1, "verdict": "pass"}, {"id": 9, "verdict": "FAIL"}]', 2) == {1: (True, "LLMジャッジ判定")}
+
+    broken = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kw: 1 / 0)))
+    with JudgePipeline(broken, "judge", workers=1, memo=JudgeMemo()) as judge:
+        assert judge.submit(["828"], "828").result(timeout=5) is None
+
+
+def test_run_bench_logic_uses_pipeline_and_judges_repeated_answers_once(fake_llm):
+    fake_llm(models=("m1", "m2"))
+    suite = {
+        "meta": {},
+        "cases": [
+            {"id": "v", "pass_threshold": 1.0,
+             "variants": [{"prompt": "828", "evaluation": {"type": "semantic_match", "expected": "828"}}] * 3},
+            {"id": "l", "request": {"messages": [{"role": "user", "content": "828"}]},
+             "eval": {"type": "semantic_match", "expected": "828"}},
+        ],
+    }
+    client = FakeJudge()
+    with JudgePipeline(client, "judge", workers=2, memo=JudgeMemo()) as judge:
+        results = main.run_bench_logic(suite, "http://x/v1", ".*", runs=1, warmup=0, timeout=5,
+                                       use_llm_judge=True, judge_model="judge", judge=judge)
+    assert [r["passed"] for r in results] == [True, True, True, True]
+    assert all(v["passed"] and v["eval_reason"].startswith("意味一致") for v in results[0]["variant_details"])
+    assert not any(k.startswith("_judge") for r in results for k in r)
+    assert not any(k.startswith("_judge") for v in results[0]["variant_details"] for k in v)
+    assert judge.judged == 1  # ジャッジモデルが同じなら 2モデル × 4件の "828" を1回だけ判定
+
+    # パイプラインを使わない評価（ジャッジなし）は従来どおり fuzzy_match にフォールバックする
+    assert compile_rule({"type": "semantic_match", "expected": "828"}).evaluate("828")[0] is True
+
+
+def test_own_pipeline_is_closed_even_when_the_run_fails(fake_llm, monkeypatch):
+    created = []
+
+    class TrackedPipeline(JudgePipeline):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.closed = False
+            created.append(self)
+
+        def close(self):
+            self.closed = True
+            super().close()
+
+    monkeypatch.setattr(main, "JudgePipeline", TrackedPipeline)
+    suite = {"meta": {}, "cases": [{"id": "l", "request": {"messages": [{"role": "user", "content": "828"}]},
+                                    "eval": {"type": "semantic_match", "expected": "828"}}]}
+    run = lambda: main.run_bench_logic(suite, "http://x/v1", ".*", runs=1, warmup=0, timeout=5, use_llm_judge=True)
+
+    fake_llm(models=())
+    assert run() == [] and created == []  # モデルがなければパイプラインを作らない
+
+    fake_llm()
+    monkeypatch.setattr(main, "_stream_completion", lambda *args, **kwargs: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        run()
+    assert len(created) == 1 and created[0].closed
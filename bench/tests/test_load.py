@@ -0,0 +1,107 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import bench.load as load
+
+
+def text_suite(n=3):
+    return {
+        "meta": {},
+        "cases": [
+            {
+                "id": "v",
+                "variants": [{"prompt": f"q {i}", "evaluation": {"type": "contains_all", "keywords": ["q"]}} for i in range(n)],
+            },
+            {"id": "img", "modality": "vision", "variants": [{"prompt": "x", "image_path": "/nope.png"}]},
+            {"id": "legacy", "request": {"messages": [{"role": "user", "content": "hello"}]}},
+        ],
+    }
+
+
+def test_collect_prompts_skips_vision():
+    prompts = load.collect_prompts(text_suite(3))
+    assert len(prompts) == 4
+    assert prompts[-1] == [{"role": "user", "content": "hello"}]
+
+
+def test_find_knee_and_slo():
+    reports = [
+        {"level": 1, "ok": 10, "throughput_rps": 1.0},
+        {"level": 2, "ok": 10, "throughput_rps": 1.9},
+        {"level": 4, "ok": 10, "throughput_rps": 2.0},
+    ]
+    assert load.find_knee(reports) == 2
+    assert load.find_knee([]) is None
+
+    report = {"error_rate": 0.2, "ttft_ms": {"p90": 500.0}, "e2e_ms": {"p90": 900.0}}
+    assert load.check_slo(report, {"ttft_p90_ms": 1000}) == []
+    breaches = load.check_slo(report, {"ttft_p90_ms": 100, "error_rate": 0.1})
+    assert len(breaches) == 2
+
+
+def test_run_load_closed_loop_sweeps_levels(fake_llm):
+    completions, _ = fake_llm(delay=0.01)
+    levels_seen = []
+    summary = load.run_load(
+        text_suite(), "http://x/v1", "m1", mode="closed", levels=[1, 3],
+        duration_sec=5, max_requests_per_level=6,
+        progress_callback=lambda kind, data: levels_seen.append(data["level"]) if kind == "level" else None,
+    )
+    assert levels_seen == [1, 3]
+    assert [r["requests"] for r in summary["levels"]] == [6, 6]
+    assert summary["levels"][1]["ttft_ms"]["p50"] is not None
+    assert completions.max_in_flight <= 3
+
+
+def test_run_load_stops_on_slo_breach(fake_llm):
+    fake_llm(delay=0.01)
+    summary = load.run_load(
+        text_suite(), "http://x/v1", "m1", mode="open", levels=[50, 100, 200],
+        duration_sec=5, max_requests_per_level=5, slo={"e2e_p90_ms": 0.001},
+    )
+    assert len(summary["levels"]) == 1
+    assert summary["stopped_reason"].startswith("SLO")
+    assert summary["max_level_within_slo"] is None
+
+
+def test_open_loop_counts_queueing_from_the_arrival_time():
+    def slow(seq):
+        load.time.sleep(0.05)
+        return {"status": "ok", "ttft_ms": 1.0, "e2e_ms": 2.0}
+
+    # 同時1件に絞ると後の到着ほど送信を待つ。その待ち時間は TTFT / E2E に含める
+    samples = load._run_open_loop(slow, 1000, 5, 4, None, load.random.Random(0), max_in_flight=1)
+    assert [round(s["e2e_ms"] - s["ttft_ms"], 6) for s in samples] == [1.0] * 4
+    assert samples[-1]["queue_ms"] >= 140 and samples[-1]["ttft_ms"] == 1.0 + samples[-1]["queue_ms"]
+    assert load.summarize_level("open", 1000, samples, 1.0)["queue_ms"]["count"] == 4
+
+
+def test_run_load_rejects_non_positive_levels(fake_llm):
+    fake_llm()
+    with pytest.raises(ValueError):
+        load.run_load(text_suite(), "http://x/v1", "m1", mode="open", levels=[1, 0])
+    with pytest.raises(ValueError):
+        load.run_load(text_suite(), "http://x/v1", "m1", mode="closed", levels=[0.5])
+
+
+def test_load_start_endpoint_registers_job(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    suite_path = tmp_path / "suite.yaml"
+    suite_path.write_text("cases:\n  - id: a\n    request:\n      messages:\n        - role: user\n          content: hi\n", encoding="utf-8")
+
+    import bench.server as server
+
+    monkeypatch.setattr(server, "run_load_task", lambda job_id, req: None)
+    client = TestClient(server.app)
+    resp = client.post("/api/load/start", json={"suite_path": str(suite_path), "model": "m1", "levels": [1, 2]})
+    data = resp.json()
+    assert data["expected_total"] == 2
+    assert server.JOBS.get(data["job_id"])["kind"] == "load"
+
+    bad = client.post("/api/load/start", json={"suite_path": str(suite_path), "model": "m1", "mode": "burst"})
+    assert "error" in bad.json()
+    # closed のユーザー数は整数だけ（open の QPS は小数でよい）
+    bad = client.post("/api/load/start", json={"suite_path": str(suite_path), "model": "m1", "levels": [0.5, 2]})
+    assert "整数" in bad.json()["error"]
+    ok = client.post("/api/load/start", json={"suite_path": str(suite_path), "model": "m1", "mode": "open",
+                                              "levels": [0.5]})
+    assert "job_id" in ok.json()
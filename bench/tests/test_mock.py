@@ -0,0 +1,76 @@
+import pytest
+
+import bench.main as main
+from bench.mock import MockServer, MockState, resolve_mock_config, sample_ms
+
+
+@pytest.fixture(scope="module")
+def mock_server():
+    config = {
+        "models": ["mock-llm", {"id": "mock-vlm", "slots": 1}],
+        "ttft_ms": 30,
+        "itl_ms": {"dist": "uniform", "min": 1, "max": 3},
+        "slots": 2,
+        "script": [
+            {"match": "2\\+2", "answer": "The answer is 4"},
+            {"match": "boom", "error": 500},
+            {"match": "cut", "answer": "one two three four five six", "itl_ms": 0},
+        ],
+    }
+    with MockServer(config) as server:
+        yield server
+
+
+def test_plans_are_deterministic_per_seed():
+    config = resolve_mock_config({"ttft_ms": {"dist": "lognormal", "median": 100, "sigma": 0.5},
+                                  "errors": {"rate": 0.3, "stream_rate": 0.3}})
+    body = {"model": "mock-llm", "messages": [{"role": "user", "content": "hello there"}]}
+    a, b = MockState(config), MockState(config)
+    plans = [a.plan(body) for _ in range(20)]
+    assert plans == [b.plan(body) for _ in range(20)]
+    assert len({p["ttft"] for p in plans}) == 20  # 同じプロンプトでも回ごとに引き直す
+    assert sample_ms(12, None) == 12.0 and sample_ms({"dist": "normal", "mean": -5, "sd": 0}, a.rng("m", "p")) == 0.0
+
+
+def test_models_endpoints_and_vision_probe(mock_server):
+    assert main.get_models(mock_server.base_url) == ["mock-llm", "mock-vlm"]
+    assert main.probe_vision_capability(mock_server.base_url, "mock-vlm") is True
+    assert main.probe_vision_capability(mock_server.base_url, "mock-llm") is False
+
+
+@pytest.mark.parametrize("backend", ["sdk", "raw"])
+def test_run_bench_logic_end_to_end(mock_server, backend):
+    suite = {
+        "meta": {"stream_backend": backend, "default_params": {"max_tokens": 4}},
+        "cases": [
+            {"id": "v", "variants": [
+                {"prompt": f"what is 2+2 ({i})", "evaluation": {"type": "contains_any", "keywords": ["4"]}}
+                for i in range(8)
+            ]},
+            {"id": "boom", "request": {"messages": [{"role": "user", "content": "boom"}]},
+             "eval": {"type": "contains_any", "keywords": ["x"]}},
+            {"id": "cut", "request": {"messages": [{"role": "user", "content": "cut"}]},
+             "eval": {"type": "contains_all", "keywords": ["three"]}},
+        ],
+    }
+    before = mock_server.state.stats["max_in_flight"].get("mock-llm", 0)
+    results = main.run_bench_logic(suite, mock_server.base_url, "mock-llm", runs=1, warmup=0, timeout=10,
+                                   concurrency=6)
+
+    variant, boom, cut = results
+    assert variant["passed"] is True and variant["variant_total_count"] == 8
+    details = variant["variant_details"]
+    assert all(d["ttft_ms"] >= 30 and d["completion_tokens"] == 4 and d["token_source"] == "usage" for d in details)
+    assert all(d["response"] == "The answer is 4" for d in details)
+    # 同時実行 6 でも、モックのスロット数（2）を超えて生成はしない
+    assert max(before, 2) == mock_server.state.stats["max_in_flight"]["mock-llm"]
+    assert boom["status"] == "error" and boom["error_type"] == "InternalServerError"
+    assert cut["status"] == "ok" and cut["passed"] is True and cut["full_response"] == "one two three four "  # max_tokens で打ち切り
+
+
+def test_stream_error_injection():
+    with MockServer({"errors": {"stream_rate": 1.0}, "ttft_ms": 0, "itl_ms": 0}) as server:
+        client = main.stream_client(server.base_url, {"stream_backend": "raw"})
+        out = main._stream_completion(client, "mock-llm", [{"role": "user", "content": "a b c"}], {}, 5)
+        assert out["status"] == "error" and out["error_type"] == "APIError"
+        assert server.state.stats["errors"] == 1
@@ -0,0 +1,56 @@
+import json
+
+import bench.perf as perf
+
+
+def run(name, median, samples):
+    return {"benchmarks": {name: {"median": median, "samples": samples}}}
+
+
+def test_compare_runs_flags_only_significant_slowdowns():
+    base = run("x", 1.0, [1.0, 1.01, 0.99, 1.02, 0.98, 1.0, 1.01])
+    slower = run("x", 1.5, [1.5, 1.51, 1.49, 1.52, 1.48, 1.5, 1.51])
+    noisy = run("x", 1.05, [1.05, 1.0, 0.98, 1.1, 1.02, 0.99, 1.06])
+    assert perf.compare_runs(base, slower)[0]["regression"] is True
+    assert perf.compare_runs(base, noisy)[0]["regression"] is False
+    assert perf.compare_runs(slower, base)[0]["regression"] is False
+    assert perf.compare_runs(base, run("y", 1.0, [1.0])) == []
+
+
+def test_main_saves_and_compares_against_baseline(tmp_path, capsys):
+    saved = tmp_path / "baseline.json"
+    assert perf.main(["--filter", "extract_first_json|evaluate_result.exact", "--samples", "5", "--min-time", "0",
+                      "--save", str(saved)]) == 0
+    data = json.loads(saved.read_text(encoding="utf-8"))
+    assert set(data["benchmarks"]) == {"extract_first_json.adversarial", "evaluate_result.exact_match"}
+    assert all(len(b["samples"]) == 5 and b["median"] > 0 for b in data["benchmarks"].values())
+
+    # ベースラインを 1/100 にすれば回帰として検出する
+    for b in data["benchmarks"].values():
+        b["samples"] = [s / 100 for s in b["samples"]]
+        b["median"] /= 100
+    saved.write_text(json.dumps(data), encoding="utf-8")
+    assert perf.main(["--filter", "extract_first_json", "--samples", "5", "--min-time", "0",
+                      "--baseline", str(saved)]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
+
+
+def test_registry_covers_the_harness_hot_paths():
+    names = list(perf.BENCHMARKS)
+    for prefix in ("load_suite.", "evaluate_result.", "extract_first_json.", "generate_html_report.", "api.bm_status.",
+                   "stream_completion.sdk.", "stream_completion.raw."):
+        assert any(n.startswith(prefix) for n in names), prefix
+    assert perf.BENCHMARKS["generate_html_report.100k"][1] is False  # --quick では省く
+
+
+def test_benchmarks_clean_up_after_themselves(tmp_path, monkeypatch):
+    import tempfile
+
+    import bench.server as server
+
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    jobs = server.JOBS
+    perf.run_benchmarks("api.bm_status|generate_html_report.10k", samples=1, min_time=0)
+    # 計測用のジョブはサーバーのストアに残らず、レポートの一時ディレクトリも消える
+    assert server.JOBS is jobs and jobs.get("perf-bm-status") is None
+    assert list(tmp_path.iterdir()) == []
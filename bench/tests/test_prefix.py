@@ -0,0 +1,84 @@
+import bench.main as main
+from bench.prefix import PrefixTracker, order_work_items
+from bench.report import write_report
+
+
+def two_case_suite(n=3):
+    return {
+        "meta": {},
+        "cases": [
+            {
+                "id": case_id,
+                "system_prompt": f"you are {case_id}",
+                "pass_threshold": 1.0,
+                "variants": [
+                    {"prompt": f"{case_id} {i}", "evaluation": {"type": "contains_all", "keywords": [f"{case_id} {i}"]}}
+                    for i in range(n)
+                ],
+            }
+            for case_id in ("a", "b")
+        ],
+    }
+
+
+def record_prompts(completions):
+    sent = []
+    create = completions.create
+
+    def recording(model, messages, stream=False, **kwargs):
+        sent.append(messages[-1]["content"])
+        return create(model, messages, stream=stream, **kwargs)
+
+    completions.create = recording
+    return sent
+
+
+def test_tracker_tags_shared_prefix_as_warm():
+    tracker = PrefixTracker(slots=1)
+    sys_a = {"role": "system", "content": "A"}
+    assert tracker.observe("m", [sys_a, {"role": "user", "content": "1"}]) == "cold"
+    assert tracker.observe("m", [sys_a, {"role": "user", "content": "2"}]) == "warm"
+    assert tracker.observe("other", [sys_a, {"role": "user", "content": "2"}]) == "cold"
+    assert tracker.observe("m", [{"role": "system", "content": "B"}, {"role": "user", "content": "1"}]) == "cold"
+    # slots=1 なので B を挟むと A は追い出されている
+    assert tracker.observe("m", [sys_a, {"role": "user", "content": "3"}]) == "cold"
+
+
+def test_order_policies():
+    groups = [("x", [1, 2]), ("y", [3, 4]), ("x", [5])]
+    assert [i for _g, i in order_work_items(groups, "suite")] == [1, 2, 3, 4, 5]
+    assert [i for _g, i in order_work_items(groups, "grouped")] == [1, 2, 5, 3, 4]
+    assert [i for _g, i in order_work_items(groups, "interleaved")] == [1, 3, 5, 2, 4]
+    shuffled = order_work_items(groups, "random", seed=1)
+    assert sorted(i for _g, i in shuffled) == [1, 2, 3, 4, 5]
+    assert shuffled == order_work_items(groups, "random", seed=1)
+
+
+def test_interleaved_order_makes_every_request_cold(fake_llm, tmp_path):
+    completions, _ = fake_llm()
+    sent = record_prompts(completions)
+
+    results = main.run_bench_logic(two_case_suite(), "http://x/v1", ".*", runs=1, warmup=0, timeout=5,
+                                   prefix_order="interleaved")
+
+    assert sent == ["a 0", "b 0", "a 1", "b 1", "a 2", "b 2"]
+    # 結果はケースの順・variant の順のまま
+    assert [r["case_id"] for r in results] == ["a", "b"]
+    assert [d["variant_index"] for d in results[0]["variant_details"]] == [0, 1, 2]
+    assert all(d["prefix_cache"] == "cold" for r in results for d in r["variant_details"])
+    assert results[0]["prefix_cache_stats"]["cold"]["count"] == 3
+
+    write_report(results, tmp_path / "report.html")
+    assert "プレフィックスキャッシュ" in (tmp_path / "report.html").read_text(encoding="utf-8")
+
+
+def test_suite_order_first_variant_is_cold_rest_warm(fake_llm):
+    completions, _ = fake_llm()
+    sent = record_prompts(completions)
+
+    results = main.run_bench_logic(two_case_suite(), "http://x/v1", ".*", runs=1, warmup=0, timeout=5)
+
+    assert sent == ["a 0", "a 1", "a 2", "b 0", "b 1", "b 2"]
+    for r in results:
+        assert [d["prefix_cache"] for d in r["variant_details"]] == ["cold", "warm", "warm"]
+        assert r["prefix_cache_stats"]["warm"]["count"] == 2
@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+
+import bench.main as main
+from bench.report import ReportAggregator, iter_jsonl_results, write_report
+
+
+def result(i, model="m1", status="ok", preview="ok", **extra):
+    return {"timestamp": f"t{i}", "model": model, "case_id": f"c{i}", "case_name": f"case {i}", "category_name": "cat",
+            "status": status, "passed": i % 2 == 0, "ttft_ms": float(i), "e2e_ms": 2.0 * i, "itl_ms": [1.0, 2.0, float(i)],
+            "response_preview": preview, "run_index": 0, **extra}
+
+
+def test_small_report_is_self_contained(tmp_path: Path):
+    out = tmp_path / "report.html"
+    info = write_report([result(i) for i in range(3)] + [result(9, preview="</script><b>x")], out)
+    text = out.read_text(encoding="utf-8")
+    assert info == {"results": 4, "chunks": 0}
+    assert "BENCH_REPORT.addChunk(0," in text
+    assert "<\\/script><b>x" in text and "</script><b>x" not in text
+    assert not (tmp_path / "report_files").exists()
+
+
+def test_large_report_writes_detail_chunks(tmp_path: Path):
+    out = tmp_path / "report.html"
+    info = write_report((result(i, preview=f"resp-{i}") for i in range(7)), out, chunk_size=2, inline_limit=3)
+    assert info == {"results": 7, "chunks": 4}
+    text = out.read_text(encoding="utf-8")
+    assert "resp-" not in text
+    assert 'chunkDir: "report_files"' in text
+    chunk = (tmp_path / "report_files" / "details_00003.js").read_text(encoding="utf-8")
+    assert chunk.startswith("BENCH_REPORT.addChunk(3,") and "resp-6" in chunk
+
+
+def test_aggregator_matches_latency_stats_and_bounds_itl():
+    results = [result(i, model=f"m{i % 2}") for i in range(40)]
+    agg = ReportAggregator()
+    for r in results:
+        agg.add(r)
+    expected = main.latency_stats(main.request_samples([r for r in results if r["model"] == "m0"]))
+    assert main.summarize_latencies(agg.by_model["m0"]["itl"]) == expected["itl_ms"]
+    assert main.summarize_latencies(agg.by_model["m0"]["ttft"]) == expected["ttft_ms"]
+
+    small = ReportAggregator(itl_reservoir=5)
+    for r in results:
+        small.add(r)
+    assert len(small.by_model["m0"]["itl"]) == 5
+    assert small.by_model["m0"]["itl_seen"] == 60
+
+
+def test_iter_jsonl_results_matches_load_results_jsonl(tmp_path: Path):
+    path = tmp_path / "results.jsonl"
+    records = [
+        result(0, status="error"),
+        {"record_type": "variant", "model": "m1", "case_id": "v", "variant_index": 0, "run_index": 0},
+        result(1),
+        result(0),  # 再開で置き換えられた結果
+        {"model": "m1", "case_id": "img", "status": "skipped", "reason": "missing_capabilities"},
+    ]
+    path.write_text("\n".join(json.dumps(r) for r in records) + "\nnot json\n", encoding="utf-8")
+    assert list(iter_jsonl_results(path)) == main.load_results_jsonl(path)
+    assert [r["status"] for r in iter_jsonl_results(path)][:2] == ["ok", "ok"]
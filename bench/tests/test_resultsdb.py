@@ -0,0 +1,75 @@
+import argparse
+import json
+from pathlib import Path
+
+import bench.main as main
+from bench.resultsdb import ResultsDB
+
+
+def legacy(model, case_id, run_index, ttft, category="math", ts="2026-01-01T00:00:00"):
+    return {"timestamp": ts, "model": model, "case_id": case_id, "category_id": category, "run_index": run_index,
+            "status": "ok", "passed": True, "ttft_ms": ttft, "e2e_ms": ttft * 2, "is_variant_test": False}
+
+
+def test_add_result_is_idempotent_and_expands_variants(tmp_path: Path):
+    with ResultsDB(tmp_path / "r.sqlite") as db:
+        db.start_run("run1", source="cli")
+        db.add_result("run1", legacy("m1", "a", 0, 100))
+        db.add_result("run1", legacy("m1", "a", 0, 120))  # 再開で同じキーが届いても重複しない
+        db.add_result("run1", {
+            "timestamp": "2026-01-01T00:00:01", "model": "m1", "case_id": "v", "category_id": "math",
+            "status": "ok", "passed": True, "is_variant_test": True, "run_index": 0,
+            "variant_details": [
+                {"variant_index": 0, "run_index": 0, "status": "ok", "ttft_ms": 10, "passed": True},
+                {"variant_index": 1, "run_index": 0, "status": "skipped", "ttft_ms": 0},
+            ],
+        })
+        db.add_result("run1", {"model": "m1", "case_id": "img", "status": "skipped", "reason": "missing_capabilities"})
+
+        assert db.query("SELECT COUNT(*) AS n FROM results")[0]["n"] == 3
+        rows = db.query("SELECT case_id, variant_index, ttft_ms FROM requests ORDER BY case_id")
+        assert rows == [{"case_id": "a", "variant_index": None, "ttft_ms": 120.0},
+                        {"case_id": "v", "variant_index": 0, "ttft_ms": 10.0}]
+        assert db.query("SELECT category_id FROM cases WHERE case_id = 'v'")[0]["category_id"] == "math"
+        indexes = {r["name"] for r in db.query("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"idx_requests_model", "idx_requests_case", "idx_requests_category", "idx_requests_timestamp"} <= indexes
+
+
+def test_latency_history_over_last_runs(tmp_path: Path):
+    with ResultsDB(tmp_path / "r.sqlite") as db:
+        for day in range(1, 5):
+            run_id = f"run{day}"
+            db.start_run(run_id, started_at=f"2026-01-0{day}T00:00:00")
+            for i, ttft in enumerate((day * 100, day * 100 + 10)):
+                db.add_result(run_id, legacy("m1", f"c{i}", 0, ttft))
+            db.add_result(run_id, legacy("m1", "other", 0, 9999, category="code"))
+            db.add_result(run_id, legacy("m2", "c0", 0, 1))
+            # キャッシュから再生したリクエストは前回の値なので数えない
+            db.add_result(run_id, dict(legacy("m1", "replayed", 0, 1), cached=True))
+
+        h = db.latency_history("m1", "ttft_ms", 90, category_id="math", last_runs=2)
+        assert [r["run_id"] for r in h["runs"]] == ["run4", "run3"]
+        assert h["runs"][0]["count"] == 2 and h["runs"][0]["cached"] == 1
+        assert h["cached"] == 2
+        assert h["runs"][0]["value"] == 409.0
+        assert h["count"] == 4
+        assert h["value"] == main.percentile([300, 310, 400, 410], 90)
+
+
+def test_run_bench_writes_results_db(tmp_path: Path, fake_llm):
+    fake_llm()
+    suite_path = tmp_path / "suite.yaml"
+    suite_path.write_text(json.dumps({
+        "cases": [{"id": "a", "request": {"messages": [{"role": "user", "content": "hi"}]},
+                   "eval": {"type": "contains_any", "keywords": ["hi"]}}],
+    }), encoding="utf-8")
+    args = argparse.Namespace(suite=str(suite_path), out=str(tmp_path / "out"), base_url="http://x/v1", models=".*",
+                              runs=2, warmup=0, timeout=5, concurrency=1, cache="off",
+                              results_db=str(tmp_path / "db.sqlite"))
+    main.run_bench(args)
+
+    with ResultsDB(tmp_path / "db.sqlite") as db:
+        runs = db.list_runs()
+        assert len(runs) == 1 and runs[0]["source"] == "cli" and runs[0]["results"] == 2
+        jsonl = next((tmp_path / "out").glob("results_*.jsonl"))
+        assert runs[0]["run_id"] == jsonl.stem
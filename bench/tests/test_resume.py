@@ -0,0 +1,99 @@
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import bench.main as main
+
+
+def suite():
+    return {
+        "meta": {},
+        "cases": [
+            {
+                "id": "v",
+                "pass_threshold": 1.0,
+                "variants": [{"prompt": f"answer {i}", "evaluation": {"type": "contains_all", "keywords": ["answer"]}} for i in range(4)],
+            },
+            {
+                "id": "legacy",
+                "request": {"messages": [{"role": "user", "content": "hello"}]},
+                "eval": {"type": "contains_all", "keywords": ["hello"]},
+            },
+        ],
+    }
+
+
+def journal_run(path, **kwargs):
+    def callback(kind, data):
+        if kind in ("result", "variant"):
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(data) + "\n")
+    return main.run_bench_logic(suite(), "http://x/v1", ".*", runs=2, warmup=0, timeout=5, progress_callback=callback, **kwargs)
+
+
+def test_variants_are_journaled_before_aggregate(tmp_path: Path, fake_llm):
+    fake_llm()
+    path = tmp_path / "results.jsonl"
+    journal_run(path)
+    kinds = [json.loads(line).get("record_type", "result") for line in path.read_text(encoding="utf-8").splitlines()]
+    assert kinds[:9] == ["variant"] * 8 + ["result"]
+    assert len(main.load_results_jsonl(path)) == 1 + 2
+
+
+def test_resume_skips_completed_variants_and_runs(tmp_path: Path, fake_llm):
+    completions, _ = fake_llm()
+    path = tmp_path / "results.jsonl"
+
+    # 5 リクエスト目の受信中にキャンセル（完了した variant は 4件）
+    def cancel_after_five():
+        return len(completions.calls) >= 5
+
+    journal_run(path, cancel_check=cancel_after_five)
+    assert len(completions.calls) == 5
+
+    state = main.build_resume_state(main.load_journal(path))
+    assert len(state["variants"][("m1", "v")]) == 4
+    assert state["done"] == {}
+
+    completions.calls.clear()
+    results = main.run_bench_logic(suite(), "http://x/v1", ".*", runs=2, warmup=0, timeout=5, resume=state)
+    # 残り variant 4件 + legacy 2 run だけが実行される
+    assert len(completions.calls) == 4 + 2
+    assert results[0]["variant_total_count"] == 8
+    assert results[0]["passed"] is True
+
+    # 全部終わった状態からの再開では何も実行しない
+    state = main.build_resume_state(results)
+    completions.calls.clear()
+    kinds = []
+    again = main.run_bench_logic(
+        suite(), "http://x/v1", ".*", runs=2, warmup=0, timeout=5, resume=state,
+        progress_callback=lambda kind, data: kinds.append(kind),
+    )
+    assert completions.calls == []
+    assert len(again) == 3
+    assert kinds.count("resumed") == 3 and "result" not in kinds
+
+
+def test_resume_endpoint_requires_journal(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    import bench.server as server
+
+    monkeypatch.setattr(server, "JOURNAL_DIR", tmp_path)
+    started = {}
+    monkeypatch.setattr(server, "run_bm_task", lambda job_id, req, resume=None: started.update(job_id=job_id, resume=resume))
+    client = TestClient(server.app)
+
+    assert client.post("/api/bm/nope/resume").status_code == 404
+
+    suite_path = tmp_path / "suite.yaml"
+    suite_path.write_text("cases:\n  - id: a\n    request:\n      messages:\n        - role: user\n          content: hi\n", encoding="utf-8")
+    server.append_journal("job-r", {"record_type": "request", "request": {"suite_path": str(suite_path), "models": ["m1"], "runs": 1}})
+    server.append_journal("job-r", {"model": "m1", "case_id": "a", "run_index": 0, "status": "ok", "passed": True})
+
+    resp = client.post("/api/bm/job-r/resume")
+    assert resp.status_code == 200
+    assert server.RUNNER.wait_idle(5)
+    assert started["job_id"] == "job-r"
+    assert ("m1", "a", 0) in started["resume"]["done"]
@@ -0,0 +1,124 @@
+import random
+import re
+from pathlib import Path
+
+import pytest
+
+import bench.main as main
+from bench.rules import AhoCorasick, KeywordSet, compile_rule, compile_suite_rules
+
+BENCH_DIR = Path(__file__).resolve().parents[1]
+
+
+def test_aho_corasick_matches_naive_search():
+    rng = random.Random(0)
+    alphabet = "abcあい"
+    for _ in range(200):
+        keywords = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 4))) for _ in range(rng.randint(1, 30))]
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        found = AhoCorasick(keywords).find(text)
+        assert found == {i for i, k in enumerate(keywords) if k in text}, (keywords, text)
+
+
+def test_many_keywords_use_automaton():
+    keywords = [f"kw{i}" for i in range(200)]
+    rule = {"type": "contains_any", "keywords": keywords}
+    assert compile_rule(rule).keyword_set._automaton is not None
+    passed, details = main.evaluate_result("... KW7 と kw199 ...", rule)
+    assert passed is True
+    assert details["matched"] == ["kw1", "kw7", "kw19", "kw199"]  # 部分文字列も検出される
+
+    rule_all = {"type": "contains_all", "keywords": keywords}
+    passed, details = main.evaluate_result(" ".join(keywords[:-1]), rule_all)
+    assert passed is False
+    assert details["reason"] == "未検出キーワード: ['kw199']"
+    assert KeywordSet(["a"])._automaton is None
+
+
+def test_compile_does_not_mutate_rule_and_is_cached():
+    rule = {"type": "exact_match", "expected": "A", "alternatives": ["B"]}
+    assert main.evaluate_result(" A ", rule)[0] is True
+    assert rule["alternatives"] == ["B"]
+    assert compile_rule(rule) is compile_rule(rule)
+    assert compile_rule(dict(rule)) is compile_rule(rule)  # 内容が同じなら別の dict でも共有する
+
+    # その場で書き換えた rule は、古いコンパイル結果を使わずにコンパイルし直す
+    rule["alternatives"].append("C")
+    assert main.evaluate_result("C", rule)[0] is True
+    rule["expected"] = "Z"
+    assert main.evaluate_result("A", rule)[0] is False
+
+
+def test_suites_restored_from_the_cache_are_not_recompiled(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    import bench.rules as rules
+
+    path = tmp_path / "suite.yaml"
+    path.write_text(
+        "cases:\n"
+        + "".join(f"  - {{id: c{i}, request: {{messages: []}}, eval: {{type: exact_match, expected: a{i}}}}}\n"
+                  for i in range(50)),
+        encoding="utf-8",
+    )
+    compiled = []
+
+    class CountingRule(rules.CompiledRule):
+        def __init__(self, rule):
+            compiled.append(rule)
+            super().__init__(rule)
+
+    monkeypatch.setattr(rules, "CompiledRule", CountingRule)
+    main.SUITE_CACHE.clear()
+    first = main.load_suite(path)
+    assert len(compiled) == 50
+    for _ in range(3):
+        suite = main.load_suite(path)
+        assert suite is not first
+        assert all(main.evaluate_result(f"a{i}", c["eval"])[0] for i, c in enumerate(suite["cases"]))
+    assert len(compiled) == 50  # 復元のたびにコンパイルし直さない
+
+
+def test_non_string_values_are_coerced_and_do_not_break_load_suite(tmp_path):
+    assert main.evaluate_result("828", {"type": "exact_match", "expected": 828})[0] is True
+    assert main.evaluate_result("1 と 2", {"type": "contains_all", "keywords": [1, 2]})[0] is True
+    assert main.evaluate_result("x", {"type": "contains_any", "keywords": [None, "x"]})[0] is True
+
+    path = tmp_path / "suite.yaml"
+    path.write_text(
+        "cases:\n"
+        "  - {id: ok, request: {messages: []}, eval: {type: exact_match, expected: 828}}\n"
+        "  - {id: bad, request: {messages: []}, eval: {type: contains_all, keywords: 5}}\n",
+        encoding="utf-8",
+    )
+    suite = main.load_suite(path)
+    passed, details = main.evaluate_result("5", suite["cases"][1]["eval"])
+    assert passed is False and details["reason"].startswith("評価ルールのエラー")
+
+
+def test_errors_surface_at_evaluation_time_like_before():
+    bad = {"type": "regex_match", "pattern": "("}
+    compiled = compile_rule(bad)
+    with pytest.raises(re.error):
+        compiled.evaluate("x")
+
+    broken = {"type": "numeric", "expected": "abc"}
+    assert main.evaluate_result("no digits", broken)[1]["reason"] == "数値が見つかりません"
+    assert main.evaluate_result("12", broken)[1]["reason"].startswith("数値評価エラー")
+
+
+def test_semantic_match_without_judge_falls_back_to_fuzzy():
+    passed, details = main.evaluate_result("東京", {"type": "semantic_match", "expected": "東京"})
+    assert passed is True
+    assert details["eval_type"] == "fuzzy_match"
+
+
+def test_unknown_type():
+    passed, details = main.evaluate_result("x", {"type": "nope"})
+    assert passed is False and "不明な評価タイプ" in details["reason"]
+
+
+def test_load_suite_precompiles_all_rules():
+    suite = main.load_suite(BENCH_DIR / "suite.yaml")
+    rules = [c["eval"] for c in suite["cases"] if "eval" in c]
+    rules += [v["evaluation"] for c in suite["cases"] for v in c.get("variants") or [] if "evaluation" in v]
+    assert compile_suite_rules(suite) == len(rules)
+    assert all(compile_rule(r) is compile_rule(r) for r in rules)
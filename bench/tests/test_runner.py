@@ -0,0 +1,116 @@
+import time
+
+import pytest
+
+import bench.main as main
+
+
+def variant_suite(n):
+    return {
+        "meta": {},
+        "cases": [
+            {
+                "id": "v",
+                "pass_threshold": 1.0,
+                "variants": [
+                    {"prompt": f"answer {i}", "evaluation": {"type": "contains_all", "keywords": [f"answer {i}"]}}
+                    for i in range(n)
+                ],
+            }
+        ],
+    }
+
+
+def test_map_bounded_keeps_input_order_under_concurrency():
+    emitted = []
+
+    def slow(x):
+        time.sleep(0.01 * (5 - x))
+        return x * 10
+
+    out = main._map_bounded(slow, range(5), concurrency=5, on_result=lambda i, r: emitted.append((i, r)))
+    assert out == [0, 10, 20, 30, 40]
+    assert emitted == [(0, 0), (1, 10), (2, 20), (3, 30), (4, 40)]
+
+
+def test_run_bench_logic_concurrent_variants_are_ordered_and_bounded(fake_llm):
+    completions, _ = fake_llm(delay=0.02)
+
+    results = main.run_bench_logic(variant_suite(8), "http://x/v1", ".*", runs=2, warmup=0, timeout=5, concurrency=3)
+
+    assert len(results) == 1
+    res = results[0]
+    assert res["passed"] is True
+    assert res["concurrency"] == 3
+    details = res["variant_details"]
+    assert [(d["variant_index"], d["run_index"]) for d in details] == [(v, r) for v in range(8) for r in range(2)]
+    assert all(d["concurrency"] == 3 for d in details)
+    assert 1 < completions.max_in_flight <= 3
+
+
+def test_run_bench_logic_legacy_runs_emit_in_order(fake_llm):
+    fake_llm(delay=0.01)
+    suite = {
+        "meta": {},
+        "cases": [
+            {
+                "id": "legacy",
+                "request": {"messages": [{"role": "user", "content": "hi"}]},
+                "eval": {"type": "contains_all", "keywords": ["hi"]},
+            }
+        ],
+    }
+    seen = []
+    main.run_bench_logic(
+        suite, "http://x/v1", ".*", runs=4, warmup=0, timeout=5,
+        progress_callback=lambda kind, data: seen.append(data) if kind == "result" else None,
+        concurrency=4,
+    )
+    assert [r["run_index"] for r in seen] == [0, 1, 2, 3]
+    assert all(r["passed"] for r in seen)
+
+
+def test_stream_completion_records_chunk_timing_and_usage(fake_llm):
+    completions, client = fake_llm(usage={"prompt_tokens": 7, "completion_tokens": 3})
+
+    out = main._stream_completion(client, "m1", [{"role": "user", "content": "a b c"}], {}, timeout=5)
+
+    assert out["status"] == "ok"
+    assert out["response"] == "a b c"
+    assert completions.calls[0]["stream_options"] == {"include_usage": True}
+    assert out["token_source"] == "usage"
+    assert (out["prompt_tokens"], out["completion_tokens"]) == (7, 3)
+    assert len(out["itl_ms"]) == 2
+
+
+def test_stream_completion_estimates_tokens_without_usage(fake_llm):
+    _, client = fake_llm()
+
+    out = main._stream_completion(client, "m1", [{"role": "user", "content": "東京 tower"}], {}, timeout=5)
+
+    assert out["token_source"] == "estimate"
+    assert out["completion_tokens"] == 2  # チャンク数
+    assert out["prompt_tokens"] == 3  # 東 / 京 / tower
+
+
+def test_percentiles_and_variant_latency_stats(fake_llm):
+    assert main.percentile([], 50) is None
+    assert main.percentile([1, 2, 3, 4], 50) == 2.5
+    assert main.summarize_latencies(range(101))["p99"] == pytest.approx(99.0)
+
+    fake_llm()
+    res = main.run_bench_logic(variant_suite(4), "http://x/v1", ".*", runs=1, warmup=0, timeout=5)[0]
+    stats = res["latency_stats"]
+    assert stats["ttft_ms"]["count"] == 4
+    assert stats["ttft_ms"]["p50"] is not None
+    assert res["completion_tokens"] == 8
+
+
+def test_html_report_shows_percentile_tables(tmp_path, fake_llm):
+    fake_llm()
+    results = main.run_bench_logic(variant_suite(3), "http://x/v1", ".*", runs=1, warmup=0, timeout=5)
+    out = tmp_path / "report.html"
+    main.generate_html_report(results, out)
+    text = out.read_text(encoding="utf-8")
+    assert "TTFT p50 / p90 / p99" in text
+    assert "ITL p50 / p90 / p99" in text
@@ -0,0 +1,103 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import bench.server as server
+from bench.scheduler import GIB, can_preload, model_sizes_from_lms_ls, order_models, readiness_delays
+
+
+def test_order_models_puts_loaded_first():
+    assert order_models(["a", "b", "c"], ["c", "x"]) == ["c", "a", "b"]
+    assert order_models(["a", "b"], []) == ["a", "b"]
+
+
+def test_model_sizes_and_can_preload():
+    out = json.dumps([{"modelKey": "a", "sizeBytes": 2 * GIB}, {"modelKey": "b", "sizeBytes": 3 * GIB}, {"modelKey": "e"}])
+    sizes = model_sizes_from_lms_ls(out)
+    assert sizes == {"a": 2 * GIB, "b": 3 * GIB}
+    assert model_sizes_from_lms_ls("not json") == {}
+
+    assert can_preload("a", "b", sizes, 5)
+    assert not can_preload("a", "b", sizes, 4.9)
+    assert not can_preload("a", "unknown", sizes, 100)
+    assert not can_preload("a", "b", sizes, None)
+
+
+def test_readiness_delays_back_off_and_stop():
+    delays = list(readiness_delays(total_sec=3, first=0.1, cap=1.0))
+    assert delays[:4] == [0.1, 0.2, 0.4, 0.8]
+    assert max(delays) == 1.0
+    assert sum(delays[:-1]) < 3 <= sum(delays)
+
+
+class FakeLMStudio:
+    """lms コマンドと /api/v0/models を模したモデル状態。"""
+
+    def __init__(self, loaded=()):
+        self.loaded = set(loaded)
+        self.commands = []
+
+    async def run_lms_command(self, args, timeout=60, cancel_check=None):
+        self.commands.append(tuple(args[1:]))
+        if args[1] == "load":
+            self.loaded.add(args[2])
+        elif args[1] == "unload":
+            self.loaded.discard(args[2])
+        elif args[1] == "ls":
+            return {"success": True, "output": json.dumps([{"modelKey": m, "sizeBytes": GIB} for m in "abc"])}
+        return {"success": True, "output": "完了"}
+
+    async def list_models_v0(self, base_url):
+        return [{"id": m, "state": "loaded" if m in self.loaded else "not-loaded"} for m in "abc"]
+
+
+@pytest.fixture
+def lmstudio(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, fake_llm):
+    def install(loaded=()):
+        fake = FakeLMStudio(loaded)
+        monkeypatch.setattr(server, "run_lms_command", fake.run_lms_command)
+        monkeypatch.setattr(server, "list_models_v0", fake.list_models_v0)
+        monkeypatch.setattr(server, "JOURNAL_DIR", tmp_path / "jobs")
+        fake_llm(models=("a", "b", "c"))
+        suite_path = tmp_path / "suite.yaml"
+        suite_path.write_text("cases:\n  - id: x\n    request:\n      messages:\n        - role: user\n          content: hi\n", encoding="utf-8")
+        return fake, str(suite_path)
+
+    return install
+
+
+def run_job(job_id, **fields):
+    req = server.BenchRequest(runs=1, cache="off", **fields)
+    server.JOBS.create(job_id)
+    server.run_bm_task(job_id, req)
+    return server.JOBS.get(job_id)
+
+
+def test_run_bm_task_records_load_metrics_and_reorders(lmstudio):
+    fake, suite_path = lmstudio(loaded=["b"])
+    job = run_job("job-sched", suite_path=suite_path, models=["a", "b"])
+
+    assert job["status"] == "done"
+    assert [r["model"] for r in job["results"]] == ["b", "a"]
+    b_load, a_load = (r["model_load"] for r in job["results"])
+    assert b_load["cold_start"] is False and b_load["load_ms"] == 0.0
+    assert a_load["cold_start"] is True and a_load["ready_ms"] >= a_load["load_ms"]
+    assert "unload_ms" in job["model_load"]["a"]
+    assert fake.commands == [("unload", "b"), ("load", "a"), ("unload", "a")]
+
+
+def test_run_bm_task_preloads_next_model_within_budget(lmstudio):
+    fake, suite_path = lmstudio()
+    job = run_job("job-preload", suite_path=suite_path, models=["a", "b"], preload_next=True, memory_budget_gb=2)
+
+    assert job["status"] == "done"
+    assert job["model_load"]["b"]["preloaded"] is True
+    # b のロードは a のアンロードより前に始まっている
+    assert fake.commands.index(("load", "b")) < fake.commands.index(("unload", "a"))
+    assert not fake.loaded
+
+    fake, suite_path = lmstudio()
+    job = run_job("job-nopreload", suite_path=suite_path, models=["a", "b"], preload_next=True, memory_budget_gb=1.5)
+    assert job["model_load"]["b"]["preloaded"] is False
+    assert fake.commands.index(("load", "b")) > fake.commands.index(("unload", "a"))
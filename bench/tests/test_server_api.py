@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 
 import pytest
@@ -59,8 +60,125 @@ def test_cancel_endpoint_sets_flag(monkeypatch: pytest.MonkeyPatch):
 
     client = TestClient(server.app)
     job_id = "job-test"
-    server.JOBS[job_id] = {"status": "running", "cancelled": False, "logs": [], "results": [], "expected_total": 0}
+    server.JOBS.create(job_id, status="running", expected_total=0)
 
     resp = client.post(f"/api/bm/{job_id}/cancel")
     assert resp.status_code == 200
-    assert server.JOBS[job_id]["cancelled"] is True
+    assert server.JOBS.get(job_id)["cancelled"] is True
+    assert server.JOBS.is_cancelled(job_id)
+
+
+def _finished_job(server, job_id):
+    server.JOBS.create(job_id, status="running", expected_total=3)
+    for i in range(3):
+        server.JOBS.append_log(job_id, "log", f"line {i}")
+        server.JOBS.append_result(job_id, {"case_id": f"c{i}", "passed": True})
+    server.JOBS.update(job_id, status="done")
+
+
+def test_status_cursor_returns_only_new_items():
+    import bench.server as server
+
+    _finished_job(server, "job-cursor")
+    client = TestClient(server.app)
+    data = client.get("/api/bm/job-cursor", params={"logs_after": 2, "results_after": 1}).json()
+    assert [log["msg"] for log in data["logs"]] == ["line 2"]
+    assert [r["case_id"] for r in data["results"]] == ["c1", "c2"]
+    assert data["results_after"] == 1
+
+    full = client.get("/api/bm/job-cursor").json()
+    assert len(full["logs"]) == 3 and len(full["results"]) == 3
+
+
+def _parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        events.append((fields["event"], json.loads(fields["data"]), fields.get("id")))
+    return events
+
+
+def test_event_stream_sends_new_events_and_ends():
+    import bench.server as server
+
+    _finished_job(server, "job-sse")
+    client = TestClient(server.app)
+    resp = client.get("/api/bm/job-sse/events", params={"results_after": 2})
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(resp.text)
+    kinds = [e[0] for e in events]
+    assert kinds == ["log", "log", "log", "result", "status", "end"]
+    assert events[3][1] == {"index": 2, "result": {"case_id": "c2", "passed": True}}
+    assert events[3][2] == "3:3"
+    assert events[4][1]["status"] == "done"
+
+    # 再接続時は Last-Event-ID から続きを送る
+    resumed = _parse_sse(client.get("/api/bm/job-sse/events", headers={"Last-Event-ID": "3:3"}).text)
+    assert [e[0] for e in resumed] == ["status", "end"]
+
+    assert client.get("/api/bm/missing/events").status_code == 404
+
+
+def test_suite_info_uses_etag(tmp_path: Path):
+    suite_path = tmp_path / "suite.yaml"
+    suite_path.write_text("cases:\n  - id: a\n    name: A\n", encoding="utf-8")
+
+    import bench.server as server
+
+    client = TestClient(server.app)
+    resp = client.get("/api/suite", params={"suite_path": str(suite_path)})
+    assert resp.status_code == 200
+    assert resp.json()["total_tests"] == 1
+    etag = resp.headers["etag"]
+
+    resp = client.get("/api/suite", params={"suite_path": str(suite_path)}, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+
+    suite_path.write_text("cases:\n  - id: a\n  - id: b\n", encoding="utf-8")
+    resp = client.get("/api/suite", params={"suite_path": str(suite_path)}, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.json()["total_tests"] == 2
+    assert resp.headers["etag"] != etag
+
+
+def test_run_bm_task_against_mock_server(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    # run_bm_task を差し替えず、モックサーバー（bench.mock）相手に実際にジョブを最後まで流す
+    import time
+
+    import bench.server as server
+    from bench.mock import MockServer
+
+    monkeypatch.setattr(server, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(server, "JOURNAL_DIR", tmp_path / "jobs")
+    suite_path = tmp_path / "suite.yaml"
+    suite_path.write_text(
+        """cases:
+  - id: legacy
+    request:
+      messages:
+        - role: user
+          content: hi
+    eval:
+      type: contains_all
+      keywords: [hi]
+""",
+        encoding="utf-8",
+    )
+
+    with MockServer({"models": ["m1", "m2"], "ttft_ms": 5, "itl_ms": 1}) as mock:
+        client = TestClient(server.app)
+        job_id = client.post(
+            "/api/bm/start",
+            json={"suite_path": str(suite_path), "base_url": mock.base_url, "models": ["m1", "m2"],
+                  "runs": 2, "warmup": 0, "timeout": 5, "cache": "off"},
+        ).json()["job_id"]
+        deadline = time.monotonic() + 30
+        while True:
+            job = client.get(f"/api/bm/{job_id}").json()
+            if job["status"] in server.FINISHED_STATUSES or time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+
+    assert job["status"] == "done"
+    assert [(r["model"], r["passed"]) for r in job["results"]] == [("m1", True)] * 2 + [("m2", True)] * 2
+    assert mock.state.stats["completed"] == 4
@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+import bench.main as main
+from bench.similarity import compile_pattern, levenshtein, levenshtein_ratio, levenshtein_reference
+
+ALPHABET = "abcABCあいう 、。İiß"
+
+
+def reference_ratio(s1, s2):
+    max_len = max(len(s1), len(s2))
+    return 1 - (levenshtein_reference(s1, s2) / max_len) if max_len > 0 else 1.0
+
+
+def random_pairs(n=400, seed=0):
+    rng = random.Random(seed)
+    for _ in range(n):
+        a = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 80)))
+        if rng.random() < 0.5:
+            b = "".join(c if rng.random() > 0.2 else rng.choice(ALPHABET) for c in a)[: rng.randint(0, len(a) + 5)]
+        else:
+            b = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 80)))
+        yield a, b
+
+
+def test_distance_matches_reference():
+    for a, b in random_pairs():
+        assert levenshtein(a, b) == levenshtein_reference(a, b), (a, b)
+
+
+def test_long_pattern_beyond_machine_word():
+    a = "x" * 300 + "abc" * 50
+    b = "x" * 290 + "abd" * 55
+    assert levenshtein(a, b) == levenshtein_reference(a, b)
+
+
+def test_ratio_with_cutoff_is_exact_or_zero():
+    for a, b in random_pairs(seed=1):
+        expected = reference_ratio(a, b)
+        assert levenshtein_ratio(a, b) == expected
+        for cutoff in (0.3, 0.8):
+            got = levenshtein_ratio(a, b, score_cutoff=cutoff, pattern=compile_pattern(b))
+            assert got == (expected if expected >= cutoff else 0.0), (a, b, cutoff)
+
+
+def test_case_insensitive_per_character():
+    assert levenshtein("ABC", "abc") == 0
+    assert levenshtein("", "") == 0 and levenshtein_ratio("", "") == 1.0
+
+
+def old_fuzzy(response_text, rule):
+    """変更前の fuzzy_match 判定（等価性確認用）。"""
+    expected = rule.get("expected", "")
+    alternatives = list(rule.get("alternatives", [expected]))
+    if expected and expected not in alternatives:
+        alternatives.insert(0, expected)
+    norm = main._normalize_loose if rule.get("normalize") == "loose" else main._normalize_basic
+    response_clean = norm(response_text.strip())
+    best_ratio, best_match = 0, None
+    for alt in alternatives:
+        ratio = reference_ratio(response_clean, norm(alt.strip()))
+        if ratio > best_ratio:
+            best_ratio, best_match = ratio, alt
+    return best_ratio >= rule.get("threshold", 0.8), best_match, best_ratio
+
+
+@pytest.mark.parametrize("normalize", ["basic", "loose"])
+def test_evaluate_fuzzy_match_equivalent_to_previous(normalize):
+    rng = random.Random(2)
+    for response, expected in random_pairs(150, seed=3):
+        alts = [expected] + ["".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 20))) for _ in range(3)]
+        rule = {"type": "fuzzy_match", "expected": expected, "alternatives": list(alts), "threshold": 0.6, "normalize": normalize}
+        passed, details = main.evaluate_result(response, rule)
+        old_passed, old_match, old_ratio = old_fuzzy(response, rule)
+        assert passed == old_passed
+        if passed:
+            assert details["matched"] == old_match
+        assert f"{old_ratio*100:.1f}%" in details["reason"]
@@ -0,0 +1,83 @@
+import json
+
+import httpx
+from openai import OpenAI
+
+import bench.main as main
+from bench.sse import RawSSEClient, iter_sse_data
+from bench.transport import BenchTransport, TransportConfig
+
+TOKENS = 3000
+
+
+def sse_body(tokens):
+    events = [{"choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}}]}]
+    events += [{"id": "c", "object": "chat.completion.chunk", "model": "m",
+                "choices": [{"index": 0, "delta": {"content": f"t{i} "}, "finish_reason": None}]}
+               for i in range(tokens)]
+    events.append({"choices": [], "usage": {"prompt_tokens": 7, "completion_tokens": tokens, "total_tokens": tokens + 7}})
+    return [f"data: {json.dumps(e)}\n\n".encode() for e in events] + [b"data: [DONE]\n\n"]
+
+
+def clients(handler):
+    http_client = httpx.Client(transport=BenchTransport(TransportConfig(retries=0), inner=httpx.MockTransport(handler)))
+    sdk = OpenAI(base_url="http://sse.test/v1", api_key="x", http_client=http_client, max_retries=0)
+    return sdk, RawSSEClient("http://sse.test/v1", api_key="x", http_client=http_client)
+
+
+def test_parses_events_split_across_reads():
+    chunks = [(b"data: a\r\n", 1.0), (b"\r\n: comment\n\ndata: b", 2.0), (b"\ndata: c\n\n", 3.0)]
+    assert list(iter_sse_data(chunks)) == [(b"a", 2.0), (b"b\nc", 3.0)]
+
+
+def test_raw_backend_matches_sdk_records():
+    body = sse_body(TOKENS)
+    sent = []
+
+    def handler(request):
+        sent.append(json.loads(request.content))
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=httpx.ByteStream(b"".join(body)))
+
+    sdk, raw = clients(handler)
+    messages = [{"role": "user", "content": "hi"}]
+    meta = {"default_params": {"max_tokens": 5000}}
+    by_sdk = main._stream_completion(sdk, "m", messages, meta, 5)
+    by_raw = main._stream_completion(raw, "m", messages, meta, 5)
+
+    assert sent[0] == sent[1]
+    assert by_raw.keys() == by_sdk.keys()
+    for key in ("status", "error_type", "response", "prompt_tokens", "completion_tokens", "token_source"):
+        assert by_raw[key] == by_sdk[key], key
+    assert by_raw["completion_tokens"] == TOKENS and len(by_raw["itl_ms"]) == len(by_sdk["itl_ms"]) == TOKENS - 1
+
+
+def test_errors_use_sdk_error_types():
+    def bad_request(request):
+        return httpx.Response(400, json={"error": {"message": "Model does not support images"}})
+
+    sdk, raw = clients(bad_request)
+    by_sdk = main._stream_completion(sdk, "m", [{"role": "user", "content": "hi"}], {}, 5)
+    by_raw = main._stream_completion(raw, "m", [{"role": "user", "content": "hi"}], {}, 5)
+    assert by_raw["status"] == by_sdk["status"] == "error"
+    assert by_raw["error_type"] == by_sdk["error_type"] == "BadRequestError"
+    assert by_raw["response"] == by_sdk["response"]
+
+    def refused(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    sdk, raw = clients(refused)
+    assert main._stream_completion(raw, "m", [], {}, 5)["error_type"] == "APIConnectionError"
+    assert main._stream_completion(sdk, "m", [], {}, 5)["error_type"] == "APIConnectionError"
+
+    def stream_error(request):
+        return httpx.Response(200, stream=httpx.ByteStream(b'data: {"error": {"message": "boom"}}\n\n'))
+
+    sdk, raw = clients(stream_error)
+    by_raw = main._stream_completion(raw, "m", [], {}, 5)
+    assert (by_raw["error_type"], by_raw["response"]) == ("APIError", "boom")
+
+
+def test_stream_client_selects_backend(fake_llm):
+    assert isinstance(main.stream_client("http://x/v1", {"stream_backend": "raw"}), RawSSEClient)
+    _, client = fake_llm()
+    assert main.stream_client("http://x/v1", {}) is client
@@ -92,3 +92,67 @@ def test_suite_auto_loads_and_is_auto_evaluable():
 
     assert variants >= 1000
     assert "semantic_match" not in eval_types
+
+
+def test_load_suite_cache_invalidates_on_include_change(tmp_path: Path):
+    from bench.suitecache import SUITE_CACHE
+
+    cat = tmp_path / "cat.yaml"
+    cat.write_text("category: {id: c, name: C}\ncases:\n  - id: a\n", encoding="utf-8")
+    suite_path = tmp_path / "suite.yaml"
+    suite_path.write_text("includes: [cat.yaml, later.yaml]\n", encoding="utf-8")
+
+    first = load_suite(suite_path)
+    hits = SUITE_CACHE.hits
+    second = load_suite(suite_path)
+    assert SUITE_CACHE.hits == hits + 1
+    assert second == first and second is not first
+    # 返り値を書き換えてもキャッシュには影響しない
+    second["cases"][0]["id"] = "mutated"
+    assert load_suite(suite_path)["cases"][0]["id"] == "a"
+
+    cat.write_text("category: {id: c, name: C}\ncases:\n  - id: a\n  - id: b\n", encoding="utf-8")
+    assert [c["id"] for c in load_suite(suite_path)["cases"]] == ["a", "b"]
+
+    # 最初は存在しなかった include が作られても読み直す
+    (tmp_path / "later.yaml").write_text("category: {id: d, name: D}\ncases:\n  - id: z\n", encoding="utf-8")
+    assert [c["id"] for c in load_suite(suite_path)["cases"]] == ["a", "b", "z"]
+
+
+def test_suite_cache_on_disk_is_shared_with_new_processes(tmp_path: Path):
+    from bench.main import _parse_suite
+    from bench.suitecache import SuiteCache
+
+    suite_path = tmp_path / "suite.yaml"
+    suite_path.write_text("cases:\n  - id: a\n", encoding="utf-8")
+    builds = []
+
+    def build(path):
+        builds.append(path)
+        return _parse_suite(path)
+
+    cache_dir = tmp_path / "cache"
+    suite, etag = SuiteCache(cache_dir).get(suite_path, build)
+    # 新しいプロセス（別のインスタンス）でもパースせずに同じ内容・ETag を返す
+    fresh = SuiteCache(cache_dir)
+    assert fresh.get(suite_path, build) == (suite, etag) and len(builds) == 1
+    assert SuiteCache(cache_dir).peek_etag(suite_path) == etag
+
+    suite_path.write_text("cases:\n  - id: a\n  - id: b\n", encoding="utf-8")
+    assert [c["id"] for c in SuiteCache(cache_dir).get(suite_path, build)[0]["cases"]] == ["a", "b"]
+    assert len(builds) == 2
+
+    # 壊れたキャッシュファイルは無視してパースし直す
+    for f in cache_dir.glob("*.pickle"):
+        f.write_bytes(b"broken")
+    assert [c["id"] for c in SuiteCache(cache_dir).get(suite_path, build)[0]["cases"]] == ["a", "b"]
+    assert len(builds) == 3 and not list(cache_dir.glob("*.tmp"))
+
+
+def test_validate_suite_reports_all_duplicates_in_linear_scan():
+    from bench.main import validate_suite
+
+    cases = [{"id": f"c{i}"} for i in range(20000)] + [{"id": "c5"}, {"id": "c7"}, {"id": "c7"}, {}]
+    with pytest.raises(ValueError, match=r"\['c5', 'c7'\]"):
+        validate_suite({"cases": cases})
+    validate_suite({"cases": cases[:20000]})
@@ -0,0 +1,152 @@
+import http.server
+import json
+import threading
+
+import httpx
+import pytest
+from openai import OpenAI
+
+import bench.main as main
+from bench.mock import MockServer
+from bench.transport import (
+    AsyncRunner,
+    BenchTransport,
+    CircuitBreaker,
+    CircuitOpenError,
+    TransportConfig,
+    backoff_delay,
+    openai_options,
+    resolve_transport,
+    shared_async_client,
+)
+
+
+def client_for(handler, sleeps, **config):
+    transport = BenchTransport(TransportConfig(**config), inner=httpx.MockTransport(handler), sleep=sleeps.append)
+    return httpx.Client(transport=transport)
+
+
+def test_retries_with_backoff_and_retry_after():
+    statuses = iter([503, 429, 200])
+    sleeps = []
+
+    def handler(request):
+        status = next(statuses)
+        return httpx.Response(status, headers={"retry-after": "1.5"} if status == 429 else {})
+
+    with client_for(handler, sleeps, retries=2, backoff_base=0.5) as client:
+        assert client.get("http://retry.test/v1/models").status_code == 200
+    assert len(sleeps) == 2 and 0 <= sleeps[0] <= 0.5 and sleeps[1] == 1.5
+
+    config = TransportConfig(backoff_base=1.0, backoff_cap=3.0)
+    assert all(0 <= backoff_delay(10, config) <= 3.0 for _ in range(50))
+    assert resolve_transport({"http_retries": "5", "http_max_connections": 4}) == TransportConfig(retries=5, max_connections=4)
+
+
+def test_connect_errors_trip_the_breaker():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ConnectError("refused", request=request)
+
+    sleeps = []
+    with client_for(handler, sleeps, retries=1, breaker_threshold=3, breaker_cooldown=60) as client:
+        with pytest.raises(httpx.ConnectError):
+            client.get("http://flapping.test/v1/models")
+        assert len(calls) == 2 and len(sleeps) == 1
+        with pytest.raises(httpx.ConnectError):
+            client.get("http://flapping.test/v1/models")
+        assert len(calls) == 3  # 3回目の失敗でブレーカーが開き、リトライもしない
+        with pytest.raises(CircuitOpenError):
+            client.get("http://flapping.test/v1/models")
+        assert len(calls) == 3
+
+
+def test_breaker_half_open_probe():
+    now = [0.0]
+    breaker = CircuitBreaker(threshold=2, cooldown=10, clock=lambda: now[0])
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    now[0] = 10
+    assert breaker.allow() and not breaker.allow()  # half-open は1件だけ通す
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.trips == 1
+    now[0] = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+class SSEHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        chunks = [{"choices": [{"index": 0, "delta": {"content": piece}}]} for piece in ("hello ", "world")]
+        body = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body.encode())))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+def test_stream_completion_records_http_phases_over_shared_pool():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SSEHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = OpenAI(base_url=f"http://127.0.0.1:{server.server_port}/v1", api_key="x", **openai_options())
+        messages = [{"role": "user", "content": "hi"}]
+        first = main._stream_completion(client, "m", messages, {}, 5)
+        second = main._stream_completion(client, "m", messages, {}, 5)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert first["status"] == "ok" and first["response"] == "hello world"
+    phases = first["http_phases"]
+    assert phases["reused"] is False and phases["retries"] == 0
+    assert 0 < phases["request_sent_ms"] <= phases["headers_ms"] <= phases["first_byte_ms"] <= first["ttft_ms"]
+    assert phases["client_ms"] == pytest.approx(first["ttft_ms"] - phases["first_byte_ms"], abs=0.02)
+    # 2件目は keep-alive の接続を使い回す
+    assert second["http_phases"]["reused"] is True and second["http_phases"]["connect_ms"] == 0.0
+
+
+def test_async_runner_shares_one_client_per_job_and_closes_it():
+    async def client():
+        return shared_async_client()
+
+    seen = []
+    with AsyncRunner() as runner:
+        first = runner.run(client())
+        threads = [threading.Thread(target=lambda: seen.append(runner.run(client()))) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert seen == [first, first] and not first.is_closed
+    assert first.is_closed and runner.loop.is_closed()
+
+
+@pytest.mark.parametrize("backend", ["sdk", "raw"])
+def test_measured_requests_are_not_retried(backend):
+    # 503 をリトライすると、失敗した試行とバックオフが ok の TTFT に入り、エラー率からも消える
+    with MockServer({"errors": {"rate": 1.0, "status": 503}, "ttft_ms": 0, "itl_ms": 0}) as server:
+        client = main.stream_client(server.base_url, {"stream_backend": backend, "http_retries": 3})
+        out = main._stream_completion(client, "mock-llm", [{"role": "user", "content": "hi"}], {}, 5)
+        assert out["status"] == "error" and out["error_type"] == "InternalServerError"
+        assert server.state.stats["requests"] == 1
+        assert main.get_models(server.base_url) == ["mock-llm"]  # 計測しないリクエストは従来どおり
+
+
+def test_fake_clients_have_no_phases(fake_llm):
+    fake_llm()
+    suite = {"meta": {}, "cases": [{"id": "l", "request": {"messages": [{"role": "user", "content": "a"}]},
+                                    "eval": {"type": "contains_all", "keywords": ["a"]}}]}
+    results = main.run_bench_logic(suite, "http://x/v1", ".*", runs=1, warmup=0, timeout=5)
+    assert results[0]["http_phases"] is None
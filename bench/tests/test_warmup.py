@@ -0,0 +1,58 @@
+import bench.main as main
+from bench.warmup import WarmupRegistry, coefficient_of_variation, resolve_warmup, run_warmup
+
+
+def sender(latencies):
+    it = iter(latencies)
+    return lambda: {"status": "ok", "ttft_ms": 1.0, "e2e_ms": next(it)}
+
+
+def test_stops_when_rolling_cv_is_below_threshold():
+    config = resolve_warmup({"warmup_cv": 0.05, "warmup_window": 3}, max_requests=10)
+    record = run_warmup(sender([900, 300, 100, 102, 98, 100, 100]), config)
+    assert record["requests"] == 5 and record["stable"] is True
+    assert record["e2e_ms"] == [900, 300, 100, 102, 98]
+    assert record["cv"] == coefficient_of_variation([100, 102, 98])
+
+
+def test_cap_and_errors():
+    config = resolve_warmup({}, max_requests=4)
+    record = run_warmup(sender([100, 300, 100, 300]), config)
+    assert record["requests"] == 4 and record["stable"] is False
+
+    record = run_warmup(lambda: {"status": "error", "error_type": "APIConnectionError"}, config)
+    assert record["requests"] == 1 and record["error"] == "APIConnectionError" and record["e2e_ms"] == []
+
+    assert run_warmup(sender([100, 100]), resolve_warmup({}, max_requests=2))["stable"] is None
+    assert resolve_warmup({"warmup": 7})["max_requests"] == 7
+
+
+def test_registry_runs_once_per_scope():
+    registry = WarmupRegistry()
+    calls = []
+    for _ in range(3):
+        registry.ensure(("u", "m"), lambda: calls.append(1) or {"requests": 1})
+    assert len(calls) == 1 and registry.get(("u", "m")) == {"requests": 1}
+
+
+def test_warmup_runs_once_per_model_for_variant_and_legacy_cases(fake_llm):
+    completions, _ = fake_llm()
+    suite = {
+        "meta": {"warmup_max_tokens": 3},
+        "cases": [
+            {"id": "v", "variants": [{"prompt": "a", "evaluation": {"type": "contains_all", "keywords": ["a"]}}]},
+            {"id": "l", "request": {"messages": [{"role": "user", "content": "b"}]},
+             "eval": {"type": "contains_all", "keywords": ["b"]}},
+        ],
+    }
+
+    results = main.run_bench_logic(suite, "http://x/v1", ".*", runs=2, warmup=4, timeout=5)
+
+    warmup_calls = [c for c in completions.calls if c["max_tokens"] == 3]
+    record = results[0]["warmup"]
+    assert 3 <= record["requests"] <= 4 and len(warmup_calls) == record["requests"]
+    # ウォームアップは最初にまとめて行い、計測・採点には含めない
+    assert all(c["max_tokens"] == 3 for c in completions.calls[:record["requests"]])
+    assert len(completions.calls) == record["requests"] + 2 + 2
+    assert results[0]["variant_total_count"] == 2
+    assert [r["warmup"] for r in results] == [record] * 3
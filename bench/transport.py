@@ -0,0 +1,405 @@
+"""
+共有 HTTP トランスポート（接続プール・リトライ・サーキットブレーカー・フェーズ計測）。
+
+従来は get_models / probe_vision_capability / run_bench_logic がそれぞれ OpenAI クライアントを作り、
+server の /api/models・get_models_fallback・list_models_v0 も呼び出しごとに httpx のクライアントを
+開いていた。接続は使い捨てで、失敗したリクエストの扱いも呼び出し元ごとに違っていた。ここでは
+
+- 設定（TransportConfig）ごとに1つの httpx.Client（非同期はイベントループごとに1つの AsyncClient）を
+  共有し、keep-alive の接続プールを使い回す。上限は max_connections / max_keepalive で指定する。
+  server のジョブ（ワーカースレッド）は AsyncRunner の1つのループで非同期処理を実行し、最後に閉じる
+- 接続エラー・429/502/503/504 はジッター付きの指数バックオフ（full jitter）でリトライする。
+  Retry-After があればそれを優先する（backoff_cap まで）。OpenAI クライアント側のリトライは 0 にする
+  （計測するリクエストのクライアントは retries=0 で作る。main.stream_client）
+- 接続先（scheme, host, port）ごとのサーキットブレーカー。連続 breaker_threshold 回失敗したら
+  breaker_cooldown 秒は送らずに CircuitOpenError（httpx.ConnectError）にし、その後1件だけ試す
+- OpenAI のクライアントが SSE の [DONE] で読むのをやめて閉じた本文は、残り（チャンク終端）を読み切って
+  接続をプールに戻す
+- httpx（httpcore）の trace イベントで、リクエストを接続・送信完了・ヘッダー受信・最初のバイトに
+  分けて時刻を記録する（capture_phases の中で送ったリクエストのみ）。モデルのレイテンシと、
+  接続・ネットワーク・クライアント側（SSE のパースなど）のオーバーヘッドを分けて見るため
+"""
+import asyncio
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Dict, NamedTuple, Optional
+
+import httpx
+
+MAX_CONNECTIONS = 64
+MAX_KEEPALIVE = 32
+KEEPALIVE_EXPIRY = 30.0
+RETRIES = 2
+BACKOFF_BASE = 0.25
+BACKOFF_CAP = 4.0
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 10.0
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class TransportConfig(NamedTuple):
+    max_connections: int = MAX_CONNECTIONS
+    max_keepalive: int = MAX_KEEPALIVE
+    keepalive_expiry: float = KEEPALIVE_EXPIRY
+    retries: int = RETRIES
+    backoff_base: float = BACKOFF_BASE
+    backoff_cap: float = BACKOFF_CAP
+    breaker_threshold: int = BREAKER_THRESHOLD
+    breaker_cooldown: float = BREAKER_COOLDOWN
+
+
+def resolve_transport(meta: Optional[dict]) -> TransportConfig:
+    """suite の meta（http_max_connections / http_retries など http_ 接頭辞のキー）から設定を作る。"""
+    meta = meta or {}
+    defaults = TransportConfig()
+    return TransportConfig(**{
+        field: type(getattr(defaults, field))(meta[f"http_{field}"]) if meta.get(f"http_{field}") is not None
+        else getattr(defaults, field)
+        for field in TransportConfig._fields
+    })
+
+
+class CircuitOpenError(httpx.ConnectError):
+    """サーキットブレーカーが開いているため送らなかった（接続できないのと同じ扱い）。"""
+
+
+class CircuitBreaker:
+    """接続先ごとのサーキットブレーカー（closed → open → half-open → closed）。"""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.clock() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        """送ってよいか。half-open では1件（プローブ）だけ通す。"""
+        with self._lock:
+            state = self.state
+            if state == "closed" or self.threshold <= 0:
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self.threshold > 0 and self.failures >= self.threshold and self.opened_at is None):
+                self.trips += 1 if self.opened_at is None else 0
+                self.opened_at = self.clock()
+            self._probing = False
+
+
+_BREAKERS: Dict[tuple, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def breaker_for(url, config: TransportConfig = TransportConfig()) -> CircuitBreaker:
+    """接続先ごとのブレーカー（同期・非同期のクライアントで共有）。"""
+    url = httpx.URL(str(url))
+    key = (url.scheme, url.host, url.port)
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(key)
+        if breaker is None:
+            breaker = _BREAKERS[key] = CircuitBreaker(config.breaker_threshold, config.breaker_cooldown)
+        return breaker
+
+
+def backoff_delay(attempt: int, config: TransportConfig, response: Optional[httpx.Response] = None, rng=random) -> float:
+    """attempt 回目（0始まり）の失敗後の待ち時間（full jitter）。Retry-After があればそれを使う。"""
+    if response is not None:
+        try:
+            return min(config.backoff_cap, max(0.0, float(response.headers.get("retry-after", ""))))
+        except ValueError:
+            pass
+    return rng.uniform(0, min(config.backoff_cap, config.backoff_base * (2 ** attempt)))
+
+
+def _retryable_error(exc: Exception) -> bool:
+    # 読み取りのタイムアウトは推論に時間がかかっているだけのことが多いので、送り直さない
+    return isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)) \
+        and not isinstance(exc, CircuitOpenError)
+
+
+# --- フェーズ計測 ---
+
+_current = threading.local()
+
+
+@contextmanager
+def capture_phases():
+    """この中で（同じスレッドから）送ったリクエストの各フェーズの時刻（perf_counter）を dict に記録する。"""
+    record: dict = {}
+    previous = getattr(_current, "record", None)
+    _current.record = record
+    try:
+        yield record
+    finally:
+        _current.record = previous
+
+
+def _tracer(record: dict, chained=None):
+    def trace(event_name, info):
+        now = time.perf_counter()
+        if event_name.endswith("connect_tcp.started"):
+            record["connect_start"] = now
+        elif event_name.endswith(("connect_tcp.complete", "start_tls.complete")):
+            record["connect_end"] = now
+        elif event_name.endswith("send_request_body.complete"):
+            record["request_sent"] = now
+        elif event_name.endswith("receive_response_headers.complete"):
+            record["headers"] = now
+        if chained is not None:
+            chained(event_name, info)
+    return trace
+
+
+# [DONE] の後に読み残してよいバイト数（チャンク終端などだけのはず）
+_DRAIN_LIMIT = 64 * 1024
+
+
+class _BodyStream(httpx.SyncByteStream):
+    """
+    最初のバイトの時刻を記録し、SSE の [DONE] まで届いた本文は閉じる前に読み切る。
+    OpenAI のクライアントは [DONE] で読むのをやめて閉じるため、チャンク終端が読み残されて
+    接続がプールに戻らず、ストリーミングのたびに接続し直していた。
+    """
+
+    def __init__(self, stream, record: Optional[dict]):
+        self._stream = stream
+        self._record = record
+        self._iter = None
+        self._tail = b""
+        self._done = False
+
+    def __iter__(self):
+        self._iter = iter(self._stream)
+        for chunk in self._iter:
+            if chunk and self._record is not None and "first_byte" not in self._record:
+                self._record["first_byte"] = time.perf_counter()
+            self._done = self._done or b"[DONE]" in self._tail + chunk
+            self._tail = chunk[-8:]
+            yield chunk
+        self._iter = None
+
+    def close(self):
+        if self._done and self._iter is not None:
+            drained = 0
+            try:
+                for chunk in self._iter:
+                    drained += len(chunk)
+                    if drained > _DRAIN_LIMIT:
+                        break
+            except httpx.HTTPError:
+                pass
+        self._stream.close()
+
+
+def _begin_attempt(record: dict, attempt: int) -> None:
+    for key in ("connect_start", "connect_end", "request_sent", "headers", "first_byte"):
+        record.pop(key, None)
+    record["retries"] = attempt
+
+
+def phase_metrics(record: Optional[dict], start_time: float, ttft_ms: Optional[float] = None) -> Optional[dict]:
+    """
+    capture_phases の記録を結果レコード用の ms にする（start_time からの経過。connect_ms だけは所要時間）。
+    client_ms は最初のバイトから最初のトークンまで（SSE のパースなどクライアント側の時間）。
+    """
+    if not record or "headers" not in record:
+        return None
+
+    def offset(key):
+        return round((record[key] - start_time) * 1000, 2) if key in record else None
+
+    first_byte = offset("first_byte")
+    connected = "connect_start" in record and "connect_end" in record
+    return {
+        "connect_ms": round((record["connect_end"] - record["connect_start"]) * 1000, 2) if connected else 0.0,
+        "reused": not connected,
+        "request_sent_ms": offset("request_sent"),
+        "headers_ms": offset("headers"),
+        "first_byte_ms": first_byte,
+        "client_ms": round(ttft_ms - first_byte, 2) if ttft_ms is not None and first_byte is not None else None,
+        "retries": record.get("retries", 0),
+    }
+
+
+# --- トランスポート ---
+
+class BenchTransport(httpx.BaseTransport):
+    """接続プール付きの HTTPTransport に、リトライ・ブレーカー・フェーズ計測を加える。"""
+
+    def __init__(self, config: TransportConfig = TransportConfig(), inner: Optional[httpx.BaseTransport] = None,
+                 sleep=time.sleep):
+        self.config = config
+        self._inner = inner or httpx.HTTPTransport(limits=_limits(config))
+        self._sleep = sleep
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        breaker = breaker_for(request.url, self.config)
+        record = getattr(_current, "record", None)
+        chained = request.extensions.get("trace")
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(f"サーキットブレーカーが開いています: {request.url.host}", request=request)
+            if record is not None:
+                _begin_attempt(record, attempt)
+                request.extensions = dict(request.extensions, trace=_tracer(record, chained))
+            try:
+                response = self._inner.handle_request(request)
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                if attempt >= self.config.retries or not _retryable_error(e):
+                    raise
+                self._sleep(backoff_delay(attempt, self.config))
+                attempt += 1
+                continue
+            if response.status_code in RETRY_STATUSES or response.status_code >= 500:
+                breaker.record_failure()
+                if response.status_code in RETRY_STATUSES and attempt < self.config.retries:
+                    response.close()
+                    self._sleep(backoff_delay(attempt, self.config, response))
+                    attempt += 1
+                    continue
+            else:
+                breaker.record_success()
+            response.stream = _BodyStream(response.stream, record)
+            return response
+
+    def close(self) -> None:
+        self._inner.close()
+
+
+class AsyncBenchTransport(httpx.AsyncBaseTransport):
+    """BenchTransport の非同期版（Web UI サーバーのモデル一覧などに使う。フェーズ計測はしない）。"""
+
+    def __init__(self, config: TransportConfig = TransportConfig(), inner: Optional[httpx.AsyncBaseTransport] = None):
+        self.config = config
+        self._inner = inner or httpx.AsyncHTTPTransport(limits=_limits(config))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        breaker = breaker_for(request.url, self.config)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(f"サーキットブレーカーが開いています: {request.url.host}", request=request)
+            try:
+                response = await self._inner.handle_async_request(request)
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                if attempt >= self.config.retries or not _retryable_error(e):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, self.config))
+                attempt += 1
+                continue
+            if response.status_code in RETRY_STATUSES or response.status_code >= 500:
+                breaker.record_failure()
+                if response.status_code in RETRY_STATUSES and attempt < self.config.retries:
+                    await response.aclose()
+                    await asyncio.sleep(backoff_delay(attempt, self.config, response))
+                    attempt += 1
+                    continue
+            else:
+                breaker.record_success()
+            return response
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+def _limits(config: TransportConfig) -> httpx.Limits:
+    return httpx.Limits(max_connections=config.max_connections, max_keepalive_connections=config.max_keepalive,
+                        keepalive_expiry=config.keepalive_expiry)
+
+
+_CLIENTS: Dict[TransportConfig, httpx.Client] = {}
+_CLIENTS_LOCK = threading.Lock()
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def shared_http_client(config: Optional[TransportConfig] = None) -> httpx.Client:
+    """設定ごとに共有する同期クライアント（OpenAI(http_client=...) に渡す）。"""
+    config = config or TransportConfig()
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(config)
+        if client is None:
+            client = _CLIENTS[config] = httpx.Client(transport=BenchTransport(config), timeout=None)
+        return client
+
+
+def shared_async_client(config: Optional[TransportConfig] = None) -> httpx.AsyncClient:
+    """実行中のイベントループごとに共有する非同期クライアント。"""
+    config = config or TransportConfig()
+    clients = _ASYNC_CLIENTS.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(config)
+    if client is None or client.is_closed:
+        client = clients[config] = httpx.AsyncClient(transport=AsyncBenchTransport(config), timeout=10.0)
+    return client
+
+
+async def aclose_async_clients() -> None:
+    """実行中のイベントループで共有している非同期クライアントを閉じる（ループを捨てる前に呼ぶ）。"""
+    for client in _ASYNC_CLIENTS.pop(asyncio.get_running_loop(), {}).values():
+        await client.aclose()
+
+
+class AsyncRunner:
+    """
+    ワーカースレッドから非同期処理を呼ぶための、ジョブ単位の長寿命のイベントループ（専用スレッドで回す）。
+
+    asyncio.run は呼ぶたびに新しいループを作るので、そのループの shared_async_client は閉じられないまま
+    捨てられ、接続も再利用されない。ジョブの間はこのループで run() し、close() でクライアントを閉じる。
+    run() は複数のスレッドから呼んでよい（先読みロードのスレッドなど）。
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="bench-async", daemon=True)
+        self._thread.start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def close(self) -> None:
+        if self.loop.is_closed():
+            return
+        try:
+            self.run(aclose_async_clients())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def openai_options(config: Optional[TransportConfig] = None) -> dict:
+    """OpenAI(...) に渡す共有トランスポートの引数（リトライはトランスポート側で行う）。"""
+    return {"http_client": shared_http_client(config), "max_retries": 0}
@@ -0,0 +1,117 @@
+"""
+モデルごとの適応的なウォームアップ。
+
+従来のウォームアップは旧形式のケースごとに固定回数（max_tokens=10 の非ストリーミング）で、スイートの
+大半を占める variants 形式には何もしていなかった。そのため最初のバリエーションがモデルのページインや
+グラフのコンパイルの時間を負担していた。ここでは
+
+- ウォームアップはモデル（分散実行ではエンドポイント × モデル）ごとに1回、最初のリクエストの前に行う
+- 短いストリーミングのリクエスト（max_tokens=warmup_max_tokens）を繰り返し、直近 window 件の E2E の
+  変動係数（標準偏差 / 平均）が cv 以下になったら安定とみなして打ち切る。上限は max_requests 件
+- 各リクエストの TTFT / E2E をウォームアップ曲線として記録する（採点・集計には含めない）
+
+設定（suite の meta、CLI / Web UI で上書き可能）:
+    warmup:            上限の件数（0 で無効）
+    warmup_cv:         安定とみなす変動係数（既定 0.10）
+    warmup_window:     変動係数を計算する直近の件数（既定 3。最低この件数は送る）
+    warmup_max_tokens: ウォームアップのリクエストの max_tokens（既定 16）
+"""
+import statistics
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+WARMUP_CV = 0.10
+WARMUP_WINDOW = 3
+WARMUP_MAX_TOKENS = 16
+
+
+def coefficient_of_variation(values) -> Optional[float]:
+    """標本の変動係数（母標準偏差 / 平均）。2件未満・平均が 0 以下なら None。"""
+    values = [v for v in values if v is not None]
+    if len(values) < 2:
+        return None
+    mean = sum(values) / len(values)
+    if mean <= 0:
+        return None
+    return statistics.pstdev(values) / mean
+
+
+def resolve_warmup(meta: dict, max_requests=None) -> dict:
+    """meta と上限の件数からウォームアップの設定を作る。max_requests が None なら meta.warmup を使う。"""
+    meta = meta or {}
+    if max_requests is None:
+        max_requests = meta.get("warmup", 0)
+    return {
+        "max_requests": max(0, int(max_requests or 0)),
+        "cv": float(meta.get("warmup_cv", WARMUP_CV)),
+        "window": max(2, int(meta.get("warmup_window", WARMUP_WINDOW))),
+        "max_tokens": int(meta.get("warmup_max_tokens", WARMUP_MAX_TOKENS)),
+    }
+
+
+def run_warmup(send: Callable[[], dict], config: dict, cancel_check: Callable = None) -> dict:
+    """
+    send() を安定するか上限に達するまで繰り返し、ウォームアップ曲線を返す。
+    send は _stream_completion と同じ形式（status / ttft_ms / e2e_ms）の dict を返す関数。
+    エラーになった場合はそこで打ち切る（計測側でも同じエラーになるため）。
+
+    戻り値: {"requests", "stable", "cv", "ttft_ms": [...], "e2e_ms": [...], "wall_ms", "error"}
+    stable は上限が window 未満で判定できなかった場合 None。
+    """
+    window = config["window"]
+    ttft_curve, e2e_curve = [], []
+    stable, cv, error = False, None, None
+    start = time.perf_counter()
+    for _ in range(config["max_requests"]):
+        if cancel_check and cancel_check():
+            break
+        out = send()
+        if out.get("status") != "ok":
+            error = out.get("error_type") or out.get("status")
+            break
+        ttft_curve.append(out.get("ttft_ms"))
+        e2e_curve.append(out.get("e2e_ms"))
+        if len(e2e_curve) >= window:
+            cv = coefficient_of_variation(e2e_curve[-window:])
+            if cv is not None and cv <= config["cv"]:
+                stable = True
+                break
+    if config["max_requests"] < window and error is None:
+        stable = None
+    return {
+        "requests": len(e2e_curve) + (1 if error else 0),
+        "stable": stable,
+        "cv": cv,
+        "ttft_ms": ttft_curve,
+        "e2e_ms": e2e_curve,
+        "wall_ms": (time.perf_counter() - start) * 1000,
+        "error": error,
+    }
+
+
+class WarmupRegistry:
+    """スコープ（(base_url, model)）ごとにウォームアップを1回だけ行う。同時に呼ばれた側は完了を待つ。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records: Dict[Hashable, dict] = {}
+        self._locks: Dict[Hashable, threading.Lock] = {}
+
+    def ensure(self, scope: Hashable, warm: Callable[[], dict]) -> dict:
+        with self._lock:
+            if scope in self._records:
+                return self._records[scope]
+            scope_lock = self._locks.setdefault(scope, threading.Lock())
+        with scope_lock:
+            with self._lock:
+                if scope in self._records:
+                    return self._records[scope]
+            record = warm()
+            with self._lock:
+                self._records[scope] = record
+            return record
+
+    def get(self, scope: Hashable) -> Optional[dict]:
+        with self._lock:
+            return self._records.get(scope)